@@ -0,0 +1,305 @@
+"""In-memory bitmap index of the campaign list filters.
+
+Campaigns are numbered by their position in id order, and every value of
+a filterable dimension (campaign type, site estado, municipio and
+furniture type) keeps the bitmap of the campaigns having it, as packed
+64-bit words. Date windows and demographic thresholds are ranges: the
+campaigns sorted by the bound are a binary search away from the bitmap of
+a range. A filter combination is then a few word-wise ORs (values of one
+dimension) and ANDs (across dimensions), and the total of the matches is
+a popcount, so listing a page needs no COUNT query.
+
+The index is built from the columnar snapshot, so it is rebuilt whenever
+an ingest refreshes the snapshot.
+"""
+import enum
+import string
+from datetime import date
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from .intervals import DateFilterMode
+from .snapshot import Snapshot
+
+WORD_BITS = 64
+# SQLite's lower() and LIKE only fold ASCII letters, so the name search
+# folds the same letters to match the SQL filter.
+ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+class Demographic(enum.Enum):
+  NSE_AB = 'nse_ab'
+  NSE_C = 'nse_c'
+  NSE_CMAS = 'nse_cmas'
+  NSE_D = 'nse_d'
+  NSE_DMAS = 'nse_dmas'
+  NSE_E = 'nse_e'
+  EDAD_0A14 = 'edad_0a14'
+  EDAD_15A19 = 'edad_15a19'
+  EDAD_20A24 = 'edad_20a24'
+  EDAD_25A34 = 'edad_25a34'
+  EDAD_35A44 = 'edad_35a44'
+  EDAD_45A64 = 'edad_45a64'
+  EDAD_65MAS = 'edad_65mas'
+  HOMBRES = 'hombres'
+  MUJERES = 'mujeres'
+
+
+class Bitmap:
+  """A set of campaign positions, one bit each."""
+
+  def __init__(self, words: np.ndarray, size: int) -> None:
+    self.words = words
+    self.size = size
+
+  @classmethod
+  def empty(cls, size: int) -> 'Bitmap':
+    return cls(np.zeros(-(-size // WORD_BITS), dtype=np.uint64), size)
+
+  @classmethod
+  def full(cls, size: int) -> 'Bitmap':
+    return cls.from_mask(np.ones(size, dtype=bool))
+
+  @classmethod
+  def from_mask(cls, mask: np.ndarray) -> 'Bitmap':
+    padded = np.zeros(-(-len(mask) // WORD_BITS) * WORD_BITS, dtype=bool)
+    padded[:len(mask)] = mask
+    words = np.packbits(padded, bitorder='little').view(np.uint64)
+    return cls(words, len(mask))
+
+  @classmethod
+  def from_positions(cls, positions: np.ndarray, size: int) -> 'Bitmap':
+    mask = np.zeros(size, dtype=bool)
+    mask[positions] = True
+    return cls.from_mask(mask)
+
+  def __and__(self, other: 'Bitmap') -> 'Bitmap':
+    return Bitmap(self.words & other.words, self.size)
+
+  def __or__(self, other: 'Bitmap') -> 'Bitmap':
+    return Bitmap(self.words | other.words, self.size)
+
+  def count(self) -> int:
+    return int(np.bitwise_count(self.words).sum())
+
+  def positions(self) -> np.ndarray:
+    bits = np.unpackbits(self.words.view(np.uint8), bitorder='little')
+    return np.flatnonzero(bits[:self.size])
+
+
+class SortedBound:
+  """Campaign positions ordered by one value, for range lookups."""
+
+  def __init__(self, values: np.ndarray, size: int) -> None:
+    missing = np.isnat(values) if values.dtype.kind == 'M' else np.isnan(values)
+    present = np.flatnonzero(~missing)
+    order = np.argsort(values[present], kind='stable')
+    self.positions = present[order]
+    self.values = values[self.positions]
+    self.size = size
+
+  def at_most(self, bound) -> Bitmap:
+    stop = np.searchsorted(self.values, bound, side='right')
+    return Bitmap.from_positions(self.positions[:stop], self.size)
+
+  def at_least(self, bound) -> Bitmap:
+    start = np.searchsorted(self.values, bound, side='left')
+    return Bitmap.from_positions(self.positions[start:], self.size)
+
+  def between(self, low, high) -> Bitmap:
+    start = np.searchsorted(self.values, low, side='left')
+    stop = np.searchsorted(self.values, high, side='right')
+    return Bitmap.from_positions(self.positions[start:stop], self.size)
+
+
+class CampaignIndex:
+  """Bitmaps of every filterable value, over the campaigns in id order."""
+
+  def __init__(
+    self,
+    ids: np.ndarray,
+    names: np.ndarray,
+    dimensions: Dict[str, Dict[str, Bitmap]],
+    bounds: Dict[str, SortedBound]
+  ) -> None:
+    self.ids = ids
+    self.names = np.char.translate(names.astype(str), ASCII_LOWER)
+    self.dimensions = dimensions
+    self.bounds = bounds
+
+  def __len__(self) -> int:
+    return len(self.ids)
+
+  def match(
+    self,
+    tipo_campania: Optional[str] = None,
+    fecha_inicio: Optional[date] = None,
+    fecha_fin: Optional[date] = None,
+    search: Optional[str] = None,
+    date_mode: DateFilterMode = DateFilterMode.START,
+    estado: Optional[List[str]] = None,
+    municipio: Optional[List[str]] = None,
+    tipo_de_mueble: Optional[List[str]] = None,
+    demografia: Optional[Demographic] = None,
+    demografia_min: Optional[float] = None
+  ) -> Bitmap:
+    """Campaigns passing every filter, like `crud.filter_campaigns`."""
+    matches = Bitmap.full(len(self))
+    if tipo_campania:
+      matches &= self.any_of('tipo_campania', [tipo_campania])
+    for dimension, values in (
+      ('estado', estado),
+      ('municipio', municipio),
+      ('tipo_de_mueble', tipo_de_mueble),
+    ):
+      if values:
+        matches &= self.any_of(dimension, values)
+
+    if fecha_inicio and fecha_fin:
+      start, end = np.datetime64(fecha_inicio), np.datetime64(fecha_fin)
+      if date_mode == DateFilterMode.OVERLAP:
+        matches &= self.bounds['first_day'].at_most(end)
+        matches &= self.bounds['last_day'].at_least(start)
+      else:
+        matches &= self.bounds['fecha_inicio'].between(start, end)
+
+    if demografia is not None and demografia_min is not None:
+      matches &= self.bounds[demografia.value].at_least(demografia_min)
+
+    if search:
+      matches &= Bitmap.from_mask(
+        np.char.find(self.names, search.translate(ASCII_LOWER)) >= 0
+      )
+
+    return matches
+
+  def any_of(self, dimension: str, values: Iterable[str]) -> Bitmap:
+    bitmaps = self.dimensions[dimension]
+    matches = Bitmap.empty(len(self))
+    for value in values:
+      if value in bitmaps:
+        matches |= bitmaps[value]
+    return matches
+
+  def page(self, matches: Bitmap, skip: int, limit: int) -> List[int]:
+    """Ids of the matching campaigns `skip:skip + limit`, in id order."""
+    return self.ids[matches.positions()[skip:skip + limit]].tolist()
+
+
+def build_campaign_index(dataset: Snapshot) -> CampaignIndex:
+  """Index the snapshot's campaigns and the sites they booked."""
+  campaigns = dataset.table('campaigns')
+  ids = np.asarray(campaigns.column('id'))
+  order = np.argsort(ids, kind='stable')
+  ids = ids[order]
+  size = len(ids)
+
+  starts = np.asarray(campaigns.column('fecha_inicio'))[order]
+  ends = np.asarray(campaigns.column('fecha_fin'))[order]
+  # Like the interval index: an open end is the start day and reversed
+  # dates are swapped.
+  ends = np.where(np.isnat(ends), starts, ends)
+  bounds = {
+    'fecha_inicio': SortedBound(starts, size),
+    'first_day': SortedBound(np.minimum(starts, ends), size),
+    'last_day': SortedBound(np.maximum(starts, ends), size),
+  }
+  for demographic in Demographic:
+    bounds[demographic.value] = SortedBound(
+      np.asarray(campaigns.column(demographic.value))[order], size
+    )
+
+  dimensions = {
+    'tipo_campania': _value_bitmaps(
+      np.arange(size), np.asarray(campaigns.column('tipo_campania'))[order],
+      campaigns.dictionary('tipo_campania'), size
+    ),
+    **_site_dimensions(dataset, ids),
+  }
+
+  return CampaignIndex(
+    ids=ids,
+    names=np.asarray(campaigns.values('name'))[order],
+    dimensions=dimensions,
+    bounds=bounds
+  )
+
+
+def _site_dimensions(
+  dataset: Snapshot, ids: np.ndarray
+) -> Dict[str, Dict[str, Bitmap]]:
+  """Estado, municipio and furniture type bitmaps of the booked sites."""
+  bookings = dataset.table('campaign_sites')
+  sites = dataset.table('sites')
+  municipios = dataset.table('municipios')
+  estados = dataset.table('estados')
+  furniture = dataset.table('furniture_types')
+  size = len(ids)
+
+  positions = _rows(ids, bookings.column('campaign_id'))
+  site_rows = _rows(sites.column('id'), bookings.column('site_id'))
+  booked = (positions >= 0) & (site_rows >= 0)
+  # A campaign books a site once per period; one pair of them is enough.
+  positions, site_rows = np.divmod(np.unique(
+    positions[booked] * len(sites) + site_rows[booked]
+  ), max(len(sites), 1))
+
+  municipio_rows = _rows(
+    municipios.column('id'), np.asarray(sites.column('municipio_id'))[site_rows]
+  )
+  estado_rows = _rows(
+    estados.column('id'),
+    np.asarray(municipios.column('estado_id'))[municipio_rows]
+  ) if len(municipios) else municipio_rows
+  estado_rows[municipio_rows < 0] = -1
+  furniture_rows = _rows(
+    furniture.column('id'),
+    np.asarray(sites.column('furniture_type_id'))[site_rows]
+  )
+
+  return {
+    'municipio': _value_bitmaps(
+      positions, municipio_rows, municipios.values('name'), size
+    ),
+    'estado': _value_bitmaps(
+      positions, estado_rows, estados.values('name'), size
+    ),
+    'tipo_de_mueble': _value_bitmaps(
+      positions, furniture_rows, furniture.values('name'), size
+    ),
+  }
+
+
+def _rows(keys: np.ndarray, references: np.ndarray) -> np.ndarray:
+  """Row of each referenced key in the sorted `keys`, or -1 if absent."""
+  keys = np.asarray(keys)
+  references = np.asarray(references, dtype=np.int64)
+  if not len(keys):
+    return np.full(len(references), -1, dtype=np.int64)
+
+  rows = np.searchsorted(keys, references).clip(0, len(keys) - 1)
+  return np.where(keys[rows] == references, rows, -1)
+
+
+def _value_bitmaps(
+  positions: np.ndarray, rows: np.ndarray, names: np.ndarray, size: int
+) -> Dict[str, Bitmap]:
+  """One bitmap per value name, of the positions whose row has it.
+
+  `rows` point into `names` (-1 for none); rows sharing a name, like
+  municipios of different estados, share its bitmap.
+  """
+  keep = rows >= 0
+  keys = np.unique(rows[keep].astype(np.int64) * max(size, 1) + positions[keep])
+  value_rows, value_positions = np.divmod(keys, max(size, 1))
+  boundaries = np.flatnonzero(np.diff(value_rows)) + 1
+
+  bitmaps: Dict[str, Bitmap] = {}
+  for group in np.split(np.arange(len(keys)), boundaries):
+    if not len(group):
+      continue
+    name = str(names[value_rows[group[0]]])
+    bitmap = Bitmap.from_positions(value_positions[group], size)
+    bitmaps[name] = bitmaps[name] | bitmap if name in bitmaps else bitmap
+  return bitmaps
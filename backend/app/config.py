@@ -0,0 +1,40 @@
+import os
+from pathlib import Path
+
+DATA_DIR = Path(
+  os.getenv('DATA_DIR', str(Path(__file__).parent.parent / 'data'))
+)
+SNAPSHOT_DIR = Path(os.getenv('SNAPSHOT_DIR', str(DATA_DIR / 'snapshot')))
+INGEST_REPORT_DIR = Path(
+  os.getenv('INGEST_REPORT_DIR', str(DATA_DIR / 'reports'))
+)
+
+CAMPAIGNS_FILE = 'bd_campanias_agrupado.csv'
+PERIODS_FILE = 'bd_campanias_periodos.csv'
+SITES_FILE = 'bd_campanias_sitios.csv'
+
+INGEST_WORKERS = int(os.getenv('INGEST_WORKERS', str(os.cpu_count() or 1)))
+
+# Statements slower than this are written to the slow-query log, with their
+# plan when SLOW_QUERY_EXPLAIN is on.
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '200'))
+SLOW_QUERY_EXPLAIN = os.getenv('SLOW_QUERY_EXPLAIN', '1') != '0'
+# Profiling and /debug endpoints are disabled unless a token is configured.
+DIAGNOSTICS_TOKEN = os.getenv('DIAGNOSTICS_TOKEN', '')
+PROFILE_INTERVAL_MS = float(os.getenv('PROFILE_INTERVAL_MS', '1'))
+
+# Concurrent identical reads share one computation; a follower waits this
+# long for it before computing on its own.
+SINGLE_FLIGHT_TIMEOUT_S = float(os.getenv('SINGLE_FLIGHT_TIMEOUT_S', '10'))
+
+# Serve a database prepared beforehand (`python seed.py --prepare`) without
+# seeding or migrating it, opened read-only so worker processes share it.
+DATABASE_READ_ONLY = os.getenv('DATABASE_READ_ONLY', '0') == '1'
+
+# Refreshes are built as numbered dataset versions under VERSIONS_DIR and
+# published once they validate. Servers look for a newly published version
+# every DATASET_CHECK_INTERVAL_S; the newest DATASET_VERSIONS_KEPT stay
+# available to clients pinned to one of them.
+VERSIONS_DIR = Path(os.getenv('VERSIONS_DIR', str(DATA_DIR / 'versions')))
+DATASET_VERSIONS_KEPT = int(os.getenv('DATASET_VERSIONS_KEPT', '3'))
+DATASET_CHECK_INTERVAL_S = float(os.getenv('DATASET_CHECK_INTERVAL_S', '5'))
@@ -1,8 +1,66 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from sqlalchemy.orm import Query, Session
+from sqlalchemy import (
+  and_, distinct, func, literal, select, text, union_all
+)
 from datetime import datetime, date
-from typing import Optional, List, Tuple
+from typing import Dict, Optional, List, Tuple
 from . import models
+from .bitmaps import CampaignIndex, Demographic
+from .distinct import STANDARD_ERROR, DistinctDimension, HyperLogLog
+from .geo import GeoLevel
+from .intervals import DateFilterMode, overlapping_campaigns
+from .periods import BUCKET_STEPS, PeriodGranularity, bucket_start
+from .sketches import PERCENTILES, DDSketch, SiteMetric
+
+IMPACTS_BY_BUCKET_SQL = '''
+WITH RECURSIVE buckets(bucket_start) AS (
+  SELECT :first_bucket
+  UNION ALL
+  SELECT date(bucket_start, :step) FROM buckets
+  WHERE date(bucket_start, :step) <= :window_end
+),
+windows AS (
+  SELECT
+    bucket_start,
+    date(bucket_start, :step, '-1 day') AS bucket_end,
+    max(bucket_start, :window_start) AS overlap_start,
+    min(date(bucket_start, :step, '-1 day'), :window_end) AS overlap_end
+  FROM buckets
+)
+SELECT
+  w.bucket_start,
+  w.bucket_end,
+  coalesce(sum(p.impactos_periodo_personas * p.share), 0),
+  coalesce(sum(p.impactos_periodo_vehiculos * p.share), 0)
+FROM windows AS w
+LEFT JOIN (
+  SELECT
+    w2.bucket_start,
+    cp.impactos_periodo_personas,
+    cp.impactos_periodo_vehiculos,
+    (julianday(min(cp.period_end, w2.overlap_end))
+      - julianday(max(cp.period_start, w2.overlap_start)) + 1)
+    / (julianday(cp.period_end) - julianday(cp.period_start) + 1) AS share
+  FROM windows AS w2
+  JOIN campaign_periods AS cp
+    ON cp.period_start <= w2.overlap_end
+    AND cp.period_end >= w2.overlap_start
+    {campaign_filter}
+) AS p ON p.bucket_start = w.bucket_start
+GROUP BY w.bucket_start
+ORDER BY w.bucket_start
+'''
+
+CAMPAIGN_PERIOD_FILTER = 'AND cp.campaign_id = :campaign_id'
+
+# Stored sketches fetched per round trip while merging; each is 4 KB.
+SKETCH_BATCH_SIZE = 256
+
+GEO_MEMBERS = {
+  GeoLevel.ESTADO: (models.Estado, models.GeoRollup.estado_id),
+  GeoLevel.ZM: (models.ZonaMetropolitana, models.GeoRollup.zm_id),
+  GeoLevel.MUNICIPIO: (models.Municipio, models.GeoRollup.municipio_id),
+}
 
 
 def get_campaigns_with_count(
@@ -12,14 +70,79 @@ def get_campaigns_with_count(
   tipo_campania: Optional[str] = None,
   fecha_inicio: Optional[date] = None,
   fecha_fin: Optional[date] = None,
-  search: Optional[str] = None
+  search: Optional[str] = None,
+  date_mode: DateFilterMode = DateFilterMode.START,
+  estado: Optional[List[str]] = None,
+  municipio: Optional[List[str]] = None,
+  tipo_de_mueble: Optional[List[str]] = None,
+  demografia: Optional[Demographic] = None,
+  demografia_min: Optional[float] = None,
+  index: Optional[CampaignIndex] = None
 ) -> Tuple[List[models.Campaign], int]:
+  """Filtered page of campaigns in id order and the total before paging.
+
+  By default the date window matches campaigns starting inside it; in
+  overlap mode it matches every campaign running on any day of the window.
+  Several estados, municipios or furniture types match campaigns booking
+  a site in any of them.
+
+  With the bitmap `index` the filters are resolved in memory and only the
+  page is read from the database; without it they are composed in SQL,
+  with the overlap window looked up in the interval index.
+  """
+  filters = {
+    'tipo_campania': tipo_campania,
+    'fecha_inicio': fecha_inicio,
+    'fecha_fin': fecha_fin,
+    'search': search,
+    'date_mode': date_mode,
+    'estado': estado,
+    'municipio': municipio,
+    'tipo_de_mueble': tipo_de_mueble,
+    'demografia': demografia,
+    'demografia_min': demografia_min,
+  }
+  if index is not None:
+    matches = index.match(**filters)
+    page_ids = index.page(matches, skip, limit)
+    campaigns = db.query(models.Campaign).filter(
+      models.Campaign.id.in_(page_ids)
+    ).order_by(models.Campaign.id).all()
+    return campaigns, matches.count()
+
+  query = filter_campaigns(db, **filters)
+  total = query.count()
+  campaigns = query.order_by(models.Campaign.id).offset(skip).limit(
+    limit
+  ).all()
+
+  return campaigns, total
+
+
+def filter_campaigns(
+  db: Session,
+  tipo_campania: Optional[str] = None,
+  fecha_inicio: Optional[date] = None,
+  fecha_fin: Optional[date] = None,
+  search: Optional[str] = None,
+  date_mode: DateFilterMode = DateFilterMode.START,
+  estado: Optional[List[str]] = None,
+  municipio: Optional[List[str]] = None,
+  tipo_de_mueble: Optional[List[str]] = None,
+  demografia: Optional[Demographic] = None,
+  demografia_min: Optional[float] = None
+) -> Query:
+  """Campaigns matching the list filters, before paging."""
   query = db.query(models.Campaign)
 
   if tipo_campania:
     query = query.filter(models.Campaign.tipo_campania == tipo_campania)
 
-  if fecha_inicio and fecha_fin:
+  if fecha_inicio and fecha_fin and date_mode == DateFilterMode.OVERLAP:
+    query = query.filter(
+      models.Campaign.id.in_(overlapping_campaigns(fecha_inicio, fecha_fin))
+    )
+  elif fecha_inicio and fecha_fin:
     query = query.filter(
       and_(
         models.Campaign.fecha_inicio >= fecha_inicio,
@@ -28,81 +151,200 @@ def get_campaigns_with_count(
     )
 
   if search:
-    query = query.filter(models.Campaign.name.ilike(f'%{search}%'))
+    query = query.filter(
+      models.Campaign.name.ilike(f'%{_escape_like(search)}%', escape='\\')
+    )
 
-  total = query.count()
-  campaigns = query.offset(skip).limit(limit).all()
+  if estado:
+    query = query.filter(models.Campaign.id.in_(
+      _rollup_campaigns(GeoLevel.ESTADO, estado)
+    ))
+  if municipio:
+    query = query.filter(models.Campaign.id.in_(
+      _rollup_campaigns(GeoLevel.MUNICIPIO, municipio)
+    ))
+  if tipo_de_mueble:
+    query = query.filter(models.Campaign.id.in_(
+      select(models.CampaignSite.campaign_id).join(
+        models.Site, models.Site.id == models.CampaignSite.site_id
+      ).join(
+        models.FurnitureType,
+        models.FurnitureType.id == models.Site.furniture_type_id
+      ).where(models.FurnitureType.name.in_(tipo_de_mueble))
+    ))
+
+  if demografia is not None and demografia_min is not None:
+    query = query.filter(
+      getattr(models.Campaign, demografia.value) >= demografia_min
+    )
 
-  return campaigns, total
+  return query
+
+
+def _escape_like(text: str) -> str:
+  """Match `text` literally in a LIKE pattern escaped with a backslash."""
+  return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _rollup_campaigns(level: GeoLevel, names: List[str]):
+  """Ids of the campaigns with sites in any region of `level` named so."""
+  member, member_key = GEO_MEMBERS[level]
+  return select(models.GeoRollup.campaign_id).join(
+    member, member.id == member_key
+  ).where(
+    models.GeoRollup.level == level.value,
+    models.GeoRollup.mes.is_(None),
+    member.name.in_(names)
+  )
+
+
+def matching_campaign_ids(db: Session, **filters):
+  """Subquery of the ids of the campaigns matching the list filters."""
+  return filter_campaigns(db, **filters).with_entities(
+    models.Campaign.id
+  ).scalar_subquery()
+
+
+def get_campaign_facets(db: Session, **filters) -> dict:
+  """Campaigns per type, start month and site estado, in one grouped query.
+
+  Each facet ignores its own filter: the type facet counts every type under
+  the other filters, the month facet ignores the date window and the
+  estado facet the estado filter, so a UI can show what choosing another
+  option would match. A campaign counts once in every estado where it
+  booked a site, read from the whole-campaign rows of the geo rollup.
+  """
+  campaign = models.Campaign
+  rollup = models.GeoRollup
+  start_month = func.strftime('%Y-%m', campaign.fecha_inicio)
+  by_type = filter_campaigns(
+    db, **{**filters, 'tipo_campania': None}
+  ).with_entities(
+    literal('tipo_campania'), campaign.tipo_campania, func.count()
+  ).group_by(campaign.tipo_campania)
+  by_month = filter_campaigns(
+    db, **{**filters, 'fecha_inicio': None, 'fecha_fin': None}
+  ).with_entities(
+    literal('mes_inicio'), start_month, func.count()
+  ).group_by(start_month)
+  by_estado = db.query(
+    literal('estado'), models.Estado.name, func.count()
+  ).select_from(rollup).join(
+    models.Estado, models.Estado.id == rollup.estado_id
+  ).filter(
+    rollup.level == GeoLevel.ESTADO.value,
+    rollup.mes.is_(None),
+    rollup.campaign_id.in_(
+      matching_campaign_ids(db, **{**filters, 'estado': None})
+    )
+  ).group_by(models.Estado.name)
 
+  facets = {'tipo_campania': [], 'mes_inicio': [], 'estado': []}
+  for facet, value, count in db.execute(union_all(
+    by_type.statement, by_month.statement, by_estado.statement
+  )):
+    facets[facet].append({'value': value, 'count': count})
 
-def get_campaign(db: Session, campaign_id: str) -> Optional[models.Campaign]:
+  for facet in ('tipo_campania', 'estado'):
+    facets[facet].sort(key=lambda item: (-item['count'], item['value'] or ''))
+  facets['mes_inicio'].sort(key=lambda item: item['value'] or '')
+  return facets
+
+
+def get_campaign(db: Session, name: str) -> Optional[models.Campaign]:
+  """Look a campaign up by its unique name, as used in the API routes."""
   return db.query(models.Campaign).filter(
-    models.Campaign.name == campaign_id
+    models.Campaign.name == name
   ).first()
 
 
-def get_campaign_sites_count(db: Session, campaign_name: str) -> int:
-  return db.query(models.CampaignSite).filter(
-    models.CampaignSite.campaign_name == campaign_name
-  ).count()
+def get_campaign_sites_count(db: Session, campaign_id: int) -> int:
+  """Distinct sites; a site booked for several periods counts once."""
+  return db.query(
+    func.count(distinct(models.CampaignSite.site_id))
+  ).filter(
+    models.CampaignSite.campaign_id == campaign_id
+  ).scalar()
 
 
-def get_campaign_periods_count(db: Session, campaign_name: str) -> int:
+def get_campaign_periods_count(db: Session, campaign_id: int) -> int:
   return db.query(models.CampaignPeriod).filter(
-    models.CampaignPeriod.campaign_name == campaign_name
+    models.CampaignPeriod.campaign_id == campaign_id
   ).count()
 
 
-def get_sites_summary(db: Session, campaign_name: str) -> dict:
-  sites = db.query(models.CampaignSite).filter(
-    models.CampaignSite.campaign_name == campaign_name
-  ).all()
-
-  furniture_type_stats = {}
-  municipality_stats = {}
-
-  for site in sites:
-    furniture_type = site.tipo_de_mueble or 'Unknown'
-    monthly_impacts = site.impactos_mensuales or 0
-
-    if furniture_type not in furniture_type_stats:
-      furniture_type_stats[furniture_type] = {'count': 0, 'total_impacts': 0}
-
-    furniture_type_stats[furniture_type]['count'] += 1
-    furniture_type_stats[furniture_type]['total_impacts'] += monthly_impacts
-    municipality = site.municipio or 'Unknown'
+def get_sites_summary(db: Session, campaign_id: int) -> dict:
+  """Sites and monthly impacts per furniture type and municipality.
 
-    if municipality not in municipality_stats:
-      municipality_stats[municipality] = {'count': 0, 'total_impacts': 0}
-
-    municipality_stats[municipality]['count'] += 1
-    municipality_stats[municipality]['total_impacts'] += monthly_impacts
+  A site booked for two fourteen-day periods of the same month has one row
+  per period carrying the same monthly impacts, so sites are counted once
+  and monthly impacts once per site and month.
+  """
+  site_months = _site_months(db, campaign_id)
 
   return {
-    'total_sites': len(sites),
+    'total_sites': db.query(
+      func.count(distinct(site_months.c.site_id))
+    ).scalar(),
     'by_type': [
       {
         'tipo_de_mueble': furniture_name,
-        'count': stats['count'],
-        'total_impacts': stats['total_impacts']
+        'count': count,
+        'total_impacts': total_impacts
       }
-      for furniture_name, stats in furniture_type_stats.items()
+      for furniture_name, count, total_impacts in _summarize_site_months(
+        db, site_months, models.Site.furniture_type_id, models.FurnitureType
+      )
     ],
     'by_municipio': [
       {
         'municipio': municipality_name,
-        'count': stats['count'],
-        'total_impacts': stats['total_impacts']
+        'count': count,
+        'total_impacts': total_impacts
       }
-      for municipality_name, stats in municipality_stats.items()
+      for municipality_name, count, total_impacts in _summarize_site_months(
+        db, site_months, models.Site.municipio_id, models.Municipio
+      )
     ]
   }
 
 
-def get_periods_summary(db: Session, campaign_name: str) -> dict:
+def _site_months(db: Session, campaign_id: int):
+  booking = models.CampaignSite
+  return db.query(
+    booking.site_id,
+    func.max(booking.impactos_mensuales).label('impactos_mensuales')
+  ).filter(
+    booking.campaign_id == campaign_id
+  ).group_by(
+    booking.site_id, booking.mes
+  ).subquery()
+
+
+def _summarize_site_months(
+  db: Session,
+  site_months,
+  key_column,
+  lookup
+) -> list:
+  """Site months grouped by the name a site's dictionary key stands for."""
+  group_label = func.coalesce(lookup.name, 'Unknown')
+  return db.query(
+    group_label,
+    func.count(distinct(site_months.c.site_id)),
+    func.coalesce(func.sum(site_months.c.impactos_mensuales), 0)
+  ).select_from(site_months).join(
+    models.Site, models.Site.id == site_months.c.site_id
+  ).outerjoin(
+    lookup, lookup.id == key_column
+  ).group_by(group_label).all()
+
+
+def get_periods_summary(db: Session, campaign_id: int) -> dict:
   periods = db.query(models.CampaignPeriod).filter(
-    models.CampaignPeriod.campaign_name == campaign_name
+    models.CampaignPeriod.campaign_id == campaign_id
+  ).order_by(
+    models.CampaignPeriod.period_start, models.CampaignPeriod.period
   ).all()
 
   period_data = [
@@ -115,11 +357,254 @@ def get_periods_summary(db: Session, campaign_name: str) -> dict:
     for period in periods
   ]
 
-  period_data.sort(key=lambda item: item['period'])
-
   return { 'total_periods': len(periods), 'data': period_data }
 
 
+def get_impacts_by_period(
+  db: Session,
+  window_start: date,
+  window_end: date,
+  granularity: PeriodGranularity,
+  campaign_id: Optional[int] = None
+) -> List[dict]:
+  """Period impacts inside a date window, re-bucketed to a granularity.
+
+  Each booked period spreads its impacts evenly over its days; a bucket
+  receives the share of the days it has in common with the period and the
+  window, so monthly and fourteen-day campaigns add up in the same buckets.
+  """
+  campaign_filter = '' if campaign_id is None else CAMPAIGN_PERIOD_FILTER
+  query = text(IMPACTS_BY_BUCKET_SQL.format(campaign_filter=campaign_filter))
+  rows = db.execute(query, {
+    'first_bucket': bucket_start(window_start, granularity).isoformat(),
+    'step': BUCKET_STEPS[granularity],
+    'window_start': window_start.isoformat(),
+    'window_end': window_end.isoformat(),
+    'campaign_id': campaign_id
+  })
+
+  return [
+    {
+      'bucket_start': date.fromisoformat(start),
+      'bucket_end': date.fromisoformat(end),
+      'people_impacts': round(people_impacts),
+      'vehicle_impacts': round(vehicle_impacts)
+    }
+    for start, end, people_impacts, vehicle_impacts in rows
+  ]
+
+
+def get_geo_rollup(
+  db: Session,
+  campaign_id: int,
+  level: GeoLevel,
+  mes: Optional[str] = None,
+  estado_id: Optional[int] = None,
+  zm_id: Optional[int] = None
+) -> List[dict]:
+  """Regions of one level read from the rollup cube, largest first.
+
+  Without `mes` the totals cover the whole campaign. Municipios can be
+  narrowed to the estado or zona metropolitana being drilled into.
+  """
+  member, member_key = GEO_MEMBERS[level]
+  rollup = models.GeoRollup
+  query = db.query(
+    member.id,
+    member.name,
+    rollup.estado_id,
+    rollup.zm_id,
+    rollup.sites,
+    rollup.impacts,
+    rollup.reach
+  ).join(
+    member, member.id == member_key
+  ).filter(
+    rollup.campaign_id == campaign_id,
+    rollup.level == level.value,
+    rollup.mes.is_(None) if mes is None else rollup.mes == mes
+  )
+
+  if estado_id is not None:
+    query = query.filter(rollup.estado_id == estado_id)
+  if zm_id is not None:
+    query = query.filter(rollup.zm_id == zm_id)
+
+  return [
+    {
+      'id': member_id,
+      'name': name,
+      'estado_id': region_estado_id,
+      'zm_id': region_zm_id,
+      'sites': sites,
+      'impacts': impacts,
+      'reach': reach
+    }
+    for member_id, name, region_estado_id, region_zm_id, sites, impacts, reach
+    in query.order_by(rollup.impacts.desc(), member.name)
+  ]
+
+
+def get_site(db: Session, codigo: str) -> Optional[models.Site]:
+  """Look a registered site up by its code, through its unique index."""
+  return db.query(models.Site).filter(
+    models.Site.codigo_del_sitio == codigo
+  ).first()
+
+
+def get_site_campaigns(db: Session, site_id: int) -> List[dict]:
+  """Campaigns booking a site, with the months and monthly impacts booked."""
+  booking = models.CampaignSite
+  site_months = db.query(
+    booking.campaign_id,
+    func.max(booking.impactos_mensuales).label('impactos_mensuales')
+  ).filter(
+    booking.site_id == site_id
+  ).group_by(
+    booking.campaign_id, booking.mes
+  ).subquery()
+
+  campaign = models.Campaign
+  rows = db.query(
+    campaign,
+    func.count(),
+    func.coalesce(func.sum(site_months.c.impactos_mensuales), 0)
+  ).join(
+    site_months, site_months.c.campaign_id == campaign.id
+  ).group_by(campaign.id).order_by(campaign.fecha_inicio, campaign.name)
+
+  return [
+    {
+      'id': booked.id,
+      'name': booked.name,
+      'tipo_campania': booked.tipo_campania,
+      'fecha_inicio': booked.fecha_inicio,
+      'fecha_fin': booked.fecha_fin,
+      'months': months,
+      'impacts': impacts
+    }
+    for booked, months, impacts in rows
+  ]
+
+
+def get_site_impacts(db: Session, site_id: int) -> List[dict]:
+  """Monthly impacts and reach of a site, counted once per month."""
+  booking = models.CampaignSite
+  rows = db.query(
+    booking.mes,
+    func.max(booking.impactos_mensuales),
+    func.max(booking.alcance_mensual),
+    func.count(distinct(booking.campaign_id))
+  ).filter(
+    booking.site_id == site_id,
+    booking.mes.is_not(None)
+  ).group_by(booking.mes).order_by(booking.mes)
+
+  return [
+    {
+      'mes': mes,
+      'impacts': impacts or 0,
+      'reach': reach or 0,
+      'campaigns': campaigns
+    }
+    for mes, impacts, reach, campaigns in rows
+  ]
+
+
+def estimate_distinct(
+  db: Session,
+  dimension: DistinctDimension,
+  campaign_ids=None,
+  mes_inicio: Optional[str] = None,
+  mes_fin: Optional[str] = None
+) -> dict:
+  """Approximate distinct sites or municipios, merging stored sketches.
+
+  `campaign_ids` (ids or a subquery of them) and the `mes` range narrow the
+  sketches merged; by default the whole portfolio is counted.
+  """
+  query = db.query(models.DistinctSketch.registers).filter(
+    models.DistinctSketch.dimension == dimension.value
+  )
+  if campaign_ids is not None:
+    query = query.filter(models.DistinctSketch.campaign_id.in_(campaign_ids))
+  if mes_inicio is not None:
+    query = query.filter(models.DistinctSketch.mes >= mes_inicio)
+  if mes_fin is not None:
+    query = query.filter(models.DistinctSketch.mes <= mes_fin)
+
+  merged = HyperLogLog()
+  sketches = 0
+  for row in query.yield_per(SKETCH_BATCH_SIZE):
+    merged.merge_bytes(row.registers)
+    sketches += 1
+
+  return {
+    'estimate': merged.estimate(),
+    'standard_error': STANDARD_ERROR,
+    'sketches': sketches
+  }
+
+
+def estimate_distinct_by_campaign(
+  db: Session, dimension: DistinctDimension, campaign_ids: List[int]
+) -> Dict[int, int]:
+  """Approximate distinct sites or municipios of each campaign.
+
+  The sketches of all `campaign_ids` are read in one query and merged per
+  campaign; a campaign without sketches estimates zero.
+  """
+  merged = {campaign_id: HyperLogLog() for campaign_id in campaign_ids}
+  query = db.query(
+    models.DistinctSketch.campaign_id, models.DistinctSketch.registers
+  ).filter(
+    models.DistinctSketch.dimension == dimension.value,
+    models.DistinctSketch.campaign_id.in_(campaign_ids)
+  )
+  for row in query.yield_per(SKETCH_BATCH_SIZE):
+    merged[row.campaign_id].merge_bytes(row.registers)
+
+  return {
+    campaign_id: sketch.estimate() for campaign_id, sketch in merged.items()
+  }
+
+
+def get_metric_stats(
+  db: Session,
+  metric: SiteMetric,
+  campaign_id: Optional[int] = None,
+  bins: int = 10
+) -> dict:
+  """Percentiles and histogram of a site metric, merging campaign sketches.
+
+  Without a campaign, every campaign's sketch is merged into the portfolio.
+  """
+  query = db.query(models.MetricSketch).filter(
+    models.MetricSketch.metric == metric.value
+  )
+  if campaign_id is not None:
+    query = query.filter(models.MetricSketch.campaign_id == campaign_id)
+
+  merged = DDSketch()
+  campaigns = 0
+  for record in query:
+    merged.merge(DDSketch.from_record(record))
+    campaigns += 1
+
+  return {
+    'campaigns': campaigns,
+    'count': merged.count,
+    'mean': merged.total / merged.count if merged.count else None,
+    'minimum': merged.minimum if merged.count else None,
+    'maximum': merged.maximum if merged.count else None,
+    'percentiles': [
+      {'percentile': round(q * 100), 'value': merged.quantile(q)}
+      for q in PERCENTILES
+    ],
+    'histogram': merged.histogram(bins)
+  }
+
+
 def get_campaign_summary(campaign: models.Campaign) -> dict:
   nse_distribution = [
     {'label': 'AB', 'value': campaign.nse_ab or 0},
@@ -150,3 +635,4 @@ def get_campaign_summary(campaign: models.Campaign) -> dict:
     'age_distribution': age_distribution,
     'gender_distribution': gender_distribution
   }
+
@@ -1,12 +1,99 @@
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
 from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import declarative_base
 from sqlalchemy.orm import sessionmaker
 
-SQLALCHEMY_DATABASE_URL = 'sqlite:///./campaigns.db'
+from . import config
+
+DATABASE_PATH = Path(__file__).parent.parent / 'campaigns.db'
+
+
+def database_url(path: str, read_only: bool = False) -> str:
+  if read_only:
+    # SQLite's URI form opens the file with mode=ro: connections never take
+    # write locks, and every worker reads the same pages from the OS cache.
+    return f'sqlite:///file:{path}?mode=ro&uri=true'
+
+  return f'sqlite:///{path}'
+
 
-engine = create_engine(
-  SQLALCHEMY_DATABASE_URL, connect_args={'check_same_thread': False}
+def create_database_engine(
+  path: Union[str, Path], read_only: bool = False
+) -> Engine:
+  return create_engine(
+    database_url(str(path), read_only),
+    connect_args={'check_same_thread': False}
+  )
+
+
+SQLALCHEMY_DATABASE_URL = database_url(
+  str(DATABASE_PATH), config.DATABASE_READ_ONLY
 )
+
+engine = create_database_engine(DATABASE_PATH, config.DATABASE_READ_ONLY)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
+
+
+class ServedVersion:
+  """One dataset version: its engine and the structures built from it."""
+
+  def __init__(self, version: int, engine: Engine, state: Any) -> None:
+    self.version = version
+    self.engine = engine
+    self.SessionLocal = sessionmaker(
+      autocommit=False, autoflush=False, bind=engine
+    )
+    self.state = state
+
+
+class ServingDatabase:
+  """The dataset versions a process serves, one of them current.
+
+  Switching to a new version is a single assignment of `current`. Requests
+  resolve their version once, when they start, so a switch never changes
+  the data under a running request, and pinned requests keep reading the
+  version they ask for while it is among the newest `keep`; the engines of
+  older versions are disposed.
+  """
+
+  def __init__(self, keep: int = config.DATASET_VERSIONS_KEPT) -> None:
+    self.keep = keep
+    self.current: Optional[ServedVersion] = None
+    self._lock = threading.Lock()
+    self._versions: Dict[int, ServedVersion] = {}
+
+  def add(self, served: ServedVersion, activate: bool = True) -> None:
+    with self._lock:
+      replaced = self._versions.get(served.version)
+      self._versions[served.version] = served
+      if activate:
+        self.current = served
+      retired = [replaced] if replaced is not None else []
+      for version in sorted(self._versions)[:-self.keep]:
+        if self.current is None or version != self.current.version:
+          retired.append(self._versions.pop(version))
+      open_engines = {id(kept.engine) for kept in self._versions.values()}
+
+    for old in retired:
+      if id(old.engine) not in open_engines:
+        old.engine.dispose()
+
+  def get(self, version: Optional[int] = None) -> Optional[ServedVersion]:
+    """The current version, or the pinned `version` (None if not open)."""
+    with self._lock:
+      if version is None:
+        return self.current
+      return self._versions.get(version)
+
+  def versions(self) -> List[int]:
+    with self._lock:
+      return sorted(self._versions)
+
+
+SERVING = ServingDatabase()
@@ -0,0 +1,210 @@
+"""Slow-query log and on-demand request profiling.
+
+Statements slower than `config.SLOW_QUERY_MS` are logged (as one JSON
+object per line on the `app.slow_queries` logger) with their SQL,
+parameters, duration, query plan and the request that ran them; the most
+recent entries are also kept in memory for `/debug/slow-queries`.
+
+A request sent with `X-Profile: true` and the configured diagnostics token
+runs under a sampling profiler: a background thread records the Python
+stack of the thread running its endpoint each `PROFILE_INTERVAL_MS`, and
+the response is the folded stacks (`frame;frame;frame count`, the input of
+flame graph tools) instead of the endpoint's body. Other requests and
+background threads running at the same time are not sampled.
+"""
+import functools
+import inspect
+import json
+import logging
+import secrets
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from . import config
+
+RECENT_SLOW_QUERIES = 100
+EXPLAINED_STATEMENTS = ('SELECT', 'WITH')
+
+logger = logging.getLogger('app.slow_queries')
+slow_queries = deque(maxlen=RECENT_SLOW_QUERIES)
+
+APP_DIR = str(Path(__file__).parent)
+
+
+def token_matches(token: Optional[str]) -> bool:
+  """Whether `token` is the configured diagnostics token (never if unset)."""
+  return bool(config.DIAGNOSTICS_TOKEN) and token is not None and (
+    secrets.compare_digest(token, config.DIAGNOSTICS_TOKEN)
+  )
+
+
+def log_slow_query(
+  cursor,
+  statement: str,
+  parameters,
+  seconds: float,
+  endpoint: Optional[str],
+  executemany: bool
+) -> Dict[str, object]:
+  entry = {
+    'timestamp': datetime.now(timezone.utc).isoformat(),
+    'endpoint': endpoint,
+    'duration_ms': round(seconds * 1000, 3),
+    'statement': statement,
+    'parameters': _parameters(parameters, executemany),
+    'plan': (
+      _explain(cursor, statement, parameters)
+      if config.SLOW_QUERY_EXPLAIN and not executemany else None
+    )
+  }
+  slow_queries.append(entry)
+  logger.warning(json.dumps(entry, default=str))
+  return entry
+
+
+def _parameters(parameters, executemany: bool):
+  if executemany:
+    return {'batches': len(parameters)}
+  if isinstance(parameters, dict):
+    return {key: _value(value) for key, value in parameters.items()}
+
+  return [_value(value) for value in parameters or ()]
+
+
+def _value(value):
+  if isinstance(value, (bytes, bytearray, memoryview)):
+    return f'<{len(value)} bytes>'
+
+  return value
+
+
+def _explain(cursor, statement: str, parameters) -> Optional[List[str]]:
+  """The SQLite query plan, read on the statement's own connection."""
+  if not statement.lstrip().upper().startswith(EXPLAINED_STATEMENTS):
+    return None
+
+  explain = cursor.connection.cursor()
+  try:
+    explain.execute(f'EXPLAIN QUERY PLAN {statement}', parameters)
+    return [row[-1] for row in explain.fetchall()]
+  except Exception as error:
+    return [f'EXPLAIN failed: {error}']
+  finally:
+    explain.close()
+
+
+class SamplingProfiler:
+  """Samples the app stacks of the threads it is given until stopped.
+
+  While active it is the profiler of the current context, which the
+  request's endpoint inherits, so `track_endpoint_thread` can hand it the
+  endpoint's thread.
+  """
+
+  def __init__(self, interval_ms: float = None) -> None:
+    self.interval = (
+      config.PROFILE_INTERVAL_MS if interval_ms is None else interval_ms
+    ) / 1000
+    self.stacks: Counter = Counter()
+    self.samples = 0
+    self._threads = set()
+    self._stopped = threading.Event()
+    self._thread = threading.Thread(target=self._run, daemon=True)
+
+  def __enter__(self) -> 'SamplingProfiler':
+    self.started = time.perf_counter()
+    self._active = active_profiler.set(self)
+    self._thread.start()
+    return self
+
+  def __exit__(self, *exc_info) -> None:
+    self._stopped.set()
+    self._thread.join()
+    active_profiler.reset(self._active)
+    self.elapsed = time.perf_counter() - self.started
+
+  def add_thread(self, thread_id: int) -> None:
+    self._threads.add(thread_id)
+
+  def remove_thread(self, thread_id: int) -> None:
+    self._threads.discard(thread_id)
+
+  def report(self) -> Dict[str, object]:
+    return {
+      'duration_ms': round(self.elapsed * 1000, 3),
+      'interval_ms': self.interval * 1000,
+      'samples': self.samples,
+      'stacks': [
+        {'stack': stack, 'samples': count}
+        for stack, count in self.stacks.most_common()
+      ]
+    }
+
+  def _run(self) -> None:
+    while not self._stopped.wait(self.interval):
+      self.samples += 1
+      frames = sys._current_frames()
+      for thread_id in tuple(self._threads):
+        stack = _app_stack(frames[thread_id]) if thread_id in frames else None
+        if stack:
+          self.stacks[stack] += 1
+
+
+active_profiler: ContextVar[Optional[SamplingProfiler]] = ContextVar(
+  'active_profiler', default=None
+)
+
+
+def track_endpoint_thread(endpoint: Callable) -> Callable:
+  """Let the request's profiler, if any, sample the thread of `endpoint`.
+
+  Only plain functions are wrapped: FastAPI runs them in a worker thread
+  of their own, while coroutines share the event loop with other requests.
+  """
+  if not callable(endpoint) or _is_coroutine(endpoint):
+    return endpoint
+
+  @functools.wraps(endpoint)
+  def run(*args, **kwargs):
+    profiler = active_profiler.get()
+    if profiler is None:
+      return endpoint(*args, **kwargs)
+
+    thread_id = threading.get_ident()
+    profiler.add_thread(thread_id)
+    try:
+      return endpoint(*args, **kwargs)
+    finally:
+      profiler.remove_thread(thread_id)
+
+  return run
+
+
+def _is_coroutine(function: Callable) -> bool:
+  return inspect.iscoroutinefunction(function) or inspect.iscoroutinefunction(
+    getattr(function, '__call__', None)
+  )
+
+
+def _app_stack(frame) -> Optional[str]:
+  """Folded stack from the outermost app frame down, if there is one."""
+  frames = []
+  while frame is not None:
+    frames.append(frame)
+    frame = frame.f_back
+  frames.reverse()
+
+  for index, candidate in enumerate(frames):
+    if candidate.f_code.co_filename.startswith(APP_DIR):
+      return ';'.join(
+        f'{Path(item.f_code.co_filename).name}:{item.f_code.co_name}'
+        for item in frames[index:]
+      )
+
+  return None
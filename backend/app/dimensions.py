@@ -0,0 +1,204 @@
+"""Dictionary encoding of the repeated site data into registry tables.
+
+Every row of the sites source repeats the static attributes of a physical
+site. Those are stored once in `sites`, keyed by `codigo_del_sitio`, and
+campaign bookings keep only the site's integer key. Sites in turn store
+integer keys for their furniture type, ad type and municipio; the municipio
+references its estado and zona metropolitana.
+
+The encoder keeps the name to key mapping of every lookup table in memory
+and only inserts the names and sites it has not seen, so the writer encodes
+a chunk with a handful of queries instead of one per row. A site keeps the
+attributes of the first row that registers it.
+"""
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import Table, event, insert, select, tuple_
+from sqlalchemy.engine import Connection
+
+from . import models
+
+UNKNOWN_MEMBER = 'Unknown'
+
+Record = Dict[str, Any]
+MunicipioName = Tuple[str, str, str]
+
+NAME_LOOKUPS: Dict[str, Table] = {
+  'tipo_de_mueble': models.FurnitureType.__table__,
+  'tipo_de_anuncio': models.AdType.__table__,
+}
+
+LOOKUP_KEYS = {
+  'tipo_de_mueble': 'furniture_type_id',
+  'tipo_de_anuncio': 'ad_type_id',
+}
+
+GEO_COLUMNS = ('estado', 'municipio', 'zm')
+
+SITE_ATTRIBUTES = tuple(
+  column.name for column in models.Site.__table__.columns
+  if column.name != 'id'
+)
+
+
+def geo_member(name: Optional[str]) -> str:
+  """Geographic names are never blank; missing ones become `Unknown`."""
+  return (name or '').strip() or UNKNOWN_MEMBER
+
+
+class DimensionEncoder:
+  """Name to key caches of the lookup tables, filled as rows are written."""
+
+  def __init__(self) -> None:
+    self._keys: Dict[str, Dict[Any, int]] = {}
+
+  def encode_sites(
+    self,
+    connection: Connection,
+    records: List[Record]
+  ) -> List[Record]:
+    """Turn site rows into bookings of registered sites.
+
+    Dimension names are replaced with their keys, then the site attributes
+    are moved to the `sites` registry and replaced with the site's key.
+    """
+    self.encode_names(connection, records)
+    sites = [
+      {column: record.pop(column, None) for column in SITE_ATTRIBUTES}
+      for record in records
+    ]
+    site_keys = self._site_keys(connection, sites)
+    for record, site in zip(records, sites):
+      record['site_id'] = site_keys[site['codigo_del_sitio']]
+
+    return records
+
+  def encode_names(
+    self,
+    connection: Connection,
+    records: List[Record]
+  ) -> List[Record]:
+    """Replace the dimension names of site records with their keys."""
+    municipios = [
+      tuple(geo_member(record.pop(column, None)) for column in GEO_COLUMNS)
+      for record in records
+    ]
+    municipio_keys = self._municipio_keys(connection, municipios)
+    for record, municipio in zip(records, municipios):
+      record['municipio_id'] = municipio_keys[municipio]
+
+    for column, table in NAME_LOOKUPS.items():
+      names = [record.pop(column, None) for record in records]
+      keys = self._name_keys(connection, table, names)
+      for record, name in zip(records, names):
+        record[LOOKUP_KEYS[column]] = keys.get(name)
+
+    return records
+
+  def _site_keys(
+    self,
+    connection: Connection,
+    sites: List[Record]
+  ) -> Dict[str, int]:
+    table = models.Site.__table__
+    cache = self._keys.setdefault(table.name, {})
+    first_seen = {}
+    for site in sites:
+      if site['codigo_del_sitio'] not in cache:
+        first_seen.setdefault(site['codigo_del_sitio'], site)
+    if first_seen:
+      connection.execute(
+        insert(table).prefix_with('OR IGNORE'), list(first_seen.values())
+      )
+      cache.update(connection.execute(
+        select(table.c.codigo_del_sitio, table.c.id).where(
+          table.c.codigo_del_sitio.in_(first_seen)
+        )
+      ).all())
+
+    return cache
+
+  def _name_keys(
+    self,
+    connection: Connection,
+    table: Table,
+    names: Iterable[Optional[str]]
+  ) -> Dict[str, int]:
+    cache = self._cache(connection, table)
+    missing = {name for name in names if name is not None} - cache.keys()
+    if missing:
+      connection.execute(
+        insert(table).prefix_with('OR IGNORE'),
+        [{'name': name} for name in sorted(missing)]
+      )
+      cache.update(connection.execute(
+        select(table.c.name, table.c.id).where(table.c.name.in_(missing))
+      ).all())
+
+    return cache
+
+  def _municipio_keys(
+    self,
+    connection: Connection,
+    municipios: List[MunicipioName]
+  ) -> Dict[MunicipioName, int]:
+    estados = self._name_keys(
+      connection, models.Estado.__table__, (m[0] for m in municipios)
+    )
+    zonas = self._name_keys(
+      connection, models.ZonaMetropolitana.__table__, (m[2] for m in municipios)
+    )
+    table = models.Municipio.__table__
+    cache = self._keys.setdefault(table.name, {})
+    missing = set(municipios) - cache.keys()
+    if missing:
+      connection.execute(insert(table).prefix_with('OR IGNORE'), [
+        {'estado_id': estados[estado], 'name': name, 'zm_id': zonas[zm]}
+        for estado, name, zm in sorted(missing)
+      ])
+      stored = connection.execute(
+        select(table.c.estado_id, table.c.name, table.c.id).where(
+          tuple_(table.c.estado_id, table.c.name).in_(
+            [(estados[estado], name) for estado, name, _ in missing]
+          )
+        )
+      )
+      keys = {(estado_id, name): key for estado_id, name, key in stored}
+      for municipio in missing:
+        estado, name, _ = municipio
+        cache[municipio] = keys[(estados[estado], name)]
+
+    return cache
+
+  def _cache(self, connection: Connection, table: Table) -> Dict[str, int]:
+    if table.name not in self._keys:
+      self._keys[table.name] = dict(
+        connection.execute(select(table.c.name, table.c.id)).all()
+      )
+    return self._keys[table.name]
+
+
+@event.listens_for(models.Site, 'before_insert')
+def encode_site_names(mapper, connection: Connection, site) -> None:
+  """Sites created through the ORM with names get the matching keys."""
+  names = {
+    column: getattr(site, column) for column in (*GEO_COLUMNS, *NAME_LOOKUPS)
+  }
+  keys = DimensionEncoder().encode_names(connection, [names])[0]
+  for key_column, key in keys.items():
+    if getattr(site, key_column) is None:
+      setattr(site, key_column, key)
+
+
+@event.listens_for(models.CampaignSite, 'before_insert')
+def register_booked_site(mapper, connection: Connection, booking) -> None:
+  """Bookings created through the ORM with a site code register the site."""
+  if booking.site_id is not None:
+    return
+
+  record = {
+    column: getattr(booking, column, None)
+    for column in (*GEO_COLUMNS, *NAME_LOOKUPS, *SITE_ATTRIBUTES)
+  }
+  encoded = DimensionEncoder().encode_sites(connection, [record])[0]
+  booking.site_id = encoded['site_id']
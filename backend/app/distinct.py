@@ -0,0 +1,164 @@
+"""Approximate distinct counts of booked sites and municipios.
+
+Every campaign keeps one HyperLogLog sketch per month (`mes`) of the sites
+and of the municipios it booked, in a derived table rebuilt with the
+rollup cube. Counting the distinct sites of any set of campaigns and
+months merges their sketches (the register-wise maximum) instead of
+running `COUNT(DISTINCT)` over the bookings.
+
+With `PRECISION` bits of the hash choosing one of `m = 2^PRECISION`
+registers, the estimate has a standard error of `1.04 / sqrt(m)`, about
+1.6% for the default 4,096 registers; small counts use linear counting
+and are close to exact.
+"""
+import enum
+import math
+from typing import Iterable
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+PRECISION = 12
+REGISTER_COUNT = 1 << PRECISION
+STANDARD_ERROR = 1.04 / math.sqrt(REGISTER_COUNT)
+HASH_BITS = 64
+
+
+class DistinctDimension(enum.Enum):
+  SITES = 'sites'
+  MUNICIPIOS = 'municipios'
+
+
+BOOKED_KEYS = '''
+SELECT b.campaign_id, b.mes, b.site_id, s.municipio_id
+FROM campaign_sites AS b
+JOIN sites AS s ON s.id = b.site_id
+WHERE b.campaign_id IS NOT NULL
+ORDER BY b.campaign_id, b.mes
+'''
+
+SKETCH_INSERT = '''
+INSERT INTO distinct_sketches (campaign_id, mes, dimension, registers)
+VALUES (:campaign_id, :mes, :dimension, :registers)
+'''
+
+
+class HyperLogLog:
+  """Dense HyperLogLog registers over 64-bit hashes of integer keys."""
+
+  def __init__(self, registers: np.ndarray = None) -> None:
+    self.registers = (
+      np.zeros(REGISTER_COUNT, dtype=np.uint8)
+      if registers is None else registers
+    )
+
+  @classmethod
+  def from_keys(cls, keys: np.ndarray) -> 'HyperLogLog':
+    sketch = cls()
+    sketch.add(keys)
+    return sketch
+
+  @classmethod
+  def from_bytes(cls, data: bytes) -> 'HyperLogLog':
+    return cls(np.frombuffer(data, dtype=np.uint8).copy())
+
+  @classmethod
+  def union(cls, sketches: Iterable[bytes]) -> 'HyperLogLog':
+    """Fold stored register arrays into one running maximum."""
+    merged = cls()
+    for data in sketches:
+      merged.merge_bytes(data)
+
+    return merged
+
+  def add(self, keys: np.ndarray) -> None:
+    hashes = _mix(np.asarray(keys).astype(np.uint64))
+    buckets = (hashes >> np.uint64(HASH_BITS - PRECISION)).astype(np.int64)
+    remaining = hashes << np.uint64(PRECISION)
+    ranks = np.where(
+      remaining == 0, HASH_BITS - PRECISION + 1,
+      HASH_BITS + 1 - _bit_length(remaining)
+    )
+    np.maximum.at(self.registers, buckets, ranks.astype(np.uint8))
+
+  def merge(self, other: 'HyperLogLog') -> None:
+    np.maximum(self.registers, other.registers, out=self.registers)
+
+  def merge_bytes(self, data: bytes) -> None:
+    """Merge stored registers in place, without copying them first."""
+    np.maximum(
+      self.registers, np.frombuffer(data, dtype=np.uint8), out=self.registers
+    )
+
+  def estimate(self) -> int:
+    alpha = 0.7213 / (1 + 1.079 / REGISTER_COUNT)
+    raw = alpha * REGISTER_COUNT ** 2 / np.sum(
+      np.ldexp(1.0, -self.registers.astype(np.int64))
+    )
+    empty = int(np.count_nonzero(self.registers == 0))
+    if raw <= 2.5 * REGISTER_COUNT and empty:
+      return round(REGISTER_COUNT * math.log(REGISTER_COUNT / empty))
+
+    return round(raw)
+
+  def to_bytes(self) -> bytes:
+    return self.registers.tobytes()
+
+
+def build_distinct_sketches(connection: Connection) -> None:
+  """Recompute the per-campaign, per-month sketches from the bookings."""
+  connection.execute(text('DELETE FROM distinct_sketches'))
+  rows = connection.execute(text(BOOKED_KEYS)).all()
+  if not rows:
+    return
+
+  campaign_ids, months, site_ids, municipio_ids = zip(*rows)
+  campaign_ids = np.array(campaign_ids, dtype=np.int64)
+  month_labels = np.array([mes or '' for mes in months])
+  keys = {
+    DistinctDimension.SITES: np.array(site_ids, dtype=np.int64),
+    DistinctDimension.MUNICIPIOS: np.array(
+      [key or 0 for key in municipio_ids], dtype=np.int64
+    ),
+  }
+  changes = (campaign_ids[1:] != campaign_ids[:-1]) | (
+    month_labels[1:] != month_labels[:-1]
+  )
+  boundaries = np.concatenate(
+    ([0], np.flatnonzero(changes) + 1, [len(campaign_ids)])
+  )
+
+  records = [
+    {
+      'campaign_id': int(campaign_ids[start]),
+      'mes': months[start],
+      'dimension': dimension.value,
+      'registers': HyperLogLog.from_keys(
+        dimension_keys[start:stop]
+      ).to_bytes()
+    }
+    for start, stop in zip(boundaries[:-1], boundaries[1:])
+    for dimension, dimension_keys in keys.items()
+  ]
+  connection.execute(text(SKETCH_INSERT), records)
+
+
+def _mix(keys: np.ndarray) -> np.ndarray:
+  """splitmix64 finalizer: spreads consecutive ids over all 64 bits."""
+  with np.errstate(over='ignore'):
+    keys = keys + np.uint64(0x9E3779B97F4A7C15)
+    keys = (keys ^ (keys >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    keys = (keys ^ (keys >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return keys ^ (keys >> np.uint64(31))
+
+
+def _bit_length(values: np.ndarray) -> np.ndarray:
+  """Exact bit length of unsigned 64-bit integers."""
+  lengths = np.zeros(values.shape, dtype=np.int64)
+  for shift in (32, 16, 8, 4, 2, 1):
+    high = values >= (np.uint64(1) << np.uint64(shift))
+    lengths += np.where(high, shift, 0)
+    values = np.where(high, values >> np.uint64(shift), values)
+
+  return lengths + (values > 0)
@@ -0,0 +1,89 @@
+"""Pre-aggregated rollup cube of the booked sites over their geography.
+
+Registered sites reference a municipio (see dimensions.py), which belongs to one
+estado and one zona metropolitana. A zona metropolitana may span estados
+(Valle de Mexico covers Ciudad de Mexico and Mexico), so both are parents
+of the municipio.
+
+`geo_rollups` holds sites, monthly impacts and monthly reach per campaign
+at every level, for each month (`mes`) and for the whole campaign (`mes`
+NULL). Like the sites summary, a site counts once per month.
+"""
+import enum
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+
+class GeoLevel(enum.Enum):
+  ESTADO = 'estado'
+  ZM = 'zm'
+  MUNICIPIO = 'municipio'
+
+
+LEVEL_KEYS = {
+  GeoLevel.ESTADO: ('estado_id',),
+  GeoLevel.ZM: ('zm_id',),
+  GeoLevel.MUNICIPIO: ('municipio_id', 'estado_id', 'zm_id'),
+}
+
+SITE_MONTHS = '''
+CREATE TEMP TABLE geo_site_months AS
+SELECT
+  b.campaign_id,
+  b.site_id,
+  coalesce(b.mes, '') AS mes,
+  m.id AS municipio_id,
+  m.estado_id,
+  m.zm_id,
+  max(b.impactos_mensuales) AS impacts,
+  max(b.alcance_mensual) AS reach
+FROM campaign_sites AS b
+JOIN sites AS s ON s.id = b.site_id
+JOIN municipios AS m ON m.id = s.municipio_id
+GROUP BY b.campaign_id, b.site_id, b.mes
+'''
+
+ROLLUP_INSERT = '''
+INSERT INTO geo_rollups (
+  campaign_id, mes, level, estado_id, zm_id, municipio_id,
+  sites, impacts, reach
+)
+SELECT
+  campaign_id, {mes}, :level, {estado_id}, {zm_id}, {municipio_id},
+  count(DISTINCT site_id),
+  coalesce(sum(impacts), 0),
+  coalesce(sum(reach), 0)
+FROM geo_site_months
+{where}
+GROUP BY campaign_id{group_mes}, {group_key}
+'''
+
+
+def build_geo_rollups(connection: Connection) -> None:
+  """Recompute the whole cube from the located sites."""
+  connection.execute(text('DELETE FROM geo_rollups'))
+  connection.execute(text('DROP TABLE IF EXISTS temp.geo_site_months'))
+  connection.execute(text(SITE_MONTHS))
+
+  for level, keys in LEVEL_KEYS.items():
+    for per_month in (True, False):
+      connection.execute(
+        text(_rollup_statement(keys, per_month)), {'level': level.value}
+      )
+
+  connection.execute(text('DROP TABLE temp.geo_site_months'))
+
+
+def _rollup_statement(keys: tuple, per_month: bool) -> str:
+  columns = {
+    key: key if key in keys else 'NULL'
+    for key in ('estado_id', 'zm_id', 'municipio_id')
+  }
+  return ROLLUP_INSERT.format(
+    mes='mes' if per_month else 'NULL',
+    where="WHERE mes != ''" if per_month else '',
+    group_mes=', mes' if per_month else '',
+    group_key=keys[0],
+    **columns
+  )
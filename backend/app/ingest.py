@@ -0,0 +1,524 @@
+import csv
+import logging
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import Table, func, insert, select, text
+from sqlalchemy.orm import Session
+
+from . import config, distinct, geo, models, sketches, snapshot
+from .dimensions import DimensionEncoder
+from .migrations import clear_dataset
+from .periods import derive_period_columns
+from .validation import (
+  DATE, FLOAT, INT, KEY, REJECTED, TEXT, ColumnSpec, Deriver, IngestReport,
+  Issue, ValidatedChunk, make_issue, validate_chunk
+)
+
+DEFAULT_CHUNK_SIZE = 5_000
+MAX_CHUNKS_IN_FLIGHT_PER_WORKER = 2
+FIRST_DATA_LINE = 2
+ISSUES_FILE = 'ingest_issues.jsonl'
+SUMMARY_FILE = 'ingest_report.json'
+# The key of the database's fingerprint among the snapshot's sources.
+DATABASE_SOURCE = 'database'
+FINGERPRINTED_MODELS = [
+  models.Campaign, models.CampaignPeriod, models.CampaignSite
+]
+
+logger = logging.getLogger(__name__)
+
+Record = Dict[str, Any]
+RawChunk = Tuple[str, int, List[Dict[str, str]]]
+ProgressCallback = Callable[[str, int], None]
+
+
+def read_csv_chunks(
+  file_path: Path,
+  chunk_size: int = DEFAULT_CHUNK_SIZE,
+  skip_rows: int = 0
+) -> Iterator[List[Dict[str, str]]]:
+  """Yield the rows of a CSV file in lists of at most `chunk_size`."""
+  with open(file_path, 'r', encoding='utf-8', newline='') as f:
+    reader = csv.DictReader(f)
+    deque(islice(reader, skip_rows), maxlen=0)
+
+    chunk = list(islice(reader, chunk_size))
+    while chunk:
+      yield chunk
+      chunk = list(islice(reader, chunk_size))
+
+
+CAMPAIGN_COLUMNS = [
+  ColumnSpec('name', 'name', KEY),
+  ColumnSpec('tipo_campania', 'tipo_campania', TEXT),
+  ColumnSpec('fecha_inicio', 'fecha_inicio', DATE),
+  ColumnSpec('fecha_fin', 'fecha_fin', DATE),
+  ColumnSpec('universo_zona_metro', 'universo_zona_metro', INT),
+  ColumnSpec('impactos_personas', 'impactos_personas', INT),
+  ColumnSpec('impactos_vehiculos', 'impactos_vehiculos', INT),
+  ColumnSpec('frecuencia_calculada', 'frecuencia_calculada', FLOAT),
+  ColumnSpec('frecuencia_promedio', 'frecuencia_promedio', FLOAT),
+  ColumnSpec('alcance', 'alcance', INT),
+  ColumnSpec('nse_ab', 'nse_ab', FLOAT),
+  ColumnSpec('nse_c', 'nse_c', FLOAT),
+  ColumnSpec('nse_cmas', 'nse_cmas', FLOAT),
+  ColumnSpec('nse_d', 'nse_d', FLOAT),
+  ColumnSpec('nse_dmas', 'nse_dmas', FLOAT),
+  ColumnSpec('nse_e', 'nse_e', FLOAT),
+  ColumnSpec('edad_0a14', 'edad_0a14', FLOAT),
+  ColumnSpec('edad_15a19', 'edad_15a19', FLOAT),
+  ColumnSpec('edad_20a24', 'edad_20a24', FLOAT),
+  ColumnSpec('edad_25a34', 'edad_25a34', FLOAT),
+  ColumnSpec('edad_35a44', 'edad_35a44', FLOAT),
+  ColumnSpec('edad_45a64', 'edad_45a64', FLOAT),
+  ColumnSpec('edad_65mas', 'edad_65mas', FLOAT),
+  ColumnSpec('hombres', 'hombres', FLOAT),
+  ColumnSpec('mujeres', 'mujeres', FLOAT),
+]
+
+PERIOD_COLUMNS = [
+  ColumnSpec('name', 'campaign_name', KEY),
+  ColumnSpec('period', 'period', KEY),
+  ColumnSpec('tipo_campania', 'granularity', KEY),
+  ColumnSpec('impactos_periodo_personas', 'impactos_periodo_personas', INT),
+  ColumnSpec('impactos_periodo_vehículos', 'impactos_periodo_vehiculos', INT),
+]
+
+SITE_COLUMNS = [
+  ColumnSpec('name', 'campaign_name', KEY),
+  ColumnSpec('codigo_del_sitio', 'codigo_del_sitio', KEY),
+  ColumnSpec('id_fourteen', 'id_fourteen', TEXT),
+  ColumnSpec('mes', 'mes', TEXT),
+  ColumnSpec('tipo_de_mueble', 'tipo_de_mueble', TEXT),
+  ColumnSpec('tipo_de_anuncio', 'tipo_de_anuncio', TEXT),
+  ColumnSpec('estado', 'estado', TEXT),
+  ColumnSpec('municipio', 'municipio', TEXT),
+  ColumnSpec('zm', 'zm', TEXT),
+  ColumnSpec('nivel_socioeconomico_ab', 'nse_ab', FLOAT),
+  ColumnSpec('nivel_socioeconomico_c', 'nse_c', FLOAT),
+  ColumnSpec('nivel_socioeconomico_c_mas', 'nse_cmas', FLOAT),
+  ColumnSpec('nivel_socioeconomico_d', 'nse_d', FLOAT),
+  ColumnSpec('nivel_socioeconomico_d_mas', 'nse_dmas', FLOAT),
+  ColumnSpec('nivel_socioeconomico_e', 'nse_e', FLOAT),
+  ColumnSpec('cero_catorce', 'edad_0a14', FLOAT),
+  ColumnSpec('quince_diecinueve', 'edad_15a19', FLOAT),
+  ColumnSpec('veinte_veinticuatro', 'edad_20a24', FLOAT),
+  ColumnSpec('veinticinco_treintaycuatro', 'edad_25a34', FLOAT),
+  ColumnSpec('treintaycinco_cuarentaycuatro', 'edad_35a44', FLOAT),
+  ColumnSpec('cuarentaycinco_sesentaycuatro', 'edad_45a64', FLOAT),
+  ColumnSpec('sesentaycinco_mas', 'edad_65mas', FLOAT),
+  ColumnSpec('per_hom', 'hombres', FLOAT),
+  ColumnSpec('per_muj', 'mujeres', FLOAT),
+  ColumnSpec('frecuencia_catorcenal', 'frecuencia_catorcenal', FLOAT),
+  ColumnSpec('frecuencia_mensual', 'frecuencia_mensual', FLOAT),
+  ColumnSpec('impactos_catorcenal', 'impactos_catorcenal', INT),
+  ColumnSpec('impactos_mensuales', 'impactos_mensuales', INT),
+  ColumnSpec('alcance_mensual', 'alcance_mensual', FLOAT),
+]
+
+COLUMN_SPECS: Dict[str, List[ColumnSpec]] = {
+  config.CAMPAIGNS_FILE: CAMPAIGN_COLUMNS,
+  config.PERIODS_FILE: PERIOD_COLUMNS,
+  config.SITES_FILE: SITE_COLUMNS,
+}
+
+TARGET_TABLES: Dict[str, Table] = {
+  config.CAMPAIGNS_FILE: models.Campaign.__table__,
+  config.PERIODS_FILE: models.CampaignPeriod.__table__,
+  config.SITES_FILE: models.CampaignSite.__table__,
+}
+
+UNIQUE_KEYS: Dict[str, Tuple[str, ...]] = {
+  config.CAMPAIGNS_FILE: ('name',),
+  config.PERIODS_FILE: ('campaign_name', 'period'),
+  config.SITES_FILE: ('campaign_name', 'codigo_del_sitio', 'id_fourteen'),
+}
+
+# Source key columns stored as a reference: (table, foreign key, column).
+KEY_REFERENCES: Dict[str, Tuple[Table, str, str]] = {
+  'campaign_name': (models.Campaign.__table__, 'campaign_id', 'name'),
+  'codigo_del_sitio': (models.Site.__table__, 'site_id', 'codigo_del_sitio'),
+}
+
+DERIVERS: Dict[str, Deriver] = {
+  config.PERIODS_FILE: derive_period_columns,
+}
+
+DUPLICATE_REASONS = {
+  config.CAMPAIGNS_FILE: 'duplicate_campaign',
+  config.PERIODS_FILE: 'duplicate_period',
+  config.SITES_FILE: 'duplicate_site_period',
+}
+
+
+def parse_chunk(
+  file_name: str,
+  rows: List[Dict[str, str]],
+  first_line: int = FIRST_DATA_LINE
+) -> ValidatedChunk:
+  """Validate and type raw CSV rows; runs in worker processes."""
+  return validate_chunk(
+    file_name,
+    rows,
+    COLUMN_SPECS[file_name],
+    first_line,
+    DERIVERS.get(file_name)
+  )
+
+
+def source_paths(data_dir: Path = config.DATA_DIR) -> List[Path]:
+  """Source files in load order: campaigns before their periods and sites."""
+  return [data_dir / file_name for file_name in COLUMN_SPECS]
+
+
+def ingest_csv_files(
+  db: Session,
+  data_dir: Path = config.DATA_DIR,
+  workers: int = config.INGEST_WORKERS,
+  chunk_size: int = DEFAULT_CHUNK_SIZE,
+  on_progress: Optional[ProgressCallback] = None,
+  resume: bool = False,
+  report_dir: Optional[Path] = config.INGEST_REPORT_DIR
+) -> IngestReport:
+  """Stream the source CSVs through a process pool into a single writer.
+
+  Files are read in chunks that are validated concurrently, with at most a
+  few chunks in flight, so memory stays bounded by the chunk size rather
+  than the file size. The writer drops rows of unknown campaigns and
+  duplicates by their unique key, numbers new campaigns and keys their
+  periods and sites by that id, registers each physical site once with
+  its dictionary-encoded dimensions, then commits each chunk together with
+  its ingest checkpoint; with `resume` a crashed ingest continues after the last
+  committed chunk.
+
+  Repaired and rejected rows are written to `report_dir` as JSON Lines
+  (`ingest_issues.jsonl`) plus a per-file summary (`ingest_report.json`).
+  """
+  paths = source_paths(data_dir)
+  checkpoints = _prepare_checkpoints(db, paths, resume)
+  seen_keys = _load_unique_keys(db)
+  campaign_ids = dict(
+    db.execute(select(models.Campaign.name, models.Campaign.id)).all()
+  )
+  encoder = DimensionEncoder()
+  chunks = _csv_chunks(paths, checkpoints, chunk_size)
+  issues_path = report_dir / ISSUES_FILE if report_dir else None
+
+  report = IngestReport([path.name for path in paths], issues_path, resume)
+  with report:
+    for file_name, chunk in _parse_chunks(chunks, workers):
+      records, issues = _accept_unique(file_name, chunk, seen_keys)
+      _key_by_campaign(file_name, records, campaign_ids)
+      if records and file_name == config.SITES_FILE:
+        records = encoder.encode_sites(db.connection(), records)
+      if records:
+        db.execute(insert(TARGET_TABLES[file_name]), records)
+
+      checkpoints[file_name].rows_committed += chunk.row_count
+      db.commit()
+      report.rows_read[file_name] += chunk.row_count
+      report.rows_written[file_name] += len(records)
+      report.add_issues(chunk.issues + issues)
+      if on_progress is not None:
+        on_progress(file_name, checkpoints[file_name].rows_committed)
+
+    build_derived_tables(db)
+    for checkpoint in checkpoints.values():
+      checkpoint.completed = True
+    db.commit()
+    if report_dir is not None:
+      report.write_summary(report_dir / SUMMARY_FILE)
+
+  return report
+
+
+def build_derived_tables(db: Session) -> None:
+  """Aggregates computed from the loaded rows."""
+  geo.build_geo_rollups(db.connection())
+  sketches.build_metric_sketches(db.connection())
+  distinct.build_distinct_sketches(db.connection())
+
+
+def has_unfinished_ingest(db: Session) -> bool:
+  return db.query(models.IngestCheckpoint).filter(
+    models.IngestCheckpoint.completed.is_(False)
+  ).count() > 0
+
+
+def database_fingerprint(db: Session) -> List[int]:
+  """Identify a loaded dataset by its schema version and loaded rows.
+
+  Loads only ever append rows, and a reseed or migration changes the row
+  ids or the schema version, so a snapshot exported before either no
+  longer matches.
+  """
+  fingerprint = [db.execute(text('PRAGMA user_version')).scalar_one()]
+  for model in FINGERPRINTED_MODELS:
+    count, last_id = db.execute(
+      select(func.count(), func.max(model.id))
+    ).one()
+    fingerprint += [count, last_id or 0]
+
+  return fingerprint
+
+
+def dataset_sources(
+  db: Session, data_dir: Path = config.DATA_DIR
+) -> snapshot.Sources:
+  """Fingerprints of the source CSVs and of the database loaded from them."""
+  return {
+    **snapshot.fingerprint_sources(source_paths(data_dir)),
+    DATABASE_SOURCE: database_fingerprint(db),
+  }
+
+
+def open_dataset_snapshot(
+  db: Optional[Session] = None
+) -> Optional[snapshot.Snapshot]:
+  """Open the columnar snapshot if it matches the current CSVs and schema.
+
+  With `db`, the snapshot must also have been exported from that database
+  as it is now; without, it only has to match the CSVs, as when loading it
+  into an empty database.
+  """
+  return snapshot.open_snapshot(
+    config.SNAPSHOT_DIR,
+    sources=(
+      snapshot.fingerprint_sources(source_paths()) if db is None
+      else dataset_sources(db)
+    ),
+    schema=snapshot.table_schema()
+  )
+
+
+def prepare_dataset_snapshot(db: Session) -> snapshot.Snapshot:
+  """Open the columnar snapshot, exporting it first when missing or stale."""
+  dataset_snapshot = open_dataset_snapshot(db)
+  if dataset_snapshot is None:
+    snapshot.export_snapshot(db, config.SNAPSHOT_DIR, dataset_sources(db))
+    dataset_snapshot = open_dataset_snapshot(db)
+
+  return dataset_snapshot
+
+
+def open_prepared_snapshot(db: Session) -> snapshot.Snapshot:
+  """The snapshot of a dataset prepared by another process.
+
+  Read-only workers cannot seed the database or export a snapshot, so a
+  missing or stale one means `seed.py --prepare` has not run.
+  """
+  dataset_snapshot = open_dataset_snapshot(db)
+  if dataset_snapshot is None:
+    raise UnpreparedDatasetError(
+      f'No current snapshot in {config.SNAPSHOT_DIR}; '
+      'run `python seed.py --prepare` before starting read-only workers'
+    )
+
+  return dataset_snapshot
+
+
+def seed_database_if_empty(db: Session) -> None:
+  """Seed the database if tables are empty.
+
+  A valid columnar snapshot is bulk loaded without any text parsing; the
+  raw CSV files are only parsed when no usable snapshot exists. An ingest
+  interrupted by a crash is resumed from its last committed chunk.
+
+  A dataset a migration marked for a reseed is reloaded from the source
+  files, since its rows lack columns only those files have.
+  """
+  reasons = db.scalars(select(models.ReseedRequired.reason)).all()
+  if reasons:
+    logger.warning(
+      'Reloading the dataset from the source files: %s', '; '.join(reasons)
+    )
+    reseed_database(db)
+    return
+
+  if has_unfinished_ingest(db):
+    ingest_csv_files(db, resume=True)
+    return
+
+  campaign_count = db.query(models.Campaign).count()
+  if campaign_count > 0:
+    return
+
+  dataset_snapshot = open_dataset_snapshot()
+  if dataset_snapshot is not None:
+    snapshot.load_snapshot(db, dataset_snapshot)
+    build_derived_tables(db)
+    db.commit()
+    return
+
+  ingest_csv_files(db)
+
+
+def reseed_database(db: Session) -> None:
+  """Replace the loaded dataset and its snapshot with the source CSVs."""
+  clear_dataset(db.connection())
+  ingest_csv_files(db)
+  snapshot.export_snapshot(db, config.SNAPSHOT_DIR, dataset_sources(db))
+
+
+class StaleCheckpointError(Exception):
+  """A source file changed after an interrupted ingest started."""
+
+
+class UnpreparedDatasetError(Exception):
+  """The read-only server found no prepared dataset to serve."""
+
+
+def _prepare_checkpoints(
+  db: Session,
+  paths: List[Path],
+  resume: bool
+) -> Dict[str, models.IngestCheckpoint]:
+  if not resume:
+    db.query(models.IngestCheckpoint).delete()
+
+  checkpoints = {}
+  for path in paths:
+    stat = path.stat()
+    checkpoint = db.get(models.IngestCheckpoint, path.name)
+    if checkpoint is None:
+      checkpoint = models.IngestCheckpoint(
+        file_name=path.name,
+        source_size=stat.st_size,
+        source_mtime_ns=stat.st_mtime_ns,
+        rows_committed=0,
+        completed=False
+      )
+      db.add(checkpoint)
+    elif (checkpoint.source_size, checkpoint.source_mtime_ns) != (
+      stat.st_size, stat.st_mtime_ns
+    ):
+      raise StaleCheckpointError(f'{path.name} changed since last ingest')
+    checkpoints[path.name] = checkpoint
+
+  db.commit()
+
+  return checkpoints
+
+
+def _csv_chunks(
+  paths: List[Path],
+  checkpoints: Dict[str, models.IngestCheckpoint],
+  chunk_size: int
+) -> Iterator[RawChunk]:
+  for path in paths:
+    checkpoint = checkpoints[path.name]
+    if checkpoint.completed:
+      continue
+
+    first_line = FIRST_DATA_LINE + checkpoint.rows_committed
+    chunks = read_csv_chunks(path, chunk_size, checkpoint.rows_committed)
+    for chunk in chunks:
+      yield path.name, first_line, chunk
+      first_line += len(chunk)
+
+
+def _parse_chunks(
+  chunks: Iterator[RawChunk],
+  workers: int
+) -> Iterator[Tuple[str, ValidatedChunk]]:
+  if workers <= 1:
+    for file_name, first_line, rows in chunks:
+      yield file_name, parse_chunk(file_name, rows, first_line)
+    return
+
+  with ProcessPoolExecutor(max_workers=workers) as executor:
+    pending = deque()
+    for file_name, first_line, rows in chunks:
+      future = executor.submit(parse_chunk, file_name, rows, first_line)
+      pending.append((file_name, future))
+      if len(pending) >= workers * MAX_CHUNKS_IN_FLIGHT_PER_WORKER:
+        file_name, future = pending.popleft()
+        yield file_name, future.result()
+
+    for file_name, future in pending:
+      yield file_name, future.result()
+
+
+def _load_unique_keys(db: Session) -> Dict[str, set]:
+  """Keys already stored, so resumed or repeated loads stay duplicate free.
+
+  Keys are in source terms: stored rows give back their campaign name and
+  site code.
+  """
+  seen_keys = {}
+  for file_name, key_columns in UNIQUE_KEYS.items():
+    table = TARGET_TABLES[file_name]
+    key_query = select(*(
+      _stored_key_column(table, column) for column in key_columns
+    ))
+    for column in key_columns:
+      if column not in table.c:
+        referenced, foreign_key, _ = KEY_REFERENCES[column]
+        key_query = key_query.join_from(
+          table, referenced, table.c[foreign_key] == referenced.c.id
+        )
+    seen_keys[file_name] = {tuple(row) for row in db.execute(key_query)}
+
+  return seen_keys
+
+
+def _stored_key_column(table: Table, column: str):
+  if column in table.c:
+    return table.c[column]
+
+  referenced, _, referenced_column = KEY_REFERENCES[column]
+  return referenced.c[referenced_column]
+
+
+def _key_by_campaign(
+  file_name: str,
+  records: List[Record],
+  campaign_ids: Dict[str, int]
+) -> None:
+  """Number new campaigns; periods and sites reference them by that id."""
+  if file_name == config.CAMPAIGNS_FILE:
+    first_id = max(campaign_ids.values(), default=0) + 1
+    for campaign_id, record in enumerate(records, first_id):
+      record['id'] = campaign_ids[record['name']] = campaign_id
+    return
+
+  for record in records:
+    record['campaign_id'] = campaign_ids[record.pop('campaign_name')]
+
+
+def _accept_unique(
+  file_name: str,
+  chunk: ValidatedChunk,
+  seen_keys: Dict[str, set]
+) -> Tuple[List[Record], List[Issue]]:
+  """Keep the first row per unique key, and only rows of known campaigns."""
+  key_columns = UNIQUE_KEYS[file_name]
+  known_campaigns = seen_keys[config.CAMPAIGNS_FILE]
+  file_keys = seen_keys[file_name]
+  accepted = []
+  issues = []
+
+  for record, line in zip(chunk.records, chunk.lines):
+    key = tuple(record[column] for column in key_columns)
+    reason = None
+    if 'campaign_name' in record and (
+      (record['campaign_name'],) not in known_campaigns
+    ):
+      reason = 'unknown_campaign'
+    elif key in file_keys:
+      reason = DUPLICATE_REASONS[file_name]
+
+    if reason is None:
+      file_keys.add(key)
+      accepted.append(record)
+    else:
+      issues.append(make_issue(
+        file_name, line, '+'.join(key_columns), '|'.join(map(str, key)),
+        REJECTED, reason
+      ))
+
+  return accepted, issues
@@ -0,0 +1,94 @@
+"""R*Tree interval index of the days each campaign is running.
+
+`campaign_intervals` is an SQLite `rtree_i32` virtual table holding one
+[start_day, end_day] box per campaign, keyed by the campaign rowid (its
+id) and kept in sync by triggers. Days are counted from 1970-01-01, so
+overlap queries against a window are answered from the tree instead of
+scanning campaigns.
+"""
+import enum
+from datetime import date
+
+from sqlalchemy import Column, Integer, MetaData, Table, event, select
+from sqlalchemy.engine import Connection
+
+from .models import Campaign
+
+EPOCH = date(1970, 1, 1)
+
+
+class DateFilterMode(enum.Enum):
+  START = 'start'
+  OVERLAP = 'overlap'
+
+
+campaign_intervals = Table(
+  'campaign_intervals',
+  MetaData(),
+  Column('id', Integer, primary_key=True),
+  Column('start_day', Integer),
+  Column('end_day', Integer),
+)
+
+
+def _interval_row(alias: str) -> str:
+  """Rowid and day bounds of a campaign row; reversed dates are swapped."""
+  start = f'{alias}.fecha_inicio'
+  end = f'coalesce({alias}.fecha_fin, {alias}.fecha_inicio)'
+  to_days = "CAST(julianday({}) - julianday('1970-01-01') AS INTEGER)"
+  return (
+    f'{alias}.rowid, {to_days.format(f"min({start}, {end})")}, '
+    f'{to_days.format(f"max({start}, {end})")}'
+  )
+
+
+INTERVAL_INDEX_DDL = [
+  'CREATE VIRTUAL TABLE IF NOT EXISTS campaign_intervals '
+  'USING rtree_i32(id, start_day, end_day)',
+  'CREATE TRIGGER IF NOT EXISTS campaign_intervals_insert '
+  'AFTER INSERT ON campaigns WHEN NEW.fecha_inicio IS NOT NULL BEGIN '
+  'INSERT INTO campaign_intervals VALUES ('
+  + _interval_row('NEW') + '); END',
+  'CREATE TRIGGER IF NOT EXISTS campaign_intervals_update '
+  'AFTER UPDATE OF fecha_inicio, fecha_fin ON campaigns BEGIN '
+  'DELETE FROM campaign_intervals WHERE id = OLD.rowid; '
+  'INSERT INTO campaign_intervals SELECT '
+  + _interval_row('NEW') + ' WHERE NEW.fecha_inicio IS NOT NULL; END',
+  'CREATE TRIGGER IF NOT EXISTS campaign_intervals_delete '
+  'AFTER DELETE ON campaigns BEGIN '
+  'DELETE FROM campaign_intervals WHERE id = OLD.rowid; END',
+]
+
+
+def to_day(day: date) -> int:
+  return (day - EPOCH).days
+
+
+def create_interval_index(connection: Connection) -> None:
+  """Create the tree and its triggers, indexing campaigns already loaded."""
+  for statement in INTERVAL_INDEX_DDL:
+    connection.exec_driver_sql(statement)
+  connection.exec_driver_sql('DELETE FROM campaign_intervals')
+  connection.exec_driver_sql(
+    'INSERT INTO campaign_intervals SELECT '
+    + _interval_row('campaigns')
+    + ' FROM campaigns WHERE fecha_inicio IS NOT NULL'
+  )
+
+
+def overlapping_campaigns(window_start: date, window_end: date):
+  """Ids of campaigns running on any day of the window."""
+  return select(campaign_intervals.c.id).where(
+    campaign_intervals.c.start_day <= to_day(window_end),
+    campaign_intervals.c.end_day >= to_day(window_start)
+  )
+
+
+@event.listens_for(Campaign.__table__, 'after_create')
+def _create_after_campaigns(target, connection: Connection, **kw) -> None:
+  create_interval_index(connection)
+
+
+@event.listens_for(Campaign.__table__, 'after_drop')
+def _drop_after_campaigns(target, connection: Connection, **kw) -> None:
+  connection.exec_driver_sql('DROP TABLE IF EXISTS campaign_intervals')
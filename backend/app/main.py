@@ -1,141 +1,131 @@
-import csv
-from pathlib import Path
+import logging
+import threading
+import time
 from contextlib import asynccontextmanager
-from datetime import datetime, date
-from typing import Optional, List, Dict, Any
+from datetime import date
+from typing import Callable, List, Optional
 
-from fastapi import FastAPI, Depends, HTTPException, Query
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
+from fastapi.routing import APIRoute
 from sqlalchemy.orm import Session
+from starlette.datastructures import State
+
+from . import schemas, config, crud, diagnostics, metrics, versions
+from .bitmaps import CampaignIndex, Demographic, build_campaign_index
+from .singleflight import FLIGHTS
+from .planning import SiteMatrix, build_site_matrix
+from .ranking import (
+  RankingGroup, RankingMetric, SiteRanking, build_site_ranking
+)
+from .similarity import CampaignMatrix, DistanceMetric, build_campaign_matrix
+from .sketches import SiteMetric
+from .distinct import DistinctDimension
+from .geo import GeoLevel
+from .intervals import DateFilterMode
+from .periods import PeriodGranularity
+from .ingest import (
+  open_prepared_snapshot, prepare_dataset_snapshot, seed_database_if_empty
+)
+from .database import SERVING, ServedVersion, SessionLocal, engine
+from .migrations import upgrade_database
+from .snapshot import Snapshot
 
-from . import models, schemas, crud
-from .database import SessionLocal, engine
-
-models.Base.metadata.create_all(bind=engine)
-
-
-
-
-def read_csv_file(file_path: Path) -> List[Dict[str, str]]:
-  with open(file_path, 'r', encoding='utf-8') as f:
-    reader = csv.DictReader(f)
-
-    return list(reader)
-
-
-def parse_int(value: str) -> int:
-  """Parse string to integer, handling date-like formats and empty values."""
-  if not value or value.strip() == '':
-    return 0
-  if '-' in value:
-    return int(value.split('-')[0])
+if not config.DATABASE_READ_ONLY:
+  upgrade_database(engine)
 
-  return int(value)
+logger = logging.getLogger(__name__)
 
 
-def parse_float(value: str) -> float:
-  """Parse string to float, handling empty values."""
-  if not value or value.strip() == '':
-    return 0.0
+def build_served_state(dataset_snapshot: Snapshot) -> State:
+  """The in-memory structures built from a dataset's snapshot."""
+  state = State()
+  state.snapshot = dataset_snapshot
+  state.site_matrix = build_site_matrix(dataset_snapshot)
+  state.campaign_matrix = build_campaign_matrix(dataset_snapshot)
+  state.site_ranking = build_site_ranking(dataset_snapshot)
+  state.campaign_index = build_campaign_index(dataset_snapshot)
+  return state
 
-  return float(value)
 
+def serve_unversioned() -> ServedVersion:
+  """Serve the database at DATABASE_PATH, seeding it when empty."""
+  db = SessionLocal()
+  try:
+    if config.DATABASE_READ_ONLY:
+      dataset_snapshot = open_prepared_snapshot(db)
+    else:
+      seed_database_if_empty(db)
+      dataset_snapshot = prepare_dataset_snapshot(db)
+  finally:
+    db.close()
 
-def create_campaign_from_row(row: Dict[str, str]) -> models.Campaign:
-  """Create Campaign model from CSV row."""
-  return models.Campaign(
-    name=row['name'],
-    tipo_campania=row['tipo_campania'],
-    fecha_inicio=datetime.strptime(row['fecha_inicio'], '%Y-%m-%d').date(),
-    fecha_fin=datetime.strptime(row['fecha_fin'], '%Y-%m-%d').date(),
-    universo_zona_metro=parse_int(row['universo_zona_metro']),
-    impactos_personas=parse_int(row['impactos_personas']),
-    impactos_vehiculos=parse_int(row['impactos_vehiculos']),
-    frecuencia_calculada=parse_float(row['frecuencia_calculada']),
-    frecuencia_promedio=parse_float(row['frecuencia_promedio']),
-    alcance=parse_int(row['alcance']),
-    nse_ab=parse_float(row['nse_ab']),
-    nse_c=parse_float(row['nse_c']),
-    nse_cmas=parse_float(row['nse_cmas']),
-    nse_d=parse_float(row['nse_d']),
-    nse_dmas=parse_float(row['nse_dmas']),
-    nse_e=parse_float(row['nse_e']),
-    edad_0a14=parse_float(row['edad_0a14']),
-    edad_15a19=parse_float(row['edad_15a19']),
-    edad_20a24=parse_float(row['edad_20a24']),
-    edad_25a34=parse_float(row['edad_25a34']),
-    edad_35a44=parse_float(row['edad_35a44']),
-    edad_45a64=parse_float(row['edad_45a64']),
-    edad_65mas=parse_float(row['edad_65mas']),
-    hombres=parse_float(row['hombres']),
-    mujeres=parse_float(row['mujeres'])
+  served = ServedVersion(
+    versions.UNVERSIONED, engine, build_served_state(dataset_snapshot)
   )
+  SERVING.add(served)
+  return served
 
 
-def create_period_from_row(row: Dict[str, str]) -> models.CampaignPeriod:
-  return models.CampaignPeriod(
-    campaign_name=row['name'],
-    period=row['period'],
-    impactos_periodo_personas=parse_int(row['impactos_periodo_personas']),
-    impactos_periodo_vehiculos=parse_int(row['impactos_periodo_vehículos'])
-  )
-
+def serve_version(version: int, activate: bool = True) -> ServedVersion:
+  """Open a published version and its structures, then switch to it.
 
-def create_site_from_row(row: Dict[str, str]) -> models.CampaignSite:
-  return models.CampaignSite(
-    campaign_name=row['name'],
-    codigo_del_sitio=row['codigo_del_sitio'],
-    tipo_de_mueble=row['tipo_de_mueble'],
-    tipo_de_anuncio=row['tipo_de_anuncio'],
-    estado=row['estado'],
-    municipio=row['municipio'],
-    zm=row['zm'],
-    frecuencia_catorcenal=parse_float(row['frecuencia_catorcenal']),
-    frecuencia_mensual=parse_float(row['frecuencia_mensual']),
-    impactos_catorcenal=parse_int(row['impactos_catorcenal']),
-    impactos_mensuales=parse_int(row['impactos_mensuales']),
-    alcance_mensual=parse_float(row['alcance_mensual'])
+  Everything is built before the switch, so requests move from one
+  complete version to the next.
+  """
+  version_engine, dataset_snapshot = versions.open_version(
+    config.VERSIONS_DIR, version
   )
+  served = ServedVersion(
+    version, version_engine, build_served_state(dataset_snapshot)
+  )
+  SERVING.add(served, activate)
+  return served
 
 
-def seed_database_if_empty(db: Session) -> None:
-  """Seed the database with CSV data if tables are empty."""
-  campaign_count = db.query(models.Campaign).count()
-  if campaign_count > 0:
-    return
-
-  base_path = Path(__file__).parent.parent / 'data'
+def watch_published_versions(stop: threading.Event) -> None:
+  while not stop.wait(config.DATASET_CHECK_INTERVAL_S):
+    version = versions.current_version(config.VERSIONS_DIR)
+    if version is None or version == SERVING.current.version:
+      continue
+    try:
+      serve_version(version)
+    except Exception:
+      logger.exception('Could not switch to dataset version %s', version)
 
-  campaigns_data = read_csv_file(base_path / 'bd_campanias_agrupado.csv')
-  periods_data = read_csv_file(base_path / 'bd_campanias_periodos.csv')
-  sites_data = read_csv_file(base_path / 'bd_campanias_sitios.csv')
 
-  seen_campaigns: set[str] = set()
-  for row in campaigns_data:
-    campaign_name = row['name']
-    if campaign_name not in seen_campaigns:
-      db.add(create_campaign_from_row(row))
-      seen_campaigns.add(campaign_name)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+  version = versions.current_version(config.VERSIONS_DIR)
+  if version is None:
+    serve_unversioned()
+  else:
+    serve_version(version)
+
+  stop = threading.Event()
+  watcher = threading.Thread(
+    target=watch_published_versions, args=(stop,), daemon=True
+  )
+  watcher.start()
+  yield
+  stop.set()
+  watcher.join()
 
-  for row in periods_data:
-    db.add(create_period_from_row(row))
 
-  for row in sites_data:
-    db.add(create_site_from_row(row))
+class ProfiledRoute(APIRoute):
+  """A route whose endpoint thread the request's profiler samples."""
 
-  db.commit()
+  def __init__(self, path: str, endpoint: Callable, **kwargs) -> None:
+    super().__init__(
+      path, diagnostics.track_endpoint_thread(endpoint), **kwargs
+    )
 
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-  db = SessionLocal()
-  try:
-    seed_database_if_empty(db)
-  finally:
-    db.close()
-  yield
-
 app = FastAPI(title='Campaign Analytics API', lifespan=lifespan)
+app.router.route_class = ProfiledRoute
+
+DATASET_VERSION_HEADER = 'X-Dataset-Version'
 
 
 app.add_middleware(
@@ -144,17 +134,139 @@ app.add_middleware(
   allow_credentials=True,
   allow_methods=['*'],
   allow_headers=['*'],
+  expose_headers=[DATASET_VERSION_HEADER],
 )
 
 
-def get_db():
-  db = SessionLocal()
+@app.middleware('http')
+async def record_request_metrics(request: Request, call_next):
+  timings = metrics.start_request(f'{request.method} {request.url.path}')
+  try:
+    response = await call_next(request)
+  except Exception:
+    # Counted as the 500 the server answers an unhandled error with.
+    _record_request(request, timings, 500, 0)
+    raise
+
+  elapsed = _record_request(
+    request,
+    timings,
+    response.status_code,
+    int(response.headers.get('content-length', 0))
+  )
+  response.headers['Server-Timing'] = timings.server_timing(elapsed)
+  return response
+
+
+def _record_request(
+  request: Request,
+  timings: metrics.RequestTimings,
+  status: int,
+  response_bytes: int
+) -> float:
+  elapsed = time.perf_counter() - timings.started
+  route = request.scope.get('route')
+  metrics.REGISTRY.record(
+    request.method,
+    route.path if route else metrics.UNMATCHED_ENDPOINT,
+    status,
+    elapsed,
+    response_bytes,
+    timings
+  )
+  return elapsed
+
+
+@app.middleware('http')
+async def profile_request(request: Request, call_next):
+  if request.headers.get('x-profile', '').lower() != 'true':
+    return await call_next(request)
+  if not diagnostics.token_matches(
+    request.headers.get('x-diagnostics-token')
+  ):
+    return JSONResponse({'detail': 'Invalid diagnostics token'}, 403)
+
+  with diagnostics.SamplingProfiler() as profiler:
+    response = await call_next(request)
+    async for _ in response.body_iterator:
+      pass
+  return JSONResponse({
+    'method': request.method,
+    'path': request.url.path,
+    'status_code': response.status_code,
+    **profiler.report()
+  })
+
+
+def get_served_version(
+  response: Response,
+  x_dataset_version: Optional[int] = Header(None)
+) -> ServedVersion:
+  """The dataset version a request reads, the current one unless pinned.
+
+  Responses name the version they were read from, so a client can pin the
+  following requests to it with the same header.
+  """
+  served = SERVING.get(x_dataset_version)
+  if served is None:
+    # Pinned to a version this process has not opened, such as one
+    # published while it was starting; opened once for concurrent requests.
+    try:
+      served = FLIGHTS.do(
+        'dataset_version',
+        x_dataset_version,
+        lambda: serve_version(x_dataset_version, activate=False)
+      )
+    except versions.MissingVersionError:
+      if x_dataset_version < SERVING.current.version:
+        raise HTTPException(
+          status_code=410, detail='Dataset version no longer available'
+        )
+      raise HTTPException(status_code=404, detail='Dataset version not found')
+
+  response.headers[DATASET_VERSION_HEADER] = str(served.version)
+  return served
+
+
+def get_db(served: ServedVersion = Depends(get_served_version)):
+  db = served.SessionLocal()
   try:
     yield db
   finally:
     db.close()
 
 
+def get_site_matrix(
+  served: ServedVersion = Depends(get_served_version)
+) -> SiteMatrix:
+  return served.state.site_matrix
+
+
+def get_campaign_matrix(
+  served: ServedVersion = Depends(get_served_version)
+) -> CampaignMatrix:
+  return served.state.campaign_matrix
+
+
+def get_site_ranking(
+  served: ServedVersion = Depends(get_served_version)
+) -> SiteRanking:
+  return served.state.site_ranking
+
+
+def get_campaign_index(
+  served: ServedVersion = Depends(get_served_version)
+) -> Optional[CampaignIndex]:
+  return served.state.campaign_index
+
+
+def require_diagnostics_token(
+  x_diagnostics_token: Optional[str] = Header(None)
+) -> None:
+  if not diagnostics.token_matches(x_diagnostics_token):
+    raise HTTPException(status_code=403, detail='Invalid diagnostics token')
+
+
 @app.get('/')
 def read_root():
   return {'message': 'Welcome to Campaign Analytics API'}
@@ -165,6 +277,21 @@ def health_check():
   return {'status': 'ok'}
 
 
+@app.get(
+  '/debug/slow-queries',
+  response_model=List[schemas.SlowQuery],
+  dependencies=[Depends(require_diagnostics_token)],
+  include_in_schema=False
+)
+def read_slow_queries():
+  return list(reversed(diagnostics.slow_queries))
+
+
+@app.get('/metrics', include_in_schema=False)
+def read_metrics():
+  return Response(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+
 @app.get('/campaigns/', response_model=schemas.PaginatedCampaigns)
 def read_campaigns(
   skip: int = Query(0, ge=0),
@@ -173,24 +300,53 @@ def read_campaigns(
   fecha_inicio: Optional[date] = None,
   fecha_fin: Optional[date] = None,
   search: Optional[str] = None,
-  db: Session = Depends(get_db)
+  date_mode: DateFilterMode = DateFilterMode.START,
+  estado: Optional[List[str]] = Query(None),
+  municipio: Optional[List[str]] = Query(None),
+  tipo_de_mueble: Optional[List[str]] = Query(None),
+  demografia: Optional[Demographic] = None,
+  demografia_min: Optional[float] = Query(None, ge=0, le=1),
+  approximate: bool = False,
+  facets: bool = False,
+  db: Session = Depends(get_db),
+  index: Optional[CampaignIndex] = Depends(get_campaign_index)
 ):
+  if (demografia is None) != (demografia_min is None):
+    raise HTTPException(
+      status_code=400,
+      detail='demografia and demografia_min must be given together'
+    )
+
+  filters = {
+    'tipo_campania': tipo_campania,
+    'fecha_inicio': fecha_inicio,
+    'fecha_fin': fecha_fin,
+    'search': search,
+    'date_mode': date_mode,
+    'estado': estado,
+    'municipio': municipio,
+    'tipo_de_mueble': tipo_de_mueble,
+    'demografia': demografia,
+    'demografia_min': demografia_min,
+  }
   campaigns, total = crud.get_campaigns_with_count(
-    db,
-    skip=skip,
-    limit=limit,
-    tipo_campania=tipo_campania,
-    fecha_inicio=fecha_inicio,
-    fecha_fin=fecha_fin,
-    search=search
+    db, skip=skip, limit=limit, index=index, **filters
   )
 
+  site_estimates = crud.estimate_distinct_by_campaign(
+    db, DistinctDimension.SITES, [campaign.id for campaign in campaigns]
+  ) if approximate else {}
+
   campaign_items = []
   for campaign in campaigns:
-    sites_count = crud.get_campaign_sites_count(db, campaign.name)
-    periods_count = crud.get_campaign_periods_count(db, campaign.name)
+    if approximate:
+      sites_count = site_estimates[campaign.id]
+    else:
+      sites_count = crud.get_campaign_sites_count(db, campaign.id)
+    periods_count = crud.get_campaign_periods_count(db, campaign.id)
 
     campaign_dict = {
+      'id': campaign.id,
       'name': campaign.name,
       'tipo_campania': campaign.tipo_campania,
       'fecha_inicio': campaign.fecha_inicio,
@@ -223,23 +379,76 @@ def read_campaigns(
 
   total_pages = (total + limit - 1) // limit if limit > 0 else 0
   current_page = skip // limit if limit > 0 else 0
+  approximate_total_sites = None
+  if approximate:
+    approximate_total_sites = crud.estimate_distinct(
+      db,
+      DistinctDimension.SITES,
+      campaign_ids=crud.matching_campaign_ids(db, **filters)
+    )['estimate']
 
   return schemas.PaginatedCampaigns(
     data=campaign_items,
     total=total,
     page=current_page,
     page_size=limit,
-    total_pages=total_pages
+    total_pages=total_pages,
+    approximate_total_sites=approximate_total_sites,
+    facets=crud.get_campaign_facets(db, **filters) if facets else None
   )
 
 
+@app.get('/periods/impacts', response_model=schemas.ImpactsOverTime)
+def read_impacts_over_time(
+  fecha_inicio: date,
+  fecha_fin: date,
+  granularity: PeriodGranularity = PeriodGranularity.MONTH,
+  campaign: Optional[str] = None,
+  db: Session = Depends(get_db)
+):
+  if fecha_fin < fecha_inicio:
+    raise HTTPException(
+      status_code=400, detail='fecha_fin must not be before fecha_inicio'
+    )
+  campaign_id = None
+  if campaign is not None:
+    found = crud.get_campaign(db, campaign)
+    if found is None:
+      raise HTTPException(status_code=404, detail='Campaign not found')
+    campaign_id = found.id
+
+  return {
+    'granularity': granularity,
+    'fecha_inicio': fecha_inicio,
+    'fecha_fin': fecha_fin,
+    'data': crud.get_impacts_by_period(
+      db, fecha_inicio, fecha_fin, granularity, campaign_id=campaign_id
+    )
+  }
+
+
 @app.get('/campaigns/{campaign_id}', response_model=schemas.CampaignDetail)
-def read_campaign(campaign_id: str, db: Session = Depends(get_db)):
-  campaign = crud.get_campaign(db, campaign_id)
-  if campaign is None:
+def read_campaign(
+  campaign_id: str,
+  db: Session = Depends(get_db),
+  served: ServedVersion = Depends(get_served_version)
+):
+  def load_detail() -> Optional[schemas.CampaignDetail]:
+    # Serialized inside the flight: the bookings are loaded lazily through
+    # the leader's session.
+    campaign = crud.get_campaign(db, campaign_id)
+    if campaign is None:
+      return None
+
+    return schemas.CampaignDetail.model_validate(campaign)
+
+  detail = FLIGHTS.do(
+    'campaign', (served.version, campaign_id), load_detail
+  )
+  if detail is None:
     raise HTTPException(status_code=404, detail='Campaign not found')
 
-  return campaign
+  return detail
 
 
 @app.get(
@@ -248,13 +457,23 @@ def read_campaign(campaign_id: str, db: Session = Depends(get_db)):
 )
 def get_campaign_sites_summary(
   campaign_id: str,
-  db: Session = Depends(get_db)
+  db: Session = Depends(get_db),
+  served: ServedVersion = Depends(get_served_version)
 ):
-  campaign = crud.get_campaign(db, campaign_id)
-  if campaign is None:
+  def load_summary() -> Optional[dict]:
+    campaign = crud.get_campaign(db, campaign_id)
+    if campaign is None:
+      return None
+
+    return crud.get_sites_summary(db, campaign.id)
+
+  summary = FLIGHTS.do(
+    'sites_summary', (served.version, campaign_id), load_summary
+  )
+  if summary is None:
     raise HTTPException(status_code=404, detail='Campaign not found')
 
-  return crud.get_sites_summary(db, campaign_id)
+  return summary
 
 
 @app.get(
@@ -263,13 +482,179 @@ def get_campaign_sites_summary(
 )
 def get_campaign_periods_summary(
   campaign_id: str,
+  db: Session = Depends(get_db),
+  served: ServedVersion = Depends(get_served_version)
+):
+  def load_summary() -> Optional[dict]:
+    campaign = crud.get_campaign(db, campaign_id)
+    if campaign is None:
+      return None
+
+    return crud.get_periods_summary(db, campaign.id)
+
+  summary = FLIGHTS.do(
+    'periods_summary', (served.version, campaign_id), load_summary
+  )
+  if summary is None:
+    raise HTTPException(status_code=404, detail='Campaign not found')
+
+  return summary
+
+
+@app.get(
+  '/campaigns/{campaign_id}/geo',
+  response_model=schemas.GeoRollup
+)
+def get_campaign_geo_rollup(
+  campaign_id: str,
+  level: GeoLevel = GeoLevel.ESTADO,
+  mes: Optional[str] = None,
+  estado_id: Optional[int] = None,
+  zm_id: Optional[int] = None,
   db: Session = Depends(get_db)
 ):
   campaign = crud.get_campaign(db, campaign_id)
   if campaign is None:
     raise HTTPException(status_code=404, detail='Campaign not found')
+  drilling = estado_id is not None or zm_id is not None
+  if drilling and level != GeoLevel.MUNICIPIO:
+    raise HTTPException(
+      status_code=400,
+      detail='estado_id and zm_id drill down into the municipio level'
+    )
+
+  return {
+    'level': level,
+    'mes': mes,
+    'data': crud.get_geo_rollup(
+      db, campaign.id, level, mes=mes, estado_id=estado_id, zm_id=zm_id
+    )
+  }
+
+
+@app.get(
+  '/campaigns/{campaign_id}/similar',
+  response_model=schemas.SimilarCampaigns
+)
+def read_similar_campaigns(
+  campaign_id: str,
+  metric: DistanceMetric = DistanceMetric.COSINE,
+  limit: int = Query(5, ge=1, le=50),
+  db: Session = Depends(get_db),
+  campaign_matrix: CampaignMatrix = Depends(get_campaign_matrix)
+):
+  campaign = crud.get_campaign(db, campaign_id)
+  if campaign is None:
+    raise HTTPException(status_code=404, detail='Campaign not found')
+
+  return {
+    'metric': metric,
+    'data': campaign_matrix.nearest(campaign.id, metric, limit)
+  }
 
-  return crud.get_periods_summary(db, campaign_id)
+
+@app.get('/sites/{codigo}', response_model=schemas.SiteDetail)
+def read_site(codigo: str, db: Session = Depends(get_db)):
+  site = crud.get_site(db, codigo)
+  if site is None:
+    raise HTTPException(status_code=404, detail='Site not found')
+
+  return schemas.SiteDetail(
+    **schemas.Site.model_validate(site).model_dump(),
+    campaigns=crud.get_site_campaigns(db, site.id),
+    impacts=crud.get_site_impacts(db, site.id)
+  )
+
+
+@app.get('/rankings/sites', response_model=schemas.SiteRanking)
+def read_site_ranking(
+  metric: RankingMetric = RankingMetric.IMPACTOS,
+  limit: int = Query(10, ge=1, le=100),
+  campaign: Optional[str] = None,
+  group_by: Optional[RankingGroup] = None,
+  db: Session = Depends(get_db),
+  site_ranking: SiteRanking = Depends(get_site_ranking)
+):
+  campaign_id = None
+  if campaign is not None:
+    found = crud.get_campaign(db, campaign)
+    if found is None:
+      raise HTTPException(status_code=404, detail='Campaign not found')
+    campaign_id = found.id
+
+  return {
+    'metric': metric,
+    'group_by': group_by,
+    'campaign': campaign,
+    'data': site_ranking.top(
+      metric, limit, campaign_id=campaign_id, group=group_by
+    )
+  }
+
+
+@app.get('/stats/distinct', response_model=schemas.DistinctCount)
+def read_distinct_count(
+  dimension: DistinctDimension = DistinctDimension.SITES,
+  campaign: Optional[List[str]] = Query(None),
+  mes_inicio: Optional[str] = Query(None, pattern=r'^\d{4}-\d{2}$'),
+  mes_fin: Optional[str] = Query(None, pattern=r'^\d{4}-\d{2}$'),
+  db: Session = Depends(get_db)
+):
+  campaign_ids = None
+  if campaign:
+    campaign_ids = []
+    for name in campaign:
+      found = crud.get_campaign(db, name)
+      if found is None:
+        raise HTTPException(status_code=404, detail='Campaign not found')
+      campaign_ids.append(found.id)
+
+  return {
+    'dimension': dimension,
+    'campaigns': campaign,
+    'mes_inicio': mes_inicio,
+    'mes_fin': mes_fin,
+    **crud.estimate_distinct(
+      db, dimension, campaign_ids=campaign_ids,
+      mes_inicio=mes_inicio, mes_fin=mes_fin
+    )
+  }
+
+
+@app.get('/stats/sites', response_model=schemas.MetricStats)
+def read_site_metric_stats(
+  metric: SiteMetric = SiteMetric.IMPACTOS,
+  campaign: Optional[str] = None,
+  bins: int = Query(10, ge=1, le=100),
+  db: Session = Depends(get_db)
+):
+  campaign_id = None
+  if campaign is not None:
+    found = crud.get_campaign(db, campaign)
+    if found is None:
+      raise HTTPException(status_code=404, detail='Campaign not found')
+    campaign_id = found.id
+
+  return {
+    'metric': metric,
+    'campaign': campaign,
+    **crud.get_metric_stats(db, metric, campaign_id=campaign_id, bins=bins)
+  }
+
+
+@app.post('/planning/reach', response_model=schemas.ReachPlan)
+def plan_reach(
+  plan: schemas.ReachPlanRequest,
+  site_matrix: SiteMatrix = Depends(get_site_matrix)
+):
+  rows, unknown_sites = site_matrix.locate(plan.sites)
+  if not len(rows):
+    raise HTTPException(status_code=404, detail='No known sites selected')
+
+  return {
+    **site_matrix.plan(rows, mes=plan.mes),
+    'unknown_sites': unknown_sites
+  }
 
 
 @app.get(
@@ -278,10 +663,20 @@ def get_campaign_periods_summary(
 )
 def get_campaign_demographic_summary(
   campaign_id: str,
-  db: Session = Depends(get_db)
+  db: Session = Depends(get_db),
+  served: ServedVersion = Depends(get_served_version)
 ):
-  campaign = crud.get_campaign(db, campaign_id)
-  if campaign is None:
+  def load_summary() -> Optional[dict]:
+    campaign = crud.get_campaign(db, campaign_id)
+    if campaign is None:
+      return None
+
+    return crud.get_campaign_summary(campaign)
+
+  summary = FLIGHTS.do(
+    'demographic_summary', (served.version, campaign_id), load_summary
+  )
+  if summary is None:
     raise HTTPException(status_code=404, detail='Campaign not found')
 
-  return crud.get_campaign_summary(campaign)
+  return summary
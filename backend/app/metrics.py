@@ -0,0 +1,298 @@
+"""Request timings, database query counts and Prometheus metrics.
+
+The HTTP middleware opens a `RequestTimings` for every request and keeps it
+in a context variable, so the SQLAlchemy cursor hooks (registered on every
+`Engine`) can add each query's time and fetched rows to the request that
+issued it. When the request ends its totals feed the process-wide
+counters and histograms rendered by `/metrics` in the Prometheus text
+format, and a `Server-Timing` header breaks the request down into time
+executing SQL (`db`), time fetching rows (`fetch`) and the rest (`app`:
+ORM hydration, handler code and serialization).
+"""
+import bisect
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from . import config, diagnostics
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+LATENCY_BUCKETS = (
+  0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+UNMATCHED_ENDPOINT = '<unmatched>'
+
+Labels = Tuple[str, ...]
+
+
+@dataclass
+class RequestTimings:
+  """Totals of one request, filled in by the cursor hooks."""
+  started: float
+  endpoint: Optional[str] = None
+  queries: int = 0
+  query_seconds: float = 0.0
+  fetch_seconds: float = 0.0
+  rows: int = 0
+
+  def server_timing(self, elapsed: float) -> str:
+    app_seconds = max(elapsed - self.query_seconds - self.fetch_seconds, 0)
+    return ', '.join([
+      f'db;dur={self.query_seconds * 1000:.2f};desc="{self.queries} queries"',
+      f'fetch;dur={self.fetch_seconds * 1000:.2f};desc="{self.rows} rows"',
+      f'app;dur={app_seconds * 1000:.2f}',
+      f'total;dur={elapsed * 1000:.2f}',
+    ])
+
+
+_current_request: ContextVar[Optional[RequestTimings]] = ContextVar(
+  'current_request', default=None
+)
+
+
+class Counter:
+  def __init__(self, name: str, help: str, labels: Sequence[str]) -> None:
+    self.name = name
+    self.help = help
+    self.labels = tuple(labels)
+    self.values: Dict[Labels, float] = {}
+
+  def inc(self, labels: Labels, amount: float = 1) -> None:
+    self.values[labels] = self.values.get(labels, 0) + amount
+
+  def render(self) -> List[str]:
+    lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+    lines.extend(
+      f'{self.name}{_labels(self.labels, labels)} {_number(value)}'
+      for labels, value in sorted(self.values.items())
+    )
+    return lines
+
+
+class Histogram:
+  """Cumulative bucket counts, sum and count per label set."""
+
+  def __init__(
+    self,
+    name: str,
+    help: str,
+    labels: Sequence[str],
+    buckets: Sequence[float] = LATENCY_BUCKETS
+  ) -> None:
+    self.name = name
+    self.help = help
+    self.labels = tuple(labels)
+    self.buckets = tuple(buckets)
+    self.values: Dict[Labels, List[float]] = {}
+
+  def observe(self, labels: Labels, value: float) -> None:
+    # One slot per bucket plus +Inf, then the sum of observed values.
+    series = self.values.setdefault(labels, [0] * (len(self.buckets) + 2))
+    series[bisect.bisect_left(self.buckets, value)] += 1
+    series[-1] += value
+
+  def render(self) -> List[str]:
+    lines = [
+      f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram'
+    ]
+    names = self.labels + ('le',)
+    for labels, series in sorted(self.values.items()):
+      cumulative = 0
+      for bound, count in zip(self.buckets + ('+Inf',), series[:-1]):
+        cumulative += count
+        bucket_labels = _labels(names, labels + (_number(bound),))
+        lines.append(f'{self.name}_bucket{bucket_labels} {cumulative}')
+      label_text = _labels(self.labels, labels)
+      lines.append(f'{self.name}_sum{label_text} {_number(series[-1])}')
+      lines.append(f'{self.name}_count{label_text} {cumulative}')
+    return lines
+
+
+class Registry:
+  """The process-wide request metrics."""
+
+  def __init__(self) -> None:
+    self.lock = threading.Lock()
+    self.requests = Counter(
+      'http_requests_total', 'HTTP requests served.',
+      ('method', 'endpoint', 'status')
+    )
+    self.latency = Histogram(
+      'http_request_duration_seconds', 'HTTP request latency in seconds.',
+      ('method', 'endpoint')
+    )
+    self.response_bytes = Counter(
+      'http_response_bytes_total', 'Bytes of HTTP response bodies.',
+      ('endpoint',)
+    )
+    self.queries = Counter(
+      'db_queries_total', 'SQL statements executed by requests.',
+      ('endpoint',)
+    )
+    self.query_seconds = Counter(
+      'db_query_duration_seconds_total',
+      'Seconds spent executing SQL statements.', ('endpoint',)
+    )
+    self.fetch_seconds = Counter(
+      'db_fetch_duration_seconds_total',
+      'Seconds spent fetching rows from the database.', ('endpoint',)
+    )
+    self.rows = Counter(
+      'db_rows_fetched_total', 'Rows fetched from the database.',
+      ('endpoint',)
+    )
+    self.flights = Counter(
+      'singleflight_calls_total',
+      'Coalesced reads by operation and outcome (leader, shared, timeout).',
+      ('operation', 'outcome')
+    )
+    self.flight_wait_seconds = Counter(
+      'singleflight_wait_seconds_total',
+      'Seconds coalesced reads spent waiting for their leader.',
+      ('operation',)
+    )
+
+  def record(
+    self,
+    method: str,
+    endpoint: str,
+    status: int,
+    elapsed: float,
+    response_bytes: int,
+    timings: RequestTimings
+  ) -> None:
+    with self.lock:
+      self.requests.inc((method, endpoint, str(status)))
+      self.latency.observe((method, endpoint), elapsed)
+      self.response_bytes.inc((endpoint,), response_bytes)
+      self.queries.inc((endpoint,), timings.queries)
+      self.query_seconds.inc((endpoint,), timings.query_seconds)
+      self.fetch_seconds.inc((endpoint,), timings.fetch_seconds)
+      self.rows.inc((endpoint,), timings.rows)
+
+  def record_flight(
+    self, operation: str, outcome: str, wait_seconds: float
+  ) -> None:
+    with self.lock:
+      self.flights.inc((operation, outcome))
+      self.flight_wait_seconds.inc((operation,), wait_seconds)
+
+  def render(self) -> str:
+    with self.lock:
+      families = (
+        self.requests, self.latency, self.response_bytes, self.queries,
+        self.query_seconds, self.fetch_seconds, self.rows, self.flights,
+        self.flight_wait_seconds
+      )
+      return '\n'.join(
+        line for family in families for line in family.render()
+      ) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def start_request(endpoint: Optional[str] = None) -> RequestTimings:
+  timings = RequestTimings(started=time.perf_counter(), endpoint=endpoint)
+  _current_request.set(timings)
+  return timings
+
+
+def current_request() -> Optional[RequestTimings]:
+  return _current_request.get()
+
+
+class _CountingCursor:
+  """DBAPI cursor proxy adding fetched rows and fetch time to a request."""
+
+  def __init__(self, cursor, timings: RequestTimings) -> None:
+    self._cursor = cursor
+    self._timings = timings
+
+  def __getattr__(self, name: str):
+    return getattr(self._cursor, name)
+
+  def fetchone(self):
+    row = self._timed(self._cursor.fetchone)
+    self._timings.rows += row is not None
+    return row
+
+  def fetchmany(self, *args):
+    rows = self._timed(self._cursor.fetchmany, *args)
+    self._timings.rows += len(rows)
+    return rows
+
+  def fetchall(self):
+    rows = self._timed(self._cursor.fetchall)
+    self._timings.rows += len(rows)
+    return rows
+
+  def _timed(self, fetch, *args):
+    started = time.perf_counter()
+    try:
+      return fetch(*args)
+    finally:
+      self._timings.fetch_seconds += time.perf_counter() - started
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(
+  connection, cursor, statement, parameters, context, executemany
+) -> None:
+  connection.info['query_started'] = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(
+  connection, cursor, statement, parameters, context, executemany
+) -> None:
+  started = connection.info.pop('query_started', None)
+  if started is None:
+    return
+
+  seconds = time.perf_counter() - started
+  timings = _current_request.get()
+  if seconds * 1000 >= config.SLOW_QUERY_MS:
+    diagnostics.log_slow_query(
+      cursor, statement, parameters, seconds,
+      timings.endpoint if timings else None, executemany
+    )
+  if timings is None:
+    return
+
+  timings.queries += 1
+  timings.query_seconds += seconds
+  # The result reads its rows through `context.cursor`, so counting them
+  # means handing it the proxy instead of the driver's cursor.
+  if context is not None and cursor.description is not None:
+    context.cursor = _CountingCursor(cursor, timings)
+
+
+def _labels(names: Sequence[str], values: Sequence[str]) -> str:
+  if not names:
+    return ''
+
+  pairs = ','.join(
+    f'{name}="{_escape(value)}"' for name, value in zip(names, values)
+  )
+  return '{' + pairs + '}'
+
+
+def _escape(value: str) -> str:
+  return (
+    str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+  )
+
+
+def _number(value) -> str:
+  if isinstance(value, str):
+    return value
+  if float(value).is_integer():
+    return str(int(value))
+
+  return repr(float(value))
@@ -0,0 +1,393 @@
+"""Schema upgrades for databases created by earlier releases.
+
+The schema version is kept in SQLite's `PRAGMA user_version`. A database
+without tables is created at the latest version; an existing one runs every
+migration after its recorded version, in order, inside one transaction.
+"""
+from typing import Callable, Dict, List
+
+from sqlalchemy import inspect
+from sqlalchemy.engine import Connection, Engine
+
+from .distinct import build_distinct_sketches
+from .geo import build_geo_rollups
+from .intervals import create_interval_index
+from .models import (
+  AdType, Base, DistinctSketch, Estado, FurnitureType, MetricSketch,
+  Municipio, ReseedRequired, ZonaMetropolitana
+)
+from .periods import (
+  GRANULARITY_BY_CAMPAIGN_TYPE, PeriodGranularity, period_bounds
+)
+from .sketches import build_metric_sketches
+
+DATASET_TABLES = [
+  'distinct_sketches', 'metric_sketches', 'geo_rollups', 'campaign_sites',
+  'sites', 'municipios', 'zonas_metropolitanas', 'estados',
+  'furniture_types', 'ad_types', 'campaign_periods', 'campaigns',
+  'ingest_checkpoints', 'reseed_required',
+]
+
+UNLOCATED_SITES = '''
+SELECT
+  coalesce(nullif(trim(estado), ''), 'Unknown') AS estado,
+  coalesce(nullif(trim(municipio), ''), 'Unknown') AS municipio,
+  max(coalesce(nullif(trim(zm), ''), 'Unknown')) AS zm
+FROM campaign_sites
+GROUP BY 1, 2
+'''
+
+LOCATE_SITES = [
+  f'''INSERT OR IGNORE INTO estados (name)
+  SELECT DISTINCT estado FROM ({UNLOCATED_SITES})''',
+  f'''INSERT OR IGNORE INTO zonas_metropolitanas (name)
+  SELECT DISTINCT zm FROM ({UNLOCATED_SITES})''',
+  f'''INSERT OR IGNORE INTO municipios (name, estado_id, zm_id)
+  SELECT s.municipio, e.id, z.id
+  FROM ({UNLOCATED_SITES}) AS s
+  JOIN estados AS e ON e.name = s.estado
+  JOIN zonas_metropolitanas AS z ON z.name = s.zm''',
+  '''UPDATE campaign_sites SET municipio_id = m.id
+  FROM municipios AS m
+  JOIN estados AS e ON e.id = m.estado_id
+  WHERE e.name = coalesce(nullif(trim(campaign_sites.estado), ''), 'Unknown')
+    AND m.name = coalesce(
+      nullif(trim(campaign_sites.municipio), ''), 'Unknown'
+    )''',
+]
+
+ENCODED_SITE_COLUMNS = [
+  ('tipo_de_mueble', 'furniture_types', 'furniture_type_id'),
+  ('tipo_de_anuncio', 'ad_types', 'ad_type_id'),
+]
+
+GEO_SITE_COLUMNS = ['estado', 'municipio', 'zm']
+
+CAMPAIGN_KEY_TABLES = [
+  ('campaigns', '''CREATE TABLE campaigns (
+  id INTEGER NOT NULL, name VARCHAR NOT NULL, tipo_campania VARCHAR,
+  fecha_inicio DATE, fecha_fin DATE, universo_zona_metro INTEGER,
+  impactos_personas INTEGER, impactos_vehiculos INTEGER,
+  frecuencia_calculada FLOAT, frecuencia_promedio FLOAT, alcance INTEGER,
+  nse_ab FLOAT, nse_c FLOAT, nse_cmas FLOAT, nse_d FLOAT, nse_dmas FLOAT,
+  nse_e FLOAT, edad_0a14 FLOAT, edad_15a19 FLOAT, edad_20a24 FLOAT,
+  edad_25a34 FLOAT, edad_35a44 FLOAT, edad_45a64 FLOAT, edad_65mas FLOAT,
+  hombres FLOAT, mujeres FLOAT,
+  PRIMARY KEY (id), UNIQUE (name)
+)''', {'id': 'old.rowid'}),
+  ('campaign_periods', '''CREATE TABLE campaign_periods (
+  id INTEGER NOT NULL, campaign_id INTEGER, period VARCHAR,
+  period_start DATE, period_end DATE, granularity VARCHAR(12),
+  impactos_periodo_personas INTEGER, impactos_periodo_vehiculos INTEGER,
+  PRIMARY KEY (id), FOREIGN KEY(campaign_id) REFERENCES campaigns (id)
+)''', {'campaign_id': 'c.id'}),
+  ('campaign_sites', '''CREATE TABLE campaign_sites (
+  id INTEGER NOT NULL, campaign_id INTEGER, codigo_del_sitio VARCHAR,
+  id_fourteen VARCHAR, mes VARCHAR, furniture_type_id INTEGER,
+  ad_type_id INTEGER, municipio_id INTEGER, frecuencia_catorcenal FLOAT,
+  frecuencia_mensual FLOAT, impactos_catorcenal INTEGER,
+  impactos_mensuales INTEGER, alcance_mensual FLOAT,
+  PRIMARY KEY (id),
+  FOREIGN KEY(campaign_id) REFERENCES campaigns (id),
+  FOREIGN KEY(furniture_type_id) REFERENCES furniture_types (id),
+  FOREIGN KEY(ad_type_id) REFERENCES ad_types (id),
+  FOREIGN KEY(municipio_id) REFERENCES municipios (id)
+)''', {'campaign_id': 'c.id'}),
+]
+
+CAMPAIGN_KEY_INDEXES = [
+  'CREATE INDEX ix_campaign_periods_campaign_start '
+  'ON campaign_periods (campaign_id, period_start)',
+  'CREATE INDEX ix_campaign_sites_campaign ON campaign_sites (campaign_id)',
+]
+
+CREATE_SITES = '''CREATE TABLE sites (
+  id INTEGER NOT NULL, codigo_del_sitio VARCHAR NOT NULL,
+  furniture_type_id INTEGER, ad_type_id INTEGER, municipio_id INTEGER,
+  frecuencia_catorcenal FLOAT, frecuencia_mensual FLOAT,
+  nse_ab FLOAT, nse_c FLOAT, nse_cmas FLOAT, nse_d FLOAT, nse_dmas FLOAT,
+  nse_e FLOAT, edad_0a14 FLOAT, edad_15a19 FLOAT, edad_20a24 FLOAT,
+  edad_25a34 FLOAT, edad_35a44 FLOAT, edad_45a64 FLOAT, edad_65mas FLOAT,
+  hombres FLOAT, mujeres FLOAT,
+  PRIMARY KEY (id), UNIQUE (codigo_del_sitio),
+  FOREIGN KEY(furniture_type_id) REFERENCES furniture_types (id),
+  FOREIGN KEY(ad_type_id) REFERENCES ad_types (id),
+  FOREIGN KEY(municipio_id) REFERENCES municipios (id)
+)'''
+
+REGISTER_BOOKED_SITES = '''
+INSERT INTO sites (
+  codigo_del_sitio, furniture_type_id, ad_type_id, municipio_id,
+  frecuencia_catorcenal, frecuencia_mensual
+)
+SELECT
+  codigo_del_sitio, furniture_type_id, ad_type_id, municipio_id,
+  frecuencia_catorcenal, frecuencia_mensual
+FROM campaign_sites
+WHERE id IN (
+  SELECT min(id) FROM campaign_sites
+  WHERE codigo_del_sitio IS NOT NULL
+  GROUP BY codigo_del_sitio
+)
+ORDER BY id
+'''
+
+CREATE_SITE_BOOKINGS = '''CREATE TABLE campaign_sites (
+  id INTEGER NOT NULL, campaign_id INTEGER, site_id INTEGER,
+  id_fourteen VARCHAR, mes VARCHAR, impactos_catorcenal INTEGER,
+  impactos_mensuales INTEGER, alcance_mensual FLOAT,
+  PRIMARY KEY (id),
+  FOREIGN KEY(campaign_id) REFERENCES campaigns (id),
+  FOREIGN KEY(site_id) REFERENCES sites (id)
+)'''
+
+SITE_BOOKING_INDEXES = [
+  'CREATE INDEX ix_campaign_sites_campaign ON campaign_sites (campaign_id)',
+  'CREATE INDEX ix_campaign_sites_site_month '
+  'ON campaign_sites (site_id, mes)',
+]
+
+
+def clear_dataset(connection: Connection) -> None:
+  """Drop loaded rows so the next startup seeds them again from source."""
+  inspector = inspect(connection)
+  for table_name in DATASET_TABLES:
+    if inspector.has_table(table_name):
+      connection.exec_driver_sql(f'DELETE FROM {table_name}')
+
+
+def require_reseed(connection: Connection, migration: str, reason: str) -> None:
+  """Keep the loaded rows, but mark them as needing a reseed."""
+  Base.metadata.create_all(bind=connection, tables=[ReseedRequired.__table__])
+  connection.exec_driver_sql(
+    'INSERT OR IGNORE INTO reseed_required (migration, reason) VALUES (?, ?)',
+    (migration, reason)
+  )
+
+
+def add_site_period_columns(connection: Connection) -> None:
+  """Sites record their fourteen-day period and month for deduplication.
+
+  Both only exist in the source files, so loaded sites cannot be
+  backfilled and the dataset is marked for a reseed.
+  """
+  connection.exec_driver_sql(
+    'ALTER TABLE campaign_sites ADD COLUMN id_fourteen VARCHAR'
+  )
+  connection.exec_driver_sql(
+    'ALTER TABLE campaign_sites ADD COLUMN mes VARCHAR'
+  )
+  if connection.exec_driver_sql('SELECT 1 FROM campaign_sites LIMIT 1').first():
+    require_reseed(
+      connection,
+      'add_site_period_columns',
+      'site bookings have no fourteen-day period or month'
+    )
+
+
+def add_period_dates(connection: Connection) -> None:
+  """Periods keep typed bounds and granularity next to their label."""
+  for column in ('period_start DATE', 'period_end DATE',
+                 'granularity VARCHAR(12)'):
+    connection.exec_driver_sql(
+      f'ALTER TABLE campaign_periods ADD COLUMN {column}'
+    )
+
+  periods = connection.exec_driver_sql(
+    'SELECT p.id, p.period, c.tipo_campania FROM campaign_periods AS p '
+    'JOIN campaigns AS c ON c.name = p.campaign_name'
+  ).all()
+  for period_id, label, campaign_type in periods:
+    granularity = GRANULARITY_BY_CAMPAIGN_TYPE.get(
+      campaign_type, PeriodGranularity.MONTH
+    )
+    try:
+      start, end = period_bounds(label, granularity)
+    except ValueError:
+      continue
+    connection.exec_driver_sql(
+      'UPDATE campaign_periods SET period_start = ?, period_end = ?, '
+      'granularity = ? WHERE id = ?',
+      (start.isoformat(), end.isoformat(), granularity.value, period_id)
+    )
+
+  connection.exec_driver_sql(
+    'CREATE INDEX IF NOT EXISTS ix_campaign_periods_campaign_start '
+    'ON campaign_periods (campaign_name, period_start)'
+  )
+
+
+def add_geo_dimensions(connection: Connection) -> None:
+  """Sites reference a municipio; regions are rolled up per campaign."""
+  connection.exec_driver_sql(
+    'ALTER TABLE campaign_sites ADD COLUMN municipio_id INTEGER'
+  )
+  Base.metadata.create_all(
+    bind=connection,
+    tables=[
+      Estado.__table__,
+      ZonaMetropolitana.__table__,
+      Municipio.__table__,
+    ]
+  )
+  for statement in LOCATE_SITES:
+    connection.exec_driver_sql(statement)
+
+
+def encode_site_dimensions(connection: Connection) -> None:
+  """Repeated site strings move to lookup tables with integer keys."""
+  Base.metadata.create_all(
+    bind=connection, tables=[FurnitureType.__table__, AdType.__table__]
+  )
+  for name_column, lookup_table, key_column in ENCODED_SITE_COLUMNS:
+    connection.exec_driver_sql(
+      f'ALTER TABLE campaign_sites ADD COLUMN {key_column} INTEGER'
+    )
+    connection.exec_driver_sql(
+      f'INSERT OR IGNORE INTO {lookup_table} (name) '
+      f'SELECT DISTINCT {name_column} FROM campaign_sites '
+      f'WHERE {name_column} IS NOT NULL'
+    )
+    connection.exec_driver_sql(
+      f'UPDATE campaign_sites SET {key_column} = ('
+      f'SELECT id FROM {lookup_table} '
+      f'WHERE name = campaign_sites.{name_column})'
+    )
+    connection.exec_driver_sql(
+      f'ALTER TABLE campaign_sites DROP COLUMN {name_column}'
+    )
+
+  for name_column in GEO_SITE_COLUMNS:
+    connection.exec_driver_sql(
+      f'ALTER TABLE campaign_sites DROP COLUMN {name_column}'
+    )
+
+
+def add_campaign_ids(connection: Connection) -> None:
+  """Campaigns get an integer key, which periods and sites reference.
+
+  SQLite cannot change a primary key in place, so the three tables are
+  rebuilt. A campaign's id is its old rowid, which keeps the interval index
+  valid; the rollups are derived and rebuilt after the upgrade.
+  """
+  connection.exec_driver_sql('DROP TABLE IF EXISTS geo_rollups')
+  connection.exec_driver_sql(
+    'DROP INDEX IF EXISTS ix_campaign_periods_campaign_start'
+  )
+  for table_name, create_table, new_columns in CAMPAIGN_KEY_TABLES:
+    joins = ''
+    if 'campaign_id' in new_columns:
+      joins = 'LEFT JOIN campaigns AS c ON c.name = old.campaign_name'
+    _rebuild_table(connection, table_name, create_table, new_columns, joins)
+
+  for statement in CAMPAIGN_KEY_INDEXES:
+    connection.exec_driver_sql(statement)
+  create_interval_index(connection)
+
+
+def register_sites(connection: Connection) -> None:
+  """Site attributes move to a registry; bookings keep the site's key.
+
+  Each site is registered with the attributes of its first booking.
+  """
+  connection.exec_driver_sql(CREATE_SITES)
+  connection.exec_driver_sql(REGISTER_BOOKED_SITES)
+  connection.exec_driver_sql('DROP INDEX IF EXISTS ix_campaign_sites_campaign')
+  _rebuild_table(
+    connection,
+    'campaign_sites',
+    CREATE_SITE_BOOKINGS,
+    {'site_id': 's.id'},
+    'LEFT JOIN sites AS s ON s.codigo_del_sitio = old.codigo_del_sitio'
+  )
+  for statement in SITE_BOOKING_INDEXES:
+    connection.exec_driver_sql(statement)
+
+
+def add_metric_sketches(connection: Connection) -> None:
+  """Site metrics get per-campaign quantile sketches of the bookings."""
+  Base.metadata.create_all(bind=connection, tables=[MetricSketch.__table__])
+  build_metric_sketches(connection)
+
+
+def add_distinct_sketches(connection: Connection) -> None:
+  """Sites and municipios get per-campaign, per-month distinct sketches."""
+  Base.metadata.create_all(bind=connection, tables=[DistinctSketch.__table__])
+  build_distinct_sketches(connection)
+
+
+def _rebuild_table(
+  connection: Connection,
+  table_name: str,
+  create_table: str,
+  new_columns: Dict[str, str],
+  joins: str = ''
+) -> None:
+  """Recreate a table from frozen DDL, copying the columns it keeps.
+
+  `new_columns` maps the columns not copied as-is to the expression that
+  fills them, over the old rows (`old`) and `joins`.
+  """
+  old_table = f'{table_name}_old'
+  connection.exec_driver_sql(f'ALTER TABLE {table_name} RENAME TO {old_table}')
+  connection.exec_driver_sql(create_table)
+
+  old_columns = _column_names(connection, old_table)
+  copied = [
+    column for column in _column_names(connection, table_name)
+    if column in old_columns and column not in new_columns
+  ]
+  sources = [*new_columns.values(), *(f'old.{c}' for c in copied)]
+  connection.exec_driver_sql(
+    f'INSERT INTO {table_name} ({", ".join([*new_columns, *copied])}) '
+    f'SELECT {", ".join(sources)} FROM {old_table} AS old {joins}'
+  )
+  connection.exec_driver_sql(f'DROP TABLE {old_table}')
+
+
+def _column_names(connection: Connection, table_name: str) -> List[str]:
+  return [
+    row[1] for row in connection.exec_driver_sql(
+      f'PRAGMA table_info({table_name})'
+    )
+  ]
+
+
+MIGRATIONS: List[Callable[[Connection], None]] = [
+  add_site_period_columns,
+  add_period_dates,
+  create_interval_index,
+  add_geo_dimensions,
+  encode_site_dimensions,
+  add_campaign_ids,
+  register_sites,
+  add_metric_sketches,
+  add_distinct_sketches,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def get_schema_version(connection: Connection) -> int:
+  return connection.exec_driver_sql('PRAGMA user_version').scalar()
+
+
+def upgrade_database(engine: Engine) -> None:
+  """Migrate to the latest schema, then rebuild the derived tables.
+
+  pysqlite only opens a transaction before data changes and lets DDL
+  commit on its own, so the transaction is begun explicitly: a failing
+  migration leaves the schema and its recorded version as they were.
+  """
+  with engine.connect() as connection, connection.begin():
+    connection.exec_driver_sql('BEGIN IMMEDIATE')
+    pending = []
+    if inspect(connection).has_table('campaigns'):
+      pending = MIGRATIONS[get_schema_version(connection):]
+      for migration in pending:
+        migration(connection)
+
+    Base.metadata.create_all(bind=connection)
+    if pending:
+      build_geo_rollups(connection)
+    connection.exec_driver_sql(f'PRAGMA user_version = {SCHEMA_VERSION}')
@@ -1,12 +1,19 @@
-from sqlalchemy import Column, Date, Float, ForeignKey, Integer, String
-from sqlalchemy.orm import relationship
+from typing import Optional
+
+from sqlalchemy import (
+  Boolean, Column, Date, Enum, Float, ForeignKey, Index, Integer,
+  LargeBinary, String, UniqueConstraint, event, select
+)
+from sqlalchemy.orm import column_property, relationship
 from .database import Base
+from .periods import PeriodGranularity, period_bounds
 
 
 class Campaign(Base):
   __tablename__ = 'campaigns'
 
-  name = Column(String, primary_key=True)
+  id = Column(Integer, primary_key=True)
+  name = Column(String, unique=True, nullable=False)
   tipo_campania = Column(String)
   fecha_inicio = Column(Date)
   fecha_fin = Column(Date)
@@ -40,29 +47,277 @@ class CampaignPeriod(Base):
   __tablename__ = 'campaign_periods'
 
   id = Column(Integer, primary_key=True)
-  campaign_name = Column(String, ForeignKey('campaigns.name'))
+  campaign_id = Column(Integer, ForeignKey('campaigns.id'))
   period = Column(String)
+  period_start = Column(Date)
+  period_end = Column(Date)
+  granularity = Column(
+    Enum(
+      PeriodGranularity,
+      values_callable=lambda granularities: [g.value for g in granularities]
+    ),
+    default=PeriodGranularity.MONTH
+  )
   impactos_periodo_personas = Column(Integer)
   impactos_periodo_vehiculos = Column(Integer)
 
+  campaign_name = column_property(
+    select(Campaign.name).where(
+      Campaign.id == campaign_id
+    ).correlate_except(Campaign).scalar_subquery()
+  )
+
   campaign = relationship('Campaign', back_populates='periods')
 
+  __table_args__ = (
+    Index('ix_campaign_periods_campaign_start', 'campaign_id', 'period_start'),
+  )
 
-class CampaignSite(Base):
-  __tablename__ = 'campaign_sites'
+
+@event.listens_for(CampaignPeriod, 'before_insert')
+def fill_period_bounds(mapper, connection, period: CampaignPeriod) -> None:
+  """Periods created with only a label get its dates; months by default."""
+  if period.period_start is not None:
+    return
+
+  granularity = PeriodGranularity(period.granularity or 'month')
+  period.granularity = granularity
+  period.period_start, period.period_end = period_bounds(
+    period.period, granularity
+  )
+
+
+class JoinedColumn:
+  """Read-only column of a row this one refers to, by default its name.
+
+  `path` follows many-to-one relationships that are joined into the query
+  loading the row, so listings read the values without a subquery per row.
+  Rows created with a value keep it until an insert hook encodes it into
+  the keys (see dimensions.py).
+  """
+
+  def __init__(self, *path: str, column: str = 'name') -> None:
+    self.path = path
+    self.column = column
+
+  def __set_name__(self, owner, name: str) -> None:
+    self.pending = f'_pending_{name}'
+
+  def __get__(self, row, owner=None):
+    if row is None:
+      return self
+
+    member = row
+    for relationship_name in self.path:
+      member = getattr(member, relationship_name)
+      if member is None:
+        return row.__dict__.get(self.pending)
+    return getattr(member, self.column)
+
+  def __set__(self, row, name: Optional[str]) -> None:
+    row.__dict__[self.pending] = name
+
+
+class FurnitureType(Base):
+  __tablename__ = 'furniture_types'
 
   id = Column(Integer, primary_key=True)
-  campaign_name = Column(String, ForeignKey('campaigns.name'))
-  codigo_del_sitio = Column(String)
-  tipo_de_mueble = Column(String)
-  tipo_de_anuncio = Column(String)
-  estado = Column(String)
-  municipio = Column(String)
-  zm = Column(String)
+  name = Column(String, unique=True, nullable=False)
+
+
+class AdType(Base):
+  __tablename__ = 'ad_types'
+
+  id = Column(Integer, primary_key=True)
+  name = Column(String, unique=True, nullable=False)
+
+
+class Estado(Base):
+  __tablename__ = 'estados'
+
+  id = Column(Integer, primary_key=True)
+  name = Column(String, unique=True, nullable=False)
+
+
+class ZonaMetropolitana(Base):
+  __tablename__ = 'zonas_metropolitanas'
+
+  id = Column(Integer, primary_key=True)
+  name = Column(String, unique=True, nullable=False)
+
+
+class Municipio(Base):
+  __tablename__ = 'municipios'
+
+  id = Column(Integer, primary_key=True)
+  name = Column(String, nullable=False)
+  estado_id = Column(Integer, ForeignKey('estados.id'), nullable=False)
+  zm_id = Column(Integer, ForeignKey('zonas_metropolitanas.id'))
+
+  estado = relationship(Estado, lazy='joined')
+  zona_metropolitana = relationship(ZonaMetropolitana, lazy='joined')
+
+  __table_args__ = (UniqueConstraint('estado_id', 'name'),)
+
+
+class Site(Base):
+  """A physical site, registered once however many campaigns book it."""
+  __tablename__ = 'sites'
+
+  id = Column(Integer, primary_key=True)
+  codigo_del_sitio = Column(String, unique=True, nullable=False)
+  furniture_type_id = Column(Integer, ForeignKey('furniture_types.id'))
+  ad_type_id = Column(Integer, ForeignKey('ad_types.id'))
+  municipio_id = Column(Integer, ForeignKey('municipios.id'))
   frecuencia_catorcenal = Column(Float)
   frecuencia_mensual = Column(Float)
+  nse_ab = Column(Float)
+  nse_c = Column(Float)
+  nse_cmas = Column(Float)
+  nse_d = Column(Float)
+  nse_dmas = Column(Float)
+  nse_e = Column(Float)
+  edad_0a14 = Column(Float)
+  edad_15a19 = Column(Float)
+  edad_20a24 = Column(Float)
+  edad_25a34 = Column(Float)
+  edad_35a44 = Column(Float)
+  edad_45a64 = Column(Float)
+  edad_65mas = Column(Float)
+  hombres = Column(Float)
+  mujeres = Column(Float)
+
+  furniture_type = relationship(FurnitureType, lazy='joined')
+  ad_type = relationship(AdType, lazy='joined')
+  municipio_member = relationship(Municipio, lazy='joined')
+
+  # Sites created with names get their keys on insert (see dimensions.py).
+  tipo_de_mueble = JoinedColumn('furniture_type')
+  tipo_de_anuncio = JoinedColumn('ad_type')
+  municipio = JoinedColumn('municipio_member')
+  estado = JoinedColumn('municipio_member', 'estado')
+  zm = JoinedColumn('municipio_member', 'zona_metropolitana')
+
+  bookings = relationship('CampaignSite', back_populates='site')
+
+
+class CampaignSite(Base):
+  """A site booked by a campaign for one fourteen-day period."""
+  __tablename__ = 'campaign_sites'
+
+  id = Column(Integer, primary_key=True)
+  campaign_id = Column(Integer, ForeignKey('campaigns.id'))
+  site_id = Column(Integer, ForeignKey('sites.id'))
+  id_fourteen = Column(String)
+  mes = Column(String)
   impactos_catorcenal = Column(Integer)
   impactos_mensuales = Column(Integer)
   alcance_mensual = Column(Float)
 
-  campaign = relationship('Campaign', back_populates='sites')
+  # Bookings created with a site code and attributes register the site on
+  # insert (see dimensions.py).
+  campaign_name = JoinedColumn('campaign')
+  codigo_del_sitio = JoinedColumn('site', column='codigo_del_sitio')
+  tipo_de_mueble = JoinedColumn('site', 'furniture_type')
+  tipo_de_anuncio = JoinedColumn('site', 'ad_type')
+  estado = JoinedColumn('site', 'municipio_member', 'estado')
+  municipio = JoinedColumn('site', 'municipio_member')
+  zm = JoinedColumn('site', 'municipio_member', 'zona_metropolitana')
+  frecuencia_catorcenal = JoinedColumn(
+    'site', column='frecuencia_catorcenal'
+  )
+  frecuencia_mensual = JoinedColumn('site', column='frecuencia_mensual')
+
+  campaign = relationship('Campaign', back_populates='sites', lazy='joined')
+  site = relationship('Site', back_populates='bookings', lazy='joined')
+
+  __table_args__ = (
+    Index('ix_campaign_sites_campaign', 'campaign_id'),
+    Index('ix_campaign_sites_site_month', 'site_id', 'mes'),
+  )
+
+
+@event.listens_for(CampaignPeriod, 'before_insert')
+@event.listens_for(CampaignSite, 'before_insert')
+def fill_campaign_id(mapper, connection, row) -> None:
+  """Rows created with only a campaign name get the campaign's key."""
+  if row.campaign_id is None and row.campaign_name is not None:
+    row.campaign_id = connection.scalar(
+      select(Campaign.id).where(Campaign.name == row.campaign_name)
+    )
+
+
+class GeoRollup(Base):
+  """Sites, impacts and reach of a campaign per geographic member."""
+  __tablename__ = 'geo_rollups'
+
+  id = Column(Integer, primary_key=True)
+  campaign_id = Column(Integer, ForeignKey('campaigns.id'))
+  mes = Column(String)
+  level = Column(String, nullable=False)
+  estado_id = Column(Integer, ForeignKey('estados.id'))
+  zm_id = Column(Integer, ForeignKey('zonas_metropolitanas.id'))
+  municipio_id = Column(Integer, ForeignKey('municipios.id'))
+  sites = Column(Integer)
+  impacts = Column(Integer)
+  reach = Column(Float)
+
+  __table_args__ = (
+    Index('ix_geo_rollups_campaign_level', 'campaign_id', 'level', 'mes'),
+  )
+
+
+class MetricSketch(Base):
+  """Quantile sketch of one site metric over a campaign's site months."""
+  __tablename__ = 'metric_sketches'
+
+  id = Column(Integer, primary_key=True)
+  campaign_id = Column(Integer, ForeignKey('campaigns.id'), nullable=False)
+  metric = Column(String, nullable=False)
+  count = Column(Integer, nullable=False)
+  total = Column(Float, nullable=False)
+  minimum = Column(Float, nullable=False)
+  maximum = Column(Float, nullable=False)
+  zero_count = Column(Integer, nullable=False)
+  key_offset = Column(Integer, nullable=False)
+  bins = Column(LargeBinary, nullable=False)
+
+  __table_args__ = (UniqueConstraint('metric', 'campaign_id'),)
+
+
+class DistinctSketch(Base):
+  """HyperLogLog registers of a campaign's sites or municipios in a month."""
+  __tablename__ = 'distinct_sketches'
+
+  id = Column(Integer, primary_key=True)
+  campaign_id = Column(Integer, ForeignKey('campaigns.id'), nullable=False)
+  mes = Column(String)
+  dimension = Column(String, nullable=False)
+  registers = Column(LargeBinary, nullable=False)
+
+  __table_args__ = (
+    Index('ix_distinct_sketches_dimension', 'dimension', 'campaign_id', 'mes'),
+  )
+
+
+class ReseedRequired(Base):
+  """A migration that could not fill its changes from the loaded rows.
+
+  The rows are kept and served, with a warning, until the dataset is
+  loaded again from the source files.
+  """
+  __tablename__ = 'reseed_required'
+
+  migration = Column(String, primary_key=True)
+  reason = Column(String, nullable=False)
+
+
+class IngestCheckpoint(Base):
+  """Progress of a CSV ingest, committed together with each chunk."""
+  __tablename__ = 'ingest_checkpoints'
+
+  file_name = Column(String, primary_key=True)
+  source_size = Column(Integer)
+  source_mtime_ns = Column(Integer)
+  rows_committed = Column(Integer, default=0)
+  completed = Column(Boolean, default=False)
@@ -0,0 +1,137 @@
+"""Calendar of the monthly and fourteen-day (catorcena) booking periods.
+
+Catorcenas form a continuous grid of fourteen-day blocks starting on
+Tuesdays. Catorcena 1 of a year is the block containing 1 January, so
+`2025-17` runs from 2025-08-05 to 2025-08-18.
+"""
+import enum
+from datetime import date, timedelta
+from typing import Dict, Tuple
+
+import numpy as np
+
+from .validation import DerivedColumns
+
+CATORCENA_EPOCH = date(2022, 12, 27)
+CATORCENA_DAYS = 14
+
+
+class PeriodGranularity(enum.Enum):
+  WEEK = 'week'
+  FOURTEEN_DAY = 'fourteen_day'
+  MONTH = 'month'
+
+
+GRANULARITY_BY_CAMPAIGN_TYPE = {
+  'mensual': PeriodGranularity.MONTH,
+  'catorcenal': PeriodGranularity.FOURTEEN_DAY,
+}
+
+BUCKET_STEPS = {
+  PeriodGranularity.WEEK: '+7 days',
+  PeriodGranularity.FOURTEEN_DAY: '+14 days',
+  PeriodGranularity.MONTH: '+1 month',
+}
+
+
+def bucket_start(day: date, granularity: PeriodGranularity) -> date:
+  """First day of the week (Monday), month or catorcena containing `day`."""
+  if granularity == PeriodGranularity.WEEK:
+    return day - timedelta(days=day.weekday())
+  if granularity == PeriodGranularity.MONTH:
+    return day.replace(day=1)
+
+  offset = (day - CATORCENA_EPOCH).days % CATORCENA_DAYS
+  return day - timedelta(days=offset)
+
+
+def catorcena_start(year: int, number: int) -> date:
+  first_catorcena = bucket_start(
+    date(year, 1, 1), PeriodGranularity.FOURTEEN_DAY
+  )
+  return first_catorcena + timedelta(days=CATORCENA_DAYS * (number - 1))
+
+
+def period_bounds(
+  label: str,
+  granularity: PeriodGranularity
+) -> Tuple[date, date]:
+  """Start and end dates of a `YYYY-NN` period label.
+
+  Raises ValueError for labels that name no month or catorcena.
+  """
+  year_text, _, number_text = label.partition('-')
+  year, number = int(year_text), int(number_text)
+
+  if granularity == PeriodGranularity.MONTH:
+    start = date(year, number, 1)
+    next_month = (start + timedelta(days=31)).replace(day=1)
+    return start, next_month - timedelta(days=1)
+
+  start = catorcena_start(year, number)
+  if number < 1 or start >= catorcena_start(year + 1, 1):
+    raise ValueError(f'{label} is not a catorcena of {year}')
+
+  return start, start + timedelta(days=CATORCENA_DAYS - 1)
+
+
+def derive_period_columns(columns: Dict[str, np.ndarray]) -> DerivedColumns:
+  """Typed bounds and granularity for the `period` labels of a chunk.
+
+  Labels are split and their bounds computed for the whole chunk at once,
+  with the same rules as `period_bounds`.
+  """
+  labels = columns['period'].astype(str)
+  campaign_types = columns['granularity'].astype(str)
+  granularities = np.full(len(labels), '', dtype=object)
+  for campaign_type, granularity in GRANULARITY_BY_CAMPAIGN_TYPE.items():
+    granularities[campaign_types == campaign_type] = granularity.value
+  monthly = granularities == PeriodGranularity.MONTH.value
+  fourteen_day = granularities == PeriodGranularity.FOURTEEN_DAY.value
+  invalid_type = ~(monthly | fourteen_day)
+
+  parts = np.char.partition(labels, '-')
+  year_text, number_text = parts[:, 0], parts[:, 2]
+  well_formed = (
+    (parts[:, 1] == '-')
+    & np.char.isdigit(year_text)
+    & (np.char.str_len(year_text) <= 4)
+    & np.char.isdigit(number_text)
+    & (np.char.str_len(number_text) <= 3)
+  )
+  year = np.where(well_formed, year_text, '0').astype(np.int64)
+  number = np.where(well_formed, number_text, '0').astype(np.int64)
+  well_formed &= year >= 1
+
+  month = ((year - 1970) * 12 + number - 1).astype('datetime64[M]')
+  month_start = month.astype('datetime64[D]')
+  month_end = (month + 1).astype('datetime64[D]') - 1
+  valid_month = monthly & (number >= 1) & (number <= 12)
+
+  catorcena = _catorcena_starts(year) + CATORCENA_DAYS * (number - 1)
+  valid_catorcena = (
+    fourteen_day & (number >= 1) & (catorcena < _catorcena_starts(year + 1))
+  )
+
+  valid = well_formed & (valid_month | valid_catorcena)
+  invalid_period = ~(invalid_type | valid)
+  not_a_time = np.datetime64('NaT', 'D')
+  starts = np.where(monthly, month_start, catorcena)
+  ends = np.where(monthly, month_end, catorcena + (CATORCENA_DAYS - 1))
+
+  return DerivedColumns(
+    {
+      'period_start': np.where(valid, starts, not_a_time),
+      'period_end': np.where(valid, ends, not_a_time),
+      'granularity': granularities.astype(str)
+    },
+    'period',
+    {'invalid_campaign_type': invalid_type, 'invalid_period': invalid_period}
+  )
+
+
+def _catorcena_starts(years: np.ndarray) -> np.ndarray:
+  """First day of catorcena 1 of each year, as in `catorcena_start`."""
+  new_year = (years - 1970).astype('datetime64[Y]').astype('datetime64[D]')
+  offset = (new_year - np.datetime64(CATORCENA_EPOCH)).astype(np.int64)
+  return new_year - offset % CATORCENA_DAYS
@@ -0,0 +1,282 @@
+"""Reach and frequency planning for ad-hoc site selections.
+
+The planner works on a `SiteMatrix` built once from the columnar snapshot:
+one row per registered site and one column per booked month, holding the
+site's monthly reach (`alcance_mensual`) and impacts (`impactos_mensuales`).
+Months a site was not booked in carry its latest earlier estimate forward,
+so a month after the last booking (the month being planned) uses the most
+recent figures of every site.
+
+Reach is deduplicated per zona metropolitana: a site reaches a share
+`alcance / universe` of its metro area's population, and audiences of
+different sites are assumed independent, so the selection reaches
+`universe * (1 - prod(1 - share))` people there. Metro areas do not
+overlap, so their reaches add up. The universes come from the campaigns'
+`universo_zona_metro`, which is the population of the metro areas a
+campaign books: the median over the campaigns booking a single metro area
+sizes it, and metro areas only booked together with others get the rest
+of those campaigns' universes.
+"""
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .snapshot import Snapshot
+
+
+class SiteMatrix:
+  """Monthly reach and impacts of every registered site, as NumPy arrays."""
+
+  def __init__(
+    self,
+    codes: np.ndarray,
+    zones: np.ndarray,
+    zone_names: np.ndarray,
+    universes: np.ndarray,
+    frequencies: np.ndarray,
+    months: np.ndarray,
+    reach: np.ndarray,
+    impacts: np.ndarray
+  ) -> None:
+    self.codes = codes
+    self.zones = zones
+    self.zone_names = zone_names
+    self.universes = universes
+    self.frequencies = frequencies
+    self.months = months
+    self.reach = reach
+    self.impacts = impacts
+    self._code_order = np.argsort(codes, kind='stable')
+    self._sorted_codes = codes[self._code_order]
+
+  def __len__(self) -> int:
+    return len(self.codes)
+
+  def locate(self, codes: Sequence[str]) -> Tuple[np.ndarray, List[str]]:
+    """Return the distinct rows of the known `codes` and the unknown ones."""
+    wanted = np.unique(np.asarray(codes, dtype=str))
+    positions, found = _search(self._sorted_codes, wanted)
+
+    return self._code_order[positions[found]], wanted[~found].tolist()
+
+  def estimates(self, mes: Optional[str] = None) -> Tuple[np.ndarray, ...]:
+    """Reach and impacts per site for `mes` (default: latest month)."""
+    column = (
+      len(self.months) - 1 if mes is None
+      else int(np.searchsorted(self.months, mes, side='right')) - 1
+    )
+    if column < 0:
+      empty = np.full(len(self), np.nan)
+      return empty, empty
+
+    return self.reach[:, column], self.impacts[:, column]
+
+  def plan(self, rows: np.ndarray, mes: Optional[str] = None) -> dict:
+    """Deduplicated reach, impacts and frequency of the sites in `rows`."""
+    reach, impacts = self.estimates(mes)
+    reach = reach[rows]
+    impacts = impacts[rows]
+    estimated = ~np.isnan(reach)
+    zones = self.zones[rows][estimated]
+    reach = reach[estimated]
+    impacts = np.nan_to_num(impacts[estimated])
+
+    zone_count = len(self.zone_names)
+    universes = self.universes[zones]
+    shares = np.clip(reach / universes, 0.0, 1.0)
+    missed = np.exp(np.bincount(
+      zones, weights=np.log1p(-shares), minlength=zone_count
+    ))
+    zone_sites = np.bincount(zones, minlength=zone_count)
+    zone_reach = self.universes * (1.0 - missed)
+    zone_impacts = np.bincount(zones, weights=impacts, minlength=zone_count)
+
+    booked = np.flatnonzero(zone_sites)
+    total_reach = float(zone_reach[booked].sum())
+    total_impacts = float(impacts.sum())
+    universe = float(self.universes[booked].sum())
+    frequencies = self.frequencies[rows][estimated]
+
+    return {
+      'mes': mes,
+      'sites': len(rows),
+      'estimated_sites': int(estimated.sum()),
+      'universo': round(universe),
+      'alcance': round(total_reach),
+      'alcance_bruto': round(float(reach.sum())),
+      'impactos': round(total_impacts),
+      'cobertura': total_reach / universe if universe else 0.0,
+      'frecuencia_calculada': (
+        total_impacts / total_reach if total_reach else 0.0
+      ),
+      'frecuencia_promedio': (
+        float(np.nanmean(frequencies))
+        if np.any(~np.isnan(frequencies)) else 0.0
+      ),
+      'by_zm': [
+        {
+          'zm': str(self.zone_names[zone]),
+          'sites': int(zone_sites[zone]),
+          'universo': round(float(self.universes[zone])),
+          'alcance': round(float(zone_reach[zone])),
+          'impactos': round(float(zone_impacts[zone]))
+        }
+        for zone in booked[np.argsort(-zone_reach[booked], kind='stable')]
+      ]
+    }
+
+
+def build_site_matrix(dataset: Snapshot) -> SiteMatrix:
+  """Lay the snapshot's sites and monthly bookings out as a site matrix."""
+  sites = dataset.table('sites')
+  bookings = dataset.table('campaign_sites')
+  site_ids = sites.column('id')
+  zone_ids = _site_zones(dataset, sites.column('municipio_id'))
+  zone_keys, zones = np.unique(zone_ids, return_inverse=True)
+  zone_names = _zone_names(dataset, zone_keys)
+
+  booking_rows, known = _search(site_ids, bookings.column('site_id'))
+  booking_months = bookings.values('mes')
+  dated = known & (booking_months != '')
+  months, month_columns = np.unique(
+    booking_months[dated], return_inverse=True
+  )
+
+  shape = (len(site_ids), len(months))
+  cells = (booking_rows[dated], month_columns)
+  reach = _fill_forward(
+    _cell_maximum(shape, cells, bookings.column('alcance_mensual')[dated])
+  )
+  impacts = _fill_forward(_cell_maximum(
+    shape, cells,
+    bookings.column('impactos_mensuales')[dated].astype(np.float64)
+  ))
+  universes = _zone_universes(
+    dataset, booking_rows[known], bookings.column('campaign_id')[known],
+    zones, len(zone_keys), reach
+  )
+
+  return SiteMatrix(
+    codes=np.asarray(sites.values('codigo_del_sitio')),
+    zones=zones,
+    zone_names=zone_names,
+    universes=universes,
+    frequencies=np.asarray(sites.column('frecuencia_mensual')),
+    months=months,
+    reach=reach,
+    impacts=impacts
+  )
+
+
+def _search(
+  sorted_keys: np.ndarray, wanted: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+  """Positions of `wanted` in `sorted_keys` and whether each was found."""
+  if not len(sorted_keys):
+    return np.zeros(len(wanted), dtype=np.int64), np.zeros(len(wanted), bool)
+
+  positions = np.minimum(
+    np.searchsorted(sorted_keys, wanted), len(sorted_keys) - 1
+  )
+  return positions, sorted_keys[positions] == wanted
+
+
+def _site_zones(dataset: Snapshot, municipio_ids: np.ndarray) -> np.ndarray:
+  municipios = dataset.table('municipios')
+  zone_by_municipio = dict(zip(
+    municipios.column('id').tolist(), municipios.column('zm_id').tolist()
+  ))
+
+  return np.array(
+    [zone_by_municipio.get(key, 0) for key in municipio_ids.tolist()],
+    dtype=np.int64
+  )
+
+
+def _zone_names(dataset: Snapshot, zone_keys: np.ndarray) -> np.ndarray:
+  zonas = dataset.table('zonas_metropolitanas')
+  names: Dict[int, str] = dict(zip(
+    zonas.column('id').tolist(), zonas.values('name').tolist()
+  ))
+
+  return np.array(
+    [names.get(key, 'Unknown') for key in zone_keys.tolist()], dtype=str
+  )
+
+
+def _cell_maximum(
+  shape: Tuple[int, int],
+  cells: Tuple[np.ndarray, np.ndarray],
+  values: np.ndarray
+) -> np.ndarray:
+  """Largest value per (site, month); a site counts once per month."""
+  matrix = np.full(shape, np.nan)
+  np.fmax.at(matrix, cells, values)
+  return matrix
+
+
+def _fill_forward(matrix: np.ndarray) -> np.ndarray:
+  """Carry each site's latest estimate into the following months."""
+  if not matrix.size:
+    return matrix
+
+  columns = np.arange(matrix.shape[1])
+  latest = np.where(np.isnan(matrix), 0, columns)
+  np.maximum.accumulate(latest, axis=1, out=latest)
+  return np.take_along_axis(matrix, latest, axis=1)
+
+
+def _zone_universes(
+  dataset: Snapshot,
+  booking_rows: np.ndarray,
+  booking_campaigns: np.ndarray,
+  zones: np.ndarray,
+  zone_count: int,
+  reach: np.ndarray
+) -> np.ndarray:
+  """Estimate the population of each metro area from campaign universes.
+
+  Campaigns booking a single metro area give its population directly; the
+  median of those tolerates the odd campaign with a mistyped universe.
+  Metro areas only booked together with others get what is left of those
+  campaigns' universes. A metro area is never smaller than the largest
+  reach of its sites, which also covers those no campaign sizes.
+  """
+  floor = np.ones(zone_count)
+  if reach.size:
+    np.fmax.at(floor, zones, np.nan_to_num(reach).max(axis=1))
+
+  campaigns = dataset.table('campaigns')
+  targets = campaigns.column('universo_zona_metro').astype(np.float64)
+  campaign_rows, _ = _search(campaigns.column('id'), booking_campaigns)
+  incidence = np.zeros((len(targets), zone_count), dtype=bool)
+  incidence[campaign_rows, zones[booking_rows]] = True
+  incidence &= (targets > 0)[:, np.newaxis]
+
+  universes = _median_by_zone(incidence, targets, zone_count)
+  known = ~np.isnan(universes)
+  shared = incidence & ~known
+  single_unknown = shared.sum(axis=1) == 1
+  residuals = targets - np.where(incidence & known, universes, 0).sum(axis=1)
+  sized = _median_by_zone(
+    shared & (single_unknown & (residuals > 0))[:, np.newaxis],
+    residuals, zone_count
+  )
+  universes = np.where(known, universes, sized)
+
+  return np.fmax(universes, floor)
+
+
+def _median_by_zone(
+  incidence: np.ndarray, targets: np.ndarray, zone_count: int
+) -> np.ndarray:
+  """Median target of the campaigns booking exactly one zone of `incidence`."""
+  single = incidence.sum(axis=1) == 1
+  single_zones = incidence[single].argmax(axis=1)
+  single_targets = targets[single]
+
+  return np.array([
+    np.median(single_targets[single_zones == zone])
+    if np.any(single_zones == zone) else np.nan
+    for zone in range(zone_count)
+  ])
@@ -0,0 +1,258 @@
+"""Top-N rankings of booked sites by impacts or reach.
+
+Site totals are laid out once from the columnar snapshot: for every
+(campaign, site) pair and for every site across the portfolio, its monthly
+impacts added once per month, as in the sites summary, and its largest
+monthly reach, since reach does not add up across months. Pairs are sorted
+by campaign, so a campaign's sites are a contiguous slice.
+
+A ranking partitions the candidate values with `numpy.argpartition` and
+only sorts the N winners. Per-group rankings (by municipio or furniture
+type) partition each group's slice; across the portfolio those slices are
+laid out at build time, within a campaign only its own sites are grouped.
+"""
+import enum
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .snapshot import Snapshot
+
+
+class RankingMetric(enum.Enum):
+  IMPACTOS = 'impactos_mensuales'
+  ALCANCE = 'alcance_mensual'
+
+
+class RankingGroup(enum.Enum):
+  MUNICIPIO = 'municipio'
+  TIPO_DE_MUEBLE = 'tipo_de_mueble'
+
+
+class SiteTotals:
+  """Impacts and reach of a set of site rows."""
+
+  def __init__(
+    self, rows: np.ndarray, impacts: np.ndarray, reach: np.ndarray
+  ) -> None:
+    self.rows = rows
+    self.values = {
+      RankingMetric.IMPACTOS: impacts,
+      RankingMetric.ALCANCE: reach,
+    }
+
+  def __len__(self) -> int:
+    return len(self.rows)
+
+  def slice(self, start: int, stop: int) -> 'SiteTotals':
+    return SiteTotals(
+      self.rows[start:stop],
+      self.values[RankingMetric.IMPACTOS][start:stop],
+      self.values[RankingMetric.ALCANCE][start:stop]
+    )
+
+
+class SiteRanking:
+  """Preloaded site totals answering top-N queries."""
+
+  def __init__(
+    self,
+    codes: np.ndarray,
+    groups: Dict[RankingGroup, Tuple[np.ndarray, np.ndarray]],
+    campaign_ids: np.ndarray,
+    campaign_totals: SiteTotals,
+    portfolio_totals: SiteTotals
+  ) -> None:
+    self.codes = codes
+    self.groups = groups
+    self.campaign_ids = campaign_ids
+    self.campaign_totals = campaign_totals
+    self.portfolio_totals = portfolio_totals
+    self.portfolio_slices = {
+      group: _group_slices(group_codes[portfolio_totals.rows])
+      for group, (_, group_codes) in groups.items()
+    }
+
+  def top(
+    self,
+    metric: RankingMetric,
+    limit: int,
+    campaign_id: Optional[int] = None,
+    group: Optional[RankingGroup] = None
+  ) -> List[dict]:
+    """The `limit` best sites, overall or within each group."""
+    totals = self.portfolio_totals
+    if campaign_id is not None:
+      totals = self.campaign_totals.slice(
+        int(np.searchsorted(self.campaign_ids, campaign_id, 'left')),
+        int(np.searchsorted(self.campaign_ids, campaign_id, 'right'))
+      )
+    values = totals.values[metric]
+    if group is None:
+      return self._records(totals, _top_n(values, limit))
+
+    names, codes = self.groups[group]
+    order, starts = (
+      self.portfolio_slices[group] if campaign_id is None
+      else _group_slices(codes[totals.rows])
+    )
+    records = []
+    for start, stop in zip(starts[:-1], starts[1:]):
+      members = order[start:stop]
+      group_name = str(names[codes[totals.rows[members[0]]]])
+      records.extend(self._records(
+        totals, members[_top_n(values[members], limit)], group_name
+      ))
+
+    return records
+
+  def _records(
+    self,
+    totals: SiteTotals,
+    positions: np.ndarray,
+    group_name: Optional[str] = None
+  ) -> List[dict]:
+    furniture_names, furniture = self.groups[RankingGroup.TIPO_DE_MUEBLE]
+    municipio_names, municipios = self.groups[RankingGroup.MUNICIPIO]
+    rows = totals.rows[positions]
+
+    return [
+      {
+        'rank': rank,
+        'group': group_name,
+        'codigo_del_sitio': str(self.codes[row]),
+        'tipo_de_mueble': str(furniture_names[furniture[row]]),
+        'municipio': str(municipio_names[municipios[row]]),
+        'impactos_mensuales': int(impacts),
+        'alcance_mensual': float(reach)
+      }
+      for rank, (row, impacts, reach) in enumerate(zip(
+        rows.tolist(),
+        totals.values[RankingMetric.IMPACTOS][positions].tolist(),
+        totals.values[RankingMetric.ALCANCE][positions].tolist()
+      ), start=1)
+    ]
+
+
+def build_site_ranking(dataset: Snapshot) -> SiteRanking:
+  """Total the snapshot's bookings per campaign and site, and per site.
+
+  Bookings without a registered site (a NULL or unknown `site_id`) are
+  left out rather than credited to a neighbouring site.
+  """
+  sites = dataset.table('sites')
+  bookings = dataset.table('campaign_sites')
+  site_ids = sites.column('id')
+  booked_ids = bookings.column('site_id')
+  site_rows = np.searchsorted(site_ids, booked_ids)
+  located = site_rows < len(site_ids)
+  located[located] = site_ids[site_rows[located]] == booked_ids[located]
+  nulls = bookings.nulls('site_id')
+  if nulls is not None:
+    located &= ~nulls
+  site_rows = site_rows[located]
+  impacts = bookings.column('impactos_mensuales')[located].astype(np.float64)
+  reach = np.nan_to_num(bookings.column('alcance_mensual')[located])
+
+  site_month_keys, booking_months = _unique_keys(np.column_stack([
+    bookings.column('campaign_id')[located],
+    site_rows,
+    bookings.column('mes')[located]
+  ]))
+  month_impacts = _maximum(booking_months, impacts, len(site_month_keys))
+  month_reach = _maximum(booking_months, reach, len(site_month_keys))
+
+  pair_keys, pair_months = _unique_keys(site_month_keys[:, :2])
+  campaign_totals = SiteTotals(
+    pair_keys[:, 1],
+    np.bincount(pair_months, month_impacts, len(pair_keys)),
+    _maximum(pair_months, month_reach, len(pair_keys))
+  )
+
+  portfolio_keys, portfolio_months = _unique_keys(site_month_keys[:, 1:])
+  portfolio_impacts = _maximum(
+    portfolio_months, month_impacts, len(portfolio_keys)
+  )
+  portfolio_reach = _maximum(
+    portfolio_months, month_reach, len(portfolio_keys)
+  )
+  booked = np.unique(portfolio_keys[:, 0])
+  site_count = len(site_ids)
+  portfolio_totals = SiteTotals(
+    booked,
+    np.bincount(
+      portfolio_keys[:, 0], portfolio_impacts, site_count
+    )[booked],
+    _maximum(portfolio_keys[:, 0], portfolio_reach, site_count)[booked]
+  )
+
+  return SiteRanking(
+    codes=np.asarray(sites.values('codigo_del_sitio')),
+    groups={
+      RankingGroup.MUNICIPIO: _site_names(
+        dataset, 'municipios', sites.column('municipio_id')
+      ),
+      RankingGroup.TIPO_DE_MUEBLE: _site_names(
+        dataset, 'furniture_types', sites.column('furniture_type_id')
+      ),
+    },
+    campaign_ids=pair_keys[:, 0],
+    campaign_totals=campaign_totals,
+    portfolio_totals=portfolio_totals
+  )
+
+
+def _top_n(values: np.ndarray, limit: int) -> np.ndarray:
+  """Positions of the `limit` largest values, largest first."""
+  if limit < len(values):
+    candidates = np.argpartition(-values, limit - 1)[:limit]
+  else:
+    candidates = np.arange(len(values))
+
+  return candidates[np.argsort(-values[candidates], kind='stable')]
+
+
+def _group_slices(codes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+  """Order positions by group code, with the boundaries of each group."""
+  order = np.argsort(codes, kind='stable')
+  if not len(codes):
+    return order, np.zeros(1, dtype=np.int64)
+
+  boundaries = np.flatnonzero(np.diff(codes[order])) + 1
+
+  return order, np.concatenate(([0], boundaries, [len(codes)]))
+
+
+def _unique_keys(keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+  """Sorted distinct key rows and the distinct row of every input row."""
+  if not len(keys):
+    return keys.reshape(0, keys.shape[1]), np.zeros(0, dtype=np.int64)
+
+  dimensions = tuple(keys.max(axis=0) + 1)
+  packed = np.ravel_multi_index(tuple(keys.T), dimensions)
+  unique, inverse = np.unique(packed, return_inverse=True)
+  return np.column_stack(np.unravel_index(unique, dimensions)), inverse
+
+
+def _maximum(groups: np.ndarray, values: np.ndarray, size: int) -> np.ndarray:
+  totals = np.zeros(size)
+  np.maximum.at(totals, groups, values)
+  return totals
+
+
+def _site_names(
+  dataset: Snapshot, table_name: str, keys: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+  """Distinct names of a lookup table and each site's code into them."""
+  lookup = dataset.table(table_name)
+  names_by_key = dict(zip(
+    lookup.column('id').tolist(), lookup.values('name').tolist()
+  ))
+  names, codes = np.unique(
+    np.array(
+      [names_by_key.get(key, 'Unknown') for key in keys.tolist()], dtype=str
+    ),
+    return_inverse=True
+  )
+
+  return names, codes.ravel()
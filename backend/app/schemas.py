@@ -1,16 +1,27 @@
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field
 from datetime import date
-from typing import List, Optional
+from typing import Any, List, Optional
+
+from .distinct import DistinctDimension
+from .geo import GeoLevel
+from .periods import PeriodGranularity
+from .ranking import RankingGroup, RankingMetric
+from .similarity import DistanceMetric
+from .sketches import SiteMetric
 
 
 class CampaignPeriodBase(BaseModel):
   period: str
+  period_start: Optional[date] = None
+  period_end: Optional[date] = None
+  granularity: Optional[PeriodGranularity] = None
   impactos_periodo_personas: Optional[int] = 0
   impactos_periodo_vehiculos: Optional[int] = 0
 
 
 class CampaignPeriod(CampaignPeriodBase):
   id: int
+  campaign_id: int
   campaign_name: str
 
   model_config = ConfigDict(from_attributes=True)
@@ -18,6 +29,8 @@ class CampaignPeriod(CampaignPeriodBase):
 
 class CampaignSiteBase(BaseModel):
   codigo_del_sitio: str
+  id_fourteen: Optional[str] = None
+  mes: Optional[str] = None
   tipo_de_mueble: str
   tipo_de_anuncio: str
   estado: str
@@ -32,6 +45,7 @@ class CampaignSiteBase(BaseModel):
 
 class CampaignSite(CampaignSiteBase):
   id: int
+  campaign_id: int
   campaign_name: str
 
   model_config = ConfigDict(from_attributes=True)
@@ -66,10 +80,13 @@ class CampaignBase(BaseModel):
 
 
 class Campaign(CampaignBase):
+  id: int
+
   model_config = ConfigDict(from_attributes=True)
 
 
 class CampaignListItem(CampaignBase):
+  id: int
   sites_count: int = 0
   periods_count: int = 0
 
@@ -83,12 +100,25 @@ class CampaignDetail(Campaign):
   model_config = ConfigDict(from_attributes=True)
 
 
+class FacetCount(BaseModel):
+  value: Optional[str] = None
+  count: int
+
+
+class CampaignFacets(BaseModel):
+  tipo_campania: List[FacetCount]
+  mes_inicio: List[FacetCount]
+  estado: List[FacetCount]
+
+
 class PaginatedCampaigns(BaseModel):
   data: List[CampaignListItem]
   total: int
   page: int
   page_size: int
   total_pages: int
+  approximate_total_sites: Optional[int] = None
+  facets: Optional[CampaignFacets] = None
 
 
 class SiteTypeSummary(BaseModel):
@@ -120,6 +150,184 @@ class PeriodsSummary(BaseModel):
   data: List[PeriodData]
 
 
+class ImpactBucket(BaseModel):
+  bucket_start: date
+  bucket_end: date
+  people_impacts: int
+  vehicle_impacts: int
+
+
+class ImpactsOverTime(BaseModel):
+  granularity: PeriodGranularity
+  fecha_inicio: date
+  fecha_fin: date
+  data: List[ImpactBucket]
+
+
+class GeoRegion(BaseModel):
+  id: int
+  name: str
+  estado_id: Optional[int] = None
+  zm_id: Optional[int] = None
+  sites: int
+  impacts: int
+  reach: float
+
+
+class GeoRollup(BaseModel):
+  level: GeoLevel
+  mes: Optional[str] = None
+  data: List[GeoRegion]
+
+
+class Site(BaseModel):
+  codigo_del_sitio: str
+  tipo_de_mueble: Optional[str] = None
+  tipo_de_anuncio: Optional[str] = None
+  estado: Optional[str] = None
+  municipio: Optional[str] = None
+  zm: Optional[str] = None
+  frecuencia_catorcenal: Optional[float] = None
+  frecuencia_mensual: Optional[float] = None
+  nse_ab: Optional[float] = None
+  nse_c: Optional[float] = None
+  nse_cmas: Optional[float] = None
+  nse_d: Optional[float] = None
+  nse_dmas: Optional[float] = None
+  nse_e: Optional[float] = None
+  edad_0a14: Optional[float] = None
+  edad_15a19: Optional[float] = None
+  edad_20a24: Optional[float] = None
+  edad_25a34: Optional[float] = None
+  edad_35a44: Optional[float] = None
+  edad_45a64: Optional[float] = None
+  edad_65mas: Optional[float] = None
+  hombres: Optional[float] = None
+  mujeres: Optional[float] = None
+
+  model_config = ConfigDict(from_attributes=True)
+
+
+class SiteCampaign(BaseModel):
+  id: int
+  name: str
+  tipo_campania: Optional[str] = None
+  fecha_inicio: Optional[date] = None
+  fecha_fin: Optional[date] = None
+  months: int
+  impacts: int
+
+
+class SiteMonth(BaseModel):
+  mes: str
+  impacts: int
+  reach: float
+  campaigns: int
+
+
+class SiteDetail(Site):
+  campaigns: List[SiteCampaign]
+  impacts: List[SiteMonth]
+
+
+class ReachPlanRequest(BaseModel):
+  sites: List[str] = Field(min_length=1, max_length=100_000)
+  mes: Optional[str] = Field(None, pattern=r'^\d{4}-\d{2}$')
+
+
+class ZoneReach(BaseModel):
+  zm: str
+  sites: int
+  universo: int
+  alcance: int
+  impactos: int
+
+
+class ReachPlan(BaseModel):
+  mes: Optional[str] = None
+  sites: int
+  estimated_sites: int
+  unknown_sites: List[str]
+  universo: int
+  alcance: int
+  alcance_bruto: int
+  impactos: int
+  cobertura: float
+  frecuencia_calculada: float
+  frecuencia_promedio: float
+  by_zm: List[ZoneReach]
+
+
+class RankedSite(BaseModel):
+  rank: int
+  group: Optional[str] = None
+  codigo_del_sitio: str
+  tipo_de_mueble: str
+  municipio: str
+  impactos_mensuales: int
+  alcance_mensual: float
+
+
+class SiteRanking(BaseModel):
+  metric: RankingMetric
+  group_by: Optional[RankingGroup] = None
+  campaign: Optional[str] = None
+  data: List[RankedSite]
+
+
+class DistinctCount(BaseModel):
+  dimension: DistinctDimension
+  campaigns: Optional[List[str]] = None
+  mes_inicio: Optional[str] = None
+  mes_fin: Optional[str] = None
+  estimate: int
+  standard_error: float
+  sketches: int
+
+
+class Percentile(BaseModel):
+  percentile: int
+  value: Optional[float] = None
+
+
+class HistogramBin(BaseModel):
+  lower: float
+  upper: float
+  count: int
+
+
+class MetricStats(BaseModel):
+  metric: SiteMetric
+  campaign: Optional[str] = None
+  campaigns: int
+  count: int
+  mean: Optional[float] = None
+  minimum: Optional[float] = None
+  maximum: Optional[float] = None
+  percentiles: List[Percentile]
+  histogram: List[HistogramBin]
+
+
+class SlowQuery(BaseModel):
+  timestamp: str
+  endpoint: Optional[str] = None
+  duration_ms: float
+  statement: str
+  parameters: Any
+  plan: Optional[List[str]] = None
+
+
+class SimilarCampaign(BaseModel):
+  id: int
+  name: str
+  distance: float
+
+
+class SimilarCampaigns(BaseModel):
+  metric: DistanceMetric
+  data: List[SimilarCampaign]
+
+
 class DemographicData(BaseModel):
   label: str
   value: float
@@ -0,0 +1,98 @@
+"""Demographic similarity between campaigns.
+
+Every campaign's audience profile (six NSE, seven age and two gender
+shares) is one row of a contiguous float matrix built from the columnar
+snapshot, so it is rebuilt whenever an ingest refreshes the snapshot.
+Ranking the campaigns closest to one of them is a single matrix-vector
+operation followed by a partial sort of the k nearest.
+"""
+import enum
+from typing import List, Optional
+
+import numpy as np
+
+from .snapshot import Snapshot
+
+DEMOGRAPHIC_COLUMNS = (
+  'nse_ab', 'nse_c', 'nse_cmas', 'nse_d', 'nse_dmas', 'nse_e',
+  'edad_0a14', 'edad_15a19', 'edad_20a24', 'edad_25a34', 'edad_35a44',
+  'edad_45a64', 'edad_65mas',
+  'hombres', 'mujeres',
+)
+
+
+class DistanceMetric(enum.Enum):
+  COSINE = 'cosine'
+  L1 = 'l1'
+
+
+class CampaignMatrix:
+  """Demographic profiles of every campaign, one row per campaign id."""
+
+  def __init__(
+    self, ids: np.ndarray, names: np.ndarray, profiles: np.ndarray
+  ) -> None:
+    self.ids = ids
+    self.names = names
+    self.profiles = np.ascontiguousarray(profiles, dtype=np.float64)
+    self.norms = np.linalg.norm(self.profiles, axis=1)
+
+  def __len__(self) -> int:
+    return len(self.ids)
+
+  def row(self, campaign_id: int) -> Optional[int]:
+    position = int(np.searchsorted(self.ids, campaign_id))
+    if position < len(self) and self.ids[position] == campaign_id:
+      return position
+
+    return None
+
+  def distances(self, row: int, metric: DistanceMetric) -> np.ndarray:
+    """Distance from the campaign at `row` to every campaign."""
+    profile = self.profiles[row]
+    if metric == DistanceMetric.L1:
+      return np.abs(self.profiles - profile).sum(axis=1)
+
+    scale = self.norms * self.norms[row]
+    similarity = np.divide(
+      self.profiles @ profile, scale,
+      out=np.zeros(len(self)), where=scale > 0
+    )
+    return 1.0 - similarity
+
+  def nearest(
+    self, campaign_id: int, metric: DistanceMetric, limit: int
+  ) -> List[dict]:
+    """The `limit` campaigns closest to `campaign_id`, nearest first."""
+    row = self.row(campaign_id)
+    if row is None or len(self) < 2:
+      return []
+
+    distances = self.distances(row, metric)
+    distances[row] = np.inf
+    count = min(limit, len(self) - 1)
+    nearest = np.argpartition(distances, count - 1)[:count]
+    nearest = nearest[np.argsort(distances[nearest], kind='stable')]
+
+    return [
+      {
+        'id': int(self.ids[position]),
+        'name': str(self.names[position]),
+        'distance': float(distances[position])
+      }
+      for position in nearest
+    ]
+
+
+def build_campaign_matrix(dataset: Snapshot) -> CampaignMatrix:
+  """Stack the snapshot's campaign demographics; missing shares count as 0."""
+  campaigns = dataset.table('campaigns')
+  profiles = np.column_stack([
+    np.nan_to_num(campaigns.column(column)) for column in DEMOGRAPHIC_COLUMNS
+  ]) if len(campaigns) else np.zeros((0, len(DEMOGRAPHIC_COLUMNS)))
+
+  return CampaignMatrix(
+    ids=np.asarray(campaigns.column('id')),
+    names=np.asarray(campaigns.values('name')),
+    profiles=profiles
+  )
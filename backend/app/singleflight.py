@@ -0,0 +1,94 @@
+"""Request coalescing for concurrent identical reads.
+
+The first request for a key (an operation and its arguments, such as the
+sites summary of one campaign) becomes the leader and computes the result;
+identical requests arriving while it runs wait for it and share its
+result, or its exception, instead of repeating the same queries. The
+dataset is read-only while serving, so a result shared this way is the
+one each of them would have computed.
+
+A follower waits at most `config.SINGLE_FLIGHT_TIMEOUT_S` seconds. After
+that it stops waiting and computes the result itself, so a stalled leader
+delays its followers by no more than the timeout. Every call is counted
+in the request metrics by operation and outcome (`leader`, `shared` or
+`timeout`), with the seconds followers spent waiting.
+"""
+import threading
+import time
+from typing import Callable, Dict, Hashable, Optional, Tuple, TypeVar
+
+from . import config, metrics
+
+T = TypeVar('T')
+
+
+class _Flight:
+  """One in-flight computation and, once done, its outcome."""
+
+  def __init__(self) -> None:
+    self.done = threading.Event()
+    self.result = None
+    self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+  def __init__(self) -> None:
+    self._lock = threading.Lock()
+    self._flights: Dict[Tuple[str, Hashable], _Flight] = {}
+
+  def do(
+    self,
+    operation: str,
+    key: Hashable,
+    compute: Callable[[], T]
+  ) -> T:
+    """Run `compute` once for concurrent calls with the same key."""
+    flight_key = (operation, key)
+    with self._lock:
+      flight = self._flights.get(flight_key)
+      leading = flight is None
+      if leading:
+        flight = self._flights[flight_key] = _Flight()
+
+    if leading:
+      return self._lead(operation, flight_key, flight, compute)
+
+    started = time.perf_counter()
+    finished = flight.done.wait(config.SINGLE_FLIGHT_TIMEOUT_S)
+    metrics.REGISTRY.record_flight(
+      operation, 'shared' if finished else 'timeout',
+      time.perf_counter() - started
+    )
+    if not finished:
+      return compute()
+    if flight.error is not None:
+      raise flight.error
+
+    return flight.result
+
+  def in_flight(self) -> int:
+    with self._lock:
+      return len(self._flights)
+
+  def _lead(
+    self,
+    operation: str,
+    flight_key: Tuple[str, Hashable],
+    flight: _Flight,
+    compute: Callable[[], T]
+  ) -> T:
+    metrics.REGISTRY.record_flight(operation, 'leader', 0.0)
+    try:
+      flight.result = compute()
+      return flight.result
+    except BaseException as error:
+      flight.error = error
+      raise
+    finally:
+      # Later calls start a new flight; the waiting ones read this one.
+      with self._lock:
+        del self._flights[flight_key]
+      flight.done.set()
+
+
+FLIGHTS = SingleFlight()
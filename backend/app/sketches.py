@@ -0,0 +1,212 @@
+"""Mergeable quantile sketches of the per-site metrics.
+
+Every campaign keeps one sketch per metric over its sites' monthly values
+(a site counts once per month, as in the summaries). The sketches are a
+derived table rebuilt with the rollup cube, so percentiles of a campaign
+read one row and portfolio-wide percentiles merge one row per campaign,
+never the site rows.
+
+The sketch is a DDSketch: values fall into logarithmic buckets
+`(gamma^(k-1), gamma^k]` with `gamma = (1 + a) / (1 - a)`, so any quantile
+is returned within a relative error `a` of the true value. Merging two
+sketches adds their bucket counts.
+"""
+import enum
+import math
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+RELATIVE_ACCURACY = 0.01
+PERCENTILES = (0.5, 0.75, 0.9, 0.95, 0.99)
+
+
+class SiteMetric(enum.Enum):
+  IMPACTOS = 'impactos_mensuales'
+  FRECUENCIA = 'frecuencia_mensual'
+  ALCANCE = 'alcance_mensual'
+
+
+SITE_MONTH_METRICS = '''
+SELECT
+  b.campaign_id,
+  max(b.impactos_mensuales) AS impactos_mensuales,
+  max(s.frecuencia_mensual) AS frecuencia_mensual,
+  max(b.alcance_mensual) AS alcance_mensual
+FROM campaign_sites AS b
+JOIN sites AS s ON s.id = b.site_id
+WHERE b.campaign_id IS NOT NULL
+GROUP BY b.campaign_id, b.site_id, b.mes
+ORDER BY b.campaign_id
+'''
+
+SKETCH_INSERT = '''
+INSERT INTO metric_sketches (
+  campaign_id, metric, count, total, minimum, maximum, zero_count,
+  key_offset, bins
+) VALUES (
+  :campaign_id, :metric, :count, :total, :minimum, :maximum, :zero_count,
+  :key_offset, :bins
+)
+'''
+
+
+class DDSketch:
+  """Counts of values per logarithmic bucket, plus the exact extremes."""
+
+  def __init__(self, relative_accuracy: float = RELATIVE_ACCURACY) -> None:
+    self.relative_accuracy = relative_accuracy
+    self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+    self.log_gamma = math.log(self.gamma)
+    self.count = 0
+    self.total = 0.0
+    self.minimum = math.inf
+    self.maximum = -math.inf
+    self.zero_count = 0
+    self.key_offset = 0
+    self.bins = np.zeros(0, dtype=np.int64)
+
+  @classmethod
+  def from_values(
+    cls, values: np.ndarray, relative_accuracy: float = RELATIVE_ACCURACY
+  ) -> 'DDSketch':
+    sketch = cls(relative_accuracy)
+    sketch.add(values)
+    return sketch
+
+  def add(self, values: np.ndarray) -> None:
+    """Add the non-missing `values`; values of 0 or less share one bucket."""
+    values = np.asarray(values, dtype=np.float64)
+    values = values[~np.isnan(values)]
+    if not len(values):
+      return
+
+    self.count += len(values)
+    self.total += float(values.sum())
+    self.minimum = min(self.minimum, float(values.min()))
+    self.maximum = max(self.maximum, float(values.max()))
+    positive = values[values > 0]
+    self.zero_count += len(values) - len(positive)
+    if len(positive):
+      keys = np.ceil(np.log(positive) / self.log_gamma).astype(np.int64)
+      offset = int(keys.min())
+      self._add_bins(offset, np.bincount(keys - offset))
+
+  def merge(self, other: 'DDSketch') -> None:
+    if other.relative_accuracy != self.relative_accuracy:
+      raise ValueError('Only sketches of the same accuracy can be merged')
+
+    self.count += other.count
+    self.total += other.total
+    self.minimum = min(self.minimum, other.minimum)
+    self.maximum = max(self.maximum, other.maximum)
+    self.zero_count += other.zero_count
+    self._add_bins(other.key_offset, other.bins)
+
+  def quantile(self, q: float) -> Optional[float]:
+    """The value at rank `q` (0 to 1), within the relative accuracy."""
+    if not self.count:
+      return None
+
+    rank = q * (self.count - 1)
+    if rank < self.zero_count:
+      return self.minimum
+
+    position = int(np.searchsorted(
+      np.cumsum(self.bins), rank - self.zero_count, side='right'
+    ))
+    value = self._bucket_values(np.array([position]))[0]
+    return float(min(max(value, self.minimum), self.maximum))
+
+  def histogram(self, bin_count: int) -> List[dict]:
+    """Counts over `bin_count` equal-width bins between the extremes."""
+    if not self.count:
+      return []
+
+    edges = np.linspace(self.minimum, self.maximum, bin_count + 1)
+    populated = np.flatnonzero(self.bins)
+    values = np.clip(
+      np.concatenate(([0.0], self._bucket_values(populated))),
+      self.minimum, self.maximum
+    )
+    weights = np.concatenate(([self.zero_count], self.bins[populated]))
+    counts, _ = np.histogram(values, bins=edges, weights=weights)
+
+    return [
+      {'lower': float(lower), 'upper': float(upper), 'count': int(count)}
+      for lower, upper, count in zip(edges[:-1], edges[1:], counts)
+    ]
+
+  def to_record(self) -> Dict[str, object]:
+    return {
+      'count': self.count,
+      'total': self.total,
+      'minimum': self.minimum,
+      'maximum': self.maximum,
+      'zero_count': self.zero_count,
+      'key_offset': self.key_offset,
+      'bins': self.bins.astype('<i8').tobytes()
+    }
+
+  @classmethod
+  def from_record(
+    cls, record, relative_accuracy: float = RELATIVE_ACCURACY
+  ) -> 'DDSketch':
+    sketch = cls(relative_accuracy)
+    sketch.count = record.count
+    sketch.total = record.total
+    sketch.minimum = record.minimum
+    sketch.maximum = record.maximum
+    sketch.zero_count = record.zero_count
+    sketch.key_offset = record.key_offset
+    sketch.bins = np.frombuffer(record.bins, dtype='<i8').astype(np.int64)
+    return sketch
+
+  def _bucket_values(self, positions: np.ndarray) -> np.ndarray:
+    """Midpoint in relative terms of each bucket at `positions`."""
+    keys = positions + self.key_offset
+    return 2 * np.power(self.gamma, keys) / (self.gamma + 1)
+
+  def _add_bins(self, offset: int, counts: np.ndarray) -> None:
+    if not len(counts):
+      return
+    if not len(self.bins):
+      self.key_offset = offset
+      self.bins = counts.astype(np.int64)
+      return
+
+    start = min(self.key_offset, offset)
+    stop = max(self.key_offset + len(self.bins), offset + len(counts))
+    bins = np.zeros(stop - start, dtype=np.int64)
+    bins[self.key_offset - start:][:len(self.bins)] += self.bins
+    bins[offset - start:][:len(counts)] += counts
+    self.key_offset = start
+    self.bins = bins
+
+
+def build_metric_sketches(connection: Connection) -> None:
+  """Recompute every campaign's metric sketches from the booked sites."""
+  connection.execute(text('DELETE FROM metric_sketches'))
+  rows = connection.execute(text(SITE_MONTH_METRICS)).all()
+  if not rows:
+    return
+
+  columns = np.array(rows, dtype=np.float64).T
+  campaign_ids = columns[0].astype(np.int64)
+  starts = np.flatnonzero(np.diff(campaign_ids)) + 1
+  boundaries = np.concatenate(([0], starts, [len(campaign_ids)]))
+
+  records = []
+  for start, stop in zip(boundaries[:-1], boundaries[1:]):
+    for metric, values in zip(SiteMetric, columns[1:]):
+      sketch = DDSketch.from_values(values[start:stop])
+      if sketch.count:
+        records.append({
+          'campaign_id': int(campaign_ids[start]),
+          'metric': metric.value,
+          **sketch.to_record()
+        })
+  if records:
+    connection.execute(text(SKETCH_INSERT), records)
@@ -0,0 +1,360 @@
+"""Columnar, memory-mappable snapshot of the campaign tables."""
+import enum
+import json
+import shutil
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import Date, Float, Integer, Table, insert, select
+from sqlalchemy.orm import Session
+
+from . import models
+
+FORMAT_VERSION = 2
+MANIFEST_FILE = 'manifest.json'
+DICTIONARY_SUFFIX = '.dict'
+NULLS_SUFFIX = '.nulls'
+LOAD_BATCH_SIZE = 10_000
+
+SNAPSHOT_TABLES: List[Table] = [
+  models.Campaign.__table__,
+  models.CampaignPeriod.__table__,
+  models.FurnitureType.__table__,
+  models.AdType.__table__,
+  models.Estado.__table__,
+  models.ZonaMetropolitana.__table__,
+  models.Municipio.__table__,
+  models.Site.__table__,
+  models.CampaignSite.__table__,
+]
+
+Sources = Dict[str, List[int]]
+Schema = Dict[str, Dict[str, str]]
+Columns = Dict[str, np.ndarray]
+
+
+class SnapshotTable:
+  """Read-only column arrays of one table.
+
+  String columns are dictionary encoded: the column holds int32 codes and
+  `dictionary(name)` holds the distinct values they point to. Missing
+  floats are NaN and missing dates NaT; missing integers and strings are
+  stored as 0 and '' with a mask, `nulls(name)`, marking the NULL rows.
+  """
+
+  def __init__(
+    self,
+    row_count: int,
+    columns: Columns,
+    dictionaries: Columns,
+    null_masks: Optional[Columns] = None
+  ) -> None:
+    self.row_count = row_count
+    self.columns = columns
+    self.dictionaries = dictionaries
+    self.null_masks = null_masks or {}
+
+  def __len__(self) -> int:
+    return self.row_count
+
+  def column(self, name: str) -> np.ndarray:
+    return self.columns[name]
+
+  def dictionary(self, name: str) -> Optional[np.ndarray]:
+    return self.dictionaries.get(name)
+
+  def nulls(self, name: str) -> Optional[np.ndarray]:
+    """Rows where the column is NULL, or None if it has no NULLs."""
+    return self.null_masks.get(name)
+
+  def values(self, name: str) -> np.ndarray:
+    """Return the column with dictionary codes resolved to strings."""
+    dictionary = self.dictionaries.get(name)
+    if dictionary is None:
+      return self.columns[name]
+
+    return dictionary[self.columns[name]]
+
+  def records(self, start: int, stop: int) -> List[Dict[str, Any]]:
+    """Materialize rows `start:stop` as plain Python dictionaries."""
+    python_columns = {}
+    for name in self.columns:
+      values = _to_python(self.values(name)[start:stop])
+      nulls = self.nulls(name)
+      if nulls is not None:
+        values = [
+          None if missing else value
+          for value, missing in zip(values, nulls[start:stop].tolist())
+        ]
+      python_columns[name] = values
+
+    return [
+      dict(zip(python_columns, row_values))
+      for row_values in zip(*python_columns.values())
+    ]
+
+
+class Snapshot:
+  def __init__(
+    self,
+    tables: Dict[str, SnapshotTable],
+    sources: Sources
+  ) -> None:
+    self.tables = tables
+    self.sources = sources
+
+  def table(self, name: str) -> SnapshotTable:
+    return self.tables[name]
+
+
+def fingerprint_sources(paths: Iterable[Path]) -> Sources:
+  """Identify source files by size and modification time."""
+  fingerprints = {}
+  for path in paths:
+    stat = path.stat()
+    fingerprints[path.name] = [stat.st_size, stat.st_mtime_ns]
+
+  return fingerprints
+
+
+def table_schema() -> Schema:
+  return {
+    table.name: {
+      column.name: _column_kind(column) for column in table.columns
+    }
+    for table in SNAPSHOT_TABLES
+  }
+
+
+def write_snapshot(
+  directory: Path,
+  tables: Dict[str, Columns],
+  sources: Sources,
+  null_masks: Optional[Dict[str, Columns]] = None
+) -> None:
+  """Write column arrays to `directory`, replacing any previous snapshot.
+
+  `null_masks` holds, per table, the NULL rows of the columns that have
+  any, as boolean arrays.
+
+  The snapshot is assembled next to the target and moved into place once
+  complete, so readers never observe a partially written snapshot.
+  """
+  staging = directory.with_name(f'{directory.name}.tmp')
+  shutil.rmtree(staging, ignore_errors=True)
+  staging.mkdir(parents=True)
+
+  null_masks = null_masks or {}
+  manifest_tables = {
+    table_name: _write_table(
+      staging / table_name, columns, null_masks.get(table_name, {})
+    )
+    for table_name, columns in tables.items()
+  }
+  manifest = {
+    'format': FORMAT_VERSION,
+    'sources': sources,
+    'tables': manifest_tables
+  }
+  (staging / MANIFEST_FILE).write_text(json.dumps(manifest, indent=2))
+
+  _replace_directory(staging, directory)
+
+
+def export_snapshot(db: Session, directory: Path, sources: Sources) -> None:
+  """Write the current database contents as a columnar snapshot."""
+  tables = {}
+  null_masks = {}
+  for table in SNAPSHOT_TABLES:
+    tables[table.name], null_masks[table.name] = _read_table_columns(db, table)
+  write_snapshot(directory, tables, sources, null_masks)
+
+
+def open_snapshot(
+  directory: Path,
+  sources: Optional[Sources] = None,
+  schema: Optional[Schema] = None
+) -> Optional[Snapshot]:
+  """Memory-map a snapshot, or return None when it is missing or stale.
+
+  The snapshot is stale when any fingerprint in `sources` differs from the
+  one it was exported with; fingerprints not given are not compared.
+  """
+  manifest_path = directory / MANIFEST_FILE
+  if not manifest_path.exists():
+    return None
+
+  manifest = json.loads(manifest_path.read_text())
+  if manifest.get('format') != FORMAT_VERSION:
+    return None
+  if sources is not None and any(
+    manifest['sources'].get(name) != fingerprint
+    for name, fingerprint in sources.items()
+  ):
+    return None
+  if schema is not None and _manifest_schema(manifest) != schema:
+    return None
+
+  tables = {
+    table_name: _open_table(directory / table_name, table_manifest)
+    for table_name, table_manifest in manifest['tables'].items()
+  }
+
+  return Snapshot(tables, manifest['sources'])
+
+
+def load_snapshot(db: Session, snapshot: Snapshot) -> None:
+  """Bulk insert every snapshot table into an empty database."""
+  for table in SNAPSHOT_TABLES:
+    snapshot_table = snapshot.table(table.name)
+    for start in range(0, len(snapshot_table), LOAD_BATCH_SIZE):
+      records = snapshot_table.records(start, start + LOAD_BATCH_SIZE)
+      db.execute(insert(table), records)
+
+  db.commit()
+
+
+def _column_kind(column) -> str:
+  if isinstance(column.type, Integer):
+    return 'int'
+  if isinstance(column.type, Float):
+    return 'float'
+  if isinstance(column.type, Date):
+    return 'date'
+
+  return 'str'
+
+
+def _array_kind(array: np.ndarray) -> str:
+  if array.dtype.kind in 'iu':
+    return 'int'
+  if array.dtype.kind == 'f':
+    return 'float'
+  if array.dtype.kind == 'M':
+    return 'date'
+
+  return 'str'
+
+
+def _manifest_schema(manifest: dict) -> Schema:
+  return {
+    table_name: table_manifest['columns']
+    for table_name, table_manifest in manifest['tables'].items()
+  }
+
+
+def _write_table(
+  directory: Path, columns: Columns, null_masks: Columns
+) -> dict:
+  directory.mkdir()
+  column_kinds = {}
+  row_count = 0
+  for column_name, nulls in null_masks.items():
+    np.save(directory / f'{column_name}{NULLS_SUFFIX}.npy', nulls)
+
+  for column_name, array in columns.items():
+    kind = _array_kind(array)
+    if kind == 'str':
+      dictionary, codes = np.unique(array.astype(str), return_inverse=True)
+      dictionary_path = directory / f'{column_name}{DICTIONARY_SUFFIX}.npy'
+      np.save(dictionary_path, dictionary)
+      array = codes.astype(np.int32)
+
+    np.save(directory / f'{column_name}.npy', array)
+    column_kinds[column_name] = kind
+    row_count = len(array)
+
+  return {
+    'rows': row_count,
+    'columns': column_kinds,
+    'nulls': sorted(null_masks)
+  }
+
+
+def _open_table(directory: Path, table_manifest: dict) -> SnapshotTable:
+  columns = {}
+  dictionaries = {}
+
+  for column_name, kind in table_manifest['columns'].items():
+    columns[column_name] = np.load(
+      directory / f'{column_name}.npy', mmap_mode='r'
+    )
+    if kind == 'str':
+      dictionaries[column_name] = np.load(
+        directory / f'{column_name}{DICTIONARY_SUFFIX}.npy', mmap_mode='r'
+      )
+
+  null_masks = {
+    column_name: np.load(
+      directory / f'{column_name}{NULLS_SUFFIX}.npy', mmap_mode='r'
+    )
+    for column_name in table_manifest.get('nulls', [])
+  }
+
+  return SnapshotTable(
+    table_manifest['rows'], columns, dictionaries, null_masks
+  )
+
+
+def _read_table_columns(db: Session, table: Table) -> Tuple[Columns, Columns]:
+  """Column arrays of a table and the NULL masks of its int and str columns.
+
+  Floats and dates hold their NULLs as NaN and NaT.
+  """
+  rows = db.execute(select(table).order_by(*table.primary_key)).all()
+  column_values = list(zip(*rows)) or [()] * len(table.columns)
+
+  columns = {}
+  null_masks = {}
+  for column, values in zip(table.columns, column_values):
+    kind = _column_kind(column)
+    columns[column.name] = _to_array(values, kind)
+    if kind in ('int', 'str'):
+      nulls = np.array([value is None for value in values], dtype=bool)
+      if nulls.any():
+        null_masks[column.name] = nulls
+
+  return columns, null_masks
+
+
+def _to_array(values: Iterable[Any], kind: str) -> np.ndarray:
+  if kind == 'int':
+    return np.array([value or 0 for value in values], dtype=np.int64)
+  if kind == 'float':
+    return np.array(
+      [np.nan if value is None else value for value in values],
+      dtype=np.float64
+    )
+  if kind == 'date':
+    return np.array(list(values), dtype='datetime64[D]')
+
+  return np.array([_to_text(value) for value in values], dtype=str)
+
+
+def _to_text(value: Any) -> str:
+  if value is None:
+    return ''
+  if isinstance(value, enum.Enum):
+    return value.value
+
+  return value
+
+
+def _to_python(array: np.ndarray) -> List[Any]:
+  if array.dtype.kind == 'M':
+    return array.astype(object).tolist()
+  if array.dtype.kind == 'f':
+    return [None if np.isnan(value) else value for value in array.tolist()]
+
+  return array.tolist()
+
+
+def _replace_directory(staging: Path, directory: Path) -> None:
+  retired = directory.with_name(f'{directory.name}.old')
+  shutil.rmtree(retired, ignore_errors=True)
+  if directory.exists():
+    directory.rename(retired)
+
+  staging.rename(directory)
+  shutil.rmtree(retired, ignore_errors=True)
@@ -0,0 +1,308 @@
+"""Vectorized validation, repair and rejection of raw CSV rows."""
+import json
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, TextIO
+
+import numpy as np
+
+KEY = 'key'
+TEXT = 'text'
+INT = 'int'
+FLOAT = 'float'
+DATE = 'date'
+
+REPAIRED = 'repaired'
+REJECTED = 'rejected'
+
+MAX_INT_DIGITS = 18
+
+Issue = Dict[str, Any]
+Record = Dict[str, Any]
+
+
+class ColumnSpec(NamedTuple):
+  source: str
+  target: str
+  kind: str
+
+
+class ColumnCheck(NamedTuple):
+  """Typed values of a column and boolean masks of the rows that failed."""
+  values: np.ndarray
+  repairs: Dict[str, np.ndarray]
+  rejections: Dict[str, np.ndarray]
+
+
+class DerivedColumns(NamedTuple):
+  """Columns computed from validated ones, and the rows they rejected."""
+  columns: Dict[str, np.ndarray]
+  source: str
+  rejections: Dict[str, np.ndarray]
+
+
+Deriver = Callable[[Dict[str, np.ndarray]], DerivedColumns]
+
+
+class ValidatedChunk(NamedTuple):
+  records: List[Record]
+  lines: List[int]
+  issues: List[Issue]
+  row_count: int
+
+
+def check_key(raw: np.ndarray) -> ColumnCheck:
+  text = np.char.strip(raw)
+  return ColumnCheck(text, {}, {'missing_key': text == ''})
+
+
+def check_text(raw: np.ndarray) -> ColumnCheck:
+  return ColumnCheck(np.char.strip(raw), {}, {})
+
+
+def check_int(raw: np.ndarray) -> ColumnCheck:
+  """Integers; spreadsheet-mangled values like `14566-06-26` keep 14566."""
+  text = np.char.strip(raw)
+  missing = text == ''
+  digits = np.char.isdigit(text)
+  parts = np.char.partition(text, '-')
+  head, tail = parts[:, 0], parts[:, 2]
+  date_like = (
+    ~digits
+    & np.char.isdigit(head)
+    & (np.char.str_len(tail) == 5)
+    & (np.char.find(tail, '-') == 2)
+    & np.char.isdigit(np.char.replace(tail, '-', ''))
+  )
+  integral = np.where(date_like, head, text)
+  too_long = np.char.str_len(integral) > MAX_INT_DIGITS
+  parseable = (digits | date_like) & ~too_long
+
+  values = np.zeros(len(text), dtype=np.int64)
+  values[parseable] = integral[parseable].astype(np.int64)
+
+  return ColumnCheck(
+    values,
+    {'missing_value': missing, 'date_like_integer': date_like & ~too_long},
+    {
+      'invalid_integer': ~(digits | date_like | missing),
+      'out_of_range': (digits | date_like) & too_long
+    }
+  )
+
+
+def check_float(raw: np.ndarray) -> ColumnCheck:
+  text = np.char.strip(raw)
+  missing = text == ''
+  parsed = _to_floats(np.where(missing, '0', text))
+  invalid = ~np.isfinite(parsed)
+
+  return ColumnCheck(
+    np.where(invalid, 0.0, parsed),
+    {'missing_value': missing},
+    {'invalid_float': invalid}
+  )
+
+
+def check_date(raw: np.ndarray) -> ColumnCheck:
+  """ISO `YYYY-MM-DD` dates; anything else, or impossible days, is rejected."""
+  text = np.char.strip(raw)
+  well_formed = (
+    (np.char.str_len(text) == 10)
+    & (np.char.count(text, '-') == 2)
+    & np.char.isdigit(np.char.replace(text, '-', ''))
+  )
+  parsed = _to_dates(np.where(well_formed, text, 'NaT'))
+
+  return ColumnCheck(parsed, {}, {'invalid_date': np.isnat(parsed)})
+
+
+COLUMN_CHECKS: Dict[str, Callable[[np.ndarray], ColumnCheck]] = {
+  KEY: check_key,
+  TEXT: check_text,
+  INT: check_int,
+  FLOAT: check_float,
+  DATE: check_date,
+}
+
+
+def validate_chunk(
+  file_name: str,
+  rows: List[Dict[str, str]],
+  specs: List[ColumnSpec],
+  first_line: int,
+  derive: Optional[Deriver] = None
+) -> ValidatedChunk:
+  """Type every column of a chunk at once, repairing or rejecting rows.
+
+  Rows with any rejected column are dropped; every repair and rejection is
+  reported as an issue that points at the source line. `derive` computes
+  extra columns from the typed ones and may reject further rows.
+  """
+  if not rows:
+    return ValidatedChunk([], [], [], 0)
+
+  lines = np.arange(first_line, first_line + len(rows))
+  rejected = np.zeros(len(rows), dtype=bool)
+  columns = {}
+  issues = []
+
+  for spec in specs:
+    raw = np.array([row.get(spec.source) or '' for row in rows], dtype=str)
+    check = COLUMN_CHECKS[spec.kind](raw)
+    columns[spec.target] = check.values
+    issues.extend(_check_issues(file_name, spec.source, check, raw, lines))
+    for mask in check.rejections.values():
+      rejected |= mask
+
+  if derive is not None:
+    derived = derive(columns)
+    columns.update(derived.columns)
+    rejections = {
+      reason: mask & ~rejected for reason, mask in derived.rejections.items()
+    }
+    raw = columns[derived.source].astype(str)
+    issues.extend(_check_issues(
+      file_name, derived.source, ColumnCheck(raw, {}, rejections), raw, lines
+    ))
+    for mask in rejections.values():
+      rejected |= mask
+
+  accepted = ~rejected
+  python_columns = {
+    target: values[accepted].tolist() for target, values in columns.items()
+  }
+  records = [
+    dict(zip(python_columns, row_values))
+    for row_values in zip(*python_columns.values())
+  ]
+
+  return ValidatedChunk(records, lines[accepted].tolist(), issues, len(rows))
+
+
+def make_issue(
+  file_name: str,
+  line: int,
+  column: str,
+  value: str,
+  action: str,
+  reason: str
+) -> Issue:
+  return {
+    'file': file_name,
+    'line': line,
+    'column': column,
+    'value': value,
+    'action': action,
+    'reason': reason
+  }
+
+
+class IngestReport:
+  """Row counts and validation issues of one ingest run.
+
+  Issues are streamed to a JSON Lines file as they are found, so the report
+  stays small in memory; `summary()` aggregates them per file and reason.
+  """
+
+  def __init__(
+    self,
+    file_names: List[str],
+    issues_path: Optional[Path] = None,
+    append: bool = False
+  ) -> None:
+    self.rows_read = {file_name: 0 for file_name in file_names}
+    self.rows_written = {file_name: 0 for file_name in file_names}
+    self.issue_counts: Counter = Counter()
+    self._issues_file: Optional[TextIO] = None
+    if issues_path is not None:
+      issues_path.parent.mkdir(parents=True, exist_ok=True)
+      mode = 'a' if append else 'w'
+      self._issues_file = open(issues_path, mode, encoding='utf-8')
+
+  def __enter__(self) -> 'IngestReport':
+    return self
+
+  def __exit__(self, *exc_info) -> None:
+    self.close()
+
+  def add_issues(self, issues: List[Issue]) -> None:
+    for issue in issues:
+      self.issue_counts[
+        (issue['file'], issue['action'], issue['reason'])
+      ] += 1
+      if self._issues_file is not None:
+        self._issues_file.write(json.dumps(issue, ensure_ascii=False) + '\n')
+
+  def summary(self) -> Dict[str, Any]:
+    files = {
+      file_name: {
+        'rows_read': self.rows_read[file_name],
+        'rows_written': self.rows_written[file_name],
+        REPAIRED: {},
+        REJECTED: {}
+      }
+      for file_name in self.rows_read
+    }
+    for (file_name, action, reason), count in sorted(
+      self.issue_counts.items()
+    ):
+      files[file_name][action][reason] = count
+
+    return {'files': files}
+
+  def write_summary(self, path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(self.summary(), indent=2))
+
+  def close(self) -> None:
+    if self._issues_file is not None:
+      self._issues_file.close()
+      self._issues_file = None
+
+
+def _check_issues(
+  file_name: str,
+  column: str,
+  check: ColumnCheck,
+  raw: np.ndarray,
+  lines: np.ndarray
+) -> List[Issue]:
+  issues = []
+  for action, masks in ((REPAIRED, check.repairs),
+                        (REJECTED, check.rejections)):
+    for reason, mask in masks.items():
+      issues.extend(
+        make_issue(file_name, line, column, value, action, reason)
+        for line, value in zip(lines[mask].tolist(), raw[mask].tolist())
+      )
+
+  return issues
+
+
+def _to_floats(text: np.ndarray) -> np.ndarray:
+  try:
+    return text.astype(np.float64)
+  except ValueError:
+    return np.array([_float_or_nan(value) for value in text], dtype=np.float64)
+
+
+def _float_or_nan(value: str) -> float:
+  try:
+    return float(value)
+  except ValueError:
+    return float('nan')
+
+
+def _to_dates(text: np.ndarray) -> np.ndarray:
+  try:
+    return text.astype('datetime64[D]')
+  except ValueError:
+    return np.array([_date_or_nat(value) for value in text])
+
+
+def _date_or_nat(value: str) -> np.datetime64:
+  try:
+    return np.datetime64(value, 'D')
+  except ValueError:
+    return np.datetime64('NaT', 'D')
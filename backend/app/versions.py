@@ -0,0 +1,221 @@
+"""Versioned datasets, built beside the one being served.
+
+A refresh ingests the source CSVs into a new numbered directory under
+`VERSIONS_DIR`, with its own database and columnar snapshot, validates it
+and only then publishes it by replacing the `CURRENT` pointer file, an
+atomic rename. Servers watch the pointer and switch to the new version
+(`database.SERVING`). A database is never written while it is served, so
+readers never see a half-loaded dataset or wait on its locks.
+
+The newest `DATASET_VERSIONS_KEPT` versions stay on disk for clients
+pinned to one of them; older ones are deleted after each publish.
+Processes still reading a deleted version keep its open files until they
+drop it.
+"""
+import os
+import shutil
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from sqlalchemy import func, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from . import config, ingest, models, snapshot
+from .database import create_database_engine
+from .migrations import upgrade_database
+from .validation import IngestReport
+
+# The database at DATABASE_PATH, served when no version was published.
+UNVERSIONED = 0
+DATABASE_FILE = 'campaigns.db'
+SNAPSHOT_DIR = 'snapshot'
+REPORT_DIR = 'reports'
+CURRENT_FILE = 'CURRENT'
+STAGING_SUFFIX = '.tmp'
+FAILED_SUFFIX = '.failed'
+# A source file losing more rows than this is more likely a broken export
+# than a refresh worth publishing.
+MAX_REJECTED_SHARE = 0.5
+
+
+class InvalidVersionError(Exception):
+  """A refreshed dataset failed validation and was not published."""
+
+
+class MissingVersionError(Exception):
+  """A dataset version is not on disk, or was garbage collected."""
+
+
+def version_dir(version: int, versions_dir: Path) -> Path:
+  return versions_dir / str(version)
+
+
+def available_versions(versions_dir: Path) -> List[int]:
+  """Completely built versions, oldest first."""
+  if not versions_dir.is_dir():
+    return []
+
+  return sorted(
+    int(path.name) for path in versions_dir.iterdir() if path.name.isdigit()
+  )
+
+
+def current_version(versions_dir: Path) -> Optional[int]:
+  """The published version, or None before the first publish."""
+  try:
+    return int((versions_dir / CURRENT_FILE).read_text())
+  except FileNotFoundError:
+    return None
+
+
+def build_version(
+  versions_dir: Path,
+  data_dir: Path = config.DATA_DIR,
+  workers: int = config.INGEST_WORKERS,
+  chunk_size: int = ingest.DEFAULT_CHUNK_SIZE,
+  on_progress: Optional[ingest.ProgressCallback] = None,
+  keep: int = config.DATASET_VERSIONS_KEPT
+) -> int:
+  """Ingest the source CSVs into a new version and publish it.
+
+  The version is assembled in a staging directory, so the published one
+  keeps being served when the ingest fails or its result does not
+  validate; a version that failed validation is left with its ingest
+  report for inspection until the next build. Versions beyond the newest
+  `keep` are collected afterwards.
+  """
+  for failed in versions_dir.glob(f'*{FAILED_SUFFIX}'):
+    shutil.rmtree(failed, ignore_errors=True)
+  version, staging = _reserve_version(versions_dir)
+  try:
+    _build(staging, data_dir, workers, chunk_size, on_progress)
+  except InvalidVersionError:
+    staging.rename(versions_dir / f'{version}{FAILED_SUFFIX}')
+    raise
+  except BaseException:
+    shutil.rmtree(staging, ignore_errors=True)
+    raise
+
+  staging.rename(version_dir(version, versions_dir))
+  publish_version(versions_dir, version)
+  collect_garbage(versions_dir, keep)
+
+  return version
+
+
+def validate_version(db: Session, report: IngestReport) -> List[str]:
+  """Problems that keep a freshly ingested dataset from being published."""
+  problems = []
+  integrity = db.execute(text('PRAGMA integrity_check')).scalar_one()
+  if integrity != 'ok':
+    problems.append(f'integrity check failed: {integrity}')
+  if not db.scalar(select(func.count()).select_from(models.Campaign)):
+    problems.append('no campaigns were loaded')
+
+  for file_name, rows_read in report.rows_read.items():
+    rejected = rows_read - report.rows_written[file_name]
+    if rows_read and rejected / rows_read > MAX_REJECTED_SHARE:
+      problems.append(f'{file_name}: {rejected} of {rows_read} rows rejected')
+
+  return problems
+
+
+def publish_version(versions_dir: Path, version: int) -> None:
+  """Point `CURRENT` at a built version, atomically."""
+  if version not in available_versions(versions_dir):
+    raise MissingVersionError(f'Dataset version {version} is not built')
+
+  pointer = versions_dir / CURRENT_FILE
+  staging = pointer.with_name(f'{CURRENT_FILE}{STAGING_SUFFIX}')
+  staging.write_text(str(version))
+  os.replace(staging, pointer)
+
+
+def collect_garbage(
+  versions_dir: Path, keep: int = config.DATASET_VERSIONS_KEPT
+) -> List[int]:
+  """Delete versions older than the newest `keep`, never the current one."""
+  current = current_version(versions_dir)
+  retired = [
+    version for version in available_versions(versions_dir)[:-keep]
+    if version != current
+  ]
+  for version in retired:
+    shutil.rmtree(version_dir(version, versions_dir))
+
+  return retired
+
+
+def open_version(
+  versions_dir: Path, version: int
+) -> Tuple[Engine, snapshot.Snapshot]:
+  """A read-only engine on a built version and its memory-mapped snapshot."""
+  directory = version_dir(version, versions_dir)
+  dataset_snapshot = snapshot.open_snapshot(
+    directory / SNAPSHOT_DIR, schema=snapshot.table_schema()
+  )
+  if dataset_snapshot is None or not (directory / DATABASE_FILE).exists():
+    raise MissingVersionError(f'Dataset version {version} is not available')
+
+  return (
+    create_database_engine(directory / DATABASE_FILE, read_only=True),
+    dataset_snapshot
+  )
+
+
+def _reserve_version(versions_dir: Path) -> Tuple[int, Path]:
+  """Claim the next version number by creating its staging directory.
+
+  Creating a directory is atomic, so builds running at the same time never
+  share a number: whoever loses the race moves on to the next one.
+  """
+  versions_dir.mkdir(parents=True, exist_ok=True)
+  numbers = [
+    int(path.name.split('.')[0]) for path in versions_dir.iterdir()
+    if path.name.split('.')[0].isdigit()
+  ]
+  version = max(numbers, default=UNVERSIONED) + 1
+  while True:
+    staging = versions_dir / f'{version}{STAGING_SUFFIX}'
+    try:
+      staging.mkdir()
+    except FileExistsError:
+      version += 1
+      continue
+    if not version_dir(version, versions_dir).exists():
+      return version, staging
+    staging.rmdir()
+    version += 1
+
+
+def _build(
+  directory: Path,
+  data_dir: Path,
+  workers: int,
+  chunk_size: int,
+  on_progress: Optional[ingest.ProgressCallback]
+) -> None:
+  engine = create_database_engine(directory / DATABASE_FILE)
+  try:
+    upgrade_database(engine)
+    with Session(engine) as db:
+      report = ingest.ingest_csv_files(
+        db,
+        data_dir,
+        workers=workers,
+        chunk_size=chunk_size,
+        on_progress=on_progress,
+        report_dir=directory / REPORT_DIR
+      )
+      problems = validate_version(db, report)
+      if problems:
+        raise InvalidVersionError(
+          f'{directory} was not published: ' + '; '.join(problems)
+        )
+
+      snapshot.export_snapshot(
+        db, directory / SNAPSHOT_DIR, ingest.dataset_sources(db, data_dir)
+      )
+  finally:
+    engine.dispose()
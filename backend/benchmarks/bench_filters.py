@@ -0,0 +1,103 @@
+"""Compare list filtering in SQL with the bitmap index.
+
+Synthetic source files are generated and ingested into a throwaway
+database, its snapshot is exported and the bitmap index built from it.
+Then every filter combination lists its first page with its total, once
+composed in SQL and once resolved with the index, and both must agree.
+
+Usage (from `backend/`):
+
+  python -m benchmarks.bench_filters --sites 1000000 --campaigns 20000
+"""
+import argparse
+import tempfile
+import time
+from datetime import date
+from pathlib import Path
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app import crud, snapshot
+from app.bitmaps import Demographic, build_campaign_index
+from app.intervals import DateFilterMode
+
+from .synthetic import generate_dataset, ingest_dataset
+
+QUERIES = 20
+FILTERS = {
+  'type': {'tipo_campania': 'mensual'},
+  'start window': {
+    'fecha_inicio': date(2024, 1, 1), 'fecha_fin': date(2024, 3, 31)
+  },
+  'overlap window': {
+    'fecha_inicio': date(2024, 1, 1),
+    'fecha_fin': date(2024, 1, 31),
+    'date_mode': DateFilterMode.OVERLAP,
+  },
+  'estado': {'estado': ['Jalisco']},
+  'municipios': {'municipio': ['Monterrey', 'Zapopan', 'Cuauhtemoc']},
+  'furniture': {'tipo_de_mueble': ['Kiosko']},
+  'demographic': {'demografia': Demographic.NSE_AB, 'demografia_min': 0.2},
+  'search': {'search': '12'},
+  'combined': {
+    'tipo_campania': 'mensual',
+    'estado': ['Nuevo Leon', 'Jalisco'],
+    'tipo_de_mueble': ['Kiosko', 'Muros'],
+    'fecha_inicio': date(2023, 6, 1),
+    'fecha_fin': date(2024, 6, 30),
+    'date_mode': DateFilterMode.OVERLAP,
+  },
+}
+
+
+def time_listing(db: Session, filters: dict, index=None):
+  started = time.perf_counter()
+  for _ in range(QUERIES):
+    campaigns, total = crud.get_campaigns_with_count(
+      db, index=index, **filters
+    )
+  elapsed = (time.perf_counter() - started) / QUERIES
+  return elapsed, total, [campaign.id for campaign in campaigns]
+
+
+def run(site_rows: int, campaign_count: int, seed: int) -> None:
+  with tempfile.TemporaryDirectory() as temp_dir:
+    data_dir = Path(temp_dir)
+    generate_dataset(data_dir, site_rows, seed, campaign_count)
+    ingest_dataset(data_dir, data_dir / 'bench.db')
+    engine = create_engine(f"sqlite:///{data_dir / 'bench.db'}")
+    with Session(engine) as db:
+      snapshot.export_snapshot(db, data_dir / 'snapshot', {})
+      started = time.perf_counter()
+      index = build_campaign_index(
+        snapshot.open_snapshot(data_dir / 'snapshot')
+      )
+      print(
+        f'index of {len(index):,} campaigns built in '
+        f'{time.perf_counter() - started:.2f} s\n'
+      )
+
+      print(f'{"filters":<16} {"matches":>8} {"sql ms":>9} {"bitmap ms":>10}')
+      for label, filters in FILTERS.items():
+        sql_seconds, sql_total, sql_page = time_listing(db, filters)
+        seconds, total, page = time_listing(db, filters, index)
+        assert (total, page) == (sql_total, sql_page), label
+        print(
+          f'{label:<16} {total:>8,} {sql_seconds * 1000:>9.2f} '
+          f'{seconds * 1000:>10.2f}'
+        )
+    engine.dispose()
+
+
+def main() -> None:
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument('--sites', type=int, default=1_000_000)
+  parser.add_argument('--campaigns', type=int, default=20_000)
+  parser.add_argument('--seed', type=int, default=0)
+  arguments = parser.parse_args()
+  run(arguments.sites, arguments.campaigns, arguments.seed)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,67 @@
+"""Measure CSV ingest throughput with 1 to N parser processes.
+
+Synthetic source files with the requested number of site rows are
+generated once, then loaded into a throwaway SQLite database once per
+worker count.
+
+Usage (from `backend/`):
+
+  python -m benchmarks.bench_ingest --sites 500000 --max-workers 8
+"""
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import ingest
+from app.database import Base
+
+from .synthetic import generate_dataset
+
+
+def time_ingest(data_dir: Path, workers: int, chunk_size: int) -> float:
+  database_path = data_dir / f'bench_{workers}.db'
+  engine = create_engine(f'sqlite:///{database_path}')
+  Base.metadata.create_all(bind=engine)
+  db = sessionmaker(bind=engine)()
+  try:
+    started = time.perf_counter()
+    ingest.ingest_csv_files(
+      db, data_dir, workers=workers, chunk_size=chunk_size
+    )
+    return time.perf_counter() - started
+  finally:
+    db.close()
+    engine.dispose()
+    database_path.unlink()
+
+
+def main() -> None:
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument('--sites', type=int, default=200_000)
+  parser.add_argument('--max-workers', type=int, default=os.cpu_count())
+  parser.add_argument('--chunk-size', type=int, default=10_000)
+  arguments = parser.parse_args()
+
+  with tempfile.TemporaryDirectory() as temp_dir:
+    data_dir = Path(temp_dir)
+    generate_dataset(data_dir, arguments.sites)
+    print(f'sites: {arguments.sites:,}  cpus: {os.cpu_count()}')
+    print(f'{"workers":>7} {"seconds":>9} {"rows/s":>11} {"speedup":>8}')
+
+    baseline = None
+    for workers in range(1, arguments.max_workers + 1):
+      elapsed = time_ingest(data_dir, workers, arguments.chunk_size)
+      baseline = baseline or elapsed
+      print(
+        f'{workers:>7} {elapsed:>9.2f} '
+        f'{arguments.sites / elapsed:>11,.0f} {baseline / elapsed:>7.2f}x'
+      )
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,99 @@
+"""Compare overlap filtering through the interval index with a full scan.
+
+Usage (from `backend/`):
+
+  python -m benchmarks.bench_intervals --campaigns 300000
+"""
+import argparse
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+import numpy as np
+from sqlalchemy import and_, create_engine, func, insert, select
+from sqlalchemy.orm import Session
+
+from app import crud, models
+from app.intervals import DateFilterMode
+from app.migrations import upgrade_database
+
+FIRST_DAY = date(2015, 1, 1)
+QUERIES = 200
+
+
+def generate_campaigns(campaign_count: int, seed: int) -> list:
+  generator = np.random.default_rng(seed)
+  offsets = generator.integers(0, 3_650, campaign_count).tolist()
+  durations = generator.integers(7, 180, campaign_count).tolist()
+  return [
+    {
+      'name': f'campaign_{index}',
+      'tipo_campania': 'mensual',
+      'fecha_inicio': FIRST_DAY + timedelta(days=offset),
+      'fecha_fin': FIRST_DAY + timedelta(days=offset + duration)
+    }
+    for index, (offset, duration) in enumerate(zip(offsets, durations))
+  ]
+
+
+def scan_overlapping(db: Session, window_start: date, window_end: date) -> int:
+  return db.scalar(select(func.count()).where(and_(
+    models.Campaign.fecha_inicio <= window_end,
+    models.Campaign.fecha_fin >= window_start
+  )))
+
+
+def index_overlapping(db: Session, window_start: date, window_end: date) -> int:
+  _, total = crud.get_campaigns_with_count(
+    db,
+    fecha_inicio=window_start,
+    fecha_fin=window_end,
+    date_mode=DateFilterMode.OVERLAP
+  )
+  return total
+
+
+def time_queries(label: str, count_function, db: Session, windows) -> list:
+  started = time.perf_counter()
+  totals = [count_function(db, *window) for window in windows]
+  elapsed = (time.perf_counter() - started) / len(windows)
+  print(f'{label:<28} {elapsed * 1000:8.3f} ms/query')
+  return totals
+
+
+def run(campaign_count: int, seed: int) -> None:
+  generator = np.random.default_rng(seed + 1)
+  windows = [
+    (FIRST_DAY + timedelta(days=offset), FIRST_DAY + timedelta(days=offset + 7))
+    for offset in generator.integers(0, 3_650, QUERIES).tolist()
+  ]
+
+  with tempfile.TemporaryDirectory() as temp_dir:
+    engine = create_engine(f"sqlite:///{Path(temp_dir) / 'bench.db'}")
+    upgrade_database(engine)
+    with Session(engine) as db:
+      started = time.perf_counter()
+      db.execute(
+        insert(models.Campaign), generate_campaigns(campaign_count, seed)
+      )
+      db.commit()
+      print(f'{"load + index":<28} {time.perf_counter() - started:8.3f} s')
+
+      scanned = time_queries('full scan', scan_overlapping, db, windows)
+      indexed = time_queries('interval index', index_overlapping, db, windows)
+      assert scanned == indexed
+    engine.dispose()
+
+
+def main() -> None:
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument('--campaigns', type=int, default=300_000)
+  parser.add_argument('--seed', type=int, default=42)
+  arguments = parser.parse_args()
+  print(f'campaigns: {arguments.campaigns:,}')
+  run(arguments.campaigns, arguments.seed)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,74 @@
+"""Time reach planning of ad-hoc selections over a synthetic site matrix.
+
+Reports the median time to locate the selected site codes and to plan their
+deduplicated reach, for selections of increasing size.
+
+Usage (from `backend/`):
+
+  python -m benchmarks.bench_planning --sites 200000 --months 24
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.planning import SiteMatrix
+
+ZONES = 60
+SELECTIONS = [10, 100, 1_000, 10_000]
+REPEATS = 20
+
+
+def generate_matrix(site_count: int, month_count: int, seed: int) -> SiteMatrix:
+  generator = np.random.default_rng(seed)
+  reach = generator.uniform(20_000, 300_000, (site_count, month_count))
+  return SiteMatrix(
+    codes=np.array([f'PRUEBA-MEX-{index:07d}' for index in range(site_count)]),
+    zones=generator.integers(0, ZONES, site_count),
+    zone_names=np.array([f'zm_{zone}' for zone in range(ZONES)]),
+    universes=generator.uniform(1e6, 22e6, ZONES),
+    frequencies=generator.uniform(10, 25, site_count),
+    months=np.array([
+      f'{2020 + month // 12}-{month % 12 + 1:02d}'
+      for month in range(month_count)
+    ]),
+    reach=reach,
+    impacts=reach * 15
+  )
+
+
+def median_ms(function) -> float:
+  timings = []
+  for _ in range(REPEATS):
+    started = time.perf_counter()
+    function()
+    timings.append(time.perf_counter() - started)
+  return float(np.median(timings)) * 1000
+
+
+def run(site_count: int, month_count: int, seed: int) -> None:
+  matrix = generate_matrix(site_count, month_count, seed)
+  generator = np.random.default_rng(seed)
+  print(f'{"selection":>10} {"locate ms":>10} {"plan ms":>10}')
+  for selection in SELECTIONS:
+    codes = matrix.codes[
+      generator.choice(site_count, min(selection, site_count), replace=False)
+    ].tolist()
+    rows, _ = matrix.locate(codes)
+    locate = median_ms(lambda: matrix.locate(codes))
+    plan = median_ms(lambda: matrix.plan(rows))
+    print(f'{selection:>10,} {locate:>10.2f} {plan:>10.2f}')
+
+
+def main() -> None:
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument('--sites', type=int, default=200_000)
+  parser.add_argument('--months', type=int, default=24)
+  parser.add_argument('--seed', type=int, default=42)
+  arguments = parser.parse_args()
+  print(f'sites: {arguments.sites:,}, months: {arguments.months}')
+  run(arguments.sites, arguments.months, arguments.seed)
+
+
+if __name__ == '__main__':
+  main()
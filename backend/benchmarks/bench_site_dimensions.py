@@ -0,0 +1,237 @@
+"""Compare the sites table with inline strings against dictionary encoding.
+
+Builds the same synthetic sites twice: once with the dimension names
+repeated in every row (the original layout) and once with integer keys into
+lookup tables, then reports the database size, the page cache hit rate of a
+warm sites summary under the same page cache budget and its latency.
+
+Python's sqlite3 does not expose SQLite's cache counters, so cache misses
+are the bytes SQLite read from the file (`/proc/self/io`, Linux only)
+divided by the page size, against the pages the summary's three scans of
+the sites table request.
+
+Usage (from `backend/`):
+
+  python -m benchmarks.bench_site_dimensions --sites 1000000 --cache-mb 128
+"""
+import argparse
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+
+from app import crud, models
+from app.dimensions import DimensionEncoder
+from app.migrations import upgrade_database
+
+CAMPAIGNS = 20
+BATCH_SIZE = 50_000
+PAGE_SIZE = 4096
+SUMMARY_SCANS = 3
+FURNITURE_TYPES = [
+  'Pantalla Digital', 'Espectacular o Cartelera', 'Relojes', 'Vallas',
+  'Muros', 'Kiosko'
+]
+AD_TYPES = ['Digital', 'Estatico']
+MUNICIPIOS = [
+  ('Ciudad de Mexico', 'Cuauhtemoc', 'Valle de Mexico'),
+  ('Ciudad de Mexico', 'Miguel Hidalgo', 'Valle de Mexico'),
+  ('Ciudad de Mexico', 'Benito Juarez', 'Valle de Mexico'),
+  ('Mexico', 'Naucalpan de Juarez', 'Valle de Mexico'),
+  ('Nuevo Leon', 'Monterrey', 'Monterrey'),
+  ('Nuevo Leon', 'San Pedro Garza Garcia', 'Monterrey'),
+  ('Jalisco', 'Guadalajara', 'Guadalajara'),
+  ('Jalisco', 'Zapopan', 'Guadalajara'),
+]
+
+WIDE_SCHEMA = """
+CREATE TABLE campaigns (name VARCHAR PRIMARY KEY);
+CREATE TABLE campaign_sites (
+  id INTEGER PRIMARY KEY, campaign_name VARCHAR, codigo_del_sitio VARCHAR,
+  id_fourteen VARCHAR, mes VARCHAR, tipo_de_mueble VARCHAR,
+  tipo_de_anuncio VARCHAR, estado VARCHAR, municipio VARCHAR, zm VARCHAR,
+  frecuencia_catorcenal FLOAT, frecuencia_mensual FLOAT,
+  impactos_catorcenal INTEGER, impactos_mensuales INTEGER,
+  alcance_mensual FLOAT
+);
+"""
+
+WIDE_SUMMARY = """
+WITH site_months AS (
+  SELECT codigo_del_sitio, max({column}) AS label,
+    max(impactos_mensuales) AS impacts
+  FROM campaign_sites WHERE campaign_name = ?
+  GROUP BY codigo_del_sitio, mes
+)
+SELECT coalesce(label, 'Unknown'), count(DISTINCT codigo_del_sitio),
+  coalesce(sum(impacts), 0)
+FROM site_months GROUP BY 1
+"""
+
+WIDE_TOTAL = """
+SELECT count(DISTINCT codigo_del_sitio) FROM (
+  SELECT codigo_del_sitio FROM campaign_sites WHERE campaign_name = ?
+  GROUP BY codigo_del_sitio, mes
+)
+"""
+
+
+def generate_sites(site_count: int, seed: int) -> list:
+  generator = np.random.default_rng(seed)
+  codes = generator.integers(0, max(site_count // 4, 1), site_count).tolist()
+  months = generator.integers(1, 13, site_count).tolist()
+  campaigns = generator.integers(0, CAMPAIGNS, site_count).tolist()
+  furniture = generator.integers(0, len(FURNITURE_TYPES), site_count).tolist()
+  ads = generator.integers(0, len(AD_TYPES), site_count).tolist()
+  places = generator.integers(0, len(MUNICIPIOS), site_count).tolist()
+  impacts = generator.integers(10_000, 5_000_000, site_count).tolist()
+  return [
+    {
+      'campaign_name': f'campania_{campaigns[i]}',
+      'codigo_del_sitio': f'PRUEBA-MEX-{codes[i]:07d}',
+      'id_fourteen': f'2025-{months[i] * 2:02d}',
+      'mes': f'2025-{months[i]:02d}',
+      'tipo_de_mueble': FURNITURE_TYPES[furniture[i]],
+      'tipo_de_anuncio': AD_TYPES[ads[i]],
+      'estado': MUNICIPIOS[places[i]][0],
+      'municipio': MUNICIPIOS[places[i]][1],
+      'zm': MUNICIPIOS[places[i]][2],
+      'frecuencia_catorcenal': 12.5,
+      'frecuencia_mensual': 25.0,
+      'impactos_catorcenal': impacts[i] // 2,
+      'impactos_mensuales': impacts[i],
+      'alcance_mensual': impacts[i] / 20
+    }
+    for i in range(site_count)
+  ]
+
+
+def build_wide(path: Path, sites: list) -> None:
+  connection = sqlite3.connect(path)
+  connection.executescript(WIDE_SCHEMA)
+  connection.executemany(
+    'INSERT INTO campaigns VALUES (?)',
+    [(f'campania_{index}',) for index in range(CAMPAIGNS)]
+  )
+  columns = list(sites[0])
+  connection.executemany(
+    f'INSERT INTO campaign_sites ({", ".join(columns)}) '
+    f'VALUES ({", ".join("?" * len(columns))})',
+    [tuple(site[column] for column in columns) for site in sites]
+  )
+  connection.commit()
+  connection.execute('VACUUM')
+  connection.close()
+
+
+def build_encoded(path: Path, sites: list) -> None:
+  engine = create_engine(f'sqlite:///{path}')
+  upgrade_database(engine)
+  encoder = DimensionEncoder()
+  campaign_ids = {f'campania_{index}': index + 1 for index in range(CAMPAIGNS)}
+  with Session(engine) as db:
+    db.execute(insert(models.Campaign), [
+      {'id': campaign_id, 'name': name}
+      for name, campaign_id in campaign_ids.items()
+    ])
+    for start in range(0, len(sites), BATCH_SIZE):
+      batch = [dict(site) for site in sites[start:start + BATCH_SIZE]]
+      for site in batch:
+        site['campaign_id'] = campaign_ids[site.pop('campaign_name')]
+      db.execute(
+        insert(models.CampaignSite),
+        encoder.encode_sites(db.connection(), batch)
+      )
+    db.commit()
+  with engine.connect() as connection:
+    connection.exec_driver_sql('VACUUM')
+  engine.dispose()
+
+
+def table_pages(path: Path, tables: list) -> int:
+  connection = sqlite3.connect(path)
+  placeholders = ', '.join('?' * len(tables))
+  pages = connection.execute(
+    f'SELECT count(*) FROM dbstat WHERE name IN ({placeholders})', tables
+  ).fetchone()[0]
+  connection.close()
+  return pages
+
+
+def bytes_read() -> int:
+  for line in Path('/proc/self/io').read_text().splitlines():
+    if line.startswith('rchar:'):
+      return int(line.split()[1])
+  return 0
+
+
+def measure(label: str, path: Path, run_summary, scanned_pages: int) -> None:
+  """Cold run to fill the cache, then a timed warm run."""
+  run_summary()
+  started_bytes = bytes_read()
+  started = time.perf_counter()
+  run_summary()
+  elapsed = time.perf_counter() - started
+  page_misses = (bytes_read() - started_bytes) / PAGE_SIZE
+  hit_rate = max(0.0, 1 - page_misses / (scanned_pages * SUMMARY_SCANS))
+  print(
+    f'{label:<10} {path.stat().st_size / 2**20:9.1f} MB '
+    f'{scanned_pages:9,} pages {hit_rate:8.1%} hits {elapsed * 1000:9.1f} ms'
+  )
+
+
+def run(site_count: int, seed: int, cache_mb: int) -> None:
+  cache_pragma = f'PRAGMA cache_size = -{cache_mb * 1024}'
+  sites = generate_sites(site_count, seed)
+  with tempfile.TemporaryDirectory() as temp_dir:
+    wide_path = Path(temp_dir) / 'wide.db'
+    encoded_path = Path(temp_dir) / 'encoded.db'
+    build_wide(wide_path, sites)
+    build_encoded(encoded_path, sites)
+    del sites
+
+    wide = sqlite3.connect(wide_path)
+    wide.execute(cache_pragma)
+
+    def wide_summary() -> None:
+      wide.execute(WIDE_TOTAL, ('campania_1',)).fetchone()
+      for column in ('tipo_de_mueble', 'municipio'):
+        wide.execute(
+          WIDE_SUMMARY.format(column=column), ('campania_1',)
+        ).fetchall()
+
+    measure(
+      'inline', wide_path, wide_summary,
+      table_pages(wide_path, ['campaign_sites'])
+    )
+    wide.close()
+
+    engine = create_engine(f'sqlite:///{encoded_path}')
+    with Session(engine) as db:
+      db.connection().exec_driver_sql(cache_pragma)
+      measure(
+        'encoded', encoded_path,
+        lambda: crud.get_sites_summary(db, 2),
+        table_pages(encoded_path, [
+          'campaign_sites', 'sites', 'furniture_types', 'municipios'
+        ])
+      )
+    engine.dispose()
+
+
+def main() -> None:
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument('--sites', type=int, default=1_000_000)
+  parser.add_argument('--seed', type=int, default=42)
+  parser.add_argument('--cache-mb', type=int, default=128)
+  arguments = parser.parse_args()
+  print(f'sites: {arguments.sites:,}, page cache: {arguments.cache_mb} MB')
+  run(arguments.sites, arguments.seed, arguments.cache_mb)
+
+
+if __name__ == '__main__':
+  main()
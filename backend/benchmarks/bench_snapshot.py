@@ -0,0 +1,81 @@
+"""Measure cold-start cost of the columnar snapshot for a large sites table.
+
+Usage (from `backend/`):
+
+  python -m benchmarks.bench_snapshot --sites 10000000
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict
+
+import numpy as np
+
+from app import snapshot
+
+FURNITURE_TYPES = np.array([
+  'Pantalla Digital', 'Espectacular o Cartelera', 'Relojes', 'Vallas',
+  'Muros', 'Kiosko'
+])
+
+
+def generate_sites(site_count: int, seed: int) -> Dict[str, np.ndarray]:
+  generator = np.random.default_rng(seed)
+  return {
+    'id': np.arange(1, site_count + 1, dtype=np.int64),
+    'tipo_de_mueble': FURNITURE_TYPES[
+      generator.integers(0, len(FURNITURE_TYPES), site_count)
+    ],
+    'impactos_mensuales': generator.integers(
+      10_000, 5_000_000, site_count, dtype=np.int64
+    ),
+    'alcance_mensual': generator.gamma(2.0, 50_000.0, site_count),
+    'frecuencia_mensual': generator.gamma(3.0, 5.0, site_count),
+  }
+
+
+def time_call(label: str, function) -> object:
+  started = time.perf_counter()
+  result = function()
+  print(f'{label:<28} {time.perf_counter() - started:8.3f} s')
+  return result
+
+
+def run(site_count: int, seed: int) -> None:
+  columns = time_call('generate', lambda: generate_sites(site_count, seed))
+
+  with tempfile.TemporaryDirectory() as temp_dir:
+    directory = Path(temp_dir) / 'snapshot'
+    time_call(
+      'write snapshot',
+      lambda: snapshot.write_snapshot(
+        directory, {'campaign_sites': columns}, {}
+      )
+    )
+    del columns
+
+    opened = time_call('open snapshot (boot)', lambda: (
+      snapshot.open_snapshot(directory)
+    ))
+    sites = opened.table('campaign_sites')
+    time_call('first scan: sum impacts', lambda: (
+      int(sites.column('impactos_mensuales').sum())
+    ))
+    time_call('group by furniture type', lambda: np.bincount(
+      sites.column('tipo_de_mueble'),
+      weights=sites.column('impactos_mensuales')
+    ))
+
+
+def main() -> None:
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument('--sites', type=int, default=10_000_000)
+  parser.add_argument('--seed', type=int, default=42)
+  arguments = parser.parse_args()
+  print(f'sites: {arguments.sites:,}')
+  run(arguments.sites, arguments.seed)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,120 @@
+"""Measure API throughput with 1 to N read-only uvicorn workers.
+
+The dataset is prepared once (`seed.py --prepare`), then for each worker
+count the server is started with DATABASE_READ_ONLY=1, as the Dockerfile
+does, and loaded with `--users-per-worker` virtual users per worker
+replaying the load test's traffic mix. The load is generated by as many
+client processes as the largest worker count, so the clients do not become
+the bottleneck. For the speedup to mean anything the machine needs spare
+cores for them: measure up to about half its cores.
+
+Usage (from `backend/`):
+
+  python -m benchmarks.bench_workers --sites 100000 --max-workers 4
+"""
+import argparse
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple
+
+import httpx
+
+from .load_test import (
+  ACTIONS, REQUEST_TIMEOUT, Catalog, Samples, measure, prepared_dataset,
+  read_catalog, serve, summarize_level
+)
+
+
+def client_process(
+  base_url: str,
+  catalog: Catalog,
+  users: int,
+  first_user: int,
+  duration: float,
+  warmup: float
+) -> Tuple[Dict[str, Samples], float]:
+  return asyncio.run(
+    measure(base_url, catalog, users, duration, warmup, 0, first_user)
+  )
+
+
+async def fetch_catalog(base_url: str) -> Catalog:
+  async with httpx.AsyncClient(
+    base_url=base_url, timeout=REQUEST_TIMEOUT
+  ) as client:
+    return await read_catalog(client)
+
+
+def run_workers(
+  scratch,
+  workers: int,
+  clients: int,
+  users_per_worker: int,
+  duration: float,
+  warmup: float
+) -> Dict[str, object]:
+  users = workers * users_per_worker
+  # Spread the users over the client processes as evenly as possible.
+  shares = [
+    users // clients + (index < users % clients) for index in range(clients)
+  ]
+  with serve(scratch, workers) as base_url:
+    catalog = asyncio.run(fetch_catalog(base_url))
+    with ProcessPoolExecutor(max_workers=clients) as pool:
+      futures = [
+        pool.submit(
+          client_process, base_url, catalog, share, sum(shares[:index]),
+          duration, warmup
+        )
+        for index, share in enumerate(shares) if share
+      ]
+      results = [future.result() for future in futures]
+
+  window = {
+    action: Samples(
+      latencies=[
+        value for samples, _ in results for value in samples[action].latencies
+      ],
+      errors=sum(samples[action].errors for samples, _ in results)
+    )
+    for action in ACTIONS
+  }
+  elapsed = max(seconds for _, seconds in results)
+  return summarize_level(users, window, elapsed)
+
+
+def main() -> None:
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument('--sites', type=int, default=100_000)
+  parser.add_argument(
+    '--max-workers', type=int, default=max((os.cpu_count() or 2) // 2, 1)
+  )
+  parser.add_argument('--users-per-worker', type=int, default=8)
+  parser.add_argument('--duration', type=float, default=10.0)
+  parser.add_argument('--warmup', type=float, default=2.0)
+  arguments = parser.parse_args()
+
+  print(
+    f'{"workers":>7} {"users":>6} {"actions/s":>10} {"speedup":>8} '
+    f'{"efficiency":>10} {"p50 ms":>8} {"p95 ms":>8} {"errors":>7}'
+  )
+  levels: List[Dict[str, object]] = []
+  with prepared_dataset(arguments.sites, seed=0) as scratch:
+    for workers in range(1, arguments.max_workers + 1):
+      level = run_workers(
+        scratch, workers, arguments.max_workers, arguments.users_per_worker,
+        arguments.duration, arguments.warmup
+      )
+      levels.append(level)
+      speedup = level['throughput'] / levels[0]['throughput']
+      print(
+        f'{workers:>7} {level["concurrency"]:>6} '
+        f'{level["throughput"]:>10.1f} {speedup:>7.2f}x '
+        f'{speedup / workers:>10.0%} {level.get("p50_ms", 0):>8.1f} '
+        f'{level.get("p95_ms", 0):>8.1f} {level["error_rate"]:>7.1%}'
+      )
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,559 @@
+"""Load test the API over HTTP with the traffic mix of the campaigns page.
+
+Virtual users run a closed loop against a uvicorn server: each picks an
+action by weight, waits for its responses and immediately picks the next.
+The actions replay what `CampaignsPage.tsx` sends: paging through the list,
+filtering it by campaign type or date window, searching by name and opening
+a campaign's modal (its three summaries, requested concurrently like the
+browser does). Campaign names, types and dates are read from the target
+before the run, so every request hits real data.
+
+Each concurrency level in the sweep runs for `--duration` seconds after a
+warm-up, and reports throughput, p50/p95/p99 latency and the error rate,
+overall and per action. The results are written as JSON (pass a previous
+report as `--baseline` to print the change) and as a self-contained HTML
+page.
+
+Unless `--url` names a running server, one is started the way the
+Dockerfile starts it (`seed.py --prepare`, then `--workers` read-only
+uvicorn workers) on a scratch copy of the data: the bundled CSVs, or
+synthetic files of `--sites` rows.
+
+Usage (from `backend/`):
+
+  python -m benchmarks.load_test --sites 100000 --concurrency 1 4 16 64
+  python -m benchmarks.load_test --url http://localhost:8000 \\
+    --baseline load_report.json --output load_report_new
+"""
+import argparse
+import asyncio
+import html
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import quote
+
+import httpx
+import numpy as np
+
+from .synthetic import generate_dataset
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_CONCURRENCY = [1, 4, 16, 64]
+PAGE_SIZE = 5
+STARTUP_TIMEOUT = 600
+REQUEST_TIMEOUT = 30.0
+# Relative frequency of each action, roughly what one visit to the page
+# sends: a few list pages, a filter change, a search and opened modals.
+ACTIONS = {
+  'list': 4,
+  'filter': 2,
+  'search': 1,
+  'modal': 3,
+}
+
+Result = Dict[str, float]
+
+
+@dataclass
+class Catalog:
+  """Values the actions draw from, read from the target's list endpoint."""
+  names: List[str]
+  types: List[str]
+  months: List[str]
+  pages: int
+
+
+@dataclass
+class Samples:
+  """Latencies and failures of one action during a measured window."""
+  latencies: List[float] = field(default_factory=list)
+  errors: int = 0
+
+
+@dataclass
+class Recorder:
+  """Where users record their actions; unset during the warm-up."""
+  window: Optional[Dict[str, Samples]] = None
+
+
+async def read_catalog(client: httpx.AsyncClient) -> Catalog:
+  names, types, months = [], set(), set()
+  skip = 0
+  while True:
+    response = await client.get(
+      '/campaigns/', params={'skip': skip, 'limit': 100}
+    )
+    response.raise_for_status()
+    body = response.json()
+    for campaign in body['data']:
+      names.append(campaign['name'])
+      types.add(campaign['tipo_campania'])
+      months.add(campaign['fecha_inicio'][:7])
+    skip += 100
+    if skip >= body['total']:
+      break
+
+  if not names:
+    raise RuntimeError('the target has no campaigns to load test')
+  return Catalog(
+    names=names,
+    types=sorted(types),
+    months=sorted(months),
+    pages=(len(names) + PAGE_SIZE - 1) // PAGE_SIZE
+  )
+
+
+def action_requests(
+  action: str, catalog: Catalog, rng: random.Random
+) -> List[Tuple[str, Dict[str, object]]]:
+  """The (path, params) an action sends, all of them concurrently."""
+  params = {'limit': PAGE_SIZE}
+  if action == 'list':
+    params['skip'] = rng.randrange(catalog.pages) * PAGE_SIZE
+    return [('/campaigns/', params)]
+  if action == 'filter':
+    if rng.random() < 0.5:
+      params['tipo_campania'] = rng.choice(catalog.types)
+    else:
+      # A window of up to three months starting at a campaign's month.
+      first = rng.randrange(len(catalog.months))
+      last = min(first + 2, len(catalog.months) - 1)
+      params['fecha_inicio'] = f'{catalog.months[first]}-01'
+      params['fecha_fin'] = f'{catalog.months[last]}-28'
+    return [('/campaigns/', params)]
+  if action == 'search':
+    name = rng.choice(catalog.names)
+    start = rng.randrange(max(len(name) - 3, 1))
+    params['search'] = name[start:start + 4]
+    return [('/campaigns/', params)]
+
+  name = quote(rng.choice(catalog.names), safe='')
+  return [
+    (f'/campaigns/{name}/sites/summary', {}),
+    (f'/campaigns/{name}/periods/summary', {}),
+    (f'/campaigns/{name}/summary', {}),
+  ]
+
+
+async def virtual_user(
+  client: httpx.AsyncClient,
+  catalog: Catalog,
+  rng: random.Random,
+  recorder: Recorder,
+  deadline: float
+) -> None:
+  """Send actions until `deadline`, recording those that end in a window."""
+  actions, weights = zip(*ACTIONS.items())
+  while time.perf_counter() < deadline:
+    action = rng.choices(actions, weights)[0]
+    started = time.perf_counter()
+    failed = False
+    try:
+      responses = await asyncio.gather(*(
+        client.get(path, params=params)
+        for path, params in action_requests(action, catalog, rng)
+      ))
+      failed = any(response.status_code >= 400 for response in responses)
+    except httpx.HTTPError:
+      failed = True
+    elapsed = time.perf_counter() - started
+
+    if recorder.window is not None:
+      recorder.window[action].latencies.append(elapsed * 1000)
+      recorder.window[action].errors += failed
+
+
+async def measure(
+  base_url: str,
+  catalog: Catalog,
+  concurrency: int,
+  duration: float,
+  warmup: float,
+  seed: int,
+  first_user: int = 0
+) -> Tuple[Dict[str, Samples], float]:
+  """Each action's samples from `concurrency` users, and the seconds taken."""
+  limits = httpx.Limits(
+    max_connections=concurrency * 3, max_keepalive_connections=concurrency * 3
+  )
+  recorder = Recorder()
+  async with httpx.AsyncClient(
+    base_url=base_url, limits=limits, timeout=REQUEST_TIMEOUT
+  ) as client:
+    started = time.perf_counter()
+    deadline = started + warmup + duration
+    users = [
+      asyncio.create_task(virtual_user(
+        client, catalog, random.Random(seed * 1_000 + user), recorder,
+        deadline
+      ))
+      for user in range(first_user, first_user + concurrency)
+    ]
+    await asyncio.sleep(warmup)
+    window = {action: Samples() for action in ACTIONS}
+    recorder.window = window
+    measured_from = time.perf_counter()
+    await asyncio.gather(*users)
+    # Actions still in flight at the deadline finish past it; count the
+    # measured window up to the last of them.
+    elapsed = time.perf_counter() - measured_from
+
+  return window, elapsed
+
+
+async def run_level(
+  base_url: str,
+  catalog: Catalog,
+  concurrency: int,
+  duration: float,
+  warmup: float,
+  seed: int
+) -> Dict[str, object]:
+  window, elapsed = await measure(
+    base_url, catalog, concurrency, duration, warmup, seed
+  )
+  return summarize_level(concurrency, window, elapsed)
+
+
+def summarize_level(
+  concurrency: int, window: Dict[str, Samples], elapsed: float
+) -> Dict[str, object]:
+  actions = {action: summarize(window[action], elapsed) for action in ACTIONS}
+  overall = summarize(Samples(
+    latencies=[value for item in window.values() for value in item.latencies],
+    errors=sum(item.errors for item in window.values())
+  ), elapsed)
+  return {'concurrency': concurrency, **overall, 'actions': actions}
+
+
+def summarize(samples: Samples, elapsed: float) -> Result:
+  count = len(samples.latencies)
+  if not count:
+    return {'count': 0, 'throughput': 0.0, 'error_rate': 0.0}
+
+  p50, p95, p99 = np.percentile(samples.latencies, [50, 95, 99])
+  return {
+    'count': count,
+    'throughput': count / elapsed,
+    'error_rate': samples.errors / count,
+    'p50_ms': float(p50),
+    'p95_ms': float(p95),
+    'p99_ms': float(p99),
+  }
+
+
+def free_port() -> int:
+  with socket.socket() as listener:
+    listener.bind(('127.0.0.1', 0))
+    return listener.getsockname()[1]
+
+
+@contextmanager
+def prepared_dataset(sites: Optional[int], seed: int) -> Iterator[Path]:
+  """Yield a scratch directory holding a database prepared for serving.
+
+  The data is the bundled CSVs, or synthetic files of `sites` rows, and
+  `seed.py --prepare` loads it as the Dockerfile does before the workers
+  start.
+  """
+  scratch = Path(tempfile.mkdtemp(prefix='load_test_'))
+  try:
+    if sites:
+      generate_dataset(scratch / 'data', sites, seed=seed)
+    else:
+      shutil.copytree(
+        BACKEND_DIR / 'data', scratch / 'data',
+        ignore=shutil.ignore_patterns('snapshot', 'reports')
+      )
+    # The database path is relative to the working directory, so it is
+    # created as `campaigns.db` inside the scratch directory.
+    subprocess.run(
+      [sys.executable, str(BACKEND_DIR / 'seed.py'), '--prepare'],
+      cwd=scratch, env=server_env(scratch), check=True
+    )
+    yield scratch
+  finally:
+    shutil.rmtree(scratch, ignore_errors=True)
+
+
+def server_env(scratch: Path) -> Dict[str, str]:
+  return {
+    **os.environ,
+    'PYTHONPATH': str(BACKEND_DIR),
+    'DATA_DIR': str(scratch / 'data'),
+    'SNAPSHOT_DIR': str(scratch / 'snapshot'),
+    'INGEST_REPORT_DIR': str(scratch / 'reports'),
+  }
+
+
+@contextmanager
+def serve(scratch: Path, workers: int = 1) -> Iterator[str]:
+  """Start uvicorn workers on a prepared directory and yield the base URL."""
+  port = free_port()
+  server = subprocess.Popen(
+    [sys.executable, '-m', 'uvicorn', 'app.main:app', '--host', '127.0.0.1',
+     '--port', str(port), '--workers', str(workers), '--log-level',
+     'warning', '--no-access-log'],
+    cwd=scratch, env={**server_env(scratch), 'DATABASE_READ_ONLY': '1'}
+  )
+  base_url = f'http://127.0.0.1:{port}'
+  try:
+    wait_until_ready(base_url, server)
+    yield base_url
+  finally:
+    server.terminate()
+    server.wait()
+
+
+def wait_until_ready(base_url: str, server: subprocess.Popen) -> None:
+  deadline = time.monotonic() + STARTUP_TIMEOUT
+  while time.monotonic() < deadline:
+    if server.poll() is not None:
+      raise RuntimeError(f'the server exited with status {server.returncode}')
+    try:
+      if httpx.get(f'{base_url}/health', timeout=1).status_code == 200:
+        return
+    except httpx.HTTPError:
+      pass
+    time.sleep(0.2)
+
+  raise RuntimeError(f'the server was not ready after {STARTUP_TIMEOUT} s')
+
+
+async def sweep(
+  base_url: str,
+  concurrency: List[int],
+  duration: float,
+  warmup: float,
+  seed: int
+) -> Tuple[Catalog, List[Dict[str, object]]]:
+  async with httpx.AsyncClient(
+    base_url=base_url, timeout=REQUEST_TIMEOUT
+  ) as client:
+    catalog = await read_catalog(client)
+
+  print(
+    f'{"users":>6} {"actions/s":>10} {"p50 ms":>8} {"p95 ms":>8} '
+    f'{"p99 ms":>8} {"errors":>7}'
+  )
+  levels = []
+  for users in concurrency:
+    level = await run_level(base_url, catalog, users, duration, warmup, seed)
+    print_level(level)
+    levels.append(level)
+  return catalog, levels
+
+
+def print_level(level: Dict[str, object]) -> None:
+  print(
+    f'{level["concurrency"]:>6} {level["throughput"]:>10.1f} '
+    f'{level.get("p50_ms", 0):>8.1f} {level.get("p95_ms", 0):>8.1f} '
+    f'{level.get("p99_ms", 0):>8.1f} {level["error_rate"]:>7.1%}'
+  )
+
+
+def compare(levels: List[Dict[str, object]], baseline: Path) -> None:
+  """Print each level's change from a previous report's matching level."""
+  previous = {
+    level['concurrency']: level
+    for level in json.loads(baseline.read_text())['levels']
+  }
+  print(f'\nchange from {baseline}:')
+  print(f'{"users":>6} {"actions/s":>10} {"p50":>8} {"p95":>8} {"p99":>8}')
+  for level in levels:
+    before = previous.get(level['concurrency'])
+    if before is None or not before['count'] or not level['count']:
+      continue
+    throughput, p50, p95, p99 = (
+      level[key] / before[key] - 1
+      for key in ('throughput', 'p50_ms', 'p95_ms', 'p99_ms')
+    )
+    print(
+      f'{level["concurrency"]:>6} {throughput:>+10.0%} {p50:>+8.0%} '
+      f'{p95:>+8.0%} {p99:>+8.0%}'
+    )
+
+
+def write_reports(
+  output: Path, report: Dict[str, object]
+) -> Tuple[Path, Path]:
+  output.parent.mkdir(parents=True, exist_ok=True)
+  json_path = output.with_suffix('.json')
+  html_path = output.with_suffix('.html')
+  json_path.write_text(json.dumps(report, indent=2) + '\n')
+  html_path.write_text(render_html(report))
+  return json_path, html_path
+
+
+def render_html(report: Dict[str, object]) -> str:
+  rows = []
+  for level in report['levels']:
+    for action, result in [('all', level), *level['actions'].items()]:
+      rows.append(
+        '<tr' + (' class="total"' if action == 'all' else '') + '>'
+        f'<td>{level["concurrency"]}</td><td>{html.escape(action)}</td>'
+        f'<td>{result["count"]}</td><td>{result["throughput"]:.1f}</td>'
+        + ''.join(
+          f'<td>{result.get(key, 0):.1f}</td>'
+          for key in ('p50_ms', 'p95_ms', 'p99_ms')
+        )
+        + f'<td>{result["error_rate"]:.2%}</td></tr>'
+      )
+
+  return f'''<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>Load test {html.escape(report["started_at"])}</title>
+<style>
+  body {{ font-family: sans-serif; margin: 2em; }}
+  table {{ border-collapse: collapse; }}
+  th, td {{ border: 1px solid #ccc; padding: 4px 10px; text-align: right; }}
+  tr.total td {{ font-weight: bold; background: #f2f2f2; }}
+</style>
+</head>
+<body>
+<h1>Load test</h1>
+<p>{html.escape(report["target"])} &middot; started
+{html.escape(report["started_at"])} &middot;
+{report["duration_s"]} s per level after {report["warmup_s"]} s of warm-up
+&middot; {report["campaigns"]} campaigns</p>
+{render_chart(report["levels"])}
+<table>
+<tr><th>users</th><th>action</th><th>count</th><th>actions/s</th>
+<th>p50 ms</th><th>p95 ms</th><th>p99 ms</th><th>errors</th></tr>
+{chr(10).join(rows)}
+</table>
+<pre>{html.escape(json.dumps(report["machine"], indent=2))}</pre>
+</body>
+</html>
+'''
+
+
+def render_chart(levels: List[Dict[str, object]]) -> str:
+  """Inline SVG of throughput and p95 latency against concurrency."""
+  measured = [level for level in levels if level['count']]
+  if not measured:
+    return ''
+
+  width, height, margin = 640, 240, 40
+  step = (width - 2 * margin) / max(len(measured) - 1, 1)
+  series = [
+    ('throughput', 'actions/s', '#1f77b4'),
+    ('p95_ms', 'p95 ms', '#d62728'),
+  ]
+  lines = []
+  for key, label, color in series:
+    top = max(level[key] for level in measured) or 1
+    points = ' '.join(
+      f'{margin + index * step:.1f},'
+      f'{height - margin - level[key] / top * (height - 2 * margin):.1f}'
+      for index, level in enumerate(measured)
+    )
+    lines.append(
+      f'<polyline fill="none" stroke="{color}" stroke-width="2" '
+      f'points="{points}"/>'
+    )
+    lines.append(
+      f'<text x="{width - margin}" y="{20 + 16 * len(lines) // 2}" '
+      f'fill="{color}" text-anchor="end">{label} (max {top:.1f})</text>'
+    )
+  ticks = ''.join(
+    f'<text x="{margin + index * step:.1f}" y="{height - 10}" '
+    f'text-anchor="middle">{level["concurrency"]}</text>'
+    for index, level in enumerate(measured)
+  )
+  return (
+    f'<svg width="{width}" height="{height}" '
+    f'xmlns="http://www.w3.org/2000/svg">'
+    + ''.join(lines) + ticks + '</svg>'
+  )
+
+
+def rounded(value):
+  if isinstance(value, float):
+    return round(value, 3)
+  if isinstance(value, dict):
+    return {key: rounded(item) for key, item in value.items()}
+  if isinstance(value, list):
+    return [rounded(item) for item in value]
+
+  return value
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+  parser = argparse.ArgumentParser(
+    description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+  )
+  parser.add_argument('--url', help='load test this server instead')
+  parser.add_argument(
+    '--sites', type=int, default=0,
+    help='synthetic site rows for the local server (default: bundled CSVs)'
+  )
+  parser.add_argument(
+    '--workers', type=int, default=1, help='uvicorn workers to start'
+  )
+  parser.add_argument(
+    '--concurrency', type=int, nargs='+', default=DEFAULT_CONCURRENCY
+  )
+  parser.add_argument('--duration', type=float, default=10.0)
+  parser.add_argument('--warmup', type=float, default=2.0)
+  parser.add_argument('--seed', type=int, default=0)
+  parser.add_argument('--output', type=Path, default=Path('load_report'))
+  parser.add_argument('--baseline', type=Path)
+  arguments = parser.parse_args(argv)
+
+  started_at = time.strftime('%Y-%m-%dT%H:%M:%S')
+  if arguments.url:
+    target = arguments.url.rstrip('/')
+    catalog, levels = asyncio.run(sweep(
+      target, arguments.concurrency, arguments.duration, arguments.warmup,
+      arguments.seed
+    ))
+  else:
+    target = (
+      f'local uvicorn, {arguments.workers} worker(s), '
+      f'{arguments.sites or "bundled"} site rows'
+    )
+    with prepared_dataset(arguments.sites, arguments.seed) as scratch, \
+        serve(scratch, arguments.workers) as base_url:
+      catalog, levels = asyncio.run(sweep(
+        base_url, arguments.concurrency, arguments.duration,
+        arguments.warmup, arguments.seed
+      ))
+
+  json_path, html_path = write_reports(arguments.output, {
+    'target': target,
+    'started_at': started_at,
+    'duration_s': arguments.duration,
+    'warmup_s': arguments.warmup,
+    'campaigns': len(catalog.names),
+    'weights': ACTIONS,
+    'machine': {
+      'python': platform.python_version(),
+      'platform': platform.platform(),
+      'cpus': os.cpu_count(),
+    },
+    'levels': rounded(levels),
+  })
+  print(f'reports written to {json_path} and {html_path}')
+
+  if arguments.baseline:
+    compare(levels, arguments.baseline)
+  return 0 if all(level['error_rate'] == 0 for level in levels) else 1
+
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -0,0 +1,273 @@
+"""Benchmark the API endpoints and the ingest paths at several dataset sizes.
+
+For each size, synthetic source files are generated and loaded by
+`seed_database_if_empty` twice into new databases: once from the CSVs and
+once from the columnar snapshot exported after the first. Then the list, the
+campaign detail and the three summary endpoints are called against the
+campaign with the most bookings. Every case records its median and p95
+latency and the SQL statements it ran, read from the `Server-Timing`
+header.
+
+Results are compared with a stored baseline, and the run fails (exit
+status 1) when a case's median latency grows by more than
+`--latency-threshold` (and by at least `--min-delta-ms`) or it runs more
+queries than `--query-threshold` allows. Baselines depend on the machine,
+so `--save` them on the machine that runs the comparison.
+
+Usage (from `backend/`):
+
+  python -m benchmarks.suite --save
+  python -m benchmarks.suite --sizes 1000 100000 --latency-threshold 0.25
+"""
+import argparse
+import atexit
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# The ingest reads its data, snapshot and report directories when the app
+# is imported, so they must point at the scratch directory before that.
+SCRATCH_DIR = Path(tempfile.mkdtemp(prefix='benchmark_suite_'))
+atexit.register(shutil.rmtree, SCRATCH_DIR, ignore_errors=True)
+os.environ['DATA_DIR'] = str(SCRATCH_DIR / 'data')
+os.environ['SNAPSHOT_DIR'] = str(SCRATCH_DIR / 'snapshot')
+os.environ['INGEST_REPORT_DIR'] = str(SCRATCH_DIR / 'reports')
+
+import numpy as np  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import create_engine, func, select  # noqa: E402
+from sqlalchemy.orm import Session, sessionmaker  # noqa: E402
+
+from app import config, ingest, models, snapshot  # noqa: E402
+from app.main import app, get_db  # noqa: E402
+from app.migrations import upgrade_database  # noqa: E402
+
+from .synthetic import generate_dataset  # noqa: E402
+
+DEFAULT_SIZES = [1_000, 100_000]
+DEFAULT_BASELINE = Path(__file__).parent / 'baselines' / 'suite.json'
+REPEATS = 20
+ENDPOINTS = {
+  'read_campaigns': '/campaigns/?limit=5',
+  'read_campaign': '/campaigns/{name}',
+  'sites_summary': '/campaigns/{name}/sites/summary',
+  'periods_summary': '/campaigns/{name}/periods/summary',
+  'demographic_summary': '/campaigns/{name}/summary',
+}
+
+Result = Dict[str, float]
+
+
+def new_session(database_path: Path) -> Session:
+  engine = create_engine(
+    f'sqlite:///{database_path}', connect_args={'check_same_thread': False}
+  )
+  upgrade_database(engine)
+  return sessionmaker(bind=engine)()
+
+
+def time_seed(database_path: Path) -> Result:
+  db = new_session(database_path)
+  try:
+    started = time.perf_counter()
+    ingest.seed_database_if_empty(db)
+    elapsed = time.perf_counter() - started
+  finally:
+    db.close()
+
+  return {'median_ms': elapsed * 1000, 'p95_ms': elapsed * 1000}
+
+
+def time_endpoint(client: TestClient, url: str, repeats: int) -> Result:
+  client.get(url)
+  latencies, queries = [], 0
+  for _ in range(repeats):
+    started = time.perf_counter()
+    response = client.get(url)
+    latencies.append((time.perf_counter() - started) * 1000)
+    response.raise_for_status()
+    queries = server_timing_queries(response.headers['server-timing'])
+
+  return {
+    'median_ms': float(np.median(latencies)),
+    'p95_ms': float(np.percentile(latencies, 95)),
+    'queries': queries,
+  }
+
+
+def server_timing_queries(header: str) -> int:
+  """Statements counted in the `db` entry of a Server-Timing header."""
+  for entry in header.split(', '):
+    name, _, params = entry.partition(';')
+    if name == 'db':
+      return int(params.split('desc="')[1].split()[0])
+
+  return 0
+
+
+def busiest_campaign(db: Session) -> str:
+  return db.execute(
+    select(models.Campaign.name)
+    .join(models.CampaignSite, models.CampaignSite.campaign_id == (
+      models.Campaign.id
+    ))
+    .group_by(models.Campaign.id)
+    .order_by(func.count().desc())
+    .limit(1)
+  ).scalar_one()
+
+
+def run_size(size: int, repeats: int) -> Dict[str, Result]:
+  """Every case for a dataset of `size` site rows."""
+  work_dir = SCRATCH_DIR / str(size)
+  work_dir.mkdir()
+  generate_dataset(config.DATA_DIR, size)
+  results = {'ingest_csv': time_seed(work_dir / 'csv.db')}
+  # The CSV load leaves the database without a snapshot; export it so the
+  # next seed takes the snapshot path.
+  db = new_session(work_dir / 'csv.db')
+  try:
+    snapshot.export_snapshot(
+      db, config.SNAPSHOT_DIR,
+      snapshot.fingerprint_sources(ingest.source_paths())
+    )
+  finally:
+    db.close()
+  results['ingest_snapshot'] = time_seed(work_dir / 'snapshot.db')
+
+  db = new_session(work_dir / 'csv.db')
+  app.dependency_overrides[get_db] = lambda: db
+  try:
+    client = TestClient(app)
+    name = busiest_campaign(db)
+    for case, url in ENDPOINTS.items():
+      results[case] = time_endpoint(client, url.format(name=name), repeats)
+  finally:
+    app.dependency_overrides.clear()
+    db.close()
+
+  return results
+
+
+def regressions(
+  results: Dict[str, Dict[str, Result]],
+  baseline: Dict[str, Dict[str, Result]],
+  latency_threshold: float,
+  min_delta_ms: float,
+  query_threshold: int
+) -> List[str]:
+  failures = []
+  for size, cases in results.items():
+    for case, result in cases.items():
+      expected = baseline.get(size, {}).get(case)
+      if expected is None:
+        continue
+
+      delta = result['median_ms'] - expected['median_ms']
+      if (
+        result['median_ms'] > expected['median_ms'] * (1 + latency_threshold)
+        and delta >= min_delta_ms
+      ):
+        failures.append(
+          f'{case} @ {size}: median {result["median_ms"]:.1f} ms vs '
+          f'{expected["median_ms"]:.1f} ms baseline'
+        )
+      if 'queries' in expected and (
+        result['queries'] > expected['queries'] + query_threshold
+      ):
+        failures.append(
+          f'{case} @ {size}: {result["queries"]} queries vs '
+          f'{expected["queries"]} baseline'
+        )
+
+  return failures
+
+
+def print_results(
+  results: Dict[str, Dict[str, Result]],
+  baseline: Dict[str, Dict[str, Result]]
+) -> None:
+  print(
+    f'{"case":<20} {"size":>9} {"median ms":>10} {"p95 ms":>9} '
+    f'{"queries":>8} {"vs base":>8}'
+  )
+  for size, cases in results.items():
+    for case, result in cases.items():
+      expected = baseline.get(size, {}).get(case)
+      change = (
+        f'{result["median_ms"] / expected["median_ms"] - 1:+8.0%}'
+        if expected else f'{"-":>8}'
+      )
+      queries = result.get('queries', '-')
+      print(
+        f'{case:<20} {int(size):>9,} {result["median_ms"]:>10.1f} '
+        f'{result["p95_ms"]:>9.1f} {queries:>8} {change}'
+      )
+
+
+def load_baseline(path: Path) -> Dict[str, Dict[str, Result]]:
+  if not path.exists():
+    return {}
+
+  return json.loads(path.read_text())['results']
+
+
+def save_baseline(path: Path, results: Dict[str, Dict[str, Result]]) -> None:
+  path.parent.mkdir(parents=True, exist_ok=True)
+  path.write_text(json.dumps({
+    'machine': {
+      'python': platform.python_version(),
+      'platform': platform.platform(),
+      'cpus': os.cpu_count(),
+    },
+    'results': {
+      size: {
+        case: {key: round(value, 3) for key, value in result.items()}
+        for case, result in cases.items()
+      }
+      for size, cases in results.items()
+    },
+  }, indent=2) + '\n')
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+  parser.add_argument('--repeats', type=int, default=REPEATS)
+  parser.add_argument('--baseline', type=Path, default=DEFAULT_BASELINE)
+  parser.add_argument(
+    '--save', action='store_true', help='store the results as the baseline'
+  )
+  parser.add_argument('--latency-threshold', type=float, default=0.25)
+  parser.add_argument('--min-delta-ms', type=float, default=2.0)
+  parser.add_argument('--query-threshold', type=int, default=0)
+  arguments = parser.parse_args(argv)
+
+  results = {
+    str(size): run_size(size, arguments.repeats) for size in arguments.sizes
+  }
+  baseline = load_baseline(arguments.baseline)
+  print_results(results, baseline)
+
+  if arguments.save:
+    save_baseline(arguments.baseline, results)
+    print(f'baseline saved to {arguments.baseline}')
+    return 0
+
+  failures = regressions(
+    results, baseline, arguments.latency_threshold, arguments.min_delta_ms,
+    arguments.query_threshold
+  )
+  for failure in failures:
+    print(f'REGRESSION {failure}', file=sys.stderr)
+  return 1 if failures else 0
+
+
+if __name__ == '__main__':
+  sys.exit(main())
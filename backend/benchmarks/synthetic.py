@@ -0,0 +1,555 @@
+"""Generate seeded synthetic source CSVs at production scale.
+
+Writes `bd_campanias_agrupado.csv`, `bd_campanias_periodos.csv` and
+`bd_campanias_sitios.csv` with the columns of the bundled files, ready for
+the ingest. Site rows are bookings of a pool of physical sites: every
+campaign books a block of sites for each catorcena it runs. Campaign sizes
+and site impacts are log-normal, zones are weighted by population and
+demographics are Dirichlet draws, and the same seed always writes the
+same files.
+
+Every column is drawn with NumPy. Each physical site, catorcena and
+campaign is formatted once, and a chunk of site rows is a single join of
+those fragments picked by index, so 10 million rows take seconds instead
+of formatting every field of every row.
+
+Usage (from `backend/`):
+
+  python -m benchmarks.synthetic --sites 1000000 --output /tmp/synthetic
+  python -m benchmarks.synthetic --sites 1000000 --output /tmp/synthetic \\
+    --database /tmp/synthetic/campaigns.db
+"""
+import argparse
+import csv
+import time
+from dataclasses import dataclass
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app import config
+from app.periods import CATORCENA_DAYS, CATORCENA_EPOCH
+
+CHUNK_ROWS = 500_000
+ROWS_PER_CAMPAIGN = 1_000
+MIN_CAMPAIGNS = 12
+ROWS_PER_PHYSICAL_SITE = 20
+FIRST_MONTH = date(2023, 1, 1)
+MONTHS = 36
+MONTHLY_SHARE = 0.65
+
+# (estado, municipio, zm); each zone's population is split evenly among its
+# municipios and weights where sites are placed.
+ZONES = {
+  'Valle de Mexico': (22_057_420, [
+    ('Ciudad de Mexico', 'Cuauhtemoc'),
+    ('Ciudad de Mexico', 'Benito Juarez'),
+    ('Ciudad de Mexico', 'Miguel Hidalgo'),
+    ('Ciudad de Mexico', 'Alvaro Obregon'),
+    ('Ciudad de Mexico', 'Iztapalapa'),
+    ('Ciudad de Mexico', 'Azcapotzalco'),
+    ('Mexico', 'Naucalpan de Juarez'),
+    ('Mexico', 'Tlalnepantla de Baz'),
+  ]),
+  'Monterrey': (5_204_346, [
+    ('Nuevo Leon', 'Monterrey'),
+    ('Nuevo Leon', 'San Pedro Garza Garcia'),
+    ('Nuevo Leon', 'Guadalupe'),
+    ('Nuevo Leon', 'Apodaca'),
+  ]),
+  'Guadalajara': (5_268_642, [
+    ('Jalisco', 'Guadalajara'),
+    ('Jalisco', 'Zapopan'),
+    ('Jalisco', 'Tlaquepaque'),
+  ]),
+  'Puebla-Tlaxcala': (3_199_530, [('Puebla', 'Puebla')]),
+  'Toluca': (2_353_924, [('Mexico', 'Toluca')]),
+  'Queretaro': (1_594_212, [('Queretaro', 'Queretaro')]),
+  'San Luis Potosi': (1_236_439, [
+    ('San Luis Potosi', 'San Luis Potosi'),
+    ('San Luis Potosi', 'Soledad de Graciano Sanchez'),
+  ]),
+  'Mexicali': (1_049_792, [('Baja California', 'Mexicali')]),
+  'Chihuahua': (988_065, [('Chihuahua', 'Chihuahua')]),
+  'Hermosillo': (958_425, [('Sonora', 'Hermosillo')]),
+}
+
+# (tipo_de_mueble, share of sites, share of them that are digital)
+FURNITURE = [
+  ('Relojes', 0.32, 0.2),
+  ('Vallas', 0.27, 0.1),
+  ('Espectacular o Cartelera', 0.14, 0.3),
+  ('Muros', 0.14, 0.0),
+  ('Pantalla Digital', 0.12, 1.0),
+  ('Kiosko', 0.01, 0.0),
+]
+
+NSE_ALPHA = [8, 10, 8, 4, 0.5, 9]
+AGE_ALPHA = [15, 5, 6, 18, 17, 25, 11]
+HOURLY_PROFILE = np.array([
+  0.2, 0.16, 0.12, 0.1, 0.11, 0.12, 0.28, 0.45, 0.6, 0.78, 0.95, 0.88,
+  0.95, 0.93, 0.94, 0.9, 0.82, 0.77, 0.68, 0.63, 0.46, 0.34, 0.27, 0.25
+])
+
+CAMPAIGN_HEADER = [
+  'name', 'sites', 'periods', 'tipo_campania', 'fecha_inicio', 'fecha_fin',
+  'universo_zona_metro', 'impactos_personas', 'impactos_vehiculos',
+  'frecuencia_calculada', 'frecuencia_promedio', 'alcance', 'nse_ab', 'nse_c',
+  'nse_cmas', 'nse_d', 'nse_dmas', 'nse_e', 'edad_0a14', 'edad_15a19',
+  'edad_20a24', 'edad_25a34', 'edad_35a44', 'edad_45a64', 'edad_65mas',
+  'hombres', 'mujeres',
+] + [f'hourly_vehicle_count_{hour:02d}' for hour in range(24)]
+
+PERIOD_HEADER = [
+  'name', 'tipo_campania', 'period', 'impactos_periodo_personas',
+  'impactos_periodo_vehículos'
+]
+
+SITE_HEADER = [
+  'codigo_del_sitio', 'tipo_de_mueble', 'tipo_de_anuncio', 'disponible',
+  'estado', 'municipio', 'zm', 'nivel_socioeconomico_ab',
+  'nivel_socioeconomico_c_mas', 'nivel_socioeconomico_c',
+  'nivel_socioeconomico_d', 'nivel_socioeconomico_e',
+  'nivel_socioeconomico_d_mas', 'cero_catorce', 'quince_diecinueve',
+  'veinte_veinticuatro', 'veinticinco_treintaycuatro',
+  'treintaycinco_cuarentaycuatro', 'cuarentaycinco_sesentaycuatro',
+  'sesentaycinco_mas', 'per_muj', 'per_hom', 'frecuencia_catorcenal',
+  'frecuencia_mensual', 'exposicion_promedio_catorcenal',
+  'impactos_catorcenal', 'alcance_vehiculos_catorcenal', 'id_fourteen', 'mes',
+  'impactos_mensuales', 'alcance_mensual', 'impactos_mensuales_prom_min_max',
+  'alcance_mensuales_prom_min_max', 'name', 'fecha_uso_inicio',
+  'fecha_uso_fin'
+]
+
+# Source NSE column order (ab, c_mas, c, d, e, d_mas) as campaign columns.
+CAMPAIGN_NSE_ORDER = [0, 2, 1, 5, 3, 4]
+
+
+@dataclass
+class PhysicalSites:
+  zone: np.ndarray
+  # Per site: impactos_catorcenal, alcance_mensual, frecuencia_mensual and
+  # the NSE, age and mujeres shares weighted by impactos_catorcenal.
+  values: np.ndarray
+  head: List[bytes]
+  tail: List[bytes]
+
+
+@dataclass
+class CampaignPlan:
+  monthly: np.ndarray
+  first_catorcena: np.ndarray
+  catorcenas: np.ndarray
+  rows: np.ndarray
+  row_starts: np.ndarray
+  site_offsets: np.ndarray
+  starts: List[date]
+  ends: List[date]
+
+  @property
+  def sites(self) -> np.ndarray:
+    return -(-self.rows // self.catorcenas)
+
+
+def generate_dataset(
+  output_dir: Path,
+  site_rows: int,
+  seed: int = 0,
+  campaign_count: Optional[int] = None,
+  chunk_rows: int = CHUNK_ROWS
+) -> Dict[str, int]:
+  """Write the three source files; returns the rows written to each."""
+  generator = np.random.default_rng(seed)
+  campaign_count = min(
+    campaign_count or max(MIN_CAMPAIGNS, site_rows // ROWS_PER_CAMPAIGN),
+    site_rows
+  )
+  output_dir.mkdir(parents=True, exist_ok=True)
+
+  plan = _plan_campaigns(generator, campaign_count, site_rows)
+  pool_size = max(
+    site_rows // ROWS_PER_PHYSICAL_SITE, int(plan.sites.max())
+  )
+  plan.site_offsets = generator.integers(0, pool_size, campaign_count)
+  sites = _physical_sites(generator, pool_size)
+  _write_sites(output_dir / config.SITES_FILE, plan, sites, chunk_rows)
+  period_rows = _write_campaigns(
+    output_dir, generator, plan, _campaign_totals(plan, sites)
+  )
+
+  return {
+    config.CAMPAIGNS_FILE: campaign_count,
+    config.PERIODS_FILE: period_rows,
+    config.SITES_FILE: site_rows,
+  }
+
+
+def _plan_campaigns(
+  generator: np.random.Generator, campaign_count: int, site_rows: int
+) -> CampaignPlan:
+  """Type, dates and booked rows of every campaign."""
+  weights = generator.lognormal(0, 1.2, campaign_count)
+  rows = generator.multinomial(
+    site_rows - campaign_count, weights / weights.sum()
+  ) + 1
+  monthly = generator.random(campaign_count) < MONTHLY_SHARE
+
+  first_month = generator.integers(0, MONTHS, campaign_count)
+  month_count = generator.integers(1, 13, campaign_count)
+  month_starts = (
+    np.datetime64(FIRST_MONTH, 'M') + first_month
+  ).astype('datetime64[D]')
+  month_ends = (
+    np.datetime64(FIRST_MONTH, 'M') + first_month + month_count
+  ).astype('datetime64[D]') - 1
+
+  # Monthly campaigns book the catorcenas starting within their months.
+  epoch = np.datetime64(CATORCENA_EPOCH, 'D')
+  first_catorcena = np.where(
+    monthly,
+    -(-(month_starts - epoch).astype(np.int64) // CATORCENA_DAYS),
+    (month_starts - epoch).astype(np.int64) // CATORCENA_DAYS
+  )
+  catorcenas = np.where(
+    monthly,
+    (month_ends - epoch).astype(np.int64) // CATORCENA_DAYS
+    - first_catorcena + 1,
+    generator.integers(1, 5, campaign_count)
+  )
+  catorcena_starts = epoch + first_catorcena * CATORCENA_DAYS
+  starts = np.where(monthly, month_starts, catorcena_starts)
+  ends = np.where(
+    monthly, month_ends,
+    catorcena_starts + catorcenas * CATORCENA_DAYS - 1
+  )
+
+  return CampaignPlan(
+    monthly=monthly,
+    first_catorcena=first_catorcena,
+    catorcenas=catorcenas,
+    rows=rows,
+    row_starts=np.concatenate(([0], np.cumsum(rows)[:-1])),
+    site_offsets=np.zeros(campaign_count, dtype=np.int64),
+    starts=starts.astype(date).tolist(),
+    ends=ends.astype(date).tolist()
+  )
+
+
+def _physical_sites(
+  generator: np.random.Generator, count: int
+) -> PhysicalSites:
+  """Fixed attributes of each site, formatted around its booking columns."""
+  places = [
+    (estado, municipio, zm, population / len(municipios))
+    for zm, (population, municipios) in ZONES.items()
+    for estado, municipio in municipios
+  ]
+  zone_names = list(ZONES)
+  population = np.array([place[3] for place in places])
+  place = generator.choice(len(places), count, p=population / population.sum())
+  zone = np.array([zone_names.index(p[2]) for p in places])[place]
+
+  furniture_share = np.array([share for _, share, _ in FURNITURE])
+  furniture = generator.choice(len(FURNITURE), count, p=furniture_share)
+  digital = generator.random(count) < np.array(
+    [share for _, _, share in FURNITURE]
+  )[furniture]
+  labels = [
+    f'{kind},{"Digital" if is_digital else "Tradicional"},Sí,'
+    f'{estado},{municipio},{zm},'.encode()
+    for kind, _, _ in FURNITURE
+    for is_digital in (False, True)
+    for estado, municipio, zm, _ in places
+  ]
+  label = (furniture * 2 + digital) * len(places) + place
+
+  nse = generator.dirichlet(NSE_ALPHA, count)
+  age = generator.dirichlet(AGE_ALPHA, count)
+  mujeres = np.clip(generator.normal(0.5, 0.03, count), 0.35, 0.65)
+  frecuencia_mensual = generator.uniform(9, 25, count)
+  frecuencia_catorcenal = frecuencia_mensual * generator.uniform(
+    0.72, 0.8, count
+  )
+  exposicion = generator.uniform(2, 60, count)
+  impactos_mensuales = np.maximum(
+    generator.lognormal(np.log(870_000), 1.0, count), 20_000
+  ).astype(np.int64)
+  impactos_catorcenal = (
+    impactos_mensuales * generator.uniform(0.45, 0.55, count)
+  ).astype(np.int64)
+  alcance_mensual = impactos_mensuales / frecuencia_mensual
+  alcance_vehiculos = (
+    impactos_catorcenal / frecuencia_catorcenal
+    * generator.uniform(0.5, 1, count)
+  )
+  shares = _share_columns(np.hstack([
+    nse, age, mujeres[:, None], 1 - mujeres[:, None]
+  ]))
+
+  head = [
+    b'SINT-%08d,%s%s%.4f,%.4f,%.4f,%d,%.2f,' % (
+      index, labels[where], site_shares, catorcenal, mensual, exposure,
+      impacts, reach
+    )
+    for index, (
+      where, site_shares, catorcenal, mensual, exposure, impacts, reach
+    ) in enumerate(zip(
+      label.tolist(), shares, frecuencia_catorcenal.tolist(),
+      frecuencia_mensual.tolist(), exposicion.tolist(),
+      impactos_catorcenal.tolist(), alcance_vehiculos.tolist()
+    ))
+  ]
+  tail = [
+    b',%d,%.2f,%d,%.2f' % (impacts, reach, impacts, reach)
+    for impacts, reach in zip(
+      impactos_mensuales.tolist(), alcance_mensual.tolist()
+    )
+  ]
+
+  weighted = impactos_catorcenal[:, None] * np.hstack([
+    nse, age, mujeres[:, None]
+  ])
+  return PhysicalSites(
+    zone=zone,
+    values=np.column_stack([
+      impactos_catorcenal, alcance_mensual, frecuencia_mensual, weighted
+    ]),
+    head=head,
+    tail=tail
+  )
+
+
+def _share_columns(shares: np.ndarray) -> List[bytes]:
+  """`0.dddddd,` for every share of a row, formatted with array arithmetic."""
+  micro = np.minimum(np.rint(shares * 1e6), 999_999).astype(np.int64)
+  text = np.empty(shares.shape + (9,), dtype=np.uint8)
+  text[..., :2] = np.frombuffer(b'0.', dtype=np.uint8)
+  text[..., 2:8] = micro[..., None] // 10 ** np.arange(5, -1, -1) % 10 + 48
+  text[..., 8] = ord(',')
+  return text.reshape(len(shares), -1).view(
+    f'S{9 * shares.shape[1]}'
+  ).ravel().tolist()
+
+
+def _write_sites(
+  path: Path, plan: CampaignPlan, sites: PhysicalSites, chunk_rows: int
+) -> None:
+  pool_size = len(sites.head)
+  catorcena_range = np.arange(
+    int(plan.first_catorcena.min()),
+    int((plan.first_catorcena + plan.catorcenas).max())
+  )
+  periods = np.array([
+    f'{_catorcena_label(number)},{_catorcena_month(number)}'.encode()
+    for number in catorcena_range.tolist()
+  ], dtype=object)
+  campaign_text = np.array([
+    f',campania_{index},{start.isoformat()},{end.isoformat()}\n'.encode()
+    for index, (start, end) in enumerate(zip(plan.starts, plan.ends))
+  ], dtype=object)
+  head = np.array(sites.head, dtype=object)
+  tail = np.array(sites.tail, dtype=object)
+
+  total_rows = int(plan.rows.sum())
+  with open(path, 'wb') as target:
+    target.write(','.join(SITE_HEADER).encode() + b'\n')
+    for start in range(0, total_rows, chunk_rows):
+      rows = np.arange(start, min(start + chunk_rows, total_rows))
+      campaign = np.searchsorted(plan.row_starts, rows, side='right') - 1
+      position = rows - plan.row_starts[campaign]
+      catorcenas = plan.catorcenas[campaign]
+      catorcena = plan.first_catorcena[campaign] + position % catorcenas
+      site = (plan.site_offsets[campaign] + position // catorcenas) % pool_size
+
+      parts = np.empty((len(rows), 4), dtype=object)
+      parts[:, 0] = head[site]
+      parts[:, 1] = periods[catorcena - catorcena_range[0]]
+      parts[:, 2] = tail[site]
+      parts[:, 3] = campaign_text[campaign]
+      target.write(b''.join(parts.ravel().tolist()))
+
+
+def _campaign_totals(
+  plan: CampaignPlan, sites: PhysicalSites
+) -> Dict[str, np.ndarray]:
+  """Sums over each campaign's rows, from prefix sums over the site pool.
+
+  A campaign books a contiguous (wrapping) block of the pool for each of
+  its catorcenas, except for the last site, which is booked for the rows
+  left over, so no pass over the rows is needed.
+  """
+  pool_size = len(sites.head)
+  values = np.vstack([
+    np.zeros(sites.values.shape[1]), np.cumsum(sites.values, axis=0)
+  ])
+  zones = np.vstack([
+    np.zeros(len(ZONES), dtype=np.int64),
+    np.cumsum(np.eye(len(ZONES), dtype=np.int64)[sites.zone], axis=0)
+  ])
+
+  def block(prefix: np.ndarray, length: np.ndarray) -> np.ndarray:
+    end = plan.site_offsets + length
+    return (
+      prefix[np.minimum(end, pool_size)] - prefix[plan.site_offsets]
+      + prefix[np.maximum(end - pool_size, 0)]
+    )
+
+  last_site = (plan.site_offsets + plan.sites - 1) % pool_size
+  last_rows = plan.rows - (plan.sites - 1) * plan.catorcenas
+  sums = (
+    block(values, plan.sites - 1) * plan.catorcenas[:, None]
+    + sites.values[last_site] * last_rows[:, None]
+  )
+
+  return {
+    'impactos': sums[:, 0],
+    'alcance': sums[:, 1],
+    'frecuencia': sums[:, 2],
+    'demographics': sums[:, 3:],
+    'zones': block(zones, plan.sites) > 0,
+  }
+
+
+def _write_campaigns(
+  output_dir: Path,
+  generator: np.random.Generator,
+  plan: CampaignPlan,
+  totals: Dict[str, np.ndarray]
+) -> int:
+  """Write the campaigns and their periods; returns the period rows."""
+  campaign_count = len(plan.rows)
+  populations = np.array([population for population, _ in ZONES.values()])
+  universes = totals['zones'] @ populations
+  impactos = totals['impactos'].astype(np.int64)
+  vehiculos = (impactos * generator.uniform(0.4, 0.8, campaign_count)).astype(
+    np.int64
+  )
+  alcance = np.minimum(
+    totals['alcance'] / plan.catorcenas, universes
+  ).astype(np.int64).clip(1)
+  demographics = totals['demographics'] / np.maximum(impactos, 1)[:, None]
+  hourly = (
+    HOURLY_PROFILE * generator.lognormal(np.log(12_000), 0.8, (
+      campaign_count, 1
+    ))
+  ).astype(np.int64)
+
+  period_rows = 0
+  with open(
+    output_dir / config.CAMPAIGNS_FILE, 'w', encoding='utf-8', newline=''
+  ) as campaigns_file, open(
+    output_dir / config.PERIODS_FILE, 'w', encoding='utf-8', newline=''
+  ) as periods_file:
+    campaigns = csv.writer(campaigns_file)
+    periods = csv.writer(periods_file)
+    campaigns.writerow(CAMPAIGN_HEADER)
+    periods.writerow(PERIOD_HEADER)
+    for index in range(campaign_count):
+      name = f'campania_{index}'
+      campaign_type = 'mensual' if plan.monthly[index] else 'catorcenal'
+      labels = _period_labels(plan, index)
+      nse = demographics[index, :6][CAMPAIGN_NSE_ORDER]
+      mujeres = demographics[index, 13]
+      campaigns.writerow([
+        name, int(plan.sites[index]), ','.join(labels), campaign_type,
+        plan.starts[index].isoformat(), plan.ends[index].isoformat(),
+        int(universes[index]), int(impactos[index]), int(vehiculos[index]),
+        round(impactos[index] / alcance[index], 8),
+        round(totals['frecuencia'][index] / plan.rows[index], 2),
+        int(alcance[index]),
+        *np.round(nse, 10).tolist(),
+        *np.round(demographics[index, 6:13], 10).tolist(),
+        round(1 - mujeres, 10), round(mujeres, 10),
+        *hourly[index].tolist()
+      ])
+
+      shares = generator.uniform(0.9, 1.1, len(labels))
+      shares /= shares.sum()
+      periods.writerows(
+        [
+          name, campaign_type, label,
+          int(impactos[index] * share), int(vehiculos[index] * share)
+        ]
+        for label, share in zip(labels, shares.tolist())
+      )
+      period_rows += len(labels)
+
+  return period_rows
+
+
+def _period_labels(plan: CampaignPlan, index: int) -> List[str]:
+  if not plan.monthly[index]:
+    first = int(plan.first_catorcena[index])
+    return [
+      _catorcena_label(number)
+      for number in range(first, first + int(plan.catorcenas[index]))
+    ]
+
+  labels, month = [], plan.starts[index]
+  while month <= plan.ends[index]:
+    labels.append(f'{month.year}-{month.month:02d}')
+    month = (month + timedelta(days=31)).replace(day=1)
+  return labels
+
+
+def _catorcena_label(number: int) -> str:
+  """`YYYY-NN` of the `number`-th catorcena after the epoch."""
+  start = CATORCENA_EPOCH + timedelta(days=CATORCENA_DAYS * number)
+  year = (start + timedelta(days=CATORCENA_DAYS - 1)).year
+  first = (date(year, 1, 1) - CATORCENA_EPOCH).days // CATORCENA_DAYS
+  return f'{year}-{number - first + 1:02d}'
+
+
+def _catorcena_month(number: int) -> str:
+  start = CATORCENA_EPOCH + timedelta(days=CATORCENA_DAYS * number)
+  return f'{start.year}-{start.month:02d}'
+
+
+def ingest_dataset(data_dir: Path, database_path: Path) -> None:
+  """Load generated files into a new SQLite database through the ingest."""
+  from sqlalchemy import create_engine
+  from sqlalchemy.orm import sessionmaker
+
+  from app import ingest
+  from app.migrations import upgrade_database
+
+  engine = create_engine(f'sqlite:///{database_path}')
+  upgrade_database(engine)
+  db = sessionmaker(bind=engine)()
+  try:
+    ingest.ingest_csv_files(db, data_dir, report_dir=data_dir)
+  finally:
+    db.close()
+    engine.dispose()
+
+
+def main() -> None:
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument('--sites', type=int, default=1_000_000)
+  parser.add_argument('--campaigns', type=int, default=None)
+  parser.add_argument('--seed', type=int, default=0)
+  parser.add_argument('--output', type=Path, required=True)
+  parser.add_argument(
+    '--database', type=Path, default=None,
+    help='also ingest the generated files into this SQLite database'
+  )
+  arguments = parser.parse_args()
+
+  started = time.perf_counter()
+  rows = generate_dataset(
+    arguments.output, arguments.sites, arguments.seed, arguments.campaigns
+  )
+  for file_name, count in rows.items():
+    print(f'{file_name}: {count:,} rows')
+  print(f'generated in {time.perf_counter() - started:.1f}s')
+
+  if arguments.database is not None:
+    started = time.perf_counter()
+    ingest_dataset(arguments.output, arguments.database)
+    print(f'ingested in {time.perf_counter() - started:.1f}s')
+
+
+if __name__ == '__main__':
+  main()
@@ -1,92 +1,95 @@
-import pandas as pd
-from datetime import datetime
-from app.database import SessionLocal, engine
-from app.models import Base, Campaign, CampaignPeriod, CampaignSite
+import argparse
+import sys
 
+from app import config, ingest, versions
+from app.database import SessionLocal, engine
+from app.migrations import upgrade_database
 
-def clean_number(x):
-  if isinstance(x, str) and '-' in x:
-    return int(x.split('-')[0])
 
-  return x
+def report_progress(file_name: str, written_rows: int) -> None:
+  sys.stderr.write(f'\r{file_name}: {written_rows:,} rows')
+  sys.stderr.flush()
 
 
-def load_data():
-  Base.metadata.create_all(bind=engine)
+def load_data(workers: int, chunk_size: int, resume: bool) -> None:
+  upgrade_database(engine)
   db = SessionLocal()
 
   try:
-    df_agrupado = pd.read_csv('data/bd_campanias_agrupado.csv')
-    df_periodos = pd.read_csv('data/bd_campanias_periodos.csv')
-    df_sitios = pd.read_csv('data/bd_campanias_sitios.csv')
-
-    df_periodos['impactos_periodo_vehiculos'] = (
-      df_periodos['impactos_periodo_vehículos'].apply(clean_number)
+    ingest.ingest_csv_files(
+      db,
+      config.DATA_DIR,
+      workers=workers,
+      chunk_size=chunk_size,
+      on_progress=report_progress,
+      resume=resume
     )
+    sys.stderr.write('\n')
+  except Exception:
+    db.rollback()
+    raise
+  finally:
+    db.close()
 
-    for _, row in df_agrupado.iterrows():
-      campaign = Campaign(
-        name=row['name'],
-        tipo_campania=row['tipo_campania'],
-        fecha_inicio=datetime.strptime(row['fecha_inicio'], '%Y-%m-%d').date(),
-        fecha_fin=datetime.strptime(row['fecha_fin'], '%Y-%m-%d').date(),
-        universo_zona_metro=row['universo_zona_metro'],
-        impactos_personas=row['impactos_personas'],
-        impactos_vehiculos=row['impactos_vehiculos'],
-        frecuencia_calculada=row['frecuencia_calculada'],
-        frecuencia_promedio=row['frecuencia_promedio'],
-        alcance=row['alcance'],
-        nse_ab=row['nse_ab'],
-        nse_c=row['nse_c'],
-        nse_cmas=row['nse_cmas'],
-        nse_d=row['nse_d'],
-        nse_dmas=row['nse_dmas'],
-        nse_e=row['nse_e'],
-        edad_0a14=row['edad_0a14'],
-        edad_15a19=row['edad_15a19'],
-        edad_20a24=row['edad_20a24'],
-        edad_25a34=row['edad_25a34'],
-        edad_35a44=row['edad_35a44'],
-        edad_45a64=row['edad_45a64'],
-        edad_65mas=row['edad_65mas'],
-        hombres=row['hombres'],
-        mujeres=row['mujeres']
-      )
-      db.add(campaign)
 
-    for _, row in df_periodos.iterrows():
-      period = CampaignPeriod(
-        campaign_name=row['name'],
-        period=row['period'],
-        impactos_periodo_personas=row['impactos_periodo_personas'],
-        impactos_periodo_vehiculos=row['impactos_periodo_vehiculos']
-      )
-      db.add(period)
+def prepare_data() -> None:
+  """Seed the database if it is empty and export its columnar snapshot.
 
-    for _, row in df_sitios.iterrows():
-      site = CampaignSite(
-        campaign_name=row['name'],
-        codigo_del_sitio=row['codigo_del_sitio'],
-        tipo_de_mueble=row['tipo_de_mueble'],
-        tipo_de_anuncio=row['tipo_de_anuncio'],
-        estado=row['estado'],
-        municipio=row['municipio'],
-        zm=row['zm'],
-        frecuencia_catorcenal=row['frecuencia_catorcenal'],
-        frecuencia_mensual=row['frecuencia_mensual'],
-        impactos_catorcenal=row['impactos_catorcenal'],
-        impactos_mensuales=row['impactos_mensuales'],
-        alcance_mensual=row['alcance_mensual']
-      )
-      db.add(site)
+  This is the server's startup work, done once so that workers started with
+  DATABASE_READ_ONLY=1 only open what it leaves behind.
+  """
+  upgrade_database(engine)
+  db = SessionLocal()
 
-    db.commit()
-  except Exception as e:
-    print(f"Error: {e}")
-    db.rollback()
+  try:
+    ingest.seed_database_if_empty(db)
+    ingest.prepare_dataset_snapshot(db)
   finally:
     db.close()
 
 
+def refresh_data(workers: int, chunk_size: int) -> None:
+  """Build the CSVs into a new dataset version and publish it.
+
+  Servers switch to it within DATASET_CHECK_INTERVAL_S, without a restart.
+  """
+  version = versions.build_version(
+    config.VERSIONS_DIR,
+    config.DATA_DIR,
+    workers=workers,
+    chunk_size=chunk_size,
+    on_progress=report_progress
+  )
+  sys.stderr.write(f'\npublished dataset version {version}\n')
+
+
 if __name__ == "__main__":
-  load_data()
+  parser = argparse.ArgumentParser(description='Load the CSV sources.')
+  parser.add_argument('--workers', type=int, default=config.INGEST_WORKERS)
+  parser.add_argument(
+    '--chunk-size', type=int, default=ingest.DEFAULT_CHUNK_SIZE
+  )
+  parser.add_argument(
+    '--resume',
+    action='store_true',
+    help='continue an interrupted load after its last committed chunk'
+  )
+  parser.add_argument(
+    '--prepare',
+    action='store_true',
+    help='only seed an empty database and export the snapshot for '
+    'read-only workers'
+  )
+  parser.add_argument(
+    '--refresh',
+    action='store_true',
+    help='build a new dataset version beside the served one and publish '
+    'it once it validates'
+  )
+  arguments = parser.parse_args()
+  if arguments.prepare:
+    prepare_data()
+  elif arguments.refresh:
+    refresh_data(arguments.workers, arguments.chunk_size)
+  else:
+    load_data(arguments.workers, arguments.chunk_size, arguments.resume)
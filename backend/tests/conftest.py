@@ -1,9 +1,12 @@
+from datetime import date
+
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
-from app.main import app, get_db
+from app import models, snapshot
+from app.main import app, get_campaign_index, get_db
 from app.database import Base
 
 # Use an in-memory SQLite database for testing
@@ -12,7 +15,12 @@ SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
 engine = create_engine(
   SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
 )
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+TestingSessionLocal = sessionmaker(
+  autocommit=False, autoflush=False, bind=engine
+)
+
+# Snapshots exported by the tests are keyed on a made-up source file.
+SNAPSHOT_SOURCES = {"bd_campanias_agrupado.csv": [10, 1]}
 
 @pytest.fixture(scope="module")
 def db_engine():
@@ -40,6 +48,53 @@ def client(db):
       pass # Do not close here, let the fixture handle it
 
   app.dependency_overrides[get_db] = override_get_db
+  # The bitmap index is built from the served dataset, not the test
+  # database, so list filters fall back to SQL unless a test provides one.
+  app.dependency_overrides[get_campaign_index] = lambda: None
   with TestClient(app) as c:
     yield c
   app.dependency_overrides.clear()
+
+@pytest.fixture
+def create_campaign(db):
+  """Factory adding a monthly campaign; keywords override its columns."""
+  def create(name: str, **columns) -> models.Campaign:
+    campaign = models.Campaign(**{
+      "name": name,
+      "tipo_campania": "mensual",
+      "fecha_inicio": date(2024, 10, 1),
+      **columns
+    })
+    db.add(campaign)
+    db.commit()
+    return campaign
+
+  return create
+
+@pytest.fixture
+def book_site(db):
+  """Factory booking a site in October 2024; keywords override its columns."""
+  def book(
+    campaign_name: str, codigo: str, **columns
+  ) -> models.CampaignSite:
+    site = models.CampaignSite(**{
+      "campaign_name": campaign_name,
+      "codigo_del_sitio": codigo,
+      "mes": "2024-10",
+      **columns
+    })
+    db.add(site)
+    db.commit()
+    return site
+
+  return book
+
+@pytest.fixture
+def export_snapshot(db, tmp_path):
+  """Factory exporting the test database to a snapshot and opening it."""
+  def export(name: str = "snapshot") -> snapshot.Snapshot:
+    directory = tmp_path / name
+    snapshot.export_snapshot(db, directory, SNAPSHOT_SOURCES)
+    return snapshot.open_snapshot(directory)
+
+  return export
@@ -6,7 +6,7 @@ from datetime import date
 import pytest
 from fastapi.testclient import TestClient
 
-from app import models
+from app import geo, models
 
 
 def create_campaign(
@@ -84,6 +84,12 @@ def create_period(db, campaign_name: str, period: str) -> models.CampaignPeriod:
   return p
 
 
+def query_count(response) -> int:
+  """Helper reading the SQL statements counted in Server-Timing."""
+  db_timing = response.headers["server-timing"].split(", ")[0]
+  return int(db_timing.split('desc="')[1].split()[0])
+
+
 class TestRootEndpoint:
   """Tests for root endpoint."""
 
@@ -175,6 +181,23 @@ class TestCampaignsListEndpoint:
     assert data["total"] == 1
     assert data["data"][0]["name"] == "Jan"
 
+  def test_filter_by_overlapping_dates(self, client: TestClient, db):
+    """Overlap mode returns campaigns running during the range."""
+    create_campaign(
+      db, "Jan", inicio=date(2023, 1, 1), fin=date(2023, 1, 31)
+    )
+    create_campaign(
+      db, "Mar", inicio=date(2023, 3, 1), fin=date(2023, 3, 31)
+    )
+
+    response = client.get(
+      "/campaigns/?fecha_inicio=2023-01-15&fecha_fin=2023-02-15"
+      "&date_mode=overlap"
+    )
+    data = response.json()
+    assert data["total"] == 1
+    assert data["data"][0]["name"] == "Jan"
+
   def test_invalid_limit_zero(self, client: TestClient):
     """Returns 422 for limit=0."""
     response = client.get("/campaigns/?limit=0")
@@ -190,6 +213,21 @@ class TestCampaignsListEndpoint:
     response = client.get("/campaigns/?limit=101")
     assert response.status_code == 422
 
+  def test_facets(self, client: TestClient, db):
+    """Facet counts are returned on request, in a single extra query."""
+    create_campaign(db, "Camp1")
+    create_site(db, "Camp1", "S1")
+    geo.build_geo_rollups(db.connection())
+
+    plain = client.get("/campaigns/")
+    faceted = client.get("/campaigns/", params={"facets": True})
+
+    assert plain.json()["facets"] is None
+    facets = faceted.json()["facets"]
+    assert facets["tipo_campania"] == [{"value": "mensual", "count": 1}]
+    assert facets["estado"] == [{"value": "Activo", "count": 1}]
+    assert query_count(faceted) == query_count(plain) + 1
+
 
 class TestCampaignDetailEndpoint:
   """Tests for GET /campaigns/{campaign_id} endpoint."""
@@ -202,6 +240,20 @@ class TestCampaignDetailEndpoint:
     data = response.json()
     assert data["name"] == "DetailCamp"
 
+  def test_children_reference_campaign_id(self, client: TestClient, db):
+    """Periods and sites carry the campaign's integer id and name."""
+    campaign = create_campaign(db, "KeyedCamp")
+    create_period(db, "KeyedCamp", "2023-01")
+    create_site(db, "KeyedCamp", "S1")
+
+    data = client.get("/campaigns/KeyedCamp").json()
+
+    assert data["id"] == campaign.id
+    assert [
+      (child["campaign_id"], child["campaign_name"])
+      for child in data["periods"] + data["sites"]
+    ] == [(campaign.id, "KeyedCamp")] * 2
+
   def test_not_found(self, client: TestClient, db):
     """Returns 404 for non-existent campaign."""
     response = client.get("/campaigns/NonExistent")
@@ -252,6 +304,130 @@ class TestPeriodsSummaryEndpoint:
     assert response.status_code == 404
 
 
+class TestImpactsOverTimeEndpoint:
+  """Tests for GET /periods/impacts endpoint."""
+
+  def test_returns_buckets(self, client: TestClient, db):
+    """Returns the window re-bucketed to the requested granularity."""
+    create_campaign(db, "TimeCamp")
+    create_period(db, "TimeCamp", "2023-01")
+
+    response = client.get(
+      "/periods/impacts",
+      params={
+        "fecha_inicio": "2023-01-01",
+        "fecha_fin": "2023-02-28",
+        "granularity": "month"
+      }
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["granularity"] == "month"
+    assert [
+      (bucket["bucket_start"], bucket["people_impacts"])
+      for bucket in data["data"]
+    ] == [("2023-01-01", 1000), ("2023-02-01", 0)]
+
+  def test_unknown_campaign(self, client: TestClient, db):
+    """Returns 404 when filtering by a campaign that does not exist."""
+    response = client.get(
+      "/periods/impacts",
+      params={
+        "fecha_inicio": "2023-01-01",
+        "fecha_fin": "2023-01-31",
+        "campaign": "NonExistent"
+      }
+    )
+    assert response.status_code == 404
+
+  def test_reversed_window(self, client: TestClient):
+    """Returns 400 when the window ends before it starts."""
+    response = client.get(
+      "/periods/impacts",
+      params={"fecha_inicio": "2023-02-01", "fecha_fin": "2023-01-01"}
+    )
+    assert response.status_code == 400
+
+  def test_invalid_granularity(self, client: TestClient):
+    """Returns 422 for an unknown granularity."""
+    response = client.get(
+      "/periods/impacts",
+      params={
+        "fecha_inicio": "2023-01-01",
+        "fecha_fin": "2023-01-31",
+        "granularity": "year"
+      }
+    )
+    assert response.status_code == 422
+
+
+class TestGeoRollupEndpoint:
+  """Tests for GET /campaigns/{id}/geo endpoint."""
+
+  def test_drill_down(self, client: TestClient, db):
+    """Returns estados, then the municipios of one estado."""
+    create_campaign(db, "GeoCamp")
+    create_site(db, "GeoCamp", "S1")
+    geo.build_geo_rollups(db.connection())
+
+    response = client.get("/campaigns/GeoCamp/geo")
+    assert response.status_code == 200
+    estado = response.json()["data"][0]
+    assert (estado["name"], estado["sites"]) == ("Activo", 1)
+
+    response = client.get(
+      "/campaigns/GeoCamp/geo",
+      params={"level": "municipio", "estado_id": estado["id"]}
+    )
+    assert [row["name"] for row in response.json()["data"]] == ["TestCity"]
+
+  def test_drill_filter_needs_municipio_level(self, client: TestClient, db):
+    """Returns 400 when drilling filters target another level."""
+    create_campaign(db, "GeoCamp")
+    response = client.get(
+      "/campaigns/GeoCamp/geo", params={"level": "zm", "estado_id": 1}
+    )
+    assert response.status_code == 400
+
+  def test_not_found(self, client: TestClient, db):
+    """Returns 404 for non-existent campaign."""
+    response = client.get("/campaigns/NonExistent/geo")
+    assert response.status_code == 404
+
+
+class TestSiteDetailEndpoint:
+  """Tests for GET /sites/{codigo} endpoint."""
+
+  def test_returns_campaigns_and_months(self, client: TestClient, db):
+    """Lists every campaign booking the site and its monthly impacts."""
+    create_campaign(db, "First")
+    create_campaign(db, "Second", inicio=date(2023, 2, 1))
+    for campaign_name, mes in [
+      ("First", "2023-01"), ("First", "2023-01"), ("Second", "2023-02")
+    ]:
+      site = create_site(db, campaign_name, "S001")
+      site.mes = mes
+    db.commit()
+
+    response = client.get("/sites/S001")
+    assert response.status_code == 200
+    data = response.json()
+    assert (data["codigo_del_sitio"], data["municipio"]) == ("S001", "TestCity")
+    assert [
+      (campaign["name"], campaign["months"], campaign["impacts"])
+      for campaign in data["campaigns"]
+    ] == [("First", 1, 200), ("Second", 1, 200)]
+    assert [
+      (month["mes"], month["impacts"], month["campaigns"])
+      for month in data["impacts"]
+    ] == [("2023-01", 200, 1), ("2023-02", 200, 1)]
+
+  def test_not_found(self, client: TestClient, db):
+    """Returns 404 for an unregistered site code."""
+    response = client.get("/sites/NOPE")
+    assert response.status_code == 404
+
+
 class TestCampaignSummaryEndpoint:
   """Tests for GET /campaigns/{id}/summary endpoint."""
 
@@ -0,0 +1,247 @@
+"""
+Tests for the bitmap index of the campaign list filters.
+"""
+from datetime import date
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app import crud, geo
+from app.bitmaps import (
+  Bitmap, CampaignIndex, Demographic, build_campaign_index
+)
+from app.intervals import DateFilterMode
+from app.main import app, get_campaign_index
+
+@pytest.fixture
+def book_furniture(book_site):
+  """Factory booking a digital site of ZM1 in January 2023."""
+  def book(
+    campaign_name: str,
+    codigo: str,
+    estado: str,
+    municipio: str,
+    tipo_mueble: str
+  ) -> None:
+    book_site(
+      campaign_name,
+      codigo,
+      tipo_de_mueble=tipo_mueble,
+      tipo_de_anuncio="Digital",
+      estado=estado,
+      municipio=municipio,
+      zm="ZM1",
+      mes="2023-01"
+    )
+
+  return book
+
+
+@pytest.fixture
+def index(
+  db: Session, create_campaign, book_furniture, export_snapshot
+) -> CampaignIndex:
+  """Four campaigns with sites in two estados and two furniture types."""
+  create_campaign(
+    "Alpha",
+    fecha_inicio=date(2023, 1, 5), fecha_fin=date(2023, 2, 10), nse_ab=0.4
+  )
+  create_campaign(
+    "Beta", tipo_campania="catorcenal",
+    fecha_inicio=date(2023, 1, 20), fecha_fin=date(2023, 1, 30), nse_ab=0.1
+  )
+  create_campaign(
+    "Gamma",
+    fecha_inicio=date(2023, 3, 1), fecha_fin=date(2023, 3, 31), nse_ab=0.25
+  )
+  create_campaign("Delta", fecha_inicio=date(2022, 12, 1))
+  book_furniture("Alpha", "S1", "Jalisco", "Zapopan", "Billboard")
+  book_furniture("Alpha", "S2", "Nuevo Leon", "Monterrey", "Mupi")
+  book_furniture("Beta", "S1", "Jalisco", "Zapopan", "Billboard")
+  book_furniture("Gamma", "S3", "Jalisco", "Guadalajara", "Mupi")
+  geo.build_geo_rollups(db.connection())
+  db.commit()
+  return build_campaign_index(export_snapshot())
+
+
+FILTERS = [
+  {},
+  {"tipo_campania": "mensual"},
+  {"estado": ["Nuevo Leon"]},
+  {"estado": ["Jalisco"], "tipo_campania": "mensual"},
+  {"municipio": ["Zapopan", "Guadalajara"]},
+  {"tipo_de_mueble": ["Mupi"]},
+  {"tipo_de_mueble": ["Unknown"]},
+  {"fecha_inicio": date(2023, 1, 1), "fecha_fin": date(2023, 1, 31)},
+  {
+    "fecha_inicio": date(2023, 2, 1),
+    "fecha_fin": date(2023, 2, 28),
+    "date_mode": DateFilterMode.OVERLAP,
+  },
+  {
+    "fecha_inicio": date(2022, 12, 1),
+    "fecha_fin": date(2022, 12, 1),
+    "date_mode": DateFilterMode.OVERLAP,
+  },
+  {"demografia": Demographic.NSE_AB, "demografia_min": 0.25},
+  {"search": "ET"},
+  {"search": "a", "tipo_de_mueble": ["Billboard"]},
+]
+
+
+def query_count(response) -> int:
+  """Helper reading the SQL statements counted in Server-Timing."""
+  db_timing = response.headers["server-timing"].split(", ")[0]
+  return int(db_timing.split('desc="')[1].split()[0])
+
+
+class TestBitmap:
+  """Tests for the packed bitmap."""
+
+  def test_set_operations(self):
+    """AND, OR, count and positions agree with Python sets."""
+    left = Bitmap.from_positions(np.array([0, 3, 64, 129]), 130)
+    right = Bitmap.from_positions(np.array([3, 5, 129]), 130)
+
+    assert (left & right).positions().tolist() == [3, 129]
+    assert (left | right).count() == 5
+    assert Bitmap.full(130).count() == 130
+    assert Bitmap.empty(130).count() == 0
+
+
+class TestCampaignIndex:
+  """Tests for resolving list filters with the bitmap index."""
+
+  @pytest.mark.parametrize("filters", FILTERS)
+  def test_matches_sql_filters(self, db: Session, index, filters):
+    """Every filter combination matches the SQL page and total."""
+    sql_campaigns, sql_total = crud.get_campaigns_with_count(
+      db, limit=100, **filters
+    )
+    campaigns, total = crud.get_campaigns_with_count(
+      db, limit=100, index=index, **filters
+    )
+
+    assert total == sql_total
+    assert [c.name for c in campaigns] == [c.name for c in sql_campaigns]
+
+  @pytest.mark.parametrize("search,expected", [
+    ("%", ["50% Off"]),
+    ("_", ["Back_To_School"]),
+    ("\\", ["Path\\Name"]),
+    ("0%", ["50% Off"]),
+    ("_to_", ["Back_To_School"]),
+    ("a", ["Back_To_School", "Path\\Name"]),
+  ])
+  def test_search_matches_wildcards_literally(
+    self, db: Session, create_campaign, export_snapshot, search, expected
+  ):
+    """LIKE wildcards in a search match themselves in SQL and the index."""
+    for name in ("50% Off", "Back_To_School", "Path\\Name"):
+      create_campaign(
+        name,
+        fecha_inicio=date(2023, 4, 1), fecha_fin=date(2023, 4, 30), nse_ab=0.3
+      )
+    index = build_campaign_index(export_snapshot("wildcards"))
+
+    sql_campaigns, sql_total = crud.get_campaigns_with_count(
+      db, limit=100, search=search
+    )
+    campaigns, total = crud.get_campaigns_with_count(
+      db, limit=100, index=index, search=search
+    )
+
+    assert [c.name for c in sql_campaigns] == expected
+    assert [c.name for c in campaigns] == expected
+    assert total == sql_total == len(expected)
+
+  @pytest.mark.parametrize("search,expected", [
+    ("Á", ["Águila"]),
+    ("ÁGUILA", ["Águila"]),
+    ("á", ["Más"]),
+    ("MÁS", []),
+  ])
+  def test_search_folds_ascii_only(
+    self, db: Session, create_campaign, export_snapshot, search, expected
+  ):
+    """Accented letters match case-sensitively in SQL and the index."""
+    for name in ("Águila", "Más"):
+      create_campaign(
+        name,
+        fecha_inicio=date(2023, 4, 1), fecha_fin=date(2023, 4, 30), nse_ab=0.3
+      )
+    index = build_campaign_index(export_snapshot("accents"))
+
+    sql_campaigns, _ = crud.get_campaigns_with_count(
+      db, limit=100, search=search
+    )
+    campaigns, _ = crud.get_campaigns_with_count(
+      db, limit=100, index=index, search=search
+    )
+
+    assert [c.name for c in sql_campaigns] == expected
+    assert [c.name for c in campaigns] == expected
+
+  def test_values_of_a_dimension_are_ored(self, index):
+    """Campaigns with sites in any of the estados match."""
+    matches = index.match(estado=["Nuevo Leon", "Jalisco"])
+
+    assert index.ids[matches.positions()].tolist() == [1, 2, 3]
+
+  def test_pages_in_id_order(self, db: Session, index):
+    """Paging skips over the matches in id order."""
+    campaigns, total = crud.get_campaigns_with_count(
+      db, skip=1, limit=1, index=index, tipo_campania="mensual"
+    )
+
+    assert total == 3
+    assert [c.name for c in campaigns] == ["Gamma"]
+
+
+class TestCampaignsListFilters:
+  """Tests for the bitmap filters of GET /campaigns/."""
+
+  def test_filters_with_index(self, client: TestClient, index):
+    """The endpoint resolves the new filters without a COUNT query."""
+    params = {"estado": "Jalisco", "tipo_de_mueble": ["Mupi", "Billboard"]}
+    in_sql = client.get("/campaigns/", params=params)
+    app.dependency_overrides[get_campaign_index] = lambda: index
+
+    response = client.get("/campaigns/", params=params)
+
+    assert response.status_code == 200
+    assert [c["name"] for c in response.json()["data"]] == [
+      "Alpha", "Beta", "Gamma"
+    ]
+    assert response.json()["total"] == 3
+    assert query_count(response) == query_count(in_sql) - 1
+
+  @pytest.mark.parametrize("params", [
+    {"estado": ["Jalisco", "Nuevo Leon"]},
+    {"search": "ET"},
+    {"search": "a", "tipo_de_mueble": "Billboard"},
+    {"estado": "Jalisco", "tipo_campania": "mensual", "limit": 1, "skip": 1},
+    {"fecha_inicio": "2023-01-01", "fecha_fin": "2023-03-31"},
+    {"demografia": "nse_ab", "demografia_min": 0.25, "search": "A"},
+  ])
+  def test_index_matches_sql(self, client: TestClient, index, params):
+    """Pages and totals are the same with and without the index."""
+    in_sql = client.get("/campaigns/", params=params)
+    app.dependency_overrides[get_campaign_index] = lambda: index
+
+    response = client.get("/campaigns/", params=params)
+
+    assert response.status_code == in_sql.status_code == 200
+    for key in ("total", "total_pages", "page"):
+      assert response.json()[key] == in_sql.json()[key]
+    assert response.json()["data"] == in_sql.json()["data"]
+
+  def test_demographic_threshold_needs_both_parameters(
+    self, client: TestClient
+  ):
+    """Returns 400 for a threshold without its demographic."""
+    response = client.get("/campaigns/", params={"demografia_min": 0.2})
+
+    assert response.status_code == 400
@@ -6,7 +6,9 @@ from datetime import date
 import pytest
 from sqlalchemy.orm import Session
 
-from app import crud, models
+from app import crud, geo, models
+from app.intervals import DateFilterMode
+from app.periods import PeriodGranularity
 
 
 def create_campaign(
@@ -55,7 +57,8 @@ def create_site(
   campaign_name: str,
   codigo: str,
   tipo_mueble: str = "Billboard",
-  municipio: str = "TestMunicipio"
+  municipio: str = "TestMunicipio",
+  estado: str = "Activo"
 ) -> models.CampaignSite:
   """Helper to create a campaign site."""
   site = models.CampaignSite(
@@ -63,7 +66,7 @@ def create_site(
     codigo_del_sitio=codigo,
     tipo_de_mueble=tipo_mueble,
     tipo_de_anuncio="Digital",
-    estado="Activo",
+    estado=estado,
     municipio=municipio,
     zm="ZM1",
     frecuencia_catorcenal=1.0,
@@ -192,7 +195,8 @@ class TestGetCampaignsWithCount:
       db, "M1", tipo="mensual", inicio=date(2023, 1, 1), fin=date(2023, 1, 31)
     )
     create_campaign(
-      db, "C1", tipo="catorcenal", inicio=date(2023, 1, 1), fin=date(2023, 1, 15)
+      db, "C1", tipo="catorcenal",
+      inicio=date(2023, 1, 1), fin=date(2023, 1, 15)
     )
     create_campaign(
       db, "M2", tipo="mensual", inicio=date(2023, 2, 1), fin=date(2023, 2, 28)
@@ -208,6 +212,126 @@ class TestGetCampaignsWithCount:
     assert campaigns[0].name == "M1"
 
 
+class TestOverlapDateFilter:
+  """Tests for the overlap date mode of get_campaigns_with_count."""
+
+  def overlapping_names(self, db: Session, inicio: date, fin: date) -> list:
+    """Helper returning names of campaigns running during a window."""
+    campaigns, _ = crud.get_campaigns_with_count(
+      db,
+      limit=100,
+      fecha_inicio=inicio,
+      fecha_fin=fin,
+      date_mode=DateFilterMode.OVERLAP
+    )
+    return sorted(campaign.name for campaign in campaigns)
+
+  def test_matches_running_campaigns(self, db: Session):
+    """Campaigns started before the window but still running match."""
+    create_campaign(
+      db, "Earlier", inicio=date(2023, 1, 15), fin=date(2023, 2, 15)
+    )
+    create_campaign(
+      db, "Inside", inicio=date(2023, 2, 10), fin=date(2023, 2, 12)
+    )
+    create_campaign(
+      db, "Spanning", inicio=date(2022, 12, 1), fin=date(2023, 6, 30)
+    )
+    create_campaign(
+      db, "Ended", inicio=date(2023, 1, 1), fin=date(2023, 1, 31)
+    )
+
+    assert self.overlapping_names(
+      db, date(2023, 2, 1), date(2023, 2, 28)
+    ) == ["Earlier", "Inside", "Spanning"]
+
+  def test_boundary_days_overlap(self, db: Session):
+    """A campaign ending on the first day of the window matches."""
+    create_campaign(
+      db, "Edge", inicio=date(2023, 1, 1), fin=date(2023, 2, 1)
+    )
+
+    assert self.overlapping_names(
+      db, date(2023, 2, 1), date(2023, 2, 28)
+    ) == ["Edge"]
+    assert self.overlapping_names(
+      db, date(2023, 2, 2), date(2023, 2, 28)
+    ) == []
+
+  def test_follows_date_updates(self, db: Session):
+    """The interval index follows changes to campaign dates."""
+    campaign = create_campaign(db, "Moved")
+    campaign.fecha_fin = date(2023, 3, 31)
+    db.commit()
+
+    assert self.overlapping_names(
+      db, date(2023, 3, 1), date(2023, 3, 31)
+    ) == ["Moved"]
+
+
+class TestGetCampaignFacets:
+  """Tests for get_campaign_facets."""
+
+  def create_campaigns(self, db: Session) -> None:
+    """Helper creating campaigns of two types, months and estados."""
+    create_campaign(db, "M1", tipo="mensual", inicio=date(2023, 1, 5))
+    create_campaign(db, "M2", tipo="mensual", inicio=date(2023, 2, 5))
+    create_campaign(db, "C1", tipo="catorcenal", inicio=date(2023, 1, 20))
+    create_site(db, "M1", "S1", estado="Jalisco")
+    create_site(db, "M1", "S2", estado="Nuevo Leon")
+    create_site(db, "M2", "S3", estado="Jalisco")
+    create_site(db, "C1", "S4", estado="Jalisco")
+    geo.build_geo_rollups(db.connection())
+
+  def test_counts_every_facet(self, db: Session):
+    """Without filters every campaign is counted in each facet."""
+    self.create_campaigns(db)
+
+    facets = crud.get_campaign_facets(db)
+
+    assert facets["tipo_campania"] == [
+      {"value": "mensual", "count": 2}, {"value": "catorcenal", "count": 1}
+    ]
+    assert facets["mes_inicio"] == [
+      {"value": "2023-01", "count": 2}, {"value": "2023-02", "count": 1}
+    ]
+    assert facets["estado"] == [
+      {"value": "Jalisco", "count": 3}, {"value": "Nuevo Leon", "count": 1}
+    ]
+
+  def test_facets_ignore_their_own_filter(self, db: Session):
+    """A filter narrows the other facets but not its own."""
+    self.create_campaigns(db)
+
+    facets = crud.get_campaign_facets(
+      db,
+      tipo_campania="mensual",
+      fecha_inicio=date(2023, 1, 1),
+      fecha_fin=date(2023, 1, 31)
+    )
+
+    assert facets["tipo_campania"] == [
+      {"value": "catorcenal", "count": 1}, {"value": "mensual", "count": 1}
+    ]
+    assert facets["mes_inicio"] == [
+      {"value": "2023-01", "count": 1}, {"value": "2023-02", "count": 1}
+    ]
+    assert facets["estado"] == [
+      {"value": "Jalisco", "count": 1}, {"value": "Nuevo Leon", "count": 1}
+    ]
+
+  def test_estado_facet_ignores_estado_filter(self, db: Session):
+    """Other estados are still counted while an estado is selected."""
+    self.create_campaigns(db)
+
+    facets = crud.get_campaign_facets(db, estado=["Nuevo Leon"])
+
+    assert facets["estado"] == [
+      {"value": "Jalisco", "count": 3}, {"value": "Nuevo Leon", "count": 1}
+    ]
+    assert facets["tipo_campania"] == [{"value": "mensual", "count": 1}]
+
+
 class TestGetCampaign:
   """Tests for get_campaign function."""
 
@@ -229,18 +353,18 @@ class TestGetCampaignSitesCount:
 
   def test_returns_zero_when_no_sites(self, db: Session):
     """Returns 0 when no sites exist."""
-    create_campaign(db, "NoSites")
-    count = crud.get_campaign_sites_count(db, "NoSites")
+    campaign = create_campaign(db, "NoSites")
+    count = crud.get_campaign_sites_count(db, campaign.id)
     assert count == 0
 
   def test_returns_correct_count(self, db: Session):
     """Returns correct site count."""
-    create_campaign(db, "WithSites")
+    campaign = create_campaign(db, "WithSites")
     create_site(db, "WithSites", "S001")
     create_site(db, "WithSites", "S002")
     create_site(db, "WithSites", "S003")
     
-    count = crud.get_campaign_sites_count(db, "WithSites")
+    count = crud.get_campaign_sites_count(db, campaign.id)
     assert count == 3
 
 
@@ -249,17 +373,17 @@ class TestGetCampaignPeriodsCount:
 
   def test_returns_zero_when_no_periods(self, db: Session):
     """Returns 0 when no periods exist."""
-    create_campaign(db, "NoPeriods")
-    count = crud.get_campaign_periods_count(db, "NoPeriods")
+    campaign = create_campaign(db, "NoPeriods")
+    count = crud.get_campaign_periods_count(db, campaign.id)
     assert count == 0
 
   def test_returns_correct_count(self, db: Session):
     """Returns correct period count."""
-    create_campaign(db, "WithPeriods")
+    campaign = create_campaign(db, "WithPeriods")
     create_period(db, "WithPeriods", "2023-01")
     create_period(db, "WithPeriods", "2023-02")
     
-    count = crud.get_campaign_periods_count(db, "WithPeriods")
+    count = crud.get_campaign_periods_count(db, campaign.id)
     assert count == 2
 
 
@@ -268,20 +392,20 @@ class TestGetSitesSummary:
 
   def test_empty_sites(self, db: Session):
     """Returns empty summary when no sites."""
-    create_campaign(db, "Empty")
-    summary = crud.get_sites_summary(db, "Empty")
+    campaign = create_campaign(db, "Empty")
+    summary = crud.get_sites_summary(db, campaign.id)
     assert summary["total_sites"] == 0
     assert summary["by_type"] == []
     assert summary["by_municipio"] == []
 
   def test_aggregates_by_type(self, db: Session):
     """Aggregates sites by furniture type."""
-    create_campaign(db, "Agg")
+    campaign = create_campaign(db, "Agg")
     create_site(db, "Agg", "S1", tipo_mueble="Billboard")
     create_site(db, "Agg", "S2", tipo_mueble="Billboard")
     create_site(db, "Agg", "S3", tipo_mueble="Mupie")
     
-    summary = crud.get_sites_summary(db, "Agg")
+    summary = crud.get_sites_summary(db, campaign.id)
     assert summary["total_sites"] == 3
     
     by_type = {item["tipo_de_mueble"]: item for item in summary["by_type"]}
@@ -290,12 +414,12 @@ class TestGetSitesSummary:
 
   def test_aggregates_by_municipio(self, db: Session):
     """Aggregates sites by municipality."""
-    create_campaign(db, "Muni")
+    campaign = create_campaign(db, "Muni")
     create_site(db, "Muni", "S1", municipio="CityA")
     create_site(db, "Muni", "S2", municipio="CityA")
     create_site(db, "Muni", "S3", municipio="CityB")
     
-    summary = crud.get_sites_summary(db, "Muni")
+    summary = crud.get_sites_summary(db, campaign.id)
     by_muni = {item["municipio"]: item for item in summary["by_municipio"]}
     assert by_muni["CityA"]["count"] == 2
     assert by_muni["CityB"]["count"] == 1
@@ -306,23 +430,91 @@ class TestGetPeriodsSummary:
 
   def test_empty_periods(self, db: Session):
     """Returns empty summary when no periods."""
-    create_campaign(db, "NoPer")
-    summary = crud.get_periods_summary(db, "NoPer")
+    campaign = create_campaign(db, "NoPer")
+    summary = crud.get_periods_summary(db, campaign.id)
     assert summary["total_periods"] == 0
     assert summary["data"] == []
 
   def test_returns_sorted_periods(self, db: Session):
-    """Returns periods sorted by name."""
-    create_campaign(db, "Sorted")
+    """Returns periods in chronological order."""
+    campaign = create_campaign(db, "Sorted")
     create_period(db, "Sorted", "2023-03")
     create_period(db, "Sorted", "2023-01")
     create_period(db, "Sorted", "2023-02")
     
-    summary = crud.get_periods_summary(db, "Sorted")
+    summary = crud.get_periods_summary(db, campaign.id)
     periods = [p["period"] for p in summary["data"]]
     assert periods == ["2023-01", "2023-02", "2023-03"]
 
 
+class TestGetImpactsByPeriod:
+  """Tests for get_impacts_by_period function."""
+
+  def create_catorcena(self, db: Session, campaign_name: str, label: str):
+    """Helper to create a fourteen-day period of 1400 people impacts."""
+    period = models.CampaignPeriod(
+      campaign_name=campaign_name,
+      period=label,
+      granularity=PeriodGranularity.FOURTEEN_DAY,
+      impactos_periodo_personas=1400,
+      impactos_periodo_vehiculos=700
+    )
+    db.add(period)
+    db.commit()
+
+  def test_month_spread_over_catorcenas(self, db: Session):
+    """A month is split across catorcenas by the days they share."""
+    create_campaign(db, "Monthly")
+    create_period(db, "Monthly", "2023-01")
+
+    buckets = crud.get_impacts_by_period(
+      db, date(2023, 1, 1), date(2023, 1, 31), PeriodGranularity.FOURTEEN_DAY
+    )
+
+    assert [
+      (bucket["bucket_start"], bucket["people_impacts"]) for bucket in buckets
+    ] == [
+      (date(2022, 12, 27), 290),
+      (date(2023, 1, 10), 452),
+      (date(2023, 1, 24), 258)
+    ]
+
+  def test_window_clips_weeks(self, db: Session):
+    """Only days inside the window count; empty buckets are kept."""
+    create_campaign(db, "Fourteen", tipo="catorcenal")
+    self.create_catorcena(db, "Fourteen", "2025-17")
+
+    buckets = crud.get_impacts_by_period(
+      db, date(2025, 8, 1), date(2025, 8, 11), PeriodGranularity.WEEK
+    )
+
+    assert [
+      (bucket["bucket_start"], bucket["bucket_end"], bucket["people_impacts"])
+      for bucket in buckets
+    ] == [
+      (date(2025, 7, 28), date(2025, 8, 3), 0),
+      (date(2025, 8, 4), date(2025, 8, 10), 600),
+      (date(2025, 8, 11), date(2025, 8, 17), 100)
+    ]
+
+  def test_adds_campaigns_and_filters(self, db: Session):
+    """Campaigns add up in a bucket unless one campaign is requested."""
+    monthly = create_campaign(db, "Monthly")
+    create_period(db, "Monthly", "2025-08")
+    create_campaign(db, "Fourteen", tipo="catorcenal")
+    self.create_catorcena(db, "Fourteen", "2025-17")
+    window = (date(2025, 8, 1), date(2025, 8, 31), PeriodGranularity.MONTH)
+
+    all_campaigns = crud.get_impacts_by_period(db, *window)
+    monthly_only = crud.get_impacts_by_period(
+      db, *window, campaign_id=monthly.id
+    )
+
+    assert all_campaigns[0]["people_impacts"] == 2400
+    assert all_campaigns[0]["vehicle_impacts"] == 1200
+    assert monthly_only[0]["people_impacts"] == 1000
+
+
 class TestGetCampaignSummary:
   """Tests for get_campaign_summary function."""
 
@@ -347,3 +539,84 @@ class TestGetCampaignSummary:
     gender = {g["label"]: g["value"] for g in summary["gender_distribution"]}
     assert gender["Hombres"] == 0.5
     assert gender["Mujeres"] == 0.5
+
+
+class TestRepeatedSitePeriods:
+  """Sites booked for several fourteen-day periods are counted once."""
+
+  def add_booking(
+    self, db: Session, campaign_name: str, codigo: str, catorcena: str
+  ) -> None:
+    """Helper to book a site for one fourteen-day period of 2024-10."""
+    db.add(models.CampaignSite(
+      campaign_name=campaign_name,
+      codigo_del_sitio=codigo,
+      id_fourteen=catorcena,
+      mes="2024-10",
+      tipo_de_mueble="Vallas",
+      municipio="CityA",
+      impactos_mensuales=300
+    ))
+    db.commit()
+
+  def test_summary_counts_sites_once(self, db: Session):
+    """Repeated bookings in one month add sites and impacts once."""
+    campaign = create_campaign(db, "Repeat")
+    self.add_booking(db, "Repeat", "S1", "2024-21")
+    self.add_booking(db, "Repeat", "S1", "2024-22")
+    self.add_booking(db, "Repeat", "S2", "2024-21")
+
+    summary = crud.get_sites_summary(db, campaign.id)
+
+    assert summary["total_sites"] == 2
+    assert summary["by_type"] == [
+      {"tipo_de_mueble": "Vallas", "count": 2, "total_impacts": 600}
+    ]
+    assert crud.get_campaign_sites_count(db, campaign.id) == 2
+
+
+class TestGetSiteHistory:
+  """Tests for get_site, get_site_campaigns and get_site_impacts."""
+
+  def add_booking(
+    self, db: Session, campaign_name: str, catorcena: str, mes: str
+  ) -> None:
+    """Helper to book site S1 for one fourteen-day period."""
+    db.add(models.CampaignSite(
+      campaign_name=campaign_name,
+      codigo_del_sitio="S1",
+      id_fourteen=catorcena,
+      mes=mes,
+      tipo_de_mueble="Vallas",
+      municipio="CityA",
+      impactos_mensuales=300,
+      alcance_mensual=30.0
+    ))
+    db.commit()
+
+  def test_returns_none_when_not_found(self, db: Session):
+    """Returns None for an unregistered site code."""
+    assert crud.get_site(db, "Missing") is None
+
+  def test_campaigns_count_months_once(self, db: Session):
+    """Each campaign adds the site's monthly impacts once per month."""
+    create_campaign(db, "Early")
+    create_campaign(db, "Late")
+    self.add_booking(db, "Early", "2024-21", "2024-10")
+    self.add_booking(db, "Early", "2024-22", "2024-10")
+    self.add_booking(db, "Early", "2024-23", "2024-11")
+    self.add_booking(db, "Late", "2024-23", "2024-11")
+
+    site = crud.get_site(db, "S1")
+    campaigns = crud.get_site_campaigns(db, site.id)
+    impacts = crud.get_site_impacts(db, site.id)
+
+    assert (site.tipo_de_mueble, site.municipio) == ("Vallas", "CityA")
+    assert [
+      (campaign["name"], campaign["months"], campaign["impacts"])
+      for campaign in campaigns
+    ] == [("Early", 2, 600), ("Late", 1, 300)]
+    assert impacts == [
+      {"mes": "2024-10", "impacts": 300, "reach": 30.0, "campaigns": 1},
+      {"mes": "2024-11", "impacts": 300, "reach": 30.0, "campaigns": 2}
+    ]
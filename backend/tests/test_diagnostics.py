@@ -0,0 +1,152 @@
+"""
+Tests for the slow-query log and request profiling.
+"""
+import threading
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app import config, diagnostics, metrics
+from app.distinct import HyperLogLog
+
+TOKEN = "s3cret"
+
+
+@pytest.fixture
+def diagnostics_token(monkeypatch):
+  """Enable the diagnostics token."""
+  monkeypatch.setattr(config, "DIAGNOSTICS_TOKEN", TOKEN)
+
+
+@pytest.fixture
+def log_every_query(monkeypatch):
+  """Treat every statement as slow, starting from an empty log."""
+  monkeypatch.setattr(config, "SLOW_QUERY_MS", 0)
+  diagnostics.slow_queries.clear()
+  yield
+  diagnostics.slow_queries.clear()
+
+
+class TestSlowQueryLog:
+  """Tests for the slow-query log."""
+
+  def test_logs_statement_plan_and_endpoint(
+    self, db: Session, log_every_query, caplog
+  ):
+    """A slow statement is logged with its plan and originating request."""
+    metrics.start_request("GET /campaigns/")
+    try:
+      db.execute(text("SELECT name FROM campaigns WHERE id = :id"), {"id": 7})
+    finally:
+      metrics._current_request.set(None)
+
+    entry = diagnostics.slow_queries[-1]
+    assert entry["endpoint"] == "GET /campaigns/"
+    assert entry["statement"] == "SELECT name FROM campaigns WHERE id = ?"
+    assert entry["parameters"] == [7]
+    assert any("campaigns" in step for step in entry["plan"])
+    assert "SELECT name FROM campaigns" in caplog.text
+
+  def test_fast_statements_are_not_logged(self, db: Session, monkeypatch):
+    """Statements under the threshold are skipped."""
+    monkeypatch.setattr(config, "SLOW_QUERY_MS", 60_000)
+    diagnostics.slow_queries.clear()
+
+    db.execute(text("SELECT 1"))
+
+    assert not diagnostics.slow_queries
+
+  def test_endpoint_requires_token(
+    self, client: TestClient, diagnostics_token, log_every_query
+  ):
+    """Recent slow queries are only readable with the token."""
+    client.get("/campaigns/")
+
+    denied = client.get("/debug/slow-queries")
+    allowed = client.get(
+      "/debug/slow-queries", headers={"X-Diagnostics-Token": TOKEN}
+    )
+
+    assert denied.status_code == 403
+    assert allowed.status_code == 200
+    assert allowed.json()[0]["endpoint"] == "GET /campaigns/"
+
+
+class TestProfiling:
+  """Tests for the sampling profiler."""
+
+  def test_samples_app_stacks(self):
+    """Stacks start at the outermost app frame."""
+    with diagnostics.SamplingProfiler(interval_ms=0.5) as profiler:
+      profiler.add_thread(threading.get_ident())
+      for _ in range(5):
+        HyperLogLog.from_keys(np.arange(200_000))
+
+    report = profiler.report()
+    assert report["samples"] > 0
+    assert report["stacks"][0]["stack"].startswith(
+      "distinct.py:from_keys;distinct.py:add"
+    )
+
+  def test_ignores_other_threads(self):
+    """Threads not handed to the profiler are never sampled."""
+    stopped = threading.Event()
+
+    def busy():
+      while not stopped.is_set():
+        HyperLogLog.from_keys(np.arange(50_000))
+
+    other = threading.Thread(target=busy)
+    other.start()
+    try:
+      with diagnostics.SamplingProfiler(interval_ms=0.5) as profiler:
+        stopped.wait(0.05)
+    finally:
+      stopped.set()
+      other.join()
+
+    report = profiler.report()
+    assert report["samples"] > 0
+    assert report["stacks"] == []
+
+  def test_profiled_request(
+    self, client: TestClient, diagnostics_token, monkeypatch
+  ):
+    """A request with the token returns its profile instead of its body."""
+    monkeypatch.setattr(config, "PROFILE_INTERVAL_MS", 0.1)
+    response = client.get(
+      "/campaigns/",
+      headers={"X-Profile": "true", "X-Diagnostics-Token": TOKEN}
+    )
+
+    assert response.status_code == 200
+    data = response.json()
+    assert (data["path"], data["status_code"]) == ("/campaigns/", 200)
+    assert {"samples", "stacks", "duration_ms"} <= set(data)
+    assert all(
+      "main.py:read_campaigns" in item["stack"] for item in data["stacks"]
+    )
+
+  @pytest.mark.parametrize("token", [None, "wrong"])
+  def test_rejects_missing_or_wrong_token(
+    self, client: TestClient, diagnostics_token, token
+  ):
+    """Profiling needs the configured token."""
+    headers = {"X-Profile": "true"}
+    if token:
+      headers["X-Diagnostics-Token"] = token
+
+    response = client.get("/campaigns/", headers=headers)
+
+    assert response.status_code == 403
+
+  def test_disabled_without_configured_token(self, client: TestClient):
+    """With no token configured, profiling is never allowed."""
+    response = client.get(
+      "/campaigns/", headers={"X-Profile": "true", "X-Diagnostics-Token": ""}
+    )
+
+    assert response.status_code == 403
@@ -0,0 +1,119 @@
+"""
+Tests for the dictionary encoding of site dimensions and the site registry.
+"""
+from datetime import date
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app import models
+from app.dimensions import DimensionEncoder
+
+
+def site_record(codigo: str, mueble: str, municipio: str) -> dict:
+  """Helper returning a validated site record with dimension names."""
+  return {
+    "campaign_name": "Camp",
+    "codigo_del_sitio": codigo,
+    "tipo_de_mueble": mueble,
+    "tipo_de_anuncio": "Digital",
+    "estado": "Nuevo Leon",
+    "municipio": municipio,
+    "zm": "Monterrey"
+  }
+
+
+class TestDimensionEncoder:
+  """Tests for DimensionEncoder."""
+
+  def test_replaces_names_with_keys(self, db: Session):
+    """Names become keys shared by every row with the same name."""
+    records = DimensionEncoder().encode_names(db.connection(), [
+      site_record("S1", "Muros", "Monterrey"),
+      site_record("S2", "Muros", "Apodaca"),
+    ])
+
+    assert records[0]["furniture_type_id"] == records[1]["furniture_type_id"]
+    assert records[0]["municipio_id"] != records[1]["municipio_id"]
+    assert "tipo_de_mueble" not in records[0]
+    assert db.query(models.FurnitureType).count() == 1
+    assert db.query(models.Municipio).count() == 2
+
+  def test_reuses_stored_keys(self, db: Session):
+    """A new encoder finds names stored by an earlier one."""
+    first = DimensionEncoder().encode_names(
+      db.connection(), [site_record("S1", "Kiosko", "Guadalupe")]
+    )
+    second = DimensionEncoder().encode_names(
+      db.connection(), [site_record("S2", "Kiosko", "Guadalupe")]
+    )
+
+    assert first[0]["furniture_type_id"] == second[0]["furniture_type_id"]
+    assert first[0]["municipio_id"] == second[0]["municipio_id"]
+    assert db.query(models.Estado).count() == 1
+
+  def test_registers_each_site_once(self, db: Session):
+    """Bookings of one site share its key; the first attributes are kept."""
+    records = DimensionEncoder().encode_sites(db.connection(), [
+      {**site_record("S1", "Muros", "Apodaca"), "id_fourteen": "2024-21"},
+      {**site_record("S1", "Vallas", "Apodaca"), "id_fourteen": "2024-22"},
+      {**site_record("S2", "Muros", "Apodaca"), "id_fourteen": "2024-21"},
+    ])
+
+    assert [record["site_id"] for record in records].count(
+      records[0]["site_id"]
+    ) == 2
+    assert records[0] == {
+      "campaign_name": "Camp",
+      "id_fourteen": "2024-21",
+      "site_id": records[0]["site_id"]
+    }
+    site = db.get(models.Site, records[0]["site_id"])
+    assert (site.codigo_del_sitio, site.tipo_de_mueble) == ("S1", "Muros")
+    assert db.query(models.Site).count() == 2
+
+
+class TestEncodedSites:
+  """Tests for sites created and read through the ORM."""
+
+  def test_names_round_trip(self, db: Session):
+    """Sites keep returning the names they were created with."""
+    db.add(models.Campaign(
+      name="Camp",
+      tipo_campania="mensual",
+      fecha_inicio=date(2023, 1, 1),
+      fecha_fin=date(2023, 1, 31)
+    ))
+    db.add(models.CampaignSite(**site_record("S1", "Muros", "Apodaca")))
+    db.commit()
+    db.expire_all()
+
+    site = db.query(models.CampaignSite).one()
+    assert site.site.furniture_type_id is not None
+    assert (
+      site.tipo_de_mueble, site.tipo_de_anuncio, site.estado, site.municipio,
+      site.zm
+    ) == ("Muros", "Digital", "Nuevo Leon", "Apodaca", "Monterrey")
+
+  def test_names_load_with_the_bookings(self, db: Session):
+    """Listing bookings reads their sites in the query that loads them."""
+    db.add(models.Campaign(name="Camp", fecha_inicio=date(2023, 1, 1)))
+    db.add(models.CampaignSite(**site_record("S1", "Muros", "Apodaca")))
+    db.add(models.CampaignSite(**site_record("S2", "Vallas", "Guadalupe")))
+    db.commit()
+    db.expire_all()
+    statements = []
+    event.listen(
+      db.connection(), "before_cursor_execute",
+      lambda connection, cursor, statement, *args: statements.append(statement)
+    )
+
+    bookings = db.query(models.CampaignSite).order_by(models.CampaignSite.id)
+    names = [
+      (booking.campaign_name, booking.codigo_del_sitio, booking.municipio)
+      for booking in bookings
+    ]
+
+    assert names == [("Camp", "S1", "Apodaca"), ("Camp", "S2", "Guadalupe")]
+    assert len(statements) == 1
+    assert statements[0].count("SELECT") == 1
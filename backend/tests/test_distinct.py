@@ -0,0 +1,124 @@
+"""
+Tests for approximate distinct counts with HyperLogLog.
+"""
+from datetime import date
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app import crud, distinct
+from app.distinct import DistinctDimension, HyperLogLog
+
+
+@pytest.fixture
+def portfolio(db: Session, create_campaign, book_site) -> None:
+  """Two campaigns sharing site S2, over two months."""
+  create_campaign("Uno", fecha_fin=date(2024, 12, 31))
+  create_campaign("Dos", fecha_fin=date(2024, 12, 31))
+  book_site("Uno", "S1", municipio="CityA")
+  book_site("Uno", "S2", municipio="CityA")
+  book_site("Uno", "S2", municipio="CityA", mes="2024-11")
+  book_site("Dos", "S2", municipio="CityA", mes="2024-11")
+  book_site("Dos", "S3", municipio="CityB", mes="2024-12")
+  distinct.build_distinct_sketches(db.connection())
+  db.commit()
+
+
+class TestHyperLogLog:
+  """Tests for the HyperLogLog sketch."""
+
+  @pytest.mark.parametrize("count", [100, 20_000, 300_000])
+  def test_estimate_within_error_bound(self, count):
+    """Estimates stay within three standard errors."""
+    sketch = HyperLogLog.from_keys(np.arange(count))
+
+    assert sketch.estimate() == pytest.approx(
+      count, rel=3 * distinct.STANDARD_ERROR
+    )
+
+  def test_merge_counts_shared_keys_once(self):
+    """A merged sketch estimates the union of both key sets."""
+    first = HyperLogLog.from_keys(np.arange(0, 60_000))
+    second = HyperLogLog.from_keys(np.arange(40_000, 100_000))
+
+    first.merge(second)
+
+    assert first.estimate() == pytest.approx(
+      100_000, rel=3 * distinct.STANDARD_ERROR
+    )
+    assert HyperLogLog.union(
+      [first.to_bytes(), second.to_bytes()]
+    ).registers.tolist() == first.registers.tolist()
+
+  def test_empty(self):
+    """An empty sketch estimates zero."""
+    assert HyperLogLog.union([]).estimate() == 0
+
+
+class TestEstimateDistinct:
+  """Tests for estimate_distinct over the stored sketches."""
+
+  def test_portfolio_and_campaigns(self, db: Session, portfolio):
+    """Sites shared by campaigns or months count once."""
+    uno = crud.get_campaign(db, "Uno")
+
+    everything = crud.estimate_distinct(db, DistinctDimension.SITES)
+    campaign = crud.estimate_distinct(
+      db, DistinctDimension.SITES, campaign_ids=[uno.id]
+    )
+    municipios = crud.estimate_distinct(db, DistinctDimension.MUNICIPIOS)
+
+    assert (everything["estimate"], everything["sketches"]) == (3, 4)
+    assert campaign["estimate"] == 2
+    assert municipios["estimate"] == 2
+    assert everything["standard_error"] == distinct.STANDARD_ERROR
+
+  def test_by_campaign(self, db: Session, portfolio, create_campaign):
+    """Each campaign gets its own estimate; one without sketches gets 0."""
+    uno = crud.get_campaign(db, "Uno")
+    dos = crud.get_campaign(db, "Dos")
+    empty = create_campaign("Vacia")
+
+    estimates = crud.estimate_distinct_by_campaign(
+      db, DistinctDimension.SITES, [uno.id, dos.id, empty.id]
+    )
+
+    assert estimates == {uno.id: 2, dos.id: 2, empty.id: 0}
+
+  def test_month_range(self, db: Session, portfolio):
+    """Only the sketches of the months in range are merged."""
+    estimate = crud.estimate_distinct(
+      db, DistinctDimension.SITES, mes_inicio="2024-11", mes_fin="2024-12"
+    )
+
+    assert estimate["estimate"] == 2
+
+
+class TestDistinctEndpoint:
+  """Tests for GET /stats/distinct and the approximate list total."""
+
+  def test_distinct_sites_of_campaigns(self, client: TestClient, portfolio):
+    """Merges the sketches of the requested campaigns."""
+    response = client.get("/stats/distinct?campaign=Uno&campaign=Dos")
+
+    assert response.status_code == 200
+    data = response.json()
+    assert (data["dimension"], data["estimate"]) == ("sites", 3)
+    assert data["campaigns"] == ["Uno", "Dos"]
+
+  def test_unknown_campaign(self, client: TestClient, portfolio):
+    """Returns 404 when any campaign does not exist."""
+    response = client.get("/stats/distinct?campaign=Uno&campaign=Nope")
+
+    assert response.status_code == 404
+
+  def test_approximate_list_total(self, client: TestClient, portfolio):
+    """The list estimates distinct sites of every matching campaign."""
+    approximate = client.get("/campaigns/?limit=2&approximate=true").json()
+    exact = client.get("/campaigns/?limit=1").json()
+
+    assert approximate["approximate_total_sites"] == 3
+    assert [item["sites_count"] for item in approximate["data"]] == [2, 2]
+    assert exact["approximate_total_sites"] is None
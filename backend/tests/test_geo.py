@@ -0,0 +1,149 @@
+"""
+Tests for the geographic dimensions and rollup cube.
+"""
+from datetime import date
+
+import pytest
+from sqlalchemy.orm import Session
+
+from app import crud, geo, models
+from app.geo import GeoLevel
+
+
+@pytest.fixture
+def create_catorcenal(create_campaign):
+  """Factory adding a catorcenal campaign over October and November."""
+  def create(name: str) -> models.Campaign:
+    return create_campaign(
+      name, tipo_campania="catorcenal", fecha_fin=date(2024, 11, 30)
+    )
+
+  return create
+
+
+@pytest.fixture
+def book_region(book_site):
+  """Factory booking a site of a region for one catorcena."""
+  def book(
+    campaign_name: str,
+    codigo: str,
+    estado: str,
+    municipio: str,
+    zm: str,
+    impactos: int = 100,
+    **columns
+  ) -> None:
+    book_site(campaign_name, codigo, **{
+      "id_fourteen": "2024-21",
+      "tipo_de_mueble": "Billboard",
+      "tipo_de_anuncio": "Digital",
+      "estado": estado,
+      "municipio": municipio,
+      "zm": zm,
+      "impactos_mensuales": impactos,
+      "alcance_mensual": impactos / 10,
+      **columns
+    })
+
+  return book
+
+
+def build_cube(db: Session) -> None:
+  """Helper to build the rollup cube."""
+  geo.build_geo_rollups(db.connection())
+  db.commit()
+
+
+@pytest.fixture
+def valle_de_mexico(create_catorcenal, book_region) -> models.Campaign:
+  """One metro area spanning two estados, over two months."""
+  campaign = create_catorcenal("Geo")
+  book_region(
+    "Geo", "S1", "Ciudad de Mexico", "Cuauhtemoc", "Valle de Mexico"
+  )
+  book_region(
+    "Geo", "S1", "Ciudad de Mexico", "Cuauhtemoc", "Valle de Mexico",
+    id_fourteen="2024-22"
+  )
+  book_region(
+    "Geo", "S2", "Mexico", "Naucalpan de Juarez", "Valle de Mexico",
+    impactos=300
+  )
+  book_region(
+    "Geo", "S3", "Nuevo Leon", "Monterrey", "Monterrey",
+    impactos=50, id_fourteen="2024-23", mes="2024-11"
+  )
+  return campaign
+
+
+def regions(rows: list) -> list:
+  """Helper returning (name, sites, impacts) of rollup rows."""
+  return [(row["name"], row["sites"], row["impacts"]) for row in rows]
+
+
+class TestBuildGeoDimensions:
+  """Tests for the municipios registered sites reference."""
+
+  def test_sites_reference_municipios(self, db: Session, valle_de_mexico):
+    """A site booked twice is registered once, with its municipio's key."""
+    build_cube(db)
+
+    sites = db.query(models.Site).order_by(models.Site.id)
+    municipio_ids = [site.municipio_id for site in sites]
+    assert None not in municipio_ids
+    assert len(municipio_ids) == len(set(municipio_ids)) == 3
+    assert db.query(models.Estado).count() == 3
+    assert db.query(models.ZonaMetropolitana).count() == 2
+
+  def test_blank_names_are_unknown(
+    self, db: Session, create_catorcenal, book_region
+  ):
+    """Sites without a region are grouped under Unknown."""
+    create_catorcenal("Blank")
+    book_region("Blank", "S1", "", "", "")
+
+    build_cube(db)
+
+    assert db.query(models.Municipio.name).scalar() == "Unknown"
+
+
+class TestGetGeoRollup:
+  """Tests for the rollup cube read by get_geo_rollup."""
+
+  def test_campaign_totals_per_level(self, db: Session, valle_de_mexico):
+    """Sites count once per month and metro areas span estados."""
+    build_cube(db)
+
+    assert regions(
+      crud.get_geo_rollup(db, valle_de_mexico.id, GeoLevel.ESTADO)
+    ) == [
+      ("Mexico", 1, 300),
+      ("Ciudad de Mexico", 1, 100),
+      ("Nuevo Leon", 1, 50)
+    ]
+    assert regions(
+      crud.get_geo_rollup(db, valle_de_mexico.id, GeoLevel.ZM)
+    ) == [("Valle de Mexico", 2, 400), ("Monterrey", 1, 50)]
+
+  def test_month_slice(self, db: Session, valle_de_mexico):
+    """A month only includes the sites booked in it."""
+    build_cube(db)
+
+    assert regions(
+      crud.get_geo_rollup(db, valle_de_mexico.id, GeoLevel.ZM, mes="2024-11")
+    ) == [("Monterrey", 1, 50)]
+
+  def test_drill_down_into_metro_area(self, db: Session, valle_de_mexico):
+    """Municipios can be narrowed to their zona metropolitana."""
+    build_cube(db)
+    valle = crud.get_geo_rollup(db, valle_de_mexico.id, GeoLevel.ZM)[0]
+
+    municipios = crud.get_geo_rollup(
+      db, valle_de_mexico.id, GeoLevel.MUNICIPIO, zm_id=valle["id"]
+    )
+
+    assert regions(municipios) == [
+      ("Naucalpan de Juarez", 1, 300),
+      ("Cuauhtemoc", 1, 100)
+    ]
+    assert all(row["zm_id"] == valle["id"] for row in municipios)
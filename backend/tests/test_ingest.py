@@ -0,0 +1,240 @@
+"""
+Tests for the CSV ingest pipeline.
+"""
+import json
+import shutil
+from datetime import date
+from pathlib import Path
+
+import pytest
+from sqlalchemy.orm import Session
+
+from app import config, ingest, models
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+
+
+@pytest.fixture
+def data_dir(tmp_path: Path) -> Path:
+  """Copy of the bundled source CSVs."""
+  for path in ingest.source_paths(DATA_DIR):
+    shutil.copy(path, tmp_path / path.name)
+  return tmp_path
+
+
+class TestParseChunk:
+  """Tests for parse_chunk."""
+
+  def test_parse_chunk_periods(self):
+    """Period rows become typed records with their source lines."""
+    rows = [{
+      "name": "Camp",
+      "tipo_campania": "mensual",
+      "period": "2025-07",
+      "impactos_periodo_personas": "2149008",
+      "impactos_periodo_vehículos": "14566-06-26"
+    }]
+
+    chunk = ingest.parse_chunk(config.PERIODS_FILE, rows, first_line=5)
+
+    assert chunk.records == [{
+      "campaign_name": "Camp",
+      "period": "2025-07",
+      "granularity": "month",
+      "impactos_periodo_personas": 2149008,
+      "impactos_periodo_vehiculos": 14566,
+      "period_start": date(2025, 7, 1),
+      "period_end": date(2025, 7, 31)
+    }]
+    assert chunk.lines == [5]
+    assert chunk.issues[0]["reason"] == "date_like_integer"
+
+  def test_rejects_unknown_catorcena(self):
+    """A fourteen-day label past the last catorcena of its year is rejected."""
+    rows = [
+      {"name": "Camp", "tipo_campania": "catorcenal", "period": label}
+      for label in ("2025-17", "2025-27")
+    ]
+
+    chunk = ingest.parse_chunk(config.PERIODS_FILE, rows)
+
+    assert [record["period_start"] for record in chunk.records] == [
+      date(2025, 8, 5)
+    ]
+    assert [
+      (issue["line"], issue["column"], issue["reason"])
+      for issue in chunk.issues if issue["action"] == "rejected"
+    ] == [(3, "period", "invalid_period")]
+
+
+class TestReadCsvChunks:
+  """Tests for chunked CSV reading."""
+
+  def test_chunk_sizes(self, data_dir: Path):
+    """Chunks hold at most chunk_size rows and cover the whole file."""
+    chunks = list(
+      ingest.read_csv_chunks(data_dir / config.PERIODS_FILE, chunk_size=10)
+    )
+    assert [len(chunk) for chunk in chunks] == [10, 10, 10, 8]
+
+
+class TestIngestCsvFiles:
+  """Tests for ingest_csv_files."""
+
+  def test_loads_all_files(self, db: Session, data_dir: Path):
+    """Loads every file and skips duplicate campaigns."""
+    report = ingest.ingest_csv_files(
+      db, data_dir, workers=1, chunk_size=50, report_dir=None
+    )
+
+    assert report.rows_read == {
+      config.CAMPAIGNS_FILE: 13,
+      config.PERIODS_FILE: 38,
+      config.SITES_FILE: 257
+    }
+    assert report.rows_written == {
+      config.CAMPAIGNS_FILE: 12,
+      config.PERIODS_FILE: 36,
+      config.SITES_FILE: 255
+    }
+    assert db.query(models.Campaign).count() == 12
+    assert db.query(models.CampaignSite).count() == 255
+    assert db.query(models.FurnitureType).count() == 6
+    assert db.query(models.Municipio).count() == 16
+
+  def test_process_pool_matches_serial(self, db: Session, data_dir: Path):
+    """Parsing in worker processes loads the same rows."""
+    ingest.ingest_csv_files(
+      db, data_dir, workers=2, chunk_size=50, report_dir=None
+    )
+
+    assert db.query(models.Campaign).count() == 12
+    assert db.query(models.CampaignPeriod).count() == 36
+    assert db.query(models.CampaignSite).count() == 255
+
+  def test_reports_progress(self, db: Session, data_dir: Path):
+    """Progress callback receives cumulative row counts per file."""
+    progress = []
+
+    ingest.ingest_csv_files(
+      db,
+      data_dir,
+      workers=1,
+      chunk_size=100,
+      on_progress=lambda file_name, rows: progress.append((file_name, rows)),
+      report_dir=None
+    )
+
+    site_progress = [
+      rows for file_name, rows in progress if file_name == config.SITES_FILE
+    ]
+    assert site_progress == [100, 200, 257]
+
+
+class InterruptedIngest(Exception):
+  """Simulated crash raised from the progress callback."""
+
+
+class TestResumeIngest:
+  """Tests for resuming an interrupted ingest."""
+
+  def crash_after_first_site_chunk(self, file_name: str, rows: int):
+    """Progress callback that fails once the first site chunk committed."""
+    if file_name == config.SITES_FILE:
+      raise InterruptedIngest()
+
+  def test_resume_continues_after_last_chunk(
+    self, db: Session, data_dir: Path
+  ):
+    """Resuming loads the remaining chunks without duplicating rows."""
+    with pytest.raises(InterruptedIngest):
+      ingest.ingest_csv_files(
+        db,
+        data_dir,
+        workers=1,
+        chunk_size=100,
+        on_progress=self.crash_after_first_site_chunk,
+        report_dir=None
+      )
+    assert db.query(models.CampaignSite).count() == 100
+    assert ingest.has_unfinished_ingest(db)
+
+    report = ingest.ingest_csv_files(
+      db, data_dir, workers=1, chunk_size=100, resume=True, report_dir=None
+    )
+
+    assert report.rows_read[config.SITES_FILE] == 157
+    assert report.rows_read[config.CAMPAIGNS_FILE] == 0
+    assert db.query(models.Campaign).count() == 12
+    assert db.query(models.CampaignSite).count() == 255
+    assert not ingest.has_unfinished_ingest(db)
+
+  def test_changed_source_cannot_resume(self, db: Session, data_dir: Path):
+    """Resuming fails when a source file changed after the crash."""
+    with pytest.raises(InterruptedIngest):
+      ingest.ingest_csv_files(
+        db,
+        data_dir,
+        workers=1,
+        chunk_size=100,
+        on_progress=self.crash_after_first_site_chunk,
+        report_dir=None
+      )
+    with open(data_dir / config.SITES_FILE, "a", encoding="utf-8") as f:
+      f.write("\n")
+
+    with pytest.raises(ingest.StaleCheckpointError):
+      ingest.ingest_csv_files(
+        db, data_dir, workers=1, resume=True, report_dir=None
+      )
+
+
+class TestIngestReport:
+  """Tests for the rejection report written by the ingest."""
+
+  def test_writes_issues_and_summary(
+    self, db: Session, data_dir: Path, tmp_path: Path
+  ):
+    """Issues are written as JSON Lines and summarized per file."""
+    report_dir = tmp_path / "reports"
+
+    ingest.ingest_csv_files(db, data_dir, workers=1, report_dir=report_dir)
+
+    summary = json.loads((report_dir / ingest.SUMMARY_FILE).read_text())
+    periods = summary["files"][config.PERIODS_FILE]
+    assert periods["repaired"]["date_like_integer"] == 18
+    assert periods["rejected"]["duplicate_period"] == 2
+    sites = summary["files"][config.SITES_FILE]
+    assert sites["rejected"] == {"duplicate_site_period": 2}
+
+    issues = [
+      json.loads(line)
+      for line in (report_dir / ingest.ISSUES_FILE).read_text().splitlines()
+    ]
+    duplicate_campaign = next(
+      issue for issue in issues if issue["reason"] == "duplicate_campaign"
+    )
+    assert duplicate_campaign == {
+      "file": config.CAMPAIGNS_FILE,
+      "line": 12,
+      "column": "name",
+      "value": "campania_7",
+      "action": "rejected",
+      "reason": "duplicate_campaign"
+    }
+
+  def test_rejects_unknown_campaign(self, db: Session, data_dir: Path):
+    """Sites of campaigns missing from the campaigns file are rejected."""
+    sites_path = data_dir / config.SITES_FILE
+    lines = sites_path.read_text(encoding="utf-8").splitlines()
+    lines[1] = lines[1].replace("campania_10", "campania_99")
+    sites_path.write_text("\n".join(lines), encoding="utf-8")
+
+    report = ingest.ingest_csv_files(
+      db, data_dir, workers=1, report_dir=None
+    )
+
+    assert report.summary()["files"][config.SITES_FILE]["rejected"] == {
+      "duplicate_site_period": 2,
+      "unknown_campaign": 1
+    }
@@ -0,0 +1,132 @@
+"""
+Tests for request instrumentation and the Prometheus metrics.
+"""
+import re
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app import crud, metrics
+
+
+def server_timing(response) -> dict:
+  """Helper mapping each Server-Timing metric to its parameters."""
+  entries = {}
+  for entry in response.headers["server-timing"].split(", "):
+    name, *params = entry.split(";")
+    entries[name] = dict(param.split("=", 1) for param in params)
+  return entries
+
+
+def sample(text_format: str, name: str, **labels) -> float:
+  """Helper reading one sample (0 if absent) from the Prometheus format."""
+  label_text = ",".join(f'{key}="{value}"' for key, value in labels.items())
+  pattern = re.escape(f"{name}{{{label_text}}}") + r" (\S+)"
+  match = re.search(pattern, text_format)
+  return float(match.group(1)) if match else 0
+
+
+class TestCursorHooks:
+  """Tests for the SQLAlchemy cursor hooks."""
+
+  def test_counts_queries_and_rows_of_request(self, db: Session):
+    """Only statements run while a request is open are counted."""
+    db.execute(text("SELECT 1")).all()
+    timings = metrics.start_request()
+
+    db.execute(text("SELECT 1 UNION ALL SELECT 2")).all()
+    db.execute(text("SELECT 3")).first()
+
+    assert (timings.queries, timings.rows) == (2, 3)
+    assert timings.query_seconds > 0
+    metrics._current_request.set(None)
+
+
+class TestHistogram:
+  """Tests for the Prometheus histogram."""
+
+  def test_renders_cumulative_buckets(self):
+    """Buckets are cumulative and end with +Inf, sum and count."""
+    histogram = metrics.Histogram("latency", "Latency.", ("path",), (1, 2))
+
+    for value in (0.5, 1.5, 1.7, 9):
+      histogram.observe(("/a",), value)
+
+    assert histogram.render()[2:] == [
+      'latency_bucket{path="/a",le="1"} 1',
+      'latency_bucket{path="/a",le="2"} 3',
+      'latency_bucket{path="/a",le="+Inf"} 4',
+      'latency_sum{path="/a"} 12.7',
+      'latency_count{path="/a"} 4',
+    ]
+
+
+class TestRequestMetrics:
+  """Tests for the middleware, Server-Timing and GET /metrics."""
+
+  def test_server_timing_breakdown(
+    self, client: TestClient, create_campaign
+  ):
+    """Each response reports its SQL, fetch and remaining time."""
+    create_campaign("Timed")
+
+    response = client.get("/campaigns/Timed/sites/summary")
+
+    timing = server_timing(response)
+    assert set(timing) == {"db", "fetch", "app", "total"}
+    assert int(timing["db"]["desc"].strip('"').split()[0]) > 0
+    assert float(timing["total"]["dur"]) >= float(timing["db"]["dur"])
+
+  def test_metrics_by_route_template(
+    self, client: TestClient, create_campaign
+  ):
+    """Requests are labelled with the route, not the requested URL."""
+    create_campaign("Counted")
+    before = client.get("/metrics").text
+    endpoint = "/campaigns/{campaign_id}/sites/summary"
+
+    response = client.get("/campaigns/Counted/sites/summary")
+    after = client.get("/metrics")
+
+    def delta(name, **labels):
+      return sample(after.text, name, **labels) - sample(before, name, **labels)
+
+    assert after.headers["content-type"].startswith("text/plain")
+    assert delta(
+      "http_requests_total", method="GET", endpoint=endpoint, status="200"
+    ) == 1
+    assert delta(
+      "http_request_duration_seconds_count", method="GET", endpoint=endpoint
+    ) == 1
+    assert delta("http_response_bytes_total", endpoint=endpoint) == (
+      len(response.content)
+    )
+    assert delta("db_queries_total", endpoint=endpoint) > 0
+    assert delta("db_rows_fetched_total", endpoint=endpoint) > 0
+
+  def test_counts_failed_requests(
+    self, client: TestClient, create_campaign, monkeypatch
+  ):
+    """A request whose endpoint raises is counted as a 500."""
+    create_campaign("Failing")
+
+    def fail(*args, **kwargs):
+      raise RuntimeError("summary failed")
+
+    monkeypatch.setattr(crud, "get_sites_summary", fail)
+    before = client.get("/metrics").text
+    endpoint = "/campaigns/{campaign_id}/sites/summary"
+
+    with pytest.raises(RuntimeError):
+      client.get("/campaigns/Failing/sites/summary")
+    after = client.get("/metrics").text
+
+    assert sample(
+      after, "http_requests_total", method="GET", endpoint=endpoint,
+      status="500"
+    ) - sample(
+      before, "http_requests_total", method="GET", endpoint=endpoint,
+      status="500"
+    ) == 1
@@ -0,0 +1,354 @@
+"""
+Tests for schema upgrades of existing databases.
+"""
+import sqlite3
+from datetime import date
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import Session
+
+from app import config, ingest, intervals, migrations, models
+
+BASELINE_SCHEMA = """
+CREATE TABLE campaigns (
+  name VARCHAR NOT NULL, tipo_campania VARCHAR, fecha_inicio DATE,
+  fecha_fin DATE, universo_zona_metro INTEGER, impactos_personas INTEGER,
+  impactos_vehiculos INTEGER, frecuencia_calculada FLOAT,
+  frecuencia_promedio FLOAT, alcance INTEGER, nse_ab FLOAT, nse_c FLOAT,
+  nse_cmas FLOAT, nse_d FLOAT, nse_dmas FLOAT, nse_e FLOAT,
+  edad_0a14 FLOAT, edad_15a19 FLOAT, edad_20a24 FLOAT, edad_25a34 FLOAT,
+  edad_35a44 FLOAT, edad_45a64 FLOAT, edad_65mas FLOAT, hombres FLOAT,
+  mujeres FLOAT, PRIMARY KEY (name)
+);
+CREATE TABLE campaign_periods (
+  id INTEGER NOT NULL, campaign_name VARCHAR, period VARCHAR,
+  impactos_periodo_personas INTEGER, impactos_periodo_vehiculos INTEGER,
+  PRIMARY KEY (id), FOREIGN KEY(campaign_name) REFERENCES campaigns (name)
+);
+CREATE TABLE campaign_sites (
+  id INTEGER NOT NULL, campaign_name VARCHAR, codigo_del_sitio VARCHAR,
+  tipo_de_mueble VARCHAR, tipo_de_anuncio VARCHAR, estado VARCHAR,
+  municipio VARCHAR, zm VARCHAR, frecuencia_catorcenal FLOAT,
+  frecuencia_mensual FLOAT, impactos_catorcenal INTEGER,
+  impactos_mensuales INTEGER, alcance_mensual FLOAT,
+  PRIMARY KEY (id), FOREIGN KEY(campaign_name) REFERENCES campaigns (name)
+);
+INSERT INTO campaigns (name, tipo_campania, fecha_inicio, fecha_fin)
+  VALUES ('Camp', 'mensual', '2023-01-01', '2023-01-31'),
+         ('Fourteen', 'catorcenal', '2025-08-05', '2025-08-18');
+INSERT INTO campaign_periods (campaign_name, period)
+  VALUES ('Camp', '2023-01'), ('Fourteen', '2025-17');
+INSERT INTO campaign_sites (
+  campaign_name, codigo_del_sitio, tipo_de_mueble, municipio
+) VALUES ('Camp', 'S1', 'Muros', 'CityA');
+"""
+
+
+def create_baseline_database(path, version: int = 0) -> None:
+  """Helper to create a database with the first released schema.
+
+  Migrations up to `version` are applied without clearing the dataset.
+  """
+  connection = sqlite3.connect(path)
+  connection.executescript(BASELINE_SCHEMA)
+  if version >= 1:
+    connection.executescript("""
+      ALTER TABLE campaign_sites ADD COLUMN id_fourteen VARCHAR;
+      ALTER TABLE campaign_sites ADD COLUMN mes VARCHAR;
+    """)
+  if version >= 2:
+    connection.executescript("""
+      ALTER TABLE campaign_periods ADD COLUMN period_start DATE;
+      ALTER TABLE campaign_periods ADD COLUMN period_end DATE;
+      ALTER TABLE campaign_periods ADD COLUMN granularity VARCHAR(12);
+    """)
+  if version >= 3:
+    for statement in intervals.INTERVAL_INDEX_DDL:
+      connection.execute(statement)
+  connection.execute(f"PRAGMA user_version = {version}")
+  connection.commit()
+  connection.close()
+
+  engine = create_engine(f"sqlite:///{path}")
+  with engine.begin() as sa_connection:
+    for migration in migrations.MIGRATIONS[3:version]:
+      migration(sa_connection)
+    sa_connection.exec_driver_sql(f"PRAGMA user_version = {version}")
+  engine.dispose()
+
+
+def schema_version(engine) -> int:
+  """Helper to read the recorded schema version."""
+  with engine.connect() as connection:
+    return migrations.get_schema_version(connection)
+
+
+class TestUpgradeDatabase:
+  """Tests for upgrade_database."""
+
+  def test_fresh_database(self, tmp_path):
+    """A new database is created at the latest version."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+
+    migrations.upgrade_database(engine)
+
+    assert inspect(engine).has_table("campaigns")
+    assert schema_version(engine) == migrations.SCHEMA_VERSION
+
+  def test_upgrades_baseline_database(self, tmp_path):
+    """A baseline database gains the new columns and is marked for reseed."""
+    path = tmp_path / "baseline.db"
+    create_baseline_database(path)
+    engine = create_engine(f"sqlite:///{path}")
+
+    migrations.upgrade_database(engine)
+
+    site_columns = {
+      column["name"] for column in inspect(engine).get_columns("campaign_sites")
+    }
+    assert {"id_fourteen", "mes"} <= site_columns
+    assert schema_version(engine) == migrations.SCHEMA_VERSION
+    with Session(engine) as db:
+      assert db.query(models.Campaign).count() == 2
+      assert db.query(models.CampaignSite).count() == 1
+      marked = db.query(models.ReseedRequired).one()
+      assert marked.migration == "add_site_period_columns"
+
+  def test_marked_dataset_is_reseeded(
+    self, tmp_path, caplog, monkeypatch
+  ):
+    """Startup reloads a dataset marked for reseed from the source files."""
+    monkeypatch.setattr(config, "SNAPSHOT_DIR", tmp_path / "snapshot")
+    path = tmp_path / "baseline.db"
+    create_baseline_database(path)
+    engine = create_engine(f"sqlite:///{path}")
+    migrations.upgrade_database(engine)
+
+    with Session(engine) as db:
+      ingest.seed_database_if_empty(db)
+
+      assert db.query(models.Campaign).filter_by(name="Camp").count() == 0
+      assert db.query(models.Campaign).count() == 12
+      assert db.query(models.CampaignSite).filter(
+        models.CampaignSite.mes.is_(None)
+      ).count() == 0
+      assert db.query(models.ReseedRequired).count() == 0
+    assert "site bookings have no fourteen-day period" in caplog.text
+
+  def test_empty_database_needs_no_reseed(self, tmp_path):
+    """Without loaded sites there is nothing to reseed."""
+    path = tmp_path / "empty.db"
+    create_baseline_database(path)
+    connection = sqlite3.connect(path)
+    connection.execute("DELETE FROM campaign_sites")
+    connection.commit()
+    connection.close()
+    engine = create_engine(f"sqlite:///{path}")
+
+    migrations.upgrade_database(engine)
+
+    with Session(engine) as db:
+      assert db.query(models.ReseedRequired).count() == 0
+
+  def test_backfills_period_dates(self, tmp_path):
+    """Period labels are turned into dates using the campaign type."""
+    path = tmp_path / "version1.db"
+    create_baseline_database(path, version=1)
+    engine = create_engine(f"sqlite:///{path}")
+
+    migrations.upgrade_database(engine)
+
+    with engine.connect() as connection:
+      periods = connection.exec_driver_sql(
+        "SELECT period, period_start, period_end, granularity "
+        "FROM campaign_periods ORDER BY period"
+      ).all()
+    assert periods == [
+      ("2023-01", "2023-01-01", "2023-01-31", "month"),
+      ("2025-17", "2025-08-05", "2025-08-18", "fourteen_day")
+    ]
+    index_names = {
+      index["name"] for index in inspect(engine).get_indexes("campaign_periods")
+    }
+    assert "ix_campaign_periods_campaign_start" in index_names
+
+  def test_indexes_campaign_intervals(self, tmp_path):
+    """Loaded campaigns are added to the interval index."""
+    path = tmp_path / "version2.db"
+    create_baseline_database(path, version=2)
+    engine = create_engine(f"sqlite:///{path}")
+
+    migrations.upgrade_database(engine)
+
+    with engine.connect() as connection:
+      intervals = connection.exec_driver_sql(
+        "SELECT start_day, end_day FROM campaign_intervals ORDER BY id"
+      ).all()
+    assert intervals == [(19358, 19388), (20305, 20318)]
+
+  def test_locates_sites_and_builds_rollups(self, tmp_path):
+    """Loaded sites get a municipio and the rollup cube is filled."""
+    path = tmp_path / "version3.db"
+    create_baseline_database(path, version=3)
+    engine = create_engine(f"sqlite:///{path}")
+
+    migrations.upgrade_database(engine)
+
+    with engine.connect() as connection:
+      located = connection.exec_driver_sql(
+        "SELECT m.name FROM sites AS s "
+        "JOIN municipios AS m ON m.id = s.municipio_id"
+      ).all()
+      rollups = connection.exec_driver_sql(
+        "SELECT level, sites FROM geo_rollups ORDER BY level"
+      ).all()
+    assert located == [("CityA",)]
+    assert rollups == [("estado", 1), ("municipio", 1), ("zm", 1)]
+
+  def test_encodes_site_dimensions(self, tmp_path):
+    """Site strings move to lookup tables and read back unchanged."""
+    path = tmp_path / "version4.db"
+    create_baseline_database(path, version=4)
+    engine = create_engine(f"sqlite:///{path}")
+
+    migrations.upgrade_database(engine)
+
+    site_columns = {
+      column["name"] for column in inspect(engine).get_columns("sites")
+    }
+    assert {"furniture_type_id", "ad_type_id", "municipio_id"} <= site_columns
+    assert not {"tipo_de_mueble", "municipio", "estado"} & site_columns
+    with Session(engine) as db:
+      site = db.query(models.CampaignSite).one()
+      assert (site.codigo_del_sitio, site.municipio) == ("S1", "CityA")
+      assert site.tipo_de_mueble == "Muros"
+      assert site.tipo_de_anuncio is None
+
+  def test_keys_campaigns_by_id(self, tmp_path):
+    """Periods and sites reference integer campaign ids after the upgrade."""
+    path = tmp_path / "version5.db"
+    create_baseline_database(path, version=5)
+    engine = create_engine(f"sqlite:///{path}")
+
+    migrations.upgrade_database(engine)
+
+    period_columns = {
+      column["name"]
+      for column in inspect(engine).get_columns("campaign_periods")
+    }
+    assert "campaign_id" in period_columns
+    assert "campaign_name" not in period_columns
+    with Session(engine) as db:
+      fourteen = db.query(models.Campaign).filter_by(name="Fourteen").one()
+      period = db.query(models.CampaignPeriod).filter_by(period="2025-17").one()
+      site = db.query(models.CampaignSite).one()
+      assert fourteen.id == 2
+      assert (period.campaign_id, period.campaign_name) == (2, "Fourteen")
+      assert (site.campaign_name, site.tipo_de_mueble) == ("Camp", "Muros")
+
+      db.add(models.Campaign(name="New", fecha_inicio=date(2024, 1, 1)))
+      db.commit()
+      intervals = db.execute(
+        text("SELECT id FROM campaign_intervals ORDER BY id")
+      ).scalars().all()
+      assert intervals == [1, 2, 3]
+
+  def test_registers_booked_sites(self, tmp_path):
+    """A site booked by two campaigns is registered once."""
+    path = tmp_path / "version6.db"
+    create_baseline_database(path, version=6)
+    connection = sqlite3.connect(path)
+    connection.execute(
+      "INSERT INTO campaign_sites ("
+      "  campaign_id, codigo_del_sitio, id_fourteen, furniture_type_id,"
+      "  municipio_id"
+      ") SELECT 2, codigo_del_sitio, '2025-17', furniture_type_id,"
+      "  municipio_id FROM campaign_sites"
+    )
+    connection.commit()
+    connection.close()
+    engine = create_engine(f"sqlite:///{path}")
+
+    migrations.upgrade_database(engine)
+
+    booking_columns = {
+      column["name"] for column in inspect(engine).get_columns("campaign_sites")
+    }
+    assert "site_id" in booking_columns
+    assert "codigo_del_sitio" not in booking_columns
+    with Session(engine) as db:
+      bookings = db.query(models.CampaignSite).order_by(models.CampaignSite.id)
+      assert [
+        (booking.campaign_name, booking.codigo_del_sitio, booking.municipio)
+        for booking in bookings
+      ] == [("Camp", "S1", "CityA"), ("Fourteen", "S1", "CityA")]
+      assert db.query(models.Site).count() == 1
+
+  def test_builds_metric_sketches(self, tmp_path):
+    """Existing bookings get their site metric sketches."""
+    path = tmp_path / "version7.db"
+    create_baseline_database(path, version=7)
+    connection = sqlite3.connect(path)
+    connection.execute("UPDATE campaign_sites SET impactos_mensuales = 100")
+    connection.commit()
+    connection.close()
+    engine = create_engine(f"sqlite:///{path}")
+
+    migrations.upgrade_database(engine)
+
+    with Session(engine) as db:
+      sketch = db.query(models.MetricSketch).one()
+      assert (sketch.metric, sketch.count) == ("impactos_mensuales", 1)
+
+  def test_builds_distinct_sketches(self, tmp_path):
+    """Existing bookings get their distinct site and municipio sketches."""
+    path = tmp_path / "version8.db"
+    create_baseline_database(path, version=8)
+    engine = create_engine(f"sqlite:///{path}")
+
+    migrations.upgrade_database(engine)
+
+    with Session(engine) as db:
+      dimensions = db.query(models.DistinctSketch.dimension).order_by(
+        models.DistinctSketch.dimension
+      ).all()
+      assert dimensions == [("municipios",), ("sites",)]
+
+  def test_failed_upgrade_changes_nothing(self, tmp_path, monkeypatch):
+    """A failing migration rolls back the earlier ones; a retry succeeds."""
+    path = tmp_path / "baseline.db"
+    create_baseline_database(path)
+    engine = create_engine(f"sqlite:///{path}")
+
+    def fail(connection):
+      raise RuntimeError("migration failed")
+
+    monkeypatch.setattr(
+      migrations, "MIGRATIONS",
+      [migrations.MIGRATIONS[0], fail, *migrations.MIGRATIONS[2:]]
+    )
+    with pytest.raises(RuntimeError):
+      migrations.upgrade_database(engine)
+
+    site_columns = {
+      column["name"] for column in inspect(engine).get_columns("campaign_sites")
+    }
+    assert "id_fourteen" not in site_columns
+    assert schema_version(engine) == 0
+
+    monkeypatch.undo()
+    migrations.upgrade_database(engine)
+
+    assert schema_version(engine) == migrations.SCHEMA_VERSION
+
+  def test_upgrade_is_idempotent(self, tmp_path):
+    """Running the upgrade twice leaves the database unchanged."""
+    path = tmp_path / "baseline.db"
+    create_baseline_database(path)
+    engine = create_engine(f"sqlite:///{path}")
+
+    migrations.upgrade_database(engine)
+    migrations.upgrade_database(engine)
+
+    assert schema_version(engine) == migrations.SCHEMA_VERSION
@@ -0,0 +1,110 @@
+"""
+Tests for the monthly and fourteen-day period calendar.
+"""
+from datetime import date
+
+import numpy as np
+import pytest
+
+from app.periods import (
+  GRANULARITY_BY_CAMPAIGN_TYPE, PeriodGranularity, bucket_start,
+  derive_period_columns, period_bounds
+)
+
+
+class TestPeriodBounds:
+  """Tests for period_bounds."""
+
+  def test_month(self):
+    """A monthly label covers the whole calendar month."""
+    assert period_bounds("2024-02", PeriodGranularity.MONTH) == (
+      date(2024, 2, 1), date(2024, 2, 29)
+    )
+
+  @pytest.mark.parametrize("label, start", [
+    ("2023-18", date(2023, 8, 22)),
+    ("2024-21", date(2024, 10, 1)),
+    ("2025-17", date(2025, 8, 5)),
+    ("2025-19", date(2025, 9, 2)),
+  ])
+  def test_catorcena(self, label, start):
+    """Catorcenas follow the continuous fourteen-day grid."""
+    assert period_bounds(label, PeriodGranularity.FOURTEEN_DAY) == (
+      start, date.fromordinal(start.toordinal() + 13)
+    )
+
+  @pytest.mark.parametrize("label, granularity", [
+    ("2025-13", PeriodGranularity.MONTH),
+    ("2025-00", PeriodGranularity.FOURTEEN_DAY),
+    ("2025-27", PeriodGranularity.FOURTEEN_DAY),
+    ("2025", PeriodGranularity.MONTH),
+  ])
+  def test_invalid_labels(self, label, granularity):
+    """Labels naming no month or catorcena raise ValueError."""
+    with pytest.raises(ValueError):
+      period_bounds(label, granularity)
+
+
+class TestDerivePeriodColumns:
+  """Tests for derive_period_columns."""
+
+  def test_matches_period_bounds(self):
+    """Every label of a chunk gets the bounds period_bounds computes."""
+    labels = [
+      f"{year}-{number:02d}" for year in range(2021, 2027)
+      for number in range(0, 29)
+    ] + ["2025", "2025-7", "25-01", "2025-x", "0000-01", "x-01", ""]
+    cases = [
+      (label, campaign_type)
+      for label in labels for campaign_type in GRANULARITY_BY_CAMPAIGN_TYPE
+    ]
+
+    derived = derive_period_columns({
+      "period": np.array([label for label, _ in cases]),
+      "granularity": np.array([campaign_type for _, campaign_type in cases])
+    })
+
+    for index, (label, campaign_type) in enumerate(cases):
+      granularity = GRANULARITY_BY_CAMPAIGN_TYPE[campaign_type]
+      try:
+        expected = period_bounds(label, granularity)
+      except ValueError:
+        expected = (None, None)
+      assert (
+        derived.columns["period_start"][index].item(),
+        derived.columns["period_end"][index].item()
+      ) == expected, label
+      assert derived.rejections["invalid_period"][index] == (
+        expected[0] is None
+      )
+    assert set(derived.columns["granularity"]) == {"month", "fourteen_day"}
+
+  def test_unknown_campaign_type(self):
+    """Rows of an unknown campaign type are rejected for that reason only."""
+    derived = derive_period_columns({
+      "period": np.array(["2025-01"]), "granularity": np.array(["anual"])
+    })
+
+    assert derived.rejections["invalid_campaign_type"].tolist() == [True]
+    assert derived.rejections["invalid_period"].tolist() == [False]
+    assert derived.columns["granularity"].tolist() == [""]
+    assert np.isnat(derived.columns["period_start"]).all()
+
+
+class TestBucketStart:
+  """Tests for bucket_start."""
+
+  def test_week_starts_on_monday(self):
+    """Weeks start on the Monday on or before the day."""
+    assert bucket_start(
+      date(2025, 8, 10), PeriodGranularity.WEEK
+    ) == date(2025, 8, 4)
+
+  def test_catorcena_alignment(self):
+    """Days map to the catorcena that contains them."""
+    assert bucket_start(
+      date(2025, 8, 18), PeriodGranularity.FOURTEEN_DAY
+    ) == date(2025, 8, 5)
+    assert bucket_start(
+      date(2023, 1, 1), PeriodGranularity.FOURTEEN_DAY
+    ) == date(2022, 12, 27)
@@ -0,0 +1,147 @@
+"""
+Tests for reach and frequency planning over the site matrix.
+"""
+from datetime import date
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import planning
+from app.main import app, get_site_matrix
+
+@pytest.fixture
+def create_metro_campaign(create_campaign):
+  """Factory adding an October campaign sized for its metro areas."""
+  def create(name: str, universo: int) -> None:
+    create_campaign(
+      name, fecha_fin=date(2024, 10, 31), universo_zona_metro=universo
+    )
+
+  return create
+
+
+@pytest.fixture
+def book_reach(book_site):
+  """Factory booking a site of a metro area, at a frequency of 10 by default."""
+  def book(
+    campaign_name: str,
+    codigo: str,
+    zm: str,
+    alcance: float,
+    mes: str = "2024-10",
+    frecuencia: float = 10.0
+  ) -> None:
+    book_site(
+      campaign_name,
+      codigo,
+      mes=mes,
+      estado=f"Estado {zm}",
+      municipio=f"Municipio {zm}",
+      zm=zm,
+      frecuencia_mensual=frecuencia,
+      impactos_mensuales=int(alcance * frecuencia),
+      alcance_mensual=alcance
+    )
+
+  return book
+
+
+@pytest.fixture
+def matrix(
+  create_metro_campaign, book_reach, export_snapshot
+) -> planning.SiteMatrix:
+  """Two sites in Norte (1,000 people) and one in Sur (2,000 people)."""
+  create_metro_campaign("Norte", 1000)
+  create_metro_campaign("Ambas", 3000)
+  book_reach("Norte", "N1", "Norte", 100.0)
+  book_reach("Norte", "N2", "Norte", 200.0)
+  book_reach("Ambas", "N1", "Norte", 100.0, mes="2024-11")
+  book_reach("Ambas", "S1", "Sur", 500.0, mes="2024-11")
+  return planning.build_site_matrix(export_snapshot())
+
+
+class TestBuildSiteMatrix:
+  """Tests for build_site_matrix."""
+
+  def test_estimates_metro_area_universes(self, matrix):
+    """Single-area campaigns size their area; shared ones size the rest."""
+    universes = dict(zip(matrix.zone_names.tolist(), matrix.universes))
+    assert universes == {"Norte": 1000.0, "Sur": 2000.0}
+
+  def test_carries_estimates_forward(self, matrix):
+    """Months without a booking reuse the site's latest estimate."""
+    assert matrix.months.tolist() == ["2024-10", "2024-11"]
+    rows, _ = matrix.locate(["N2"])
+    reach, _ = matrix.estimates("2024-11")
+    assert reach[rows].tolist() == [200.0]
+
+
+class TestPlan:
+  """Tests for SiteMatrix.plan."""
+
+  def test_deduplicates_reach_within_metro_area(self, matrix):
+    """Audiences of one metro area overlap; metro areas add up."""
+    rows, unknown = matrix.locate(["N1", "N2", "S1", "N1", "Missing"])
+
+    plan = matrix.plan(rows)
+
+    assert unknown == ["Missing"]
+    assert plan["sites"] == 3
+    assert plan["universo"] == 3000
+    assert plan["alcance_bruto"] == 800
+    assert plan["alcance"] == 280 + 500
+    assert plan["impactos"] == 8000
+    assert plan["frecuencia_calculada"] == pytest.approx(8000 / 780)
+    assert plan["frecuencia_promedio"] == 10.0
+    assert [(zone["zm"], zone["alcance"]) for zone in plan["by_zm"]] == [
+      ("Sur", 500), ("Norte", 280)
+    ]
+
+  def test_month_before_any_booking(self, matrix):
+    """Sites without an estimate for the month add no reach."""
+    rows, _ = matrix.locate(["S1"])
+
+    plan = matrix.plan(rows, mes="2024-10")
+
+    assert (plan["sites"], plan["estimated_sites"]) == (1, 0)
+    assert plan["alcance"] == 0
+    assert plan["frecuencia_promedio"] == 0.0
+    assert plan["by_zm"] == []
+
+  def test_average_frequency_of_estimated_sites(
+    self, create_metro_campaign, book_reach, export_snapshot
+  ):
+    """Sites without an estimate for the month are left out of the mean."""
+    create_metro_campaign("Norte", 1000)
+    create_metro_campaign("Sur", 2000)
+    book_reach("Norte", "N1", "Norte", 100.0)
+    book_reach("Sur", "S1", "Sur", 500.0, mes="2024-11", frecuencia=4.0)
+    matrix = planning.build_site_matrix(export_snapshot())
+    rows, _ = matrix.locate(["N1", "S1"])
+
+    assert matrix.plan(rows, mes="2024-10")["frecuencia_promedio"] == 10.0
+    assert matrix.plan(rows, mes="2024-11")["frecuencia_promedio"] == 7.0
+
+
+class TestReachPlanningEndpoint:
+  """Tests for POST /planning/reach endpoint."""
+
+  def test_plans_selection(self, client: TestClient, matrix):
+    """Returns the deduplicated plan and lists unknown sites."""
+    app.dependency_overrides[get_site_matrix] = lambda: matrix
+
+    response = client.post(
+      "/planning/reach", json={"sites": ["N1", "N2", "X"], "mes": "2024-12"}
+    )
+
+    assert response.status_code == 200
+    data = response.json()
+    assert (data["alcance"], data["unknown_sites"]) == (280, ["X"])
+
+  def test_no_known_sites(self, client: TestClient, matrix):
+    """Returns 404 when none of the selected sites is registered."""
+    app.dependency_overrides[get_site_matrix] = lambda: matrix
+
+    response = client.post("/planning/reach", json={"sites": ["X"]})
+
+    assert response.status_code == 404
@@ -0,0 +1,173 @@
+"""
+Tests for top-N site rankings.
+"""
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app import models, ranking
+from app.main import app, get_site_ranking
+from app.ranking import RankingGroup, RankingMetric
+
+
+@pytest.fixture
+def book_impacts(book_site):
+  """Factory booking a site of CityA whose reach is a tenth of its impacts."""
+  def book(
+    campaign_name: str,
+    codigo: str,
+    tipo_mueble: str,
+    impactos: int,
+    **columns
+  ) -> None:
+    book_site(campaign_name, codigo, **{
+      "id_fourteen": "2024-21",
+      "tipo_de_mueble": tipo_mueble,
+      "municipio": "CityA",
+      "impactos_mensuales": impactos,
+      "alcance_mensual": impactos / 10,
+      **columns
+    })
+
+  return book
+
+
+@pytest.fixture
+def site_ranking(
+  create_campaign, book_impacts, export_snapshot
+) -> ranking.SiteRanking:
+  """Two campaigns sharing site V1 in October."""
+  create_campaign("Uno")
+  create_campaign("Dos")
+  book_impacts("Uno", "V1", "Vallas", 100)
+  book_impacts("Uno", "V1", "Vallas", 100, id_fourteen="2024-22")
+  book_impacts("Uno", "V1", "Vallas", 400, mes="2024-11")
+  book_impacts("Uno", "V2", "Vallas", 300)
+  book_impacts("Uno", "M1", "Muros", 50)
+  book_impacts("Dos", "V1", "Vallas", 100)
+  book_impacts("Dos", "M2", "Muros", 900)
+  return ranking.build_site_ranking(export_snapshot())
+
+
+def ranked(records: list) -> list:
+  """Helper returning (group, code, value) of ranked sites."""
+  return [
+    (record["group"], record["codigo_del_sitio"], record["impactos_mensuales"])
+    for record in records
+  ]
+
+
+class TestTop:
+  """Tests for SiteRanking.top."""
+
+  def test_portfolio_counts_site_months_once(self, site_ranking):
+    """A site booked twice in a month adds that month's impacts once."""
+    records = site_ranking.top(RankingMetric.IMPACTOS, 3)
+
+    assert ranked(records) == [
+      (None, "M2", 900), (None, "V1", 500), (None, "V2", 300)
+    ]
+    assert [record["rank"] for record in records] == [1, 2, 3]
+
+  def test_campaign_ranking(self, site_ranking, db: Session):
+    """Only the campaign's own bookings are ranked."""
+    campaign = db.query(models.Campaign).filter_by(name="Dos").one()
+
+    records = site_ranking.top(RankingMetric.IMPACTOS, 5, campaign.id)
+
+    assert ranked(records) == [(None, "M2", 900), (None, "V1", 100)]
+
+  def test_reach_is_best_month(self, site_ranking):
+    """Reach ranks by the site's largest monthly reach."""
+    records = site_ranking.top(RankingMetric.ALCANCE, 1)
+
+    assert records[0]["alcance_mensual"] == 90.0
+
+  def test_top_per_group(self, site_ranking, db: Session):
+    """Each furniture type gets its own top N."""
+    campaign = db.query(models.Campaign).filter_by(name="Uno").one()
+
+    portfolio = site_ranking.top(
+      RankingMetric.IMPACTOS, 1, group=RankingGroup.TIPO_DE_MUEBLE
+    )
+    in_campaign = site_ranking.top(
+      RankingMetric.IMPACTOS, 1, campaign.id, RankingGroup.TIPO_DE_MUEBLE
+    )
+
+    assert ranked(portfolio) == [("Muros", "M2", 900), ("Vallas", "V1", 500)]
+    assert ranked(in_campaign) == [("Muros", "M1", 50), ("Vallas", "V1", 500)]
+
+  def test_skips_bookings_without_a_site(
+    self, db: Session, create_campaign, book_impacts, export_snapshot
+  ):
+    """Bookings of a NULL or unknown site are not credited to any site."""
+    campaign = create_campaign("Uno")
+    book_impacts("Uno", "V1", "Vallas", 100)
+    book_impacts("Uno", "V2", "Vallas", 300)
+    for site_id in (None, 999):
+      db.execute(
+        text(
+          "INSERT INTO campaign_sites (campaign_id, site_id, mes,"
+          " impactos_mensuales) VALUES (:campaign, :site, '2024-10', 5000)"
+        ),
+        {"campaign": campaign.id, "site": site_id}
+      )
+    db.commit()
+
+    site_ranking = ranking.build_site_ranking(export_snapshot())
+
+    assert ranked(site_ranking.top(RankingMetric.IMPACTOS, 5)) == [
+      (None, "V2", 300), (None, "V1", 100)
+    ]
+    assert ranked(
+      site_ranking.top(RankingMetric.IMPACTOS, 5, campaign.id)
+    ) == [(None, "V2", 300), (None, "V1", 100)]
+
+  def test_unknown_campaign(self, site_ranking):
+    """A campaign without bookings ranks no sites."""
+    assert site_ranking.top(RankingMetric.IMPACTOS, 3, campaign_id=99) == []
+    assert site_ranking.top(
+      RankingMetric.IMPACTOS, 3, 99, RankingGroup.MUNICIPIO
+    ) == []
+
+
+class TestTopN:
+  """Tests for the partial sort."""
+
+  def test_matches_full_sort(self):
+    """The partial sort returns the same winners as a full sort."""
+    values = np.random.default_rng(7).random(1_000)
+
+    assert ranking._top_n(values, 10).tolist() == (
+      np.argsort(-values)[:10].tolist()
+    )
+
+
+class TestSiteRankingEndpoint:
+  """Tests for GET /rankings/sites endpoint."""
+
+  def test_ranks_campaign_sites(self, client: TestClient, site_ranking):
+    """Ranks a campaign's sites by the chosen metric."""
+    app.dependency_overrides[get_site_ranking] = lambda: site_ranking
+
+    response = client.get(
+      "/rankings/sites?campaign=Uno&metric=alcance_mensual&limit=1"
+      "&group_by=tipo_de_mueble"
+    )
+
+    assert response.status_code == 200
+    data = response.json()
+    assert (data["metric"], data["group_by"]) == (
+      "alcance_mensual", "tipo_de_mueble"
+    )
+    assert [site["codigo_del_sitio"] for site in data["data"]] == ["M1", "V1"]
+
+  def test_not_found(self, client: TestClient, site_ranking):
+    """Returns 404 for non-existent campaign."""
+    app.dependency_overrides[get_site_ranking] = lambda: site_ranking
+
+    response = client.get("/rankings/sites?campaign=NonExistent")
+
+    assert response.status_code == 404
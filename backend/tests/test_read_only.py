@@ -0,0 +1,58 @@
+"""
+Tests for serving a prepared dataset read-only.
+"""
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from app import config, ingest, main
+from app.database import database_url
+
+
+class TestReadOnlyDatabase:
+  """Tests for the read-only database URL."""
+
+  def test_reads_but_rejects_writes(self, tmp_path):
+    """A read-only engine sees the data and cannot change it."""
+    path = tmp_path / "campaigns.db"
+    writer = create_engine(database_url(str(path)))
+    with writer.begin() as connection:
+      connection.execute(text("CREATE TABLE campaigns (name TEXT)"))
+      connection.execute(text("INSERT INTO campaigns VALUES ('A')"))
+    reader = create_engine(database_url(str(path), read_only=True))
+
+    with reader.connect() as connection:
+      assert connection.execute(
+        text("SELECT name FROM campaigns")
+      ).scalar_one() == "A"
+      with pytest.raises(OperationalError, match="readonly"):
+        connection.execute(text("INSERT INTO campaigns VALUES ('B')"))
+
+
+class TestPreparedDataset:
+  """Tests for starting workers on a dataset prepared by another process."""
+
+  def test_missing_snapshot_is_an_error(self, db, tmp_path, monkeypatch):
+    """Workers refuse to start before `seed.py --prepare` has run."""
+    monkeypatch.setattr(config, "SNAPSHOT_DIR", tmp_path / "snapshot")
+
+    with pytest.raises(ingest.UnpreparedDatasetError, match="--prepare"):
+      ingest.open_prepared_snapshot(db)
+
+  def test_read_only_startup_does_not_seed(
+    self, client: TestClient, monkeypatch
+  ):
+    """Read-only startup only opens the snapshot left by the preparation."""
+    def fail(*args):
+      pytest.fail("a read-only worker wrote to the dataset")
+
+    monkeypatch.setattr(config, "DATABASE_READ_ONLY", True)
+    monkeypatch.setattr(main, "seed_database_if_empty", fail)
+    monkeypatch.setattr(main, "prepare_dataset_snapshot", fail)
+
+    with TestClient(main.app) as read_only_client:
+      response = read_only_client.get("/health")
+
+    assert response.status_code == 200
+    assert main.SERVING.current.state.snapshot is not None
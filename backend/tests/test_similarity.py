@@ -0,0 +1,83 @@
+"""
+Tests for demographic similarity between campaigns.
+"""
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app, get_campaign_matrix
+from app.similarity import (
+  CampaignMatrix, DEMOGRAPHIC_COLUMNS, DistanceMetric, build_campaign_matrix
+)
+
+@pytest.fixture
+def matrix(create_campaign, export_snapshot) -> CampaignMatrix:
+  """Campaigns with 90%, 80%, 40% and 10% of their audience in NSE AB."""
+  for name, nse_ab in [("A", 0.9), ("B", 0.8), ("C", 0.4), ("D", 0.1)]:
+    create_campaign(
+      name, nse_ab=nse_ab, nse_c=1 - nse_ab, hombres=0.5, mujeres=0.5
+    )
+  return build_campaign_matrix(export_snapshot())
+
+
+class TestBuildCampaignMatrix:
+  """Tests for build_campaign_matrix."""
+
+  def test_one_row_per_campaign(self, matrix):
+    """Profiles form a contiguous matrix; missing shares are 0."""
+    assert matrix.profiles.shape == (4, len(DEMOGRAPHIC_COLUMNS))
+    assert matrix.profiles.flags["C_CONTIGUOUS"]
+    assert matrix.profiles[0].sum() == pytest.approx(2.0)
+
+
+class TestNearest:
+  """Tests for CampaignMatrix.nearest."""
+
+  def test_l1_ranking(self, matrix):
+    """Closest campaigns come first and the campaign itself is left out."""
+    nearest = matrix.nearest(1, DistanceMetric.L1, limit=2)
+
+    assert [campaign["name"] for campaign in nearest] == ["B", "C"]
+    assert nearest[0]["distance"] == pytest.approx(0.2)
+
+  def test_cosine_ranking(self, matrix):
+    """Cosine distance ranks by the direction of the profile."""
+    nearest = matrix.nearest(4, DistanceMetric.COSINE, limit=10)
+
+    assert [campaign["name"] for campaign in nearest] == ["C", "B", "A"]
+    assert all(campaign["distance"] > 0 for campaign in nearest)
+
+  def test_empty_profile(self):
+    """A campaign without demographics is at cosine distance 1."""
+    matrix = CampaignMatrix(
+      np.array([1, 2]), np.array(["A", "B"]),
+      np.array([[0.0, 1.0], [0.0, 0.0]])
+    )
+
+    assert matrix.nearest(1, DistanceMetric.COSINE, 1)[0]["distance"] == 1.0
+
+  def test_unknown_campaign(self, matrix):
+    """Returns no campaigns for an id outside the matrix."""
+    assert matrix.nearest(99, DistanceMetric.L1, 3) == []
+
+
+class TestSimilarCampaignsEndpoint:
+  """Tests for GET /campaigns/{id}/similar endpoint."""
+
+  def test_returns_nearest(self, client: TestClient, matrix):
+    """Returns the nearest campaigns for the chosen metric."""
+    app.dependency_overrides[get_campaign_matrix] = lambda: matrix
+
+    response = client.get("/campaigns/D/similar?metric=l1&limit=1")
+
+    assert response.status_code == 200
+    assert response.json()["metric"] == "l1"
+    assert [c["name"] for c in response.json()["data"]] == ["C"]
+
+  def test_not_found(self, client: TestClient, matrix):
+    """Returns 404 for non-existent campaign."""
+    app.dependency_overrides[get_campaign_matrix] = lambda: matrix
+
+    response = client.get("/campaigns/NonExistent/similar")
+
+    assert response.status_code == 404
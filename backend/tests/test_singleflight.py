@@ -0,0 +1,131 @@
+"""
+Tests for coalescing concurrent identical reads.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import config, metrics
+from app.singleflight import SingleFlight
+
+
+def flight_calls(operation: str, outcome: str) -> float:
+  """Helper reading a single-flight counter."""
+  return metrics.REGISTRY.flights.values.get((operation, outcome), 0)
+
+
+def run_concurrently(flights: SingleFlight, calls: int, compute):
+  """Helper starting `calls` identical calls while the first one blocks.
+
+  The leader runs `compute` only after every follower has started, so all
+  of them join its flight.
+  """
+  release = threading.Event()
+  started = threading.Event()
+
+  def blocked():
+    started.set()
+    release.wait(5)
+    return compute()
+
+  with ThreadPoolExecutor(max_workers=calls) as pool:
+    leader = pool.submit(flights.do, "test", "key", blocked)
+    started.wait(5)
+    followers = [
+      pool.submit(flights.do, "test", "key", compute)
+      for _ in range(calls - 1)
+    ]
+    while sum(f.running() for f in followers) < calls - 1:
+      time.sleep(0.001)
+    time.sleep(0.05)
+    release.set()
+    return [leader] + followers
+
+
+class TestSingleFlight:
+  """Tests for SingleFlight."""
+
+  def test_concurrent_calls_share_one_computation(self):
+    """Only the leader computes; every caller gets its result."""
+    flights = SingleFlight()
+    computed = []
+    shared_before = flight_calls("test", "shared")
+
+    def compute():
+      computed.append(1)
+      return {"sites": 3}
+
+    futures = run_concurrently(flights, 5, compute)
+
+    assert [future.result() for future in futures] == [{"sites": 3}] * 5
+    assert len(computed) == 1
+    assert flight_calls("test", "shared") - shared_before == 4
+    assert flights.in_flight() == 0
+
+  def test_leader_error_is_shared(self):
+    """Followers see the exception raised by the leader."""
+    flights = SingleFlight()
+
+    def compute():
+      raise ValueError("boom")
+
+    futures = run_concurrently(flights, 3, compute)
+
+    for future in futures:
+      with pytest.raises(ValueError, match="boom"):
+        future.result()
+    assert flights.in_flight() == 0
+
+  def test_followers_compute_after_timeout(self, monkeypatch):
+    """A follower stops waiting for a stalled leader after the timeout."""
+    monkeypatch.setattr(config, "SINGLE_FLIGHT_TIMEOUT_S", 0.01)
+    flights = SingleFlight()
+    release = threading.Event()
+    timeouts_before = flight_calls("test", "timeout")
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+      leader = pool.submit(
+        flights.do, "test", "key", lambda: release.wait(5) and "leader"
+      )
+      while not flights.in_flight():
+        time.sleep(0.001)
+      follower = flights.do("test", "key", lambda: "own")
+      release.set()
+
+      assert follower == "own"
+      assert leader.result() == "leader"
+    assert flight_calls("test", "timeout") - timeouts_before == 1
+
+  def test_sequential_calls_recompute(self):
+    """A finished flight is not a cache: the next call computes again."""
+    flights = SingleFlight()
+    results = iter([1, 2])
+
+    assert flights.do("test", "key", lambda: next(results)) == 1
+    assert flights.do("test", "key", lambda: next(results)) == 2
+
+  def test_keys_do_not_share(self):
+    """Calls with other keys or operations run their own computation."""
+    flights = SingleFlight()
+
+    assert flights.do("test", 1, lambda: "one") == "one"
+    assert flights.do("test", 2, lambda: "two") == "two"
+    assert flights.do("other", 1, lambda: "other") == "other"
+
+
+class TestCoalescedEndpoints:
+  """Tests for the coalesced campaign endpoints."""
+
+  def test_flights_are_exported(self, client: TestClient):
+    """The campaign reads are counted in /metrics."""
+    client.get("/campaigns/Missing/sites/summary")
+
+    body = client.get("/metrics").text
+
+    assert (
+      'singleflight_calls_total{operation="sites_summary",outcome="leader"}'
+      in body
+    )
@@ -0,0 +1,177 @@
+"""
+Tests for the site metric quantile sketches.
+"""
+from datetime import date
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app import crud, models, sketches
+from app.sketches import DDSketch, SiteMetric
+
+
+def create_campaign(db: Session, name: str) -> models.Campaign:
+  """Helper to create a campaign."""
+  campaign = models.Campaign(name=name, fecha_inicio=date(2024, 10, 1))
+  db.add(campaign)
+  db.commit()
+  return campaign
+
+
+def book_sites(db: Session, campaign_name: str, impacts: list) -> None:
+  """Helper to book one site per impacts value, all in 2024-10."""
+  for index, impactos in enumerate(impacts):
+    db.add(models.CampaignSite(
+      campaign_name=campaign_name,
+      codigo_del_sitio=f"{campaign_name}-{index}",
+      mes="2024-10",
+      frecuencia_mensual=10.0,
+      impactos_mensuales=impactos,
+      alcance_mensual=impactos / 10
+    ))
+  db.commit()
+
+
+def build_sketches(db: Session) -> None:
+  """Helper to rebuild the sketches table."""
+  sketches.build_metric_sketches(db.connection())
+  db.commit()
+
+
+def percentiles(stats: dict) -> dict:
+  """Helper mapping each percentile to its value."""
+  return {row["percentile"]: row["value"] for row in stats["percentiles"]}
+
+
+class TestDDSketch:
+  """Tests for the DDSketch."""
+
+  def test_quantiles_within_relative_accuracy(self):
+    """Quantiles are within 1% of the exact ones."""
+    values = np.random.default_rng(3).lognormal(12, 1, 20_000)
+
+    sketch = DDSketch.from_values(values)
+
+    for q in (0.5, 0.9, 0.99):
+      assert sketch.quantile(q) == pytest.approx(
+        np.quantile(values, q), rel=0.02
+      )
+    assert (sketch.minimum, sketch.maximum) == (values.min(), values.max())
+
+  def test_merge_equals_single_sketch(self):
+    """Merging sketches of two halves equals sketching all values."""
+    values = np.random.default_rng(5).uniform(1, 1_000, 1_000)
+    first = DDSketch.from_values(values[:300])
+    second = DDSketch.from_values(values[300:])
+
+    first.merge(second)
+    whole = DDSketch.from_values(values)
+
+    assert first.count == whole.count
+    assert first.key_offset == whole.key_offset
+    assert first.bins.tolist() == whole.bins.tolist()
+
+  def test_zeros_and_missing_values(self):
+    """Zeros share one bucket and missing values are skipped."""
+    sketch = DDSketch.from_values(np.array([0.0, 0.0, np.nan, 5.0]))
+
+    assert (sketch.count, sketch.zero_count) == (3, 2)
+    assert sketch.quantile(0.5) == 0.0
+    assert sketch.quantile(1.0) == 5.0
+
+  def test_histogram(self):
+    """Histogram counts add up to the sketched values."""
+    sketch = DDSketch.from_values(np.array([1.0, 2.0, 9.0, 10.0]))
+
+    histogram = sketch.histogram(2)
+
+    assert [row["count"] for row in histogram] == [2, 2]
+    assert (histogram[0]["lower"], histogram[-1]["upper"]) == (1.0, 10.0)
+
+  def test_record_round_trip(self):
+    """A stored sketch reads back with the same buckets."""
+    sketch = DDSketch.from_values(np.array([3.0, 30.0, 300.0]))
+    record = models.MetricSketch(**sketch.to_record())
+
+    restored = DDSketch.from_record(record)
+
+    assert restored.bins.tolist() == sketch.bins.tolist()
+    assert restored.quantile(0.5) == sketch.quantile(0.5)
+
+
+class TestGetMetricStats:
+  """Tests for get_metric_stats over the stored sketches."""
+
+  def test_campaign_and_portfolio(self, db: Session):
+    """A campaign reads its own sketch; the portfolio merges them all."""
+    small = create_campaign(db, "Small")
+    create_campaign(db, "Large")
+    book_sites(db, "Small", [100, 200, 300])
+    book_sites(db, "Large", [1_000, 2_000, 3_000, 4_000])
+    build_sketches(db)
+
+    campaign_stats = crud.get_metric_stats(
+      db, SiteMetric.IMPACTOS, campaign_id=small.id
+    )
+    portfolio = crud.get_metric_stats(db, SiteMetric.IMPACTOS, bins=4)
+
+    assert (campaign_stats["campaigns"], campaign_stats["count"]) == (1, 3)
+    assert percentiles(campaign_stats)[50] == pytest.approx(200, rel=0.01)
+    assert campaign_stats["mean"] == pytest.approx(200)
+    assert (portfolio["campaigns"], portfolio["count"]) == (2, 7)
+    assert percentiles(portfolio)[50] == pytest.approx(1_000, rel=0.01)
+    assert (portfolio["minimum"], portfolio["maximum"]) == (100, 4_000)
+    assert sum(row["count"] for row in portfolio["histogram"]) == 7
+
+  def test_site_counts_once_per_month(self, db: Session):
+    """Two bookings of a site in one month are a single observation."""
+    create_campaign(db, "Repeat")
+    for catorcena in ("2024-21", "2024-22"):
+      db.add(models.CampaignSite(
+        campaign_name="Repeat",
+        codigo_del_sitio="S1",
+        id_fourteen=catorcena,
+        mes="2024-10",
+        impactos_mensuales=500
+      ))
+    db.commit()
+    build_sketches(db)
+
+    stats = crud.get_metric_stats(db, SiteMetric.IMPACTOS)
+
+    assert stats["count"] == 1
+
+  def test_empty(self, db: Session):
+    """Without sketches there are no values."""
+    stats = crud.get_metric_stats(db, SiteMetric.ALCANCE)
+
+    assert (stats["count"], stats["mean"], stats["histogram"]) == (0, None, [])
+    assert percentiles(stats)[99] is None
+
+
+class TestSiteStatsEndpoint:
+  """Tests for GET /stats/sites endpoint."""
+
+  def test_returns_percentiles(self, client: TestClient, db: Session):
+    """Returns percentiles and histogram of a campaign's metric."""
+    create_campaign(db, "Stats")
+    book_sites(db, "Stats", [100, 200, 300])
+    build_sketches(db)
+
+    response = client.get(
+      "/stats/sites?metric=frecuencia_mensual&campaign=Stats&bins=3"
+    )
+
+    assert response.status_code == 200
+    data = response.json()
+    assert (data["metric"], data["count"]) == ("frecuencia_mensual", 3)
+    assert percentiles(data)[90] == 10.0
+    assert len(data["histogram"]) == 3
+
+  def test_not_found(self, client: TestClient, db: Session):
+    """Returns 404 for non-existent campaign."""
+    response = client.get("/stats/sites?campaign=NonExistent")
+
+    assert response.status_code == 404
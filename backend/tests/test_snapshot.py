@@ -0,0 +1,219 @@
+"""
+Tests for the columnar dataset snapshot.
+"""
+from datetime import date
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app import config, ingest, migrations, models, snapshot
+
+
+def create_campaign(db: Session, name: str) -> models.Campaign:
+  """Helper to create a campaign."""
+  campaign = models.Campaign(
+    name=name,
+    tipo_campania="mensual",
+    fecha_inicio=date(2023, 1, 1),
+    fecha_fin=date(2023, 1, 31),
+    impactos_personas=500,
+    frecuencia_calculada=1.5
+  )
+  db.add(campaign)
+  db.commit()
+  return campaign
+
+
+def create_site(
+  db: Session,
+  campaign_name: str,
+  codigo: str,
+  tipo_mueble: str = "Billboard"
+) -> models.CampaignSite:
+  """Helper to create a campaign site."""
+  site = models.CampaignSite(
+    campaign_name=campaign_name,
+    codigo_del_sitio=codigo,
+    tipo_de_mueble=tipo_mueble,
+    tipo_de_anuncio="Digital",
+    estado="Activo",
+    municipio="TestMunicipio",
+    zm="ZM1",
+    impactos_mensuales=200,
+    alcance_mensual=0.5
+  )
+  db.add(site)
+  db.commit()
+  return site
+
+
+SOURCES = {"bd_campanias_agrupado.csv": [10, 1]}
+
+
+class TestWriteAndOpenSnapshot:
+  """Tests for writing and memory-mapping snapshots."""
+
+  def test_round_trip_arrays(self, tmp_path):
+    """Columns come back memory-mapped with the same values."""
+    directory = tmp_path / "snapshot"
+    snapshot.write_snapshot(
+      directory,
+      {
+        "sites": {
+          "impacts": np.array([1, 2, 3], dtype=np.int64),
+          "kind": np.array(["Vallas", "Muros", "Vallas"])
+        }
+      },
+      SOURCES
+    )
+
+    opened = snapshot.open_snapshot(directory)
+    sites = opened.table("sites")
+    assert len(sites) == 3
+    assert isinstance(sites.column("impacts"), np.memmap)
+    assert sites.column("impacts").tolist() == [1, 2, 3]
+    assert sites.values("kind").tolist() == ["Vallas", "Muros", "Vallas"]
+    assert sites.dictionary("kind").tolist() == ["Muros", "Vallas"]
+
+  def test_missing_snapshot(self, tmp_path):
+    """Returns None when no snapshot was written."""
+    assert snapshot.open_snapshot(tmp_path / "missing") is None
+
+  def test_stale_sources(self, tmp_path):
+    """Returns None when source files changed since the export."""
+    directory = tmp_path / "snapshot"
+    snapshot.write_snapshot(directory, {}, SOURCES)
+
+    changed = {"bd_campanias_agrupado.csv": [11, 2]}
+    assert snapshot.open_snapshot(directory, sources=changed) is None
+    assert snapshot.open_snapshot(directory, sources=SOURCES) is not None
+
+  def test_rewrite_replaces_previous(self, tmp_path):
+    """Writing again replaces the previous snapshot."""
+    directory = tmp_path / "snapshot"
+    snapshot.write_snapshot(
+      directory, {"t": {"a": np.array([1])}}, SOURCES
+    )
+    snapshot.write_snapshot(
+      directory, {"t": {"a": np.array([7, 8])}}, SOURCES
+    )
+
+    opened = snapshot.open_snapshot(directory)
+    assert opened.table("t").column("a").tolist() == [7, 8]
+    assert not (tmp_path / "snapshot.tmp").exists()
+
+
+class TestExportSnapshot:
+  """Tests for exporting the database to a snapshot."""
+
+  def test_exports_all_tables(self, db: Session, tmp_path):
+    """Every model table is exported with a matching schema."""
+    create_campaign(db, "Camp")
+    create_site(db, "Camp", "S1", tipo_mueble="Muros")
+    create_site(db, "Camp", "S2")
+    directory = tmp_path / "snapshot"
+
+    snapshot.export_snapshot(db, directory, SOURCES)
+
+    opened = snapshot.open_snapshot(
+      directory, sources=SOURCES, schema=snapshot.table_schema()
+    )
+    campaigns = opened.table("campaigns")
+    sites = opened.table("sites")
+    assert campaigns.values("name").tolist() == ["Camp"]
+    assert campaigns.column("fecha_inicio")[0] == np.datetime64("2023-01-01")
+    furniture_names = dict(zip(
+      opened.table("furniture_types").column("id").tolist(),
+      opened.table("furniture_types").values("name").tolist()
+    ))
+    assert [
+      furniture_names[key] for key in sites.column("furniture_type_id")
+    ] == ["Muros", "Billboard"]
+    assert sites.values("codigo_del_sitio").tolist() == ["S1", "S2"]
+    bookings = opened.table("campaign_sites")
+    assert bookings.column("impactos_mensuales").sum() == 400
+    assert len(opened.table("campaign_periods")) == 0
+
+  def test_missing_values(self, db: Session, tmp_path):
+    """NULL integers and strings are masked and floats exported as NaN."""
+    create_campaign(db, "Sparse")
+    directory = tmp_path / "snapshot"
+
+    snapshot.export_snapshot(db, directory, SOURCES)
+
+    campaigns = snapshot.open_snapshot(directory).table("campaigns")
+    assert campaigns.nulls("impactos_vehiculos").tolist() == [True]
+    assert campaigns.nulls("name") is None
+    assert np.isnan(campaigns.column("frecuencia_promedio")[0])
+    assert campaigns.records(0, 1)[0]["impactos_vehiculos"] is None
+
+
+class TestLoadSnapshot:
+  """Tests for rebuilding the database from a snapshot."""
+
+  def test_restores_rows(self, db: Session, tmp_path):
+    """Loading a snapshot restores the exported rows."""
+    create_campaign(db, "Camp")
+    create_site(db, "Camp", "S1")
+    directory = tmp_path / "snapshot"
+    snapshot.export_snapshot(db, directory, SOURCES)
+    migrations.clear_dataset(db.connection())
+    db.commit()
+
+    snapshot.load_snapshot(db, snapshot.open_snapshot(directory))
+
+    campaign = db.query(models.Campaign).one()
+    assert campaign.name == "Camp"
+    assert campaign.fecha_inicio == date(2023, 1, 1)
+    assert campaign.frecuencia_promedio is None
+    assert [
+      (site.codigo_del_sitio, site.tipo_de_mueble, site.municipio)
+      for site in campaign.sites
+    ] == [("S1", "Billboard", "TestMunicipio")]
+
+  def test_restores_nulls(self, db: Session, tmp_path):
+    """NULL columns, foreign keys included, come back as NULL."""
+    create_campaign(db, "Camp")
+    db.add(models.CampaignSite(
+      campaign_name="Camp", codigo_del_sitio="S1", tipo_de_anuncio="Digital"
+    ))
+    db.commit()
+    exported = db.query(models.Site).one()
+    foreign_keys = (exported.furniture_type_id, exported.municipio_id)
+    directory = tmp_path / "snapshot"
+    snapshot.export_snapshot(db, directory, SOURCES)
+    migrations.clear_dataset(db.connection())
+    db.commit()
+
+    snapshot.load_snapshot(db, snapshot.open_snapshot(directory))
+
+    campaign = db.query(models.Campaign).one()
+    site = db.query(models.Site).one()
+    assert campaign.impactos_vehiculos is None
+    assert site.furniture_type_id is None
+    assert (site.furniture_type_id, site.municipio_id) == foreign_keys
+
+
+class TestDatasetSnapshot:
+  """Tests for keying the served snapshot on its database."""
+
+  def test_reexports_after_database_changes(
+    self, db: Session, tmp_path, monkeypatch
+  ):
+    """A snapshot of an older state of the database is not served."""
+    monkeypatch.setattr(config, "SNAPSHOT_DIR", tmp_path / "snapshot")
+    create_campaign(db, "First")
+    ingest.prepare_dataset_snapshot(db)
+    create_campaign(db, "Second")
+
+    assert ingest.open_dataset_snapshot(db) is None
+    assert ingest.open_dataset_snapshot() is not None
+    prepared = ingest.prepare_dataset_snapshot(db)
+
+    assert prepared.table("campaigns").values("name").tolist() == [
+      "First", "Second"
+    ]
+    assert prepared.sources[ingest.DATABASE_SOURCE] == (
+      ingest.database_fingerprint(db)
+    )
+
@@ -0,0 +1,107 @@
+"""
+Tests for vectorized row validation.
+"""
+import numpy as np
+
+from app import validation
+from app.validation import ColumnSpec
+
+
+def check(kind: str, values: list) -> validation.ColumnCheck:
+  """Helper to run a column check over raw strings."""
+  return validation.COLUMN_CHECKS[kind](np.array(values, dtype=str))
+
+
+class TestCheckInt:
+  """Tests for integer columns."""
+
+  def test_plain_and_date_like(self):
+    """Date-like values keep their leading number and are flagged."""
+    result = check(validation.INT, ["12", "14566-06-26", ""])
+    assert result.values.tolist() == [12, 14566, 0]
+    assert result.repairs["date_like_integer"].tolist() == [
+      False, True, False
+    ]
+    assert result.repairs["missing_value"].tolist() == [False, False, True]
+
+  def test_rejects_garbage(self):
+    """Non numeric and overflowing values are rejected."""
+    result = check(validation.INT, ["abc", "-5", "1" * 25, "7"])
+    assert result.rejections["invalid_integer"].tolist() == [
+      True, True, False, False
+    ]
+    assert result.rejections["out_of_range"].tolist() == [
+      False, False, True, False
+    ]
+
+
+class TestCheckFloat:
+  """Tests for float columns."""
+
+  def test_parses_and_repairs(self):
+    """Floats parse, blanks become zero."""
+    result = check(validation.FLOAT, ["0.5", "", "1e-3"])
+    assert result.values.tolist() == [0.5, 0.0, 0.001]
+    assert result.repairs["missing_value"].tolist() == [False, True, False]
+
+  def test_rejects_invalid(self):
+    """Unparseable and non finite values are rejected."""
+    result = check(validation.FLOAT, ["x", "nan", "2"])
+    assert result.rejections["invalid_float"].tolist() == [True, True, False]
+    assert result.values.tolist() == [0.0, 0.0, 2.0]
+
+
+class TestCheckDate:
+  """Tests for date columns."""
+
+  def test_rejects_malformed_dates(self):
+    """Only real ISO dates are accepted."""
+    result = check(
+      validation.DATE, ["2025-03-01", "2025-02-30", "01/03/2025", ""]
+    )
+    assert result.rejections["invalid_date"].tolist() == [
+      False, True, True, True
+    ]
+    assert result.values[0] == np.datetime64("2025-03-01")
+
+
+class TestValidateChunk:
+  """Tests for validate_chunk."""
+
+  SPECS = [
+    ColumnSpec("name", "campaign_name", validation.KEY),
+    ColumnSpec("impacts", "impacts", validation.INT),
+  ]
+
+  def test_drops_rejected_rows(self):
+    """Rejected rows are dropped and reported with their line."""
+    rows = [
+      {"name": "A", "impacts": "10"},
+      {"name": "", "impacts": "20"},
+      {"name": "C", "impacts": "bad"},
+    ]
+
+    chunk = validation.validate_chunk("f.csv", rows, self.SPECS, 2)
+
+    assert chunk.records == [{"campaign_name": "A", "impacts": 10}]
+    assert chunk.lines == [2]
+    assert chunk.row_count == 3
+    assert [(i["line"], i["reason"]) for i in chunk.issues] == [
+      (3, "missing_key"), (4, "invalid_integer")
+    ]
+
+
+class TestIngestReport:
+  """Tests for IngestReport."""
+
+  def test_summary_counts(self, tmp_path):
+    """Summary groups issue counts per file, action and reason."""
+    issues_path = tmp_path / "issues.jsonl"
+    with validation.IngestReport(["f.csv"], issues_path) as report:
+      report.add_issues([
+        validation.make_issue("f.csv", 2, "a", "", "repaired", "missing"),
+        validation.make_issue("f.csv", 3, "a", "", "repaired", "missing"),
+      ])
+
+    assert report.summary()["files"]["f.csv"]["repaired"] == {"missing": 2}
+    assert len(issues_path.read_text().splitlines()) == 2
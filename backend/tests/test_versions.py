@@ -0,0 +1,201 @@
+"""
+Tests for versioned datasets and switching the served version.
+"""
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+
+from app import config, ingest, main, versions
+from app.database import ServedVersion, ServingDatabase
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+
+
+@pytest.fixture
+def data_dir(tmp_path: Path) -> Path:
+  """Copy of the bundled source CSVs."""
+  directory = tmp_path / "data"
+  directory.mkdir()
+  for path in ingest.source_paths(DATA_DIR):
+    shutil.copy(path, directory / path.name)
+  return directory
+
+
+@pytest.fixture
+def versions_dir(tmp_path: Path, monkeypatch) -> Path:
+  """An empty versions directory, served by a fresh set of engines."""
+  directory = tmp_path / "versions"
+  monkeypatch.setattr(config, "VERSIONS_DIR", directory)
+  monkeypatch.setattr(main, "SERVING", ServingDatabase())
+  return directory
+
+
+def build(versions_dir: Path, data_dir: Path, **options) -> int:
+  """Helper to build and publish a version serially."""
+  return versions.build_version(versions_dir, data_dir, workers=1, **options)
+
+
+def drop_last_campaign(data_dir: Path) -> None:
+  """Helper removing the last campaign row from the source CSV."""
+  path = data_dir / config.CAMPAIGNS_FILE
+  lines = path.read_text(encoding="utf-8").splitlines(keepends=True)
+  path.write_text("".join(lines[:-1]), encoding="utf-8")
+
+
+def campaigns_total(client: TestClient, **headers) -> tuple:
+  """Helper listing campaigns; returns the total and the served version."""
+  response = client.get("/campaigns/", headers=headers)
+  assert response.status_code == 200
+  return response.json()["total"], response.headers["x-dataset-version"]
+
+
+class TestBuildVersion:
+  """Tests for building and publishing dataset versions."""
+
+  def test_builds_and_publishes(self, versions_dir: Path, data_dir: Path):
+    """A refresh is numbered, published and holds a database and snapshot."""
+    assert versions.current_version(versions_dir) is None
+
+    assert build(versions_dir, data_dir) == 1
+    assert build(versions_dir, data_dir) == 2
+
+    assert versions.current_version(versions_dir) == 2
+    assert versions.available_versions(versions_dir) == [1, 2]
+    engine, dataset_snapshot = versions.open_version(versions_dir, 2)
+    engine.dispose()
+    assert len(dataset_snapshot.table("campaigns")) == 12
+
+  def test_invalid_refresh_is_not_published(
+    self, versions_dir: Path, data_dir: Path
+  ):
+    """A refresh failing validation leaves the current version in place."""
+    build(versions_dir, data_dir)
+    campaigns = data_dir / config.CAMPAIGNS_FILE
+    header = campaigns.read_text(encoding="utf-8").splitlines()[0]
+    campaigns.write_text(header + "\n", encoding="utf-8")
+
+    with pytest.raises(versions.InvalidVersionError, match="no campaigns"):
+      build(versions_dir, data_dir)
+
+    assert versions.current_version(versions_dir) == 1
+    assert versions.available_versions(versions_dir) == [1]
+    assert (versions_dir / "2.failed" / versions.REPORT_DIR).is_dir()
+    assert not (versions_dir / "2.tmp").exists()
+
+  def test_skips_versions_being_built(
+    self, versions_dir: Path, data_dir: Path
+  ):
+    """A build never reuses the number another build has reserved."""
+    build(versions_dir, data_dir)
+    in_progress = versions_dir / "2.tmp"
+    in_progress.mkdir()
+
+    assert build(versions_dir, data_dir) == 3
+    assert in_progress.is_dir()
+    assert versions.available_versions(versions_dir) == [1, 3]
+
+  def test_reserves_distinct_versions(self, versions_dir: Path):
+    """Reservations racing on the same number each get their own."""
+    with ThreadPoolExecutor(max_workers=8) as executor:
+      reserved = list(executor.map(
+        lambda _: versions._reserve_version(versions_dir), range(8)
+      ))
+
+    assert sorted(version for version, _ in reserved) == list(range(1, 9))
+    assert all(staging.is_dir() for _, staging in reserved)
+
+  def test_collects_old_versions(self, versions_dir: Path, data_dir: Path):
+    """Only the newest versions are kept, and never the current one."""
+    for _ in range(3):
+      build(versions_dir, data_dir, keep=3)
+    versions.publish_version(versions_dir, 1)
+
+    assert versions.collect_garbage(versions_dir, keep=1) == [2]
+    assert versions.available_versions(versions_dir) == [1, 3]
+    with pytest.raises(versions.MissingVersionError):
+      versions.publish_version(versions_dir, 2)
+
+
+class TestServingDatabase:
+  """Tests for the served versions of one process."""
+
+  def test_switch_and_retire(self, tmp_path: Path):
+    """Adding a version makes it current; the oldest beyond keep close."""
+    serving = ServingDatabase(keep=2)
+    served = [
+      ServedVersion(
+        version, create_engine(f"sqlite:///{tmp_path / f'{version}.db'}"),
+        None
+      )
+      for version in (1, 2, 3)
+    ]
+    for version in served:
+      serving.add(version)
+
+    assert serving.get() is served[2]
+    assert serving.get(2) is served[1]
+    assert serving.get(1) is None
+    assert serving.versions() == [2, 3]
+
+  def test_pinned_version_is_not_activated(self, tmp_path: Path):
+    """A version opened for pinned requests does not become current."""
+    serving = ServingDatabase()
+    engine = create_engine(f"sqlite:///{tmp_path / 'served.db'}")
+    serving.add(ServedVersion(2, engine, None))
+
+    serving.add(ServedVersion(1, engine, None), activate=False)
+
+    assert serving.get().version == 2
+    assert serving.versions() == [1, 2]
+
+
+class TestServedVersions:
+  """Tests for serving, pinning and switching published versions."""
+
+  def test_pins_a_version(self, versions_dir: Path, data_dir: Path):
+    """Pinned requests keep reading the version they name."""
+    build(versions_dir, data_dir)
+    drop_last_campaign(data_dir)
+    build(versions_dir, data_dir)
+
+    with TestClient(main.app) as client:
+      assert campaigns_total(client) == (11, "2")
+      assert campaigns_total(client, **{"X-Dataset-Version": "1"}) == (12, "1")
+      unknown = client.get("/campaigns/", headers={"X-Dataset-Version": "9"})
+
+    assert unknown.status_code == 404
+
+  def test_collected_version_is_gone(
+    self, versions_dir: Path, data_dir: Path
+  ):
+    """A pinned version that was collected answers 410."""
+    build(versions_dir, data_dir)
+    build(versions_dir, data_dir, keep=1)
+
+    with TestClient(main.app) as client:
+      response = client.get("/campaigns/", headers={"X-Dataset-Version": "1"})
+
+    assert response.status_code == 410
+
+  def test_switches_to_published_version(
+    self, versions_dir: Path, data_dir: Path, monkeypatch
+  ):
+    """A running server picks up a newly published version."""
+    monkeypatch.setattr(config, "DATASET_CHECK_INTERVAL_S", 0.01)
+    build(versions_dir, data_dir)
+
+    with TestClient(main.app) as client:
+      assert campaigns_total(client) == (12, "1")
+      drop_last_campaign(data_dir)
+      build(versions_dir, data_dir)
+      deadline = time.monotonic() + 5
+      while main.SERVING.current.version != 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+      assert campaigns_total(client) == (11, "2")
+      assert campaigns_total(client, **{"X-Dataset-Version": "1"}) == (12, "1")